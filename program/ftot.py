@@ -74,6 +74,9 @@ if __name__ == '__main__':
             
             oc2b = optional step to solve and save pulp problem from pickled, constrained, problem. Run oc3 after.
 
+            o2u = optional step to re-solve the o2 problem for each unmet demand penalty scaling factor in the
+            udp_sensitivity_probes table of the main.db and save the udp_sensitivity_results table; run after o1
+
             os =  optimization sourcing; optional step to calculate source facilities for optimal flows, 
             uses existing solution from o and must be run after o
             
@@ -97,10 +100,18 @@ if __name__ == '__main__':
             m2c = optionally create time and commodity mapping with a topographic basemap
             m2d = optionally create time and commodity mapping with a streets basemap
             
+            # pipeline
+            # --------
+            run = run s f c g o1 o2 p d in order, skipping the steps whose inputs have not changed since they last
+            ran; the input fingerprints are stored in the main.db
+            --force_rerun = a command line option to re-run every pipeline step regardless of the fingerprints
+            --last_step = a command line option to stop the pipeline after the given step, e.g. g
+
             # utilities, tools, and advanced options
             # ---------------------------------------
             test = a test method that can be used for debugging purposes
             --skip_arcpy_check = a command line option to skip the arcpy dependency check  
+            --profile = a command line option to profile the step; same as setting Profile_Steps in the XML
     """
 
     parser = argparse.ArgumentParser(description=program_description, usage=help_text)
@@ -109,14 +120,26 @@ if __name__ == '__main__':
 
     parser.add_argument("task", choices=("s", "f", "f2", "c", "c2", "g", "g2",
                                          "o", "oc",
-                                         "o1", "o2", "o2b", "oc1", "oc2", "oc2b", "oc3", "os", "p",
+                                         "o1", "o2", "o2b", "o2u", "oc1", "oc2", "oc2b", "oc3", "os", "p",
                                          "d", "m", "mb", "mc", "md", "m2", "m2b", "m2c", "m2d",
-                                         "test"
+                                         "run", "test"
                                          ), type=str)
     parser.add_argument('-skip_arcpy_check', action='store_true',
                         default=False,
                         dest='skip_arcpy_check',
                         help='Use argument to skip the arcpy dependency check')
+    parser.add_argument('-profile', action='store_true',
+                        default=False,
+                        dest='profile',
+                        help='Use argument to save function, SQL, and memory profiles of the step')
+    parser.add_argument('-force_rerun', action='store_true',
+                        default=False,
+                        dest='force_rerun',
+                        help='Use argument with the run task to re-run every step regardless of the input fingerprints')
+    parser.add_argument('-last_step', choices=("s", "f", "c", "g", "o1", "o2", "p", "d"),
+                        default='d',
+                        dest='last_step',
+                        help='Use argument with the run task to stop the pipeline after the given step')
 
     args = parser.parse_args()
 
@@ -196,6 +219,15 @@ if __name__ == '__main__':
                      "Download the modeler here: http://code.google.com/p/pulp-or/downloads/list.")
         sys.exit(1)
 
+    # start the step profiler if requested; the pipeline passes the option on to each step it runs
+    # ----------------------------------------------------------------------------------------------
+
+    profiler = None
+    if (args.profile or the_scenario.profile_steps) and args.task not in ['run', 'test']:
+        from ftot_profiler import StepProfiler
+        profiler = StepProfiler(the_scenario, args.task, logger)
+        profiler.start()
+
     # run the task
     # ----------------------------------------------------------------------------------------------
 
@@ -249,6 +281,11 @@ if __name__ == '__main__':
             from ftot_pulp import o2b
             o2b(the_scenario, logger)
 
+        # optional step to re-solve the optimization problem for a set of unmet demand penalty scaling factors
+        elif args.task in ['o2u']:
+            from ftot_pulp import solve_udp_sensitivity
+            solve_udp_sensitivity(the_scenario, logger)
+
         # optimization option - processor candidates generation
         elif args.task in ['oc1']:
             from ftot_pulp_candidate_generation import oc1
@@ -288,6 +325,12 @@ if __name__ == '__main__':
             from ftot_maps import prepare_time_commodity_subsets_for_mapping
             prepare_time_commodity_subsets_for_mapping(the_scenario, logger, args.task)
 
+        # pipeline; runs each stale step in its own process
+        elif args.task in ['run']:
+            from ftot_pipeline import run_pipeline
+            run_pipeline(the_scenario, xml_file_location, FTOT_VERSION, args.skip_arcpy_check, args.force_rerun,
+                         logger, args.last_step, args.profile)
+
         elif args.task in ['test']:
             logger.info("in the test case")
             import pdb
@@ -304,8 +347,15 @@ if __name__ == '__main__':
                 logger.error(trace_line)
         logger.error("!!!!!!!!!!!!!!!!!!!!!!!!!!!!! EXCEPTION RAISED !!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
 
+        # keep the profile of a failed step; it often shows where the step was stuck
+        if profiler is not None:
+            profiler.stop()
+
         sys.exit(1)
 
+    if profiler is not None:
+        profiler.stop()
+
     logger.info("======================== FTOT RUN FINISHED: {:2} ==================================".format(
         str(args.task).upper()))
     logger.info("======================== Total Runtime (HMS): \t{} \t ".format(
@@ -0,0 +1,264 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: ftot_batch.py
+#
+# Purpose: Runs a batch of FTOT scenarios. Scenarios that share a network configuration and the other inputs
+# of the s, f, c, and g steps are grouped; the network preprocessing (setup, facilities, artificial links, and
+# the networkx graph and od pairs) runs once per group and is copied to the other scenarios of the group.
+# The optimization and reporting steps of every scenario then run in parallel worker processes.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+import datetime
+import traceback
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import ftot_supporting
+from ftot import FTOT_VERSION, VERSION_DATE
+
+# the last step that is shared by the scenarios of a group
+SHARED_LAST_STEP = 'g'
+
+# outputs of the shared steps copied from the first scenario of a group to the others
+SHARED_OUTPUTS = ["main.db", "main.gdb", "debug", "temp_networkx_shp_files"]
+
+
+# ===================================================================================================
+
+
+def get_scenario_xmls(scenario_inputs):
+    # each input is a scenario XML or a text file listing one scenario XML per line
+    scenario_xmls = []
+    for scenario_input in scenario_inputs:
+        if scenario_input.lower().endswith('.txt'):
+            with open(scenario_input, 'r') as rf:
+                for line in rf:
+                    line = line.strip().strip('"')
+                    if line != "" and not line.startswith('#'):
+                        scenario_xmls.append(line)
+        else:
+            scenario_xmls.append(scenario_input)
+
+    scenario_xmls = [os.path.abspath(xml) for xml in scenario_xmls]
+    for xml in scenario_xmls:
+        if not os.path.exists(xml):
+            raise IOError("{} doesn't exist".format(xml))
+
+    # every scenario writes its main.db and reports next to its XML
+    run_directories = [os.path.dirname(xml) for xml in scenario_xmls]
+    if len(set(run_directories)) != len(run_directories):
+        raise Exception("Each scenario XML in a batch must be in its own directory")
+
+    return scenario_xmls
+
+
+# ===================================================================================================
+
+
+def group_scenarios(scenario_xmls, logger):
+    # groups the scenarios by the fingerprint of the g step, which covers the network configuration (network gdb,
+    # disruption, artificial link distances, modal costs, short haul penalties) along with the facility inputs
+    # and every other input of the s, f, c, and g steps. input files are fingerprinted by content rather than
+    # path, and inputs first read in o1 or later (e.g., the default UDP) do not split the groups.
+    # returns a list of groups of scenario XMLs.
+    logger.info("start: group_scenarios")
+    from ftot_scenario import load_scenario_config_file
+    from ftot_pipeline import get_step_fingerprints
+
+    xml_schema_file_location = os.path.join(os.path.dirname(os.path.realpath(__file__)), "lib", "Master_FTOT_Schema.xsd")
+
+    groups = {}
+    for xml in scenario_xmls:
+        the_scenario = load_scenario_config_file(xml, xml_schema_file_location, logger)
+        fingerprints = get_step_fingerprints(the_scenario, xml, FTOT_VERSION, logger)
+        groups.setdefault(fingerprints[SHARED_LAST_STEP], []).append(xml)
+
+    groups = list(groups.values())
+    for group_number, group in enumerate(groups, start=1):
+        logger.info("scenario group {}: {} scenario(s)".format(group_number, len(group)))
+        for xml in group:
+            logger.debug("scenario group {}: \t{}".format(group_number, xml))
+
+    logger.result("{} scenarios in {} network groups".format(len(scenario_xmls), len(groups)))
+    return groups
+
+
+# ===================================================================================================
+
+
+def run_scenario_pipeline(xml, last_step, skip_arcpy_check):
+    # runs the ftot.py pipeline for one scenario in its own process. returns the xml and the exit code.
+    ftot_script = os.path.join(os.path.dirname(os.path.realpath(__file__)), "ftot.py")
+    command = [sys.executable, ftot_script, xml, "run", "-last_step", last_step]
+    if skip_arcpy_check:
+        command.append('-skip_arcpy_check')
+    with open(os.devnull, 'w') as devnull:
+        # the step logs are written to each scenario's logs folder
+        return_code = subprocess.call(command, stdout=devnull, stderr=subprocess.STDOUT)
+    return xml, return_code
+
+
+# ===================================================================================================
+
+
+def run_in_parallel(scenario_xmls, last_step, skip_arcpy_check, max_workers, logger):
+    # each worker thread waits on one ftot.py process, so at most max_workers scenarios run at a time.
+    # returns the scenarios that failed.
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_scenario_pipeline, xml, last_step, skip_arcpy_check) for xml in scenario_xmls]
+        for future in futures:
+            xml, return_code = future.result()
+            if return_code == 0:
+                logger.info("finished: {} through step {}".format(xml, last_step))
+            else:
+                logger.error("scenario {} failed with exit code {}. See the scenario logs for details.".format(
+                    xml, return_code))
+                failed.append(xml)
+    return failed
+
+
+# ===================================================================================================
+
+
+def copy_shared_outputs(source_xml, target_xml, logger):
+    # copies the outputs of the shared steps, along with their logs and run metrics so the reports are complete
+    logger.debug("start: copy_shared_outputs from {} to {}".format(source_xml, target_xml))
+    source_dir = os.path.dirname(source_xml)
+    target_dir = os.path.dirname(target_xml)
+
+    for output in SHARED_OUTPUTS:
+        source = os.path.join(source_dir, output)
+        target = os.path.join(target_dir, output)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+        if os.path.isdir(source):
+            shutil.copytree(source, target, ignore=shutil.ignore_patterns('*.lock'))
+        elif os.path.exists(source):
+            shutil.copy2(source, target)
+
+    source_logs = os.path.join(source_dir, "logs")
+    target_logs = os.path.join(target_dir, "logs")
+    if not os.path.exists(target_logs):
+        os.makedirs(target_logs)
+    shared_steps = ['s', 'f', 'c', 'g']
+    for step in shared_steps:
+        for log_file in glob.glob(os.path.join(source_logs, "{}_log_*.log".format(step))):
+            shutil.copy2(log_file, target_logs)
+
+    source_metrics = os.path.join(source_logs, ftot_supporting.RUN_METRICS_FILE)
+    if os.path.exists(source_metrics):
+        with open(source_metrics, 'r') as rf, \
+                open(os.path.join(target_logs, ftot_supporting.RUN_METRICS_FILE), 'a') as wf:
+            for line in rf:
+                try:
+                    if json.loads(line)['step'] in shared_steps:
+                        wf.write(line)
+                except (ValueError, KeyError):
+                    continue
+
+
+# ===================================================================================================
+
+
+def run_batch(scenario_xmls, max_workers, skip_arcpy_check, logger):
+    logger.info("start: run_batch")
+
+    groups = group_scenarios(scenario_xmls, logger)
+
+    # network preprocessing, once per group, through the first scenario of each group
+    logger.info("start: shared steps s through {} for {} groups".format(SHARED_LAST_STEP, len(groups)))
+    start_time = datetime.datetime.now()
+    failed = run_in_parallel([group[0] for group in groups], SHARED_LAST_STEP, skip_arcpy_check, max_workers, logger)
+    logger.info("finished: shared steps. Runtime (HMS): \t{}".format(ftot_supporting.get_total_runtime_string(start_time)))
+
+    # the copied main.db carries the pipeline fingerprints, so the pipeline of each scenario in the group
+    # picks up at o1
+    scenarios_to_run = []
+    for group in groups:
+        if group[0] in failed:
+            logger.error("skipping {} scenario(s) that share the network of {}".format(len(group) - 1, group[0]))
+            failed.extend(group[1:])
+            continue
+        for xml in group[1:]:
+            copy_shared_outputs(group[0], xml, logger)
+        scenarios_to_run.extend(group)
+
+    logger.info("start: remaining steps for {} scenarios".format(len(scenarios_to_run)))
+    start_time = datetime.datetime.now()
+    failed.extend(run_in_parallel(scenarios_to_run, 'd', skip_arcpy_check, max_workers, logger))
+    logger.info("finished: remaining steps. Runtime (HMS): \t{}".format(ftot_supporting.get_total_runtime_string(start_time)))
+
+    logger.result("{} of {} scenarios completed".format(len(scenario_xmls) - len(failed), len(scenario_xmls)))
+    for xml in failed:
+        logger.warning("scenario did not complete: {}".format(xml))
+
+    logger.info("finished: run_batch")
+    return failed
+
+
+# ===================================================================================================
+
+if __name__ == '__main__':
+
+    start_time = datetime.datetime.now()
+
+    program_description = 'FTOT batch runner. Version Number: ' + FTOT_VERSION + ", (" + VERSION_DATE + ")"
+
+    parser = argparse.ArgumentParser(description=program_description)
+    parser.add_argument("scenarios", nargs='+', type=str,
+                        help="Full paths to the XML scenarios, or to text files listing one XML scenario per line")
+    parser.add_argument('-max_workers', type=int,
+                        default=max(1, multiprocessing.cpu_count() // 2),
+                        dest='max_workers',
+                        help='The number of scenarios to run at the same time')
+    parser.add_argument('-skip_arcpy_check', action='store_true',
+                        default=False,
+                        dest='skip_arcpy_check',
+                        help='Use argument to skip the arcpy dependency check')
+
+    args = parser.parse_args()
+
+    scenario_xmls = get_scenario_xmls(args.scenarios)
+
+    # the batch log is written next to the scenario folders
+    batch_directory = os.path.commonpath([os.path.dirname(os.path.dirname(xml)) for xml in scenario_xmls])
+    logger = ftot_supporting.create_loggers(batch_directory, "batch")
+
+    logger.info("=================================================================================")
+    logger.info("============= FTOT BATCH STARTING.  {} scenarios, {} workers =====================".format(
+        len(scenario_xmls), args.max_workers))
+    logger.info("=================================================================================")
+
+    try:
+        failed = run_batch(scenario_xmls, max(1, args.max_workers), args.skip_arcpy_check, logger)
+
+    except:
+
+        stack_trace = traceback.format_exc()
+        split_stack_trace = stack_trace.split('\n')
+        logger.error("!!!!!!!!!!!!!!!!!!!!!!!!!!!!! EXCEPTION RAISED !!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
+        for i in range(0, len(split_stack_trace)):
+            trace_line = split_stack_trace[i].rstrip()
+            if trace_line != "":
+                logger.error(trace_line)
+        logger.error("!!!!!!!!!!!!!!!!!!!!!!!!!!!!! EXCEPTION RAISED !!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
+
+        sys.exit(1)
+
+    logger.info("======================== FTOT BATCH FINISHED ====================================")
+    logger.info("======================== Total Runtime (HMS): \t{} \t ".format(
+        ftot_supporting.get_total_runtime_string(start_time)))
+    logger.info("=================================================================================")
+
+    if len(failed) > 0:
+        sys.exit(1)
@@ -114,7 +114,7 @@ def db_cleanup_tables(the_scenario, logger):
         logger.debug("create the commodities table")
         main_db_con.executescript(
             """create table commodities(commodity_ID INTEGER PRIMARY KEY, commodity_name text, supertype text, subtype text,
-            units text, phase_of_matter text, density text, max_transport_distance numeric, proportion_of_supertype numeric,
+            units text, phase_of_matter text, density text, density_value numeric, density_units text, max_transport_distance numeric, proportion_of_supertype numeric,
             share_max_transport_distance text, CONSTRAINT unique_name UNIQUE(commodity_name) );""")
         # proportion_of_supertype specifies how much demand is satisfied by this subtype relative to the "pure"
         # fuel/commodity. this will depend on the process
@@ -436,7 +436,7 @@ def check_for_input_error(input_file_type, input_type, input_val, filename, inde
         elif input_val == 'solid':
             # check if units are valid units for solid (dimension of units must be mass)
             try:
-                if not str(ureg(units).dimensionality) == '[mass]':
+                if not ftot_supporting.get_units_dimensionality(units) == '[mass]':
                     error_message = "The phase_of_matter entry in row {} of {} is solid, but the units are {}" \
                                     " which is not a valid unit for this phase of matter. Solids must be measured in " \
                                     "units of mass.".format(index, filename, units)
@@ -447,7 +447,7 @@ def check_for_input_error(input_file_type, input_type, input_val, filename, inde
         elif input_val == 'liquid':
             # check if units are valid units for liquid (dimension of units must be volume, aka length^3)
             try:
-                if not str(ureg(units).dimensionality) == '[length] ** 3':
+                if not ftot_supporting.get_units_dimensionality(units) == '[length] ** 3':
                     error_message = "The phase_of_matter entry in row {} of {} is liquid, but the units are {}" \
                                     " which is not a valid unit for this phase of matter. Liquids must be measured" \
                                     " in units of volume.".format(index, filename, units)
@@ -625,13 +625,6 @@ def load_facility_commodities_input_data(the_scenario, input_file_type, commodit
             commodity_unit     = str(row["units"]).strip().replace(' ', '_').lower()  # remove all spaces and make lowercase
             commodity_phase    = str(row["phase_of_matter"]).strip().lower()  # remove spaces and make lowercase
 
-            # adding udp if it exists in dest.csv, or just use default udp
-            if input_file_type == 'dest' and 'udp' in row and row['udp']:
-                # Set UDP to pint string for commodity-specific conversions
-                udp = f"{row['udp']} {the_scenario.default_units_currency} / {commodity_unit}"
-            else:
-                udp = f"{the_scenario.unMetDemandPenalty} {the_scenario.default_units_currency} / {the_scenario.default_units_solid_phase}"
-
             # check for proc_cand-specific "non-commodities" to ignore validation and process proc-specific "total" rows
             non_commodities = ['minsize', 'maxsize', 'cost_formula', 'min_aggregation', 'total']
 
@@ -766,7 +759,8 @@ def load_facility_commodities_input_data(the_scenario, input_file_type, commodit
                                format(schedule_name, facility_schedule_dict[facility_name], facility_name))
                 schedule_name = facility_schedule_dict[facility_name]
 
-            # add udp if it exists in dest.csv, otherwise use default udp
+            # add udp if it exists in dest.csv. destinations without one are left null and get the default
+            # Unmet_Demand_Penalty of the scenario XML in o1, so the facility setup does not depend on it
             if "udp" in list(row.keys()) and row["udp"]:
                 udp = row["udp"]
                 check_for_input_error(input_file_type, "udp", udp, commodity_input_file,
@@ -774,7 +768,7 @@ def load_facility_commodities_input_data(the_scenario, input_file_type, commodit
                 # Set UDP to pint string for commodity-specific conversions
                 udp = f"{udp} {the_scenario.default_units_currency} / {commodity_unit}"
             elif input_file_type == 'dest':
-                udp = f"{the_scenario.unMetDemandPenalty} {the_scenario.default_units_currency} / {the_scenario.default_units_solid_phase}"
+                udp = None
             else:
                 udp = "Null"
 
@@ -875,20 +869,52 @@ def populate_facility_commodities_table(the_scenario, input_file_type, commodity
         generated_candidate = 1
 
     # connect to main.db and add values to table
+    # the whole file is loaded in one transaction: dimension lookups are read once up front,
+    # then facilities and facility_commodities are inserted with executemany
     # ---------------------------------------------------------
-    for facility_name, facility_data in iteritems(facility_commodities_dict):
-        logger.debug("starting DB processing for facility_name: {}".format(facility_name))
+    with sqlite3.connect(the_scenario.main_db) as db_con:
+
+        # cache the dimension tables (keep the first match, as the single-row lookups do)
+        facility_type_ids = {}
+        for facility_type, facility_type_id in db_con.execute("select facility_type, facility_type_id from facility_type_id;"):
+            facility_type_ids[facility_type] = facility_type_id
+
+        facility_location_ids = {}
+        for facility_name, location_id in db_con.execute("select facility_name, location_id from tmp_facility_locations;"):
+            facility_location_ids.setdefault(facility_name, location_id)
+
+        schedules = {}
+        for schedule_name, schedule_id, total_availability in db_con.execute("select schedule_name, schedule_id, tot_availability from schedule_names;"):
+            schedules.setdefault(schedule_name, (schedule_id, total_availability))
+
+        commodity_ids = {}
+        for commodity_name, commodity_id in db_con.execute("select commodity_name, commodity_id from commodities;"):
+            commodity_ids[commodity_name] = commodity_id
+
+        # stage the facility dimension
+        # ---------------------------------------------------------
+        facility_info = {}
+        facility_rows = []
+        for facility_name, facility_data in iteritems(facility_commodities_dict):
+            logger.debug("starting DB processing for facility_name: {}".format(facility_name))
 
-        with sqlite3.connect(the_scenario.main_db) as db_con:
             # unpack the facility_type (should be the same for all entries)
             facility_type = facility_data[0][0]
-            facility_type_id = get_facility_id_type(the_scenario, db_con, facility_type, logger)
+            if facility_type not in facility_type_ids:
+                facility_type_ids[facility_type] = get_facility_id_type(the_scenario, db_con, facility_type, logger)
+            facility_type_id = facility_type_ids[facility_type]
 
-            location_id = get_facility_location_id(the_scenario, db_con, facility_name, logger)
+            location_id = facility_location_ids.get(str(facility_name))
+            if location_id is None:
+                logger.debug("location_id for tmp_facility_name: {} is not found.".format(facility_name))
 
-            # get schedule id from the db
+            # get schedule id from the cache
             schedule_name = facility_data[0][12]
-            schedule_id, total_availability = get_schedule_id(the_scenario, db_con, schedule_name, logger, get_avail=True)
+            if str(schedule_name) not in schedules:
+                # if schedule id is not found, replace with the default schedule
+                logger.info('schedule_id for schedule_name: {} is not found. Replace with default'.format(schedule_name))
+                schedule_name = 'default'
+            schedule_id, total_availability = schedules[str(schedule_name)]
 
             build_cost = facility_data[0][10]
 
@@ -899,39 +925,58 @@ def populate_facility_commodities_table(the_scenario, input_file_type, commodity
             else:
                 candidate = 0
 
+            # Specify ignore_facility = 'false' for candidates. Otherwise, the input-from-file candidates get ignored like excess generated candidates.
+            ignore_facility = 'false' if build_cost > 0 else None
+
+            # capacity ratios are filled in once all commodities of the facility are known
+            facility_rows.append((str(location_id), facility_name, facility_type_id, ignore_facility, candidate,
+                                  schedule_id, None, build_cost, None, total_availability))
+            facility_info[facility_name] = [facility_type_id, location_id, total_availability]
+
+        db_con.executemany("insert or ignore into facilities "
+                           "(location_id, facility_name, facility_type_id, ignore_facility, candidate, schedule_id, max_capacity_ratio, build_cost, min_capacity_ratio, availability) "
+                           "values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);", facility_rows)
+
+        # get the facility_id of each facility (the first one added, if the facility was loaded before)
+        facility_ids = {}
+        for facility_name, facility_type_id, facility_id in db_con.execute("select facility_name, facility_type_id, min(facility_id) "
+                                                                           "from facilities group by facility_name, facility_type_id;"):
+            facility_ids[facility_name, facility_type_id] = facility_id
+
+        # stage the commodity dimension and the facility_commodities rows
+        # ---------------------------------------------------------
+        facility_commodity_rows = []
+        facility_capacity = {}
+        for facility_name, facility_data in iteritems(facility_commodities_dict):
+            facility_type_id, location_id, total_availability = facility_info[facility_name]
+            facility_id = facility_ids.get((facility_name, facility_type_id))
+            if not facility_id:
+                error = "something went wrong getting {} facility_id ".format(facility_id)
+                logger.error(error)
+                raise Exception(error)
+
             # placeholders for capacity calculation
             overall_min_ratio = 'Null'
             overall_max_ratio = 'Null'
-            running_total = {('i', 'solid'): Q_(0, the_scenario.default_units_solid_phase)}
-            running_total['o', 'solid'] = Q_(0, the_scenario.default_units_solid_phase)
-            running_total['i', 'liquid'] = Q_(0, the_scenario.default_units_liquid_phase)
-            running_total['o', 'liquid'] = Q_(0, the_scenario.default_units_liquid_phase)
             check_total = {}
 
-            # get the facility_id from the db (add the facility if it doesn't exist)
-            # and set up entry in facility_id table
-            facility_id = get_facility_id(the_scenario, db_con, location_id, facility_name, facility_type_id, candidate, schedule_id, total_availability, overall_max_ratio, build_cost, overall_min_ratio, logger)
-                
             # iterate through each commodity
             for commodity_data in facility_data:
                 [facility_type, commodity_name, commodity_quantity, commodity_units, commodity_phase, commodity_max_transport_distance, io, share_max_transport_distance, min_capacity, candidate_data, build_cost, max_capacity, schedule_id, udp, access_cost] = commodity_data
 
                 if commodity_name != 'total':
                     # get commodity_id (add the commodity if it doesn't exist)
-                    commodity_id = get_commodity_id(the_scenario, db_con, commodity_data, logger)
+                    if commodity_name not in commodity_ids:
+                        commodity_ids[commodity_name] = get_commodity_id(the_scenario, db_con, commodity_data, logger)
+                    commodity_id = commodity_ids[commodity_name]
 
                     if not commodity_quantity == "0.0":  # skip anything with no material
-                        sql = "insert into facility_commodities " \
-                                "(facility_id, location_id, commodity_id, quantity, units, original_quantity, original_units, io, share_max_transport_distance, access_cost) " \
-                                "values ('{}', '{}', '{}', '{}', '{}', '{}', '{}', '{}', '{}', '{}');".format(facility_id, location_id, commodity_id, 
-                                                                                            commodity_quantity, commodity_units, # Will convert these to solid quantity and units
-                                                                                            commodity_quantity, commodity_units, 
-                                                                                            io, share_max_transport_distance, access_cost)
-
-                        db_con.execute(sql)
-
-                        if input_file_type == 'dest':
-                            db_con.execute("update facility_commodities set udp = '{}' where facility_id = {} and commodity_id = {};".format(udp, facility_id, commodity_id))
+                        # values are bound as text to match the affinity conversion of the quoted insert
+                        facility_commodity_rows.append((str(facility_id), str(location_id), str(commodity_id),
+                                                        str(commodity_quantity), str(commodity_units),  # Will convert these to solid quantity and units
+                                                        str(commodity_quantity), str(commodity_units),
+                                                        str(io), str(share_max_transport_distance), str(access_cost),
+                                                        str(udp) if input_file_type == 'dest' and udp is not None else None))
 
                         # if the capacity for this commodity is more constraining than any to date, update overall ratio
                         if min_capacity != 'Null':
@@ -940,7 +985,7 @@ def populate_facility_commodities_table(the_scenario, input_file_type, commodity
                             else:
                                 if min_capacity/commodity_quantity > overall_min_ratio:
                                     overall_min_ratio = min_capacity/commodity_quantity
-                            
+
                         if max_capacity != 'Null':
                             if overall_max_ratio == 'Null':
                                 overall_max_ratio = max_capacity/commodity_quantity
@@ -950,46 +995,73 @@ def populate_facility_commodities_table(the_scenario, input_file_type, commodity
                     else:
                         logger.debug("skipping commodity_data {} because quantity: {}".format(commodity_name, commodity_quantity))
                 else:  # total row
-                    # if total row is liquid, all contributing commodities must be liquid else throw error 
+                    # if total row is liquid, all contributing commodities must be liquid else throw error
                     if min_capacity != 'Null':
                         check_total.setdefault((io, commodity_phase),{})['min'] = Q_(float(min_capacity), commodity_units)
                     if max_capacity != 'Null':
                         check_total.setdefault((io, commodity_phase),{})['max'] = Q_(float(max_capacity), commodity_units)
 
-            db_con.execute("""update commodities
-            set share_max_transport_distance = 
-            (select 'Y' from facility_commodities fc
-            where commodities.commodity_id = fc.commodity_id
-            and fc.share_max_transport_distance = 'Y')
-            where exists             (select 'Y' from facility_commodities fc
-            where commodities.commodity_id = fc.commodity_id
-            and fc.share_max_transport_distance = 'Y')
-                ;"""
-            )
-        
-        # cannot load density dict until commodities table is populated, at least for a given facility  
+            facility_capacity[facility_name] = [facility_id, facility_type, total_availability, overall_min_ratio, overall_max_ratio, check_total]
+
+        db_con.executemany("insert into facility_commodities "
+                           "(facility_id, location_id, commodity_id, quantity, units, original_quantity, original_units, io, share_max_transport_distance, access_cost, udp) "
+                           "values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);", facility_commodity_rows)
+
+        db_con.execute("""update commodities
+        set share_max_transport_distance = 
+        (select 'Y' from facility_commodities fc
+        where commodities.commodity_id = fc.commodity_id
+        and fc.share_max_transport_distance = 'Y')
+        where exists             (select 'Y' from facility_commodities fc
+        where commodities.commodity_id = fc.commodity_id
+        and fc.share_max_transport_distance = 'Y')
+            ;"""
+        )
+
+    # total capacity rows are checked against the sum of the facility's commodities
+    # cannot load density dict until commodities table is populated
+    # ---------------------------------------------------------
+    total_facility_ids = [capacity[0] for capacity in facility_capacity.values() if len(capacity[5]) > 0]
+    running_totals = {}
+    if len(total_facility_ids) > 0:
+        density_dict = ftot_supporting_gis.make_commodity_density_dict(the_scenario, logger)
+
+        for facility_id in total_facility_ids:
+            running_total = {('i', 'solid'): Q_(0, the_scenario.default_units_solid_phase)}
+            running_total['o', 'solid'] = Q_(0, the_scenario.default_units_solid_phase)
+            running_total['i', 'liquid'] = Q_(0, the_scenario.default_units_liquid_phase)
+            running_total['o', 'liquid'] = Q_(0, the_scenario.default_units_liquid_phase)
+            running_totals[facility_id] = [running_total, {'i': True, 'o': True}]
+
+        with sqlite3.connect(the_scenario.main_db) as db_con:
+            for row in db_con.execute("""select fc.facility_id, fc.io, fc.units, fc.quantity, c.commodity_name, c.phase_of_matter
+            from facility_commodities fc, commodities c
+            where fc.facility_id in ({})
+            and c.commodity_id = fc.commodity_id
+            order by fc.rowid
+            ;""".format(", ".join(str(facility_id) for facility_id in total_facility_ids))):
+                facility_id = row[0]
+                io = row[1]
+                commodity_units = row[2]
+                commodity_quantity = row[3]
+                commodity_name = row[4]
+                phase_of_matter = row[5]
+                running_total, all_liquid = running_totals[facility_id]
+                running_total[io, phase_of_matter] = running_total[io, phase_of_matter] + Q_(commodity_quantity, commodity_units)
+                if commodity_units == the_scenario.default_units_solid_phase:
+                    all_liquid[io] = False
+                if commodity_units == the_scenario.default_units_liquid_phase:
+                    # if liquid, convert and add to solid total
+                    # this is double counting, but effectively it gives us one total for just liquids and one for everything (with converted liquids)
+                    running_total[io, 'solid'] = running_total[io, 'solid'] + density_dict[commodity_name]*Q_(commodity_quantity, commodity_units)
+
+    # finalize the capacity ratios and scaling of each facility
+    # ---------------------------------------------------------
+    facility_updates = []
+    scaling_updates = []
+    for facility_name, (facility_id, facility_type, total_availability, overall_min_ratio, overall_max_ratio, check_total) in iteritems(facility_capacity):
         if len(check_total) > 0:
-            density_dict = ftot_supporting_gis.make_commodity_density_dict(the_scenario, logger)
-            all_liquid = {'i': True, 'o': True}
-            
-            with sqlite3.connect(the_scenario.main_db) as db_con:
-                for row in db_con.execute("""select fc.io, fc.units, fc.quantity, c.commodity_name, c.phase_of_matter
-                from facility_commodities fc, commodities c
-                where fc.facility_id = {}
-                and c.commodity_id = fc.commodity_id
-                ;""".format(facility_id)):
-                    io = row[0]
-                    commodity_units = row[1]
-                    commodity_quantity = row[2]
-                    commodity_name = row[3]
-                    phase_of_matter = row[4]
-                    running_total[io, phase_of_matter] = running_total[io, phase_of_matter] + Q_(commodity_quantity, commodity_units)
-                    if commodity_units == the_scenario.default_units_solid_phase:
-                        all_liquid[io] = False
-                    if commodity_units == the_scenario.default_units_liquid_phase:
-                        # if liquid, convert and add to solid total
-                        # this is double counting, but effectively it gives us one total for just liquids and one for everything (with converted liquids)
-                        running_total[io, 'solid'] = running_total[io, 'solid'] + density_dict[commodity_name]*Q_(commodity_quantity, commodity_units)
+            running_total, all_liquid = running_totals[facility_id]
 
             # if the capacity for this commodity is more constraining than any to date, update overall ratio
             for (io_phase_key, capacity_dict) in check_total.items():
@@ -1011,22 +1083,26 @@ def populate_facility_commodities_table(the_scenario, input_file_type, commodity
                             overall_max_ratio = capacity_value.magnitude/(running_total[io_phase_key]).magnitude
                         else:
                             if capacity_value.magnitude/(running_total[io_phase_key]).magnitude < overall_max_ratio:
-                                overall_max_ratio = capacity_value.magnitude/(running_total[io_phase_key]).magnitude                 
-        
-        with sqlite3.connect(the_scenario.main_db) as db_con:
-            db_con.execute("update facilities set max_capacity_ratio = {} where facility_id = {};".format(overall_max_ratio, facility_id))
-            db_con.execute("update facilities set min_capacity_ratio = {} where facility_id = {};".format(overall_min_ratio, facility_id))
-            
-            if facility_type == "processor":
-                capacity_scaling = overall_max_ratio
-            else:
-                capacity_scaling = 1
-            db_con.execute("update facilities set capacity_scaling = {} where facility_id = {};".format(capacity_scaling, facility_id))
-            
-            if capacity_scaling != 'Null' :
-                scaling_factor = total_availability * capacity_scaling
-                db_con.execute("update facilities set scaling_factor = {} where facility_id = {};".format(scaling_factor, facility_id))
-                db_con.execute("update facility_commodities set scaled_quantity = {} * quantity where facility_id = {};".format(scaling_factor, facility_id))
+                                overall_max_ratio = capacity_value.magnitude/(running_total[io_phase_key]).magnitude
+
+        if facility_type == "processor":
+            capacity_scaling = overall_max_ratio
+        else:
+            capacity_scaling = 1
+
+        facility_updates.append((None if overall_max_ratio == 'Null' else overall_max_ratio,
+                                 None if overall_min_ratio == 'Null' else overall_min_ratio,
+                                 None if capacity_scaling == 'Null' else capacity_scaling,
+                                 facility_id))
+
+        if capacity_scaling != 'Null':
+            scaling_factor = total_availability * capacity_scaling
+            scaling_updates.append((scaling_factor, facility_id))
+
+    with sqlite3.connect(the_scenario.main_db) as db_con:
+        db_con.executemany("update facilities set max_capacity_ratio = ?, min_capacity_ratio = ?, capacity_scaling = ? where facility_id = ?;", facility_updates)
+        db_con.executemany("update facilities set scaling_factor = ? where facility_id = ?;", scaling_updates)
+        db_con.executemany("update facility_commodities set scaled_quantity = ? * quantity where facility_id = ?;", scaling_updates)
 
     logger.debug("finished: populate_facility_commodities_table")
 
@@ -1040,6 +1116,15 @@ def update_facility_commodities_table(the_scenario, logger):
     # Solid to liquid using density conversion
     density_dict = ftot_supporting_gis.make_commodity_density_dict(the_scenario, logger)
 
+    # default units used for the converted values
+    default_density_units = '{}/{}'.format(the_scenario.default_units_solid_phase, the_scenario.default_units_liquid_phase)
+    solid_cost_units = f"{the_scenario.default_units_currency} / {the_scenario.default_units_solid_phase}"
+    liquid_cost_units = f"{the_scenario.default_units_currency} / {the_scenario.default_units_liquid_phase}"
+    solid_cost_dimension = f"{the_scenario.default_units_currency} / [mass]"
+
+    # densities converted to the default XML units, one per commodity
+    density_conv_dict = {}
+
     # Extract quantity and units from facility_commodities and convert if liquid
     with sqlite3.connect(the_scenario.main_db) as db_con:
         query = """
@@ -1060,47 +1145,46 @@ def update_facility_commodities_table(the_scenario, logger):
 
             # initialize densities as None for solids
             density_conv = None
+            density_conv_magnitude = None
 
             # if commodity_density.csv has a density for this commodity
             if commodity_phase == 'liquid':
                 # uses commodity density or default density if not specified
-                density = density_dict[commodity_name]
-
                 # convert density to default XML units
-                density_conv = Q_(density).to('{}/{}'.format(the_scenario.default_units_solid_phase, the_scenario.default_units_liquid_phase))
+                if commodity_name not in density_conv_dict:
+                    density_conv_dict[commodity_name] = Q_(density_dict[commodity_name]).to(default_density_units)
+                density_conv = density_conv_dict[commodity_name]
+                density_conv_magnitude = density_conv.magnitude
                 
                 # new units and quantity to feed into optimization
                 new_units = the_scenario.default_units_solid_phase
-                new_quantity = (density_conv * Q_(float(commodity_quantity), commodity_units)).to(new_units).magnitude
+                new_quantity = float(commodity_quantity) * density_conv_magnitude * \
+                    ftot_supporting.get_conversion_factor(commodity_units, the_scenario.default_units_liquid_phase)
                 logger.debug(f"{commodity_name}: Converted {commodity_quantity} {commodity_units} to {new_quantity} {new_units} using density {density_conv}")
 
             # Update UDP units based on new units and density
             new_udp = None
             if udp:
+                udp_magnitude, udp_units = ftot_supporting.parse_quantity_string(udp)
                 # If UDP is already solid, keep as solid, convert to default solid unit
-                if Q_(udp).check(f"{the_scenario.default_units_currency} / [mass]"):
-                    new_udp = Q_(udp).to(f"{the_scenario.default_units_currency} / {the_scenario.default_units_solid_phase}")
+                if ftot_supporting.check_units_dimensionality(udp_units, solid_cost_dimension):
+                    new_udp = udp_magnitude * ftot_supporting.get_conversion_factor(udp_units, solid_cost_units)
                 # when udp is specified in dest.csv as a liquid, convert to solid with density
                 else:
-                    new_udp = Q_(udp).to(f"{the_scenario.default_units_currency} / {the_scenario.default_units_liquid_phase}") / density_conv
-                    logger.debug(f"{commodity_name}: Converted UDP of {udp} to {new_udp} using commodity density {density_conv}.")
-                
-                # rewrite into fc table as numerical value
-                new_udp = new_udp.magnitude
+                    new_udp = udp_magnitude * ftot_supporting.get_conversion_factor(udp_units, liquid_cost_units) / density_conv_magnitude
+                    logger.debug(f"{commodity_name}: Converted UDP of {udp} to {new_udp} {solid_cost_units} using commodity density {density_conv}.")
 
             # Update access cost based on new units and density
             new_access_cost = 0
             if isinstance(access_cost, str) and access_cost.lower() not in ("", "none"):
+                access_cost_magnitude, access_cost_units = ftot_supporting.parse_quantity_string(access_cost)
                 # If access_cost is already solid, keep as solid, convert to default solid unit
-                if Q_(access_cost).check(f"{the_scenario.default_units_currency} / [mass]"):
-                    new_access_cost = Q_(access_cost).to(f"{the_scenario.default_units_currency} / {the_scenario.default_units_solid_phase}")
+                if ftot_supporting.check_units_dimensionality(access_cost_units, solid_cost_dimension):
+                    new_access_cost = access_cost_magnitude * ftot_supporting.get_conversion_factor(access_cost_units, solid_cost_units)
                 # when access_cost is specified in input data as a liquid, convert to solid with density
                 else:
-                    new_access_cost = Q_(access_cost).to(f"{the_scenario.default_units_currency} / {the_scenario.default_units_liquid_phase}") / density_conv
-                    logger.debug(f"{commodity_name}: Converted access cost of {access_cost} to {new_access_cost} using commodity density {density_conv}.")
-                
-                # rewrite into fc table as numerical value
-                new_access_cost = new_access_cost.magnitude
+                    new_access_cost = access_cost_magnitude * ftot_supporting.get_conversion_factor(access_cost_units, liquid_cost_units) / density_conv_magnitude
+                    logger.debug(f"{commodity_name}: Converted access cost of {access_cost} to {new_access_cost} {solid_cost_units} using commodity density {density_conv}.")
 
             # updating facility_commodities with density-converted values
             fc_updates.append((float(new_quantity),
@@ -1112,7 +1196,10 @@ def update_facility_commodities_table(the_scenario, logger):
                         ))
             
             # adding density values to commodities table
+            # the numeric magnitude and units are stored alongside the pint string so later steps can use them directly in SQL
             c_updates.append((str(density_conv) if density_conv else None, 
+                              density_conv_magnitude,
+                              str(density_conv.units) if density_conv else None,
                               commodity_id
             ))
 
@@ -1126,7 +1213,7 @@ def update_facility_commodities_table(the_scenario, logger):
         # update density in commodities table
         db_con.executemany("""
             UPDATE commodities 
-            SET density = ?
+            SET density = ?, density_value = ?, density_units = ?
             WHERE commodity_id = ?
             """, c_updates)
 
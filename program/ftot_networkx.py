@@ -16,9 +16,23 @@ import math
 import csv
 from heapq import heappush, heappop
 from itertools import count
+from collections import deque
 from six import iteritems
 from ftot import Q_
 
+# number of od_pairs rows read from the db at a time while the shortest path tasks are made
+OD_PAIRS_FETCH_SIZE = 10000
+
+# o-d pairs sent to a worker in one shortest path task. the pairs of a node are never split across tasks.
+OD_PAIRS_CHUNK_SIZE = 5000
+
+# shortest path tasks queued per worker process before more od_pairs are read
+OD_PAIRS_TASKS_PER_PROCESSOR = 2
+
+# edge_id_dict and commodity_subgraph_dict of each shortest path worker process, set once when the worker starts
+worker_edge_id_dict = None
+worker_commodity_subgraph_dict = None
+
 # -----------------------------------------------------------------------------
 
 
@@ -178,50 +192,38 @@ def presolve_network(the_scenario, G, logger):
     # Create a dictionary of edge_ids from the database which is used later to uniquely identify edges
     edge_id_dict = find_edge_ids(the_scenario, logger)
 
-    # Make origin-destination pairs where od_pairs is a dictionary keyed off [commodity_id, target, source],
-    # value is a list of [scenario_rt_id, phase_of_matter] for that key
-    od_pairs = make_od_pairs(the_scenario, logger)
-
-    # Use multi-processing to determine shortest_paths for each target in the od_pairs dictionary
-    manager = multiprocessing.Manager()
-    all_route_edges = manager.list()
-    no_path_pairs = manager.list()
-    logger.debug("multiprocessing.cpu_count() =  {}".format(multiprocessing.cpu_count()))
-
-    # To parallelize computations, assign a set of targets to be passed to each processor
-    stuff_to_pass = []
-    logger.debug("start: identify shortest_path between each o-d pair by commodity")
-    # by commodity and destination
-    for commodity_id in od_pairs:
-        phase_of_matter = od_pairs[commodity_id]['phase_of_matter']
-        allowed_modes = commodity_subgraph_dict[commodity_id]['modes'] 
-
-        if 'targets' in od_pairs[commodity_id].keys():
-            for a_target in od_pairs[commodity_id]['targets'].keys():
-                stuff_to_pass.append([commodity_subgraph_dict[commodity_id]['subgraph'],
-                                    od_pairs[commodity_id]['targets'][a_target],
-                                    a_target, all_route_edges, no_path_pairs,
-                                    edge_id_dict, phase_of_matter, allowed_modes, 'target'])
-        else:    
-            for a_source in od_pairs[commodity_id]['sources'].keys():
-                if 'facility_subgraphs' in commodity_subgraph_dict[commodity_id].keys():
-                    subgraph = commodity_subgraph_dict[commodity_id]['facility_subgraphs'][a_source]
-                else:
-                    subgraph = commodity_subgraph_dict[commodity_id]['subgraph']
-                stuff_to_pass.append([subgraph,
-                                    od_pairs[commodity_id]['sources'][a_source],
-                                    a_source, all_route_edges, no_path_pairs,
-                                    edge_id_dict, phase_of_matter, allowed_modes, 'source'])
+    # Make the od_pairs table. commodity_st records whether the shortest paths of each commodity
+    # are found from its sources or to its targets
+    commodity_st = make_od_pairs(the_scenario, logger)
 
     # Allow multiprocessing, with no more than 75% of cores to be used, rounding down if necessary
     logger.info("start: the multiprocessing route solve.")
+    logger.debug("multiprocessing.cpu_count() =  {}".format(multiprocessing.cpu_count()))
     processors_to_save = int(math.ceil(multiprocessing.cpu_count() * 0.25))
     processors_to_use = multiprocessing.cpu_count() - processors_to_save
     logger.info("number of CPUs to use = {}".format(processors_to_use))
 
-    pool = multiprocessing.Pool(processes=processors_to_use)
+    # The o-d pairs are streamed from the db to the workers in chunks of source (or target) nodes, so routing
+    # starts with the first chunk read. Reading waits while the queue of tasks is full, which bounds the number
+    # of o-d pairs and route edges held in memory. The graphs are sent to each worker once, when it starts,
+    # and the tasks only carry node ids.
+    max_pending_tasks = processors_to_use * OD_PAIRS_TASKS_PER_PROCESSOR
+    pending_tasks = deque()
+    no_path_pairs = []
+    route_edge_count = 0
+
+    logger.debug("start: identify shortest_path between each o-d pair by commodity")
+    pool = multiprocessing.Pool(processes=processors_to_use, initializer=init_shortest_path_worker,
+                                initargs=(edge_id_dict, commodity_subgraph_dict))
     try:
-        pool.map(multi_shortest_paths, stuff_to_pass)
+        with sqlite3.connect(the_scenario.main_db) as db_cur:
+            for chunk in stream_od_pair_tasks(db_cur, commodity_st, commodity_subgraph_dict, logger):
+                pending_tasks.append(pool.apply_async(multi_shortest_paths, (chunk,)))
+                while len(pending_tasks) >= max_pending_tasks:
+                    route_edge_count += save_shortest_paths(db_cur, pending_tasks.popleft().get(), no_path_pairs)
+            while pending_tasks:
+                route_edge_count += save_shortest_paths(db_cur, pending_tasks.popleft().get(), no_path_pairs)
+            db_cur.commit()
     except Exception as e:
         pool.close()
         pool.terminate()
@@ -230,6 +232,7 @@ def presolve_network(the_scenario, G, logger):
     pool.close()
     pool.join()
 
+    logger.debug("{} route edges added to the route_edges table".format(route_edge_count))
     logger.info("end: identify shortest_path between each o-d pair")
 
     # Log any origin-destination pairs without a shortest path
@@ -239,18 +242,6 @@ def presolve_network(the_scenario, G, logger):
             s, t, rt_id = i
             logger.debug("Missing shortest path for source {}, target {}, scenario_route_id {}".format(s, t, rt_id))
 
-    with sqlite3.connect(the_scenario.main_db) as db_cur:
-        sql = """
-            insert into route_edges
-            (from_node_id, to_node_id, edge_id, scenario_rt_id, rt_order_ind)
-            values (?,?,?,?,?);
-            """
-
-        logger.debug("start: update route_edges table")
-        db_cur.executemany(sql, all_route_edges)
-        db_cur.commit()
-        logger.debug("end: update route_edges table")
-
     with sqlite3.connect(the_scenario.main_db) as db_cur:
         sql = """
             insert or ignore into shortest_edges
@@ -269,14 +260,50 @@ def presolve_network(the_scenario, G, logger):
 # -----------------------------------------------------------------------------
 
 
+# Sets the edge_id_dict and commodity subgraphs of a worker process once, rather than sending them with every task
+def init_shortest_path_worker(edge_id_dict, commodity_subgraph_dict):
+    global worker_edge_id_dict, worker_commodity_subgraph_dict
+    worker_edge_id_dict = edge_id_dict
+    worker_commodity_subgraph_dict = commodity_subgraph_dict
+
+
+# -----------------------------------------------------------------------------
+
+
+# Returns the graph the shortest paths of a node are found on: the MTD subgraph of a source facility
+# if the commodity has a max transport distance, otherwise the subgraph of the commodity's modes
+def get_shortest_path_graph(commodity_subgraph_dict, commodity_id, node, st):
+    if st == 'source' and 'facility_subgraphs' in commodity_subgraph_dict[commodity_id].keys():
+        return commodity_subgraph_dict[commodity_id]['facility_subgraphs'][node]
+    return commodity_subgraph_dict[commodity_id]['subgraph']
+
+
+# -----------------------------------------------------------------------------
+
+
+# Finds the shortest paths of a chunk of nodes made by stream_od_pair_tasks.
+# Returns the route edges and the o-d pairs without a path.
+def multi_shortest_paths(chunk):
+    route_edges = []
+    no_path_pairs = []
+    for commodity_id, node, node_pairs, phase_of_matter, st in chunk:
+        G = get_shortest_path_graph(worker_commodity_subgraph_dict, commodity_id, node, st)
+        allowed_modes = worker_commodity_subgraph_dict[commodity_id]['modes']
+        node_shortest_paths([G, node_pairs, node, worker_edge_id_dict, phase_of_matter, allowed_modes, st],
+                            route_edges, no_path_pairs)
+    return route_edges, no_path_pairs
+
+
+# -----------------------------------------------------------------------------
+
+
 # This method uses a shortest_path algorithm from the nx library to flag edges in the
 # network that are a part of the shortest path connecting an origin to a destination
 # for each commodity
-def multi_shortest_paths(stuff_to_pass):
+def node_shortest_paths(stuff_to_pass, route_edges, no_path_pairs):
 
-    global all_route_edges, no_path_pairs
-    if stuff_to_pass[8] == 'target':
-        G, sources, target, all_route_edges, no_path_pairs, edge_id_dict, phase_of_matter, allowed_modes, st_dummy = stuff_to_pass
+    if stuff_to_pass[6] == 'target':
+        G, sources, target, edge_id_dict, phase_of_matter, allowed_modes, st_dummy = stuff_to_pass
         t = target
         shortest_paths_to_t = nx.shortest_path(G, target=t, weight='{}_weight'.format(phase_of_matter))
         for a_source in sources:
@@ -306,9 +333,9 @@ def multi_shortest_paths(stuff_to_pass):
                             error = """something went wrong finding the edge_id from node {} to node {}
                                     for scenario_rt_id {} in shortest path algorithm""".format(from_node, to_node, rt_id)
                             raise Exception(error)
-                        all_route_edges.append((from_node, to_node, min_edge_id, rt_id, index + 1))
+                        route_edges.append((from_node, to_node, min_edge_id, rt_id, index + 1))
     else:
-        G, targets, source, all_route_edges, no_path_pairs, edge_id_dict, phase_of_matter, allowed_modes, st_dummy = stuff_to_pass
+        G, targets, source, edge_id_dict, phase_of_matter, allowed_modes, st_dummy = stuff_to_pass
         s = source
         shortest_paths_from_s = nx.shortest_path(G, source=s, weight='{}_weight'.format(phase_of_matter))
         for a_target in targets:
@@ -338,7 +365,24 @@ def multi_shortest_paths(stuff_to_pass):
                             error = """something went wrong finding the edge_id from node {} to node {}
                                     for scenario_rt_id {} in shortest path algorithm""".format(from_node, to_node, rt_id)
                             raise Exception(error)
-                        all_route_edges.append((from_node, to_node, min_edge_id, rt_id, index + 1))
+                        route_edges.append((from_node, to_node, min_edge_id, rt_id, index + 1))
+
+
+# -----------------------------------------------------------------------------
+
+
+# Writes the route edges of a finished shortest path task to the route_edges table
+# and returns the number of route edges written
+def save_shortest_paths(db_cur, task_result, no_path_pairs):
+    route_edges, task_no_path_pairs = task_result
+    sql = """
+        insert into route_edges
+        (from_node_id, to_node_id, edge_id, scenario_rt_id, rt_order_ind)
+        values (?,?,?,?,?);
+        """
+    db_cur.executemany(sql, route_edges)
+    no_path_pairs.extend(task_no_path_pairs)
+    return len(route_edges)
 
 
 # -----------------------------------------------------------------------------
@@ -861,13 +905,6 @@ def make_od_pairs(the_scenario, logger):
 
         logger.info("end: create o-d pairs table")
 
-        # Fetch all od-pairs, ordered by target
-        sql = '''
-        SELECT to_node_id, from_node_id, scenario_rt_id, commodity_id, phase_of_matter
-        FROM od_pairs ORDER BY to_node_id DESC;
-        '''
-        sql_list = db_cur.execute(sql).fetchall()
-
         # If commodity associated with a max transport distance, always make shortest paths from source
         sql = '''
         select odp.commodity_id, count(distinct odp.from_node_id), count(distinct odp.to_node_id), cm.max_transport_distance
@@ -891,36 +928,106 @@ def make_od_pairs(the_scenario, logger):
                 else:
                     commodity_st[commodity_id] = 'target'
 
-    # Loop through the od_pairs
-    od_pairs = {}
-    for row in sql_list:
-        target = row[0]
-        source = row[1]
-        scenario_rt_id = row[2]
-        commodity_id = row[3]
-        phase_of_matter = row[4]
-        if commodity_st[commodity_id] == 'target':
-            if commodity_id not in od_pairs:
-                od_pairs[commodity_id] = {}
-                od_pairs[commodity_id]['phase_of_matter'] = phase_of_matter
-                od_pairs[commodity_id]['targets'] = {}
-            if target not in od_pairs[commodity_id]['targets'].keys():
-                od_pairs[commodity_id]['targets'][target] = {}
-            if source not in od_pairs[commodity_id]['targets'][target].keys():
-                od_pairs[commodity_id]['targets'][target][source] = []
-            od_pairs[commodity_id]['targets'][target][source].append(scenario_rt_id)
+    return commodity_st
+
+
+# -----------------------------------------------------------------------------
+
+
+# Generator of the shortest path tasks for the od_pairs table. A task is a chunk of up to OD_PAIRS_CHUNK_SIZE
+# o-d pairs, as a list of [commodity_id, node, pairs of the node, phase_of_matter, st]. Each node is a source with
+# its targets (or a target with its sources, for commodities solved to their targets). The od_pairs of each
+# commodity are read in OD_PAIRS_FETCH_SIZE rows ordered by that node, so only the current chunk is held.
+def stream_od_pair_tasks(db_cur, commodity_st, commodity_subgraph_dict, logger):
+    chunk = []
+    chunk_pair_count = 0
+    for commodity_id in commodity_st:
+        st = commodity_st[commodity_id]
+        if st == 'source':
+            sql = '''
+            SELECT from_node_id, to_node_id, scenario_rt_id, phase_of_matter
+            FROM od_pairs WHERE commodity_id = ? ORDER BY from_node_id;
+            '''
         else:
-            if commodity_id not in od_pairs:
-                od_pairs[commodity_id] = {}
-                od_pairs[commodity_id]['phase_of_matter'] = phase_of_matter
-                od_pairs[commodity_id]['sources'] = {}
-            if source not in od_pairs[commodity_id]['sources'].keys():
-                od_pairs[commodity_id]['sources'][source] = {}
-            if target not in od_pairs[commodity_id]['sources'][source].keys():
-                od_pairs[commodity_id]['sources'][source][target] = []
-            od_pairs[commodity_id]['sources'][source][target].append(scenario_rt_id)
-    
-    return od_pairs
+            sql = '''
+            SELECT to_node_id, from_node_id, scenario_rt_id, phase_of_matter
+            FROM od_pairs WHERE commodity_id = ? ORDER BY to_node_id DESC;
+            '''
+        od_cursor = db_cur.execute(sql, (commodity_id,))
+
+        node_tasks = []
+        node = None
+        node_pairs = {}
+        phase_of_matter = None
+        node_count = 0
+        outside_mtd_count = 0
+        while True:
+            rows = od_cursor.fetchmany(OD_PAIRS_FETCH_SIZE)
+            # an empty fetch ends the commodity and completes its last node
+            for row in rows if rows else [(None,)]:
+                # a new node, so the pairs of the previous node are complete
+                if row[0] != node:
+                    if node is not None:
+                        task, outside_mtd = make_shortest_path_task(commodity_id, st, node, node_pairs,
+                                                                    phase_of_matter, commodity_subgraph_dict)
+                        for s, t, rt_id in outside_mtd:
+                            logger.debug("Missing shortest path for source {}, target {}, scenario_route_id {}: "
+                                         "outside the max transport distance".format(s, t, rt_id))
+                        outside_mtd_count += len(outside_mtd)
+                        if task is not None:
+                            node_count += 1
+                            node_tasks.append(task)
+                    node = row[0]
+                    node_pairs = {}
+                if node is None:
+                    break
+                if row[1] not in node_pairs:
+                    node_pairs[row[1]] = []
+                node_pairs[row[1]].append(row[2])
+                phase_of_matter = row[3]
+
+            # fill the chunk with the completed nodes
+            for task in node_tasks:
+                chunk.append(task)
+                chunk_pair_count += sum(len(rt_ids) for rt_ids in task[2].values())
+                if chunk_pair_count >= OD_PAIRS_CHUNK_SIZE:
+                    yield chunk
+                    chunk = []
+                    chunk_pair_count = 0
+            node_tasks = []
+            if not rows:
+                break
+
+        logger.debug("commodity_id {}: {} nodes solved by {}".format(commodity_id, node_count, st))
+        if outside_mtd_count > 0:
+            logger.warning("commodity_id {}: {} o-d pairs are outside the max transport distance and have no "
+                           "shortest path; see log file list".format(commodity_id, outside_mtd_count))
+
+    if chunk:
+        yield chunk
+
+
+# -----------------------------------------------------------------------------
+
+
+# Makes the shortest path task of one node. With a max transport distance, targets outside the MTD subgraph
+# of the source facility cannot be reached and are dropped before the task is sent to a worker.
+# Returns the task (None if no targets remain) and the (source, target, scenario_rt_id) of the dropped pairs.
+def make_shortest_path_task(commodity_id, st, node, node_pairs, phase_of_matter, commodity_subgraph_dict):
+    outside_mtd = []
+    if st == 'source' and 'facility_subgraphs' in commodity_subgraph_dict[commodity_id].keys():
+        subgraph = get_shortest_path_graph(commodity_subgraph_dict, commodity_id, node, st)
+        targets = {}
+        for a_target in node_pairs:
+            if a_target in subgraph:
+                targets[a_target] = node_pairs[a_target]
+            else:
+                outside_mtd.extend((node, a_target, rt_id) for rt_id in node_pairs[a_target])
+        node_pairs = targets
+
+    if not node_pairs:
+        return None, outside_mtd
+    return [commodity_id, node, node_pairs, phase_of_matter, st], outside_mtd
 
 
 # -----------------------------------------------------------------------------
@@ -1522,6 +1629,11 @@ def clean_networkx_graph(the_scenario, G, logger):
                 converted_pipeline_tariff_cost = "{}/{}".format(the_scenario.default_units_currency, the_scenario.default_units_liquid_phase)
                 route_cost_scaling = Q_(pipeline_tariff_cost).to(converted_pipeline_tariff_cost).magnitude / average_density
 
+            # links partially disrupted in the s step are impeded in proportion to their lost availability
+            availability = G.edges[u, v, keys].get('Availability')
+            if availability is not None and 0 < availability < 1:
+                route_cost_scaling = route_cost_scaling / availability
+
         # Intermodal Edges - artificial == 2
         # ------------------------------------
         elif artificial == 2:
@@ -0,0 +1,358 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: ftot_pipeline.py
+#
+# Purpose: Runs the s f c g o1 o2 p d tasks as one pipeline, skipping the tasks whose inputs have not changed
+# since they last ran. Each task's inputs (the scenario XML fields it reads, its input files, and the tasks
+# upstream of it) are fingerprinted and the fingerprints are stored in the pipeline_fingerprints table of the main.db.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import datetime
+import subprocess
+from xml.dom import minidom
+
+import ftot_supporting
+
+
+# the pipeline tasks in run order, and the tasks whose main.db tables and gdb each task reads
+PIPELINE_STEPS = ['s', 'f', 'c', 'g', 'o1', 'o2', 'p', 'd']
+
+UPSTREAM_STEPS = {'s': [],
+                  'f': ['s'],
+                  'c': ['f'],
+                  'g': ['c'],
+                  'o1': ['g'],
+                  'o2': ['o1'],
+                  'p': ['o2'],
+                  'd': ['p']}
+
+# first task that reads each scenario XML element. elements not listed here are matched by their enclosing
+# section in XML_SECTION_STEPS, and anything else is treated as an input to s so that it re-runs everything.
+XML_ELEMENT_STEPS = {'Scenario_Name': 'd',
+                     'Scenario_Description': 'd',
+                     'Density_Conversion_Factor': 'f',
+                     'Default_Units_Solid_Phase': 'f',
+                     'Default_Units_Liquid_Phase': 'f',
+                     'Default_Units_Distance': 'f',
+                     'Default_Units_Currency': 'f',
+                     'NDR_On': 'f',
+                     # f leaves the udp of destinations without one null and o1 applies this default
+                     'Unmet_Demand_Penalty': 'o1',
+                     # Capacity_On also picks the FAF4 capacity version of the default network
+                     'Capacity_On': 's',
+                     'Artificial_Link_Backend': 's',
+                     'Prune_Edges': 'o1',
+                     'Lazy_Capacity_Constraints': 'o2',
+                     'Lazy_Capacity_Max_Iterations': 'o2',
+                     'Report_With_Artificial_Links': 'p'}
+
+# elements that do not change the results of any task. the common data folder is only read by the map step.
+XML_IGNORED_ELEMENTS = ['Profile_Steps', 'Common_Data_Folder']
+
+# elements that hold the path of an input file or folder. their text is left out of the fingerprints, since the
+# same inputs copied to another folder should not re-run anything; the files are fingerprinted through
+# FILE_INPUT_STEPS instead.
+XML_PATH_ELEMENTS = ['Base_Network_Gdb',
+                     'Disruption_Data',
+                     'Base_RMP_Layer',
+                     'Base_Destination_Layer',
+                     'Base_Processors_Layer',
+                     'RMP_Commodity_Data',
+                     'Destinations_Commodity_Data',
+                     'Processors_Commodity_Data',
+                     'Processors_Candidate_Commodity_Data',
+                     'Schedule_Data',
+                     'Commodity_Mode_Data',
+                     'Commodity_Density_Data',
+                     'Impedance_Weights_Data',
+                     'Speed_Time_Data',
+                     'Detailed_Emissions_Data']
+
+XML_SECTION_STEPS = {'Assumptions': 'g',
+                     'Network_Costs': 'g',
+                     'Short_Haul_Penalties': 'g',
+                     'CO2_Optimization': 'g',
+                     'Artificial_Links': 'c',
+                     'Capacity_Options': 'o1',
+                     'Solver_Options': 'o2'}
+
+# input files and folders of each task, by scenario attribute
+FILE_INPUT_STEPS = {'base_network_gdb': 's',
+                    'disruption_data': 's',
+                    'base_rmp_layer': 'f',
+                    'base_destination_layer': 'f',
+                    'base_processors_layer': 'f',
+                    'rmp_commodity_data': 'f',
+                    'destinations_commodity_data': 'f',
+                    'processors_commodity_data': 'f',
+                    'processors_candidate_slate_data': 'f',
+                    'schedule': 'f',
+                    'commodity_density_data': 'f',
+                    'commodity_mode_data': 'g',
+                    'impedance_weights_data': 'g',
+                    'speed_time_data': 'g',
+                    'detailed_emissions_data': 'g'}
+
+# main.db tables each task leaves behind; a task is re-run if they are missing
+STEP_OUTPUT_TABLES = {'s': ['config'],
+                      'f': ['facilities', 'facility_commodities'],
+                      'c': [],
+                      'g': ['networkx_nodes', 'networkx_edges', 'od_pairs'],
+                      'o1': ['edges'],
+                      'o2': ['optimal_variables'],
+                      'p': ['optimal_route_segments', 'optimal_scenario_results'],
+                      'd': []}
+
+
+# ===================================================================================================
+
+
+def run_pipeline(the_scenario, xml_file_location, ftot_version, skip_arcpy_check, force_rerun, logger,
+                 last_step='d', profile=False):
+    logger.info("start: run_pipeline")
+
+    fingerprints = get_step_fingerprints(the_scenario, xml_file_location, ftot_version, logger)
+    stored_fingerprints = load_step_fingerprints(the_scenario, logger)
+    pipeline_steps = PIPELINE_STEPS[:PIPELINE_STEPS.index(last_step) + 1]
+
+    # once a task runs, everything downstream of it runs too
+    first_stale_step = None
+    for step in pipeline_steps:
+        if force_rerun:
+            reason = "-force_rerun was set"
+        elif step not in stored_fingerprints:
+            reason = "no record of a previous run"
+        elif stored_fingerprints[step] != fingerprints[step]:
+            reason = "inputs changed since the last run"
+        elif not step_outputs_exist(the_scenario, step):
+            reason = "outputs from the last run are missing"
+        else:
+            logger.info("skipping step {}: inputs unchanged since the last run".format(step))
+            continue
+        logger.info("step {} will run: {}".format(step, reason))
+        first_stale_step = step
+        break
+
+    if first_stale_step is None:
+        logger.result("pipeline is up to date; no steps were run")
+        return
+
+    steps_to_run = pipeline_steps[pipeline_steps.index(first_stale_step):]
+    logger.config("pipeline steps to run: \t{}".format(" ".join(steps_to_run)))
+    logger.metric("pipeline_steps_skipped", PIPELINE_STEPS.index(first_stale_step))
+
+    ftot_script = os.path.join(os.path.dirname(os.path.realpath(__file__)), "ftot.py")
+    for step in steps_to_run:
+        # the downstream records are dropped before the task runs so an interrupted run can't leave them behind
+        delete_step_fingerprints(the_scenario, PIPELINE_STEPS[PIPELINE_STEPS.index(step):], logger)
+
+        logger.info("start: pipeline step {}".format(step))
+        start_time = datetime.datetime.now()
+        command = [sys.executable, ftot_script, xml_file_location, step]
+        if skip_arcpy_check:
+            command.append('-skip_arcpy_check')
+        if profile:
+            command.append('-profile')
+        return_code = subprocess.call(command)
+        if return_code != 0:
+            error = "pipeline step {} failed with exit code {}. See the {} step log for details.".format(
+                step, return_code, step)
+            logger.error(error)
+            raise Exception(error)
+
+        save_step_fingerprint(the_scenario, step, fingerprints[step], logger)
+        logger.info("finished: pipeline step {}. Runtime (HMS): \t{}".format(
+            step, ftot_supporting.get_total_runtime_string(start_time)))
+
+    logger.info("finished: run_pipeline")
+
+
+# ===================================================================================================
+
+
+def get_step_fingerprints(the_scenario, xml_file_location, ftot_version, logger):
+    # fingerprints each task from its own inputs and the fingerprints of the tasks upstream of it
+    step_inputs = get_step_inputs(the_scenario, xml_file_location, ftot_version, logger)
+
+    fingerprints = {}
+    for step in PIPELINE_STEPS:
+        step_record = {'step': step,
+                       'inputs': step_inputs[step],
+                       'upstream': [fingerprints[upstream] for upstream in UPSTREAM_STEPS[step]]}
+        fingerprints[step] = hashlib.sha1(json.dumps(step_record, sort_keys=True).encode('utf-8')).hexdigest()
+
+    return fingerprints
+
+
+# ===================================================================================================
+
+
+def get_step_inputs(the_scenario, xml_file_location, ftot_version, logger):
+    # returns the XML element values and input file fingerprints of each task
+    logger.debug("start: get_step_inputs")
+
+    # FTOT version changes re-run the whole pipeline
+    step_inputs = dict([(step, {'xml': {}, 'files': {}}) for step in PIPELINE_STEPS])
+    step_inputs['s']['xml']['FTOT_Version'] = ftot_version
+
+    xml_scenario = minidom.parse(xml_file_location)
+    for element_path, value in get_xml_leaf_values(xml_scenario.documentElement, []):
+        if element_path[-1] in XML_IGNORED_ELEMENTS or element_path[-1] in XML_PATH_ELEMENTS:
+            continue
+        step = 's'
+        if element_path[-1] in XML_ELEMENT_STEPS:
+            step = XML_ELEMENT_STEPS[element_path[-1]]
+        else:
+            for section in element_path:
+                if section in XML_SECTION_STEPS:
+                    step = XML_SECTION_STEPS[section]
+        step_inputs[step]['xml']["/".join(element_path)] = value
+
+    for attribute, step in FILE_INPUT_STEPS.items():
+        path = getattr(the_scenario, attribute, "None")
+        step_inputs[step]['files'][attribute] = get_path_fingerprint(path)
+
+    return step_inputs
+
+
+# ===================================================================================================
+
+
+def get_xml_leaf_values(element, parent_path):
+    # yields the path and text of every element in the scenario XML that has no child elements
+    element_path = parent_path + [element.tagName]
+    child_elements = [child for child in element.childNodes if child.nodeType == child.ELEMENT_NODE]
+    if len(child_elements) == 0:
+        text = "".join(child.data for child in element.childNodes if child.nodeType == child.TEXT_NODE)
+        yield element_path, text.strip()
+    for child in child_elements:
+        for leaf in get_xml_leaf_values(child, element_path):
+            yield leaf
+
+
+# ===================================================================================================
+
+
+def get_path_fingerprint(path):
+    # files and shapefiles are hashed by content. folders (e.g., a file geodatabase) are fingerprinted by the
+    # relative name, size, and modified time of their files, since hashing a national network on every run would
+    # cost more than the steps it skips. none of the fingerprints include the folder the input is in.
+    if path is None or path == "None":
+        return None
+
+    # a feature class inside a file geodatabase is fingerprinted by its geodatabase
+    if ".gdb" in path.lower() and not os.path.exists(path):
+        path = path[:path.lower().index(".gdb") + 4]
+
+    if os.path.isdir(path):
+        file_stats = []
+        for root, dirs, files in os.walk(path):
+            for a_file in sorted(files):
+                if a_file.endswith('.lock'):
+                    continue
+                full_path = os.path.join(root, a_file)
+                stat = os.stat(full_path)
+                file_stats.append([os.path.relpath(full_path, path), stat.st_size, stat.st_mtime])
+        return hashlib.sha1(json.dumps(sorted(file_stats)).encode('utf-8')).hexdigest()
+
+    if path.lower().endswith('.shp'):
+        stem = os.path.splitext(path)[0]
+        folder = os.path.dirname(path) or "."
+        sha1 = hashlib.sha1()
+        for a_file in sorted(os.listdir(folder)):
+            full_path = os.path.join(folder, a_file)
+            if os.path.splitext(full_path)[0] == stem:
+                # the extension of each part of the shapefile, then its content
+                sha1.update(os.path.splitext(a_file)[1].lower().encode('utf-8'))
+                sha1.update(get_file_hash(full_path).encode('utf-8'))
+        return sha1.hexdigest()
+
+    if os.path.isfile(path):
+        return get_file_hash(path)
+
+    return "missing: {}".format(path)
+
+
+# ===================================================================================================
+
+
+def get_file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as rf:
+        for block in iter(lambda: rf.read(1024 * 1024), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+# ===================================================================================================
+
+
+def load_step_fingerprints(the_scenario, logger):
+    # returns the stored fingerprint of each task, or an empty dict if the scenario has not been set up
+    logger.debug("start: load_step_fingerprints")
+    if not os.path.exists(the_scenario.main_db):
+        return {}
+
+    with sqlite3.connect(the_scenario.main_db) as db_con:
+        db_con.execute("""create table if not exists pipeline_fingerprints(
+            step text primary key,
+            fingerprint text,
+            run_time text
+            );""")
+        return dict(db_con.execute("select step, fingerprint from pipeline_fingerprints").fetchall())
+
+
+# ===================================================================================================
+
+
+def save_step_fingerprint(the_scenario, step, fingerprint, logger):
+    logger.debug("start: save_step_fingerprint for step {}".format(step))
+
+    # s re-creates the main.db, so the table may need to be created again
+    with sqlite3.connect(the_scenario.main_db) as db_con:
+        db_con.execute("""create table if not exists pipeline_fingerprints(
+            step text primary key,
+            fingerprint text,
+            run_time text
+            );""")
+        db_con.execute("insert or replace into pipeline_fingerprints values (?, ?, ?)",
+                       (step, fingerprint, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        db_con.commit()
+
+
+# ===================================================================================================
+
+
+def delete_step_fingerprints(the_scenario, steps, logger):
+    logger.debug("start: delete_step_fingerprints for steps {}".format(steps))
+    if not os.path.exists(the_scenario.main_db):
+        return
+
+    with sqlite3.connect(the_scenario.main_db) as db_con:
+        db_con.execute("""create table if not exists pipeline_fingerprints(
+            step text primary key,
+            fingerprint text,
+            run_time text
+            );""")
+        db_con.executemany("delete from pipeline_fingerprints where step = ?", [(step,) for step in steps])
+        db_con.commit()
+
+
+# ===================================================================================================
+
+
+def step_outputs_exist(the_scenario, step):
+    if step == 's' and not os.path.exists(the_scenario.main_gdb):
+        return False
+
+    with sqlite3.connect(the_scenario.main_db) as db_con:
+        for table_name in STEP_OUTPUT_TABLES[step]:
+            sql = "select count(*) from sqlite_master where type='table' and name=?"
+            if db_con.execute(sql, (table_name,)).fetchone()[0] == 0:
+                return False
+    return True
@@ -11,7 +11,6 @@ import arcpy
 import sqlite3
 import os
 from collections import defaultdict
-from ftot import Q_
 
 
 # =========================================================================
@@ -435,7 +434,7 @@ def make_optimal_route_segments_db(the_scenario, logger):
             ov.time_period,
             ov.length,
             c.phase_of_matter,
-            c.density,
+            c.density_value,
             nx_e_cost.transport_cost,
             nx_e_cost.route_cost,
             nx_e_cost.route_cost_transport,
@@ -484,8 +483,7 @@ def make_optimal_route_segments_db(the_scenario, logger):
             from_node_id        = row[19]
             to_node_id          = row[20]
 
-            # convert density to numerical if it exists, then use to convert costs back to original liquid
-            density = Q_(density).magnitude if density else None
+            # density is numerical (default units) if it exists, use to convert costs back to original liquid
 
             # format for the optimal route segments table
             optimal_segments_list.append([1,  # rt id
@@ -588,7 +586,7 @@ def make_optimal_route_segments_from_routes_db(the_scenario, logger):
             ov.time_period,
             nx_e.length,
             c.phase_of_matter,
-            c.density,
+            c.density_value,
             nx_e_cost.transport_cost,
             nx_e_cost.route_cost,
             nx_e_cost.route_cost_transport,
@@ -644,8 +642,7 @@ def make_optimal_route_segments_from_routes_db(the_scenario, logger):
             from_node_id        = row[20]
             to_node_id          = row[21]
 
-            # convert density to numerical if it exists, then use to convert costs back to original liquid
-            density = Q_(density).magnitude if density else None
+            # density is numerical (default units) if it exists, use to convert costs back to original liquid
 
             # format for the optimal route segments table
             optimal_segments_list.append([scenario_rt_id,  # rt id
@@ -1815,14 +1812,14 @@ def detailed_emissions_setup(the_scenario, logger):
         # query commodity_vehicle_attrs DB table
         # populate attributes dictionary
         attribute_dict = {}
-        commodity_vehicle_attrs = db_con.execute("select * from commodity_vehicle_attrs;")
+        commodity_vehicle_attrs = db_con.execute("select commodity, mode, attribute, link_type, value_magnitude from commodity_vehicle_attrs;")
         commodity_vehicle_attrs = commodity_vehicle_attrs.fetchall()
         for row in commodity_vehicle_attrs:
             commodity = row[0]
             mode = row[1]
             attribute = row[2]
             link_type = row[3]
-            value = Q_(row[4])
+            value = row[4]  # magnitude in the units of the value (value_units)
 
             if attribute in ['Fuel_Efficiency']:
                 if commodity not in attribute_dict:
@@ -1847,7 +1844,6 @@ def detailed_emissions_setup(the_scenario, logger):
         db_cur = db_con.execute(sql_mode_commodity)
         mode_and_commodity_list = db_cur.fetchall()
 
-        # Loop through all gases using separate SQL queries for road vs. non-road
         # For road, calculate emissions assuming full truckloads
         # Note: will replace CO2 at very end to use decimal truckload
 
@@ -1863,111 +1859,79 @@ def detailed_emissions_setup(the_scenario, logger):
         access_and_urban_code["rural_limited"] = {'where': "urban_rural == 0 and limited_access == 1"}
         access_and_urban_code["rural_nonlimited"] = {'where': "urban_rural == 0 and limited_access == 0"}
 
+        # Load every emission factor into a factor table keyed by commodity, mode, pollutant, and link class
+        # link class is one of the road types above for road, 'network' for other modes, or 'artificial'
+        # vehicle_payload is NULL where emissions scale with flow instead of full vehicle loads
+        emission_factor_list = []
         for row in mode_and_commodity_list:
             mode = row[0]
             commodity_name = row[1]
 
             for pollutant in set(attribute_dict[commodity_name][mode]):
-                if pollutant in ['Load', 'Fuel_Efficiency']:
-                    continue # SKIP because not a pollutant
+                if pollutant in ['Load', 'Fuel_Efficiency', 'co2']:
+                    continue # SKIP because not a pollutant, or CO2 which is replaced below
 
                 # emissions on main network links
                 # may not have detailed emissions for all modes so check if 'general' emission factor exists
-                if 'general' in attribute_dict[commodity_name][mode][pollutant]: 
-
-                    vehicle_payload = attribute_dict[commodity_name][mode]['Load']['general'].magnitude
-
+                if 'general' in attribute_dict[commodity_name][mode][pollutant]:
                     if 'road' == mode:
-
+                        vehicle_payload = attribute_dict[commodity_name][mode]['Load']['general']
                         for road_measure_name in access_and_urban_code:
-                            emissions_val = attribute_dict[commodity_name][mode][pollutant][road_measure_name].magnitude
-                            where_clause = access_and_urban_code[road_measure_name]['where']
-                            
-                            sql_road_emissions = """ -- emissions for road by limited_access and urban_rural designation
-                                        insert into detailed_emissions
-                                        select
-                                        commodity_name,
-                                        '{}', -- mode
-                                        '{}_{}', -- measure_name
-                                        sum({} * length * round(commodity_flow/{} + 0.4999)), -- value (emissions scalar * vmt)
-                                        'grams', -- units
-                                        ''
-                                        from optimal_route_segments
-                                        where network_source_id = '{}' and commodity_name = '{}' and {} -- additional where_clause
-                                        and artificial != 1 -- exclude artificial links
-                                        group by commodity_name, network_source_id
-                                        ;""".format(mode, pollutant, road_measure_name, emissions_val, vehicle_payload, mode, commodity_name, where_clause)
-                            db_con.execute(sql_road_emissions)
-                    
+                            emissions_val = attribute_dict[commodity_name][mode][pollutant][road_measure_name]
+                            emission_factor_list.append((commodity_name, mode, pollutant, road_measure_name, emissions_val, vehicle_payload))
                     else: # rail, water, or pipeline
+                        emissions_val = attribute_dict[commodity_name][mode][pollutant]['general']
+                        emission_factor_list.append((commodity_name, mode, pollutant, 'network', emissions_val, None))
 
-                        emissions_val = attribute_dict[commodity_name][mode][pollutant]['general'].magnitude
-                        sql_nonroad_emissions = """ -- emissions by mode and commodity
-                                    insert into detailed_emissions
-                                    select
-                                    commodity_name,
-                                    '{}', --mode
-                                    '{}_network', --pollutant
-                                    sum(commodity_flow * length * {}),
-                                    'grams',
-                                    ''
-                                    from optimal_route_segments
-                                    where network_source_id = '{}' and commodity_name = '{}' and artificial != 1
-                                    group by commodity_name, network_source_id
-                                    ;""".format(mode, pollutant, emissions_val, mode, commodity_name)
-                        db_con.execute(sql_nonroad_emissions)
-                
                 # emissions on artificial links
                 # if reporting with artificial link set to true
                 if the_scenario.report_with_artificial:
-                    emissions_val = attribute_dict[commodity_name][mode][pollutant]['artificial'].magnitude
-                    vehicle_payload = attribute_dict[commodity_name][mode]['Load']['artificial'].magnitude
+                    emissions_val = attribute_dict[commodity_name][mode][pollutant]['artificial']
+                    vehicle_payload = attribute_dict[commodity_name][mode]['Load']['artificial']
+                    emission_factor_list.append((commodity_name, mode, pollutant, 'artificial', emissions_val, vehicle_payload))
 
-                    sql_emissions_art = """ -- emissions for artificial links
-                                        insert into detailed_emissions
-                                        select
-                                        commodity_name,
-                                        '{}', --mode
-                                        '{}_artificial_links', --pollutant
-                                        sum({} * length * round(commodity_flow/{} + 0.4999)), -- value (emissions scalar * vmt)
-                                        'grams',
-                                        ''
-                                        from optimal_route_segments
-                                        where network_source_id = '{}' and commodity_name = '{}' and artificial == 1
-                                        group by commodity_name, network_source_id
-                                        ;""".format(mode, pollutant, emissions_val, vehicle_payload, mode, commodity_name)
-                    db_con.execute(sql_emissions_art)
-
-                # now total the pollutant values
-                sql_emissions_total = """insert into detailed_emissions
-                                    select
-                                    commodity,
-                                    mode,
-                                    '{}', --pollutant
-                                    sum(de.value),
-                                    units,
-                                    '{}' --note
-                                    from detailed_emissions de
-                                    where de.measure like '{}^_%' ESCAPE '^'
-                                    and mode = '{}' and commodity = '{}'
-                                    group by commodity, mode, units
-                                    ;""".format(pollutant, note, pollutant, mode, commodity_name)
-                db_con.execute(sql_emissions_total)
-
-                # now delete the intermediate records
-                # except keep the artificial link breakout
-                sql_emissions_delete = """delete
-                            from detailed_emissions
-                            where measure like '{}^_%' ESCAPE '^'
-                            ;""".format(pollutant)
-                db_con.execute(sql_emissions_delete)
-
-        # replace the "full truckload CO2" calculated above with the "decimal truckload" value from the main scenario results
+        db_con.executescript("""
+            drop table if exists tmp_emission_factors;
+            create temp table tmp_emission_factors(
+            commodity text,
+            mode text,
+            pollutant text,
+            link_class text,
+            emissions_val real,
+            vehicle_payload real
+            );
+            create index tmp_emission_factors_index on tmp_emission_factors(commodity, mode, link_class);
+            """)
+        db_con.executemany("insert into tmp_emission_factors values (?, ?, ?, ?, ?, ?);", emission_factor_list)
+
+        # classify each segment once, then total all pollutants in a single grouped join
+        road_class_case = "\n".join(["when {} then '{}'".format(access_and_urban_code[road_measure_name]['where'], road_measure_name)
+                                     for road_measure_name in access_and_urban_code])
+        sql_emissions = """ -- emissions by commodity, mode, and pollutant
+                        insert into detailed_emissions
+                        select
+                        seg.commodity_name,
+                        seg.network_source_id, -- mode
+                        ef.pollutant, -- measure
+                        sum(case when ef.vehicle_payload is null then seg.commodity_flow * seg.length * ef.emissions_val -- emissions scalar * flow
+                            else ef.emissions_val * seg.length * round(seg.commodity_flow/ef.vehicle_payload + 0.4999) end), -- emissions scalar * vmt
+                        'grams', -- units
+                        '{}' -- note
+                        from (select commodity_name, network_source_id, commodity_flow, length,
+                              case when artificial == 1 then 'artificial'
+                                   when artificial != 1 and network_source_id != 'road' then 'network'
+                                   when artificial != 1 then (case {} end)
+                              end as link_class
+                              from optimal_route_segments) seg
+                        join tmp_emission_factors ef
+                        on ef.commodity = seg.commodity_name and ef.mode = seg.network_source_id and ef.link_class = seg.link_class
+                        group by seg.commodity_name, seg.network_source_id, ef.pollutant
+                        ;""".format(note, road_class_case)
+        db_con.execute(sql_emissions)
+        db_con.execute("drop table if exists tmp_emission_factors;")
+
+        # add the "decimal truckload" CO2 value from the main scenario results
         # do for all modes because non-road use trucks on artificial links
-        delete_co2 = """delete from detailed_emissions
-                        where measure = 'co2';"""
-        db_con.execute(delete_co2)
-
         add_co2 = """insert into detailed_emissions
                      select commodity, mode, measure, sum(value), units, notes
                      from optimal_scenario_results where measure = 'co2'
@@ -579,63 +579,8 @@ def generate_bulk_processor_candidates(the_scenario, logger):
     # we can back track to the original commodity (or optionally assign a generic feedstock)
     # so that we can aggregate feedstocks for candiate facilities locations.
 
-    logger.debug(
-        "dropping then adding the optimal_feedstock_flows table with the feedstock_as_fuel flows on the route segments")
-    logger.debug(
-        "note: this table selects the flow from the first link in the route. this is because pulp sums all flows on "
-        "the link")
-    logger.warning(
-        "this can take a few minutes on the capacitated seattle network... might want to look into optimizing the sql "
-        "statement for larger runs")
-    sql1 = "DROP TABLE if exists optimal_feedstock_flows;"
-
-    sql2 = """CREATE INDEX  if not exists 'ors_index' ON 'optimal_route_segments' (
-	'scenario_rt_id',
-	'rt_variant_id',
-	'from_position'
-         );"""
-
-    sql3 = """
-               CREATE TABLE optimal_feedstock_flows as
-               select 
-                    ors.network_source_id as network_source_id, 
-                    ors.network_source_oid as network_source_oid, 
-                    odp.from_location_id as location_id, 
-                    ors.scenario_rt_id as scenario_rt_Id, 
-                    ors.rt_variant_id as rt_variant_id, 
-                    ors.from_position as from_position, 
-                   (select sum(cumm.miles) from optimal_route_segments cumm where (cumm.scenario_rt_id = 
-                   ors.scenario_rt_id and cumm.rt_variant_id = ors.rt_variant_id and ors.from_position >= 
-                   cumm.from_position )) as cumm_dist, 
-            	   ors.commodity_name as feedstock_as_fuel_name, 
-                    (select orig_flow.commodity_flow from optimal_route_segments orig_flow where (
-                    orig_flow.scenario_rt_id = ors.scenario_rt_id)) as feedstock_as_fuel_flow , 
-                    null as commodity_name, 
-                    null as commodity_flow, 
-                    cast(null as real) as max_transport_distance,
-                    null as ignore_link
-                from optimal_route_segments ors
-                join optimal_route_segments cumm on ( cumm.scenario_rt_id = ors.scenario_rt_id and ors.from_position 
-                >= cumm.from_position ) 
-                
-                join od_pairs odp on odp.scenario_rt_id = ors.scenario_rt_id
-                group by ors.scenario_rt_id, ors.rt_variant_id, ors.from_position
-                order by ors.scenario_rt_id, ors.rt_variant_id, ors.from_position
-                ;"""
-
-    with sqlite3.connect(the_scenario.main_db) as db_con:
-        logger.debug("drop the optimal_feedstock_flows table")
-        db_con.execute(sql1)  # drop the table
-        logger.debug("create the index on optimal_route_segments")
-        db_con.execute(sql2)  # create the index on optimal_route_segments
-        logger.debug("create the optimal_feedstock_flows table and add the records")
-        db_con.execute(sql3)  # create the table and add the records
-
-    # now set the appropriate feedstock and quantities.
-    # then sum the flows by commodity
-    # then query the table for flows greater than the facility size but within
-    # the raw material transport distance
-
+    # build the ratio of feedstock to feedstock-as-fuel once for each rmp location and feedstock-as-fuel
+    # these are used to scale the feedstock_as_fuel flows in the optimal_feedstock_flows table
     logger.debug("creating a list of fuel ratios by location_id to scale the feedstock_as_fuel flows")
     sql = """  
             -- this is the code for selecting the rmps and rmps_as_proc facilities 
@@ -666,7 +611,7 @@ def generate_bulk_processor_candidates(the_scenario, logger):
             location_id = row[4]
             quantity = row[5]
             units = row[6]
-            if not location_id in list(fuel_ratios.keys()):
+            if not location_id in fuel_ratios:
                 fuel_ratios[location_id] = []
                 fuel_ratios[location_id].append(0)  # one feedstock
                 fuel_ratios[location_id].append([])  # many feedstocks-as-fuel
@@ -677,54 +622,89 @@ def generate_bulk_processor_candidates(the_scenario, logger):
                 # this is the feedstock-as-fuel value
                 fuel_ratios[location_id][1].append([commodity_name, Q_(quantity, units)])
 
-    # now iterate through the table we just created to make a list of 
-    # updated fields for a bulk update execute many
-    logger.debug("interating through the list of feedstock_as_fuel to generate the update_list for the execute many")
-    update_list = []
-    sql = """ 
-             select scenario_rt_id, rt_variant_id, location_id, feedstock_as_fuel_name, feedstock_as_fuel_flow
-             from optimal_feedstock_flows
-          """
-    with sqlite3.connect(the_scenario.main_db) as db_con:
-        db_cur = db_con.cursor()
-        db_cur.execute(sql)
+    ratio_list = []
+    for location_id, (feedstock, feedstocks_as_fuel) in iteritems(fuel_ratios):
+        if not feedstock:
+            continue  # no feedstock to back track to at this location
+        feedstock_name, feedstock_quant_and_units, max_transport_distance = feedstock
+        for feedstock_as_fuel_name, feedstock_as_fuel_quant_and_units in feedstocks_as_fuel:
+            ratio = (feedstock_quant_and_units / feedstock_as_fuel_quant_and_units).magnitude
+            ratio_list.append([location_id, feedstock_as_fuel_name, str(feedstock_name), ratio,
+                               float(max_transport_distance)])
+
+    # build optimal_feedstock_flows in one pass over optimal_route_segments.
+    # the cumulative distance along each route variant and the flow on the first link of the route are window
+    # functions over the (scenario_rt_id, rt_variant_id, from_position) index.
+    # links within the max transport distance of the rmp get the feedstock and the scaled flow.
+    logger.debug(
+        "dropping then adding the optimal_feedstock_flows table with the feedstock_as_fuel flows on the route segments")
+    logger.debug(
+        "note: this table selects the flow from the first link in the route. this is because pulp sums all flows on "
+        "the link")
+    sql1 = "DROP TABLE if exists optimal_feedstock_flows;"
+
+    sql2 = """CREATE INDEX  if not exists 'ors_index' ON 'optimal_route_segments' (
+	'scenario_rt_id',
+	'rt_variant_id',
+	'from_position'
+         );"""
+
+    sql3 = """
+               CREATE TABLE optimal_feedstock_flows as
+               select 
+                    ors.network_source_id as network_source_id, 
+                    ors.network_source_oid as network_source_oid, 
+                    odp.from_location_id as location_id, 
+                    ors.scenario_rt_id as scenario_rt_Id, 
+                    ors.rt_variant_id as rt_variant_id, 
+                    ors.from_position as from_position, 
+                    ors.cumm_dist as cumm_dist, 
+                    ors.commodity_name as feedstock_as_fuel_name, 
+                    ors.feedstock_as_fuel_flow as feedstock_as_fuel_flow, 
+                    case when ors.cumm_dist <= ffr.max_transport_distance then ffr.feedstock_name end as commodity_name, 
+                    case when ors.cumm_dist <= ffr.max_transport_distance 
+                        then ors.feedstock_as_fuel_flow * ffr.ratio end as commodity_flow, 
+                    case when ors.cumm_dist <= ffr.max_transport_distance 
+                        then ffr.max_transport_distance else cast(null as real) end as max_transport_distance,
+                    null as ignore_link
+                from (select 
+                        network_source_id, 
+                        network_source_oid, 
+                        scenario_rt_id, 
+                        rt_variant_id, 
+                        from_position, 
+                        commodity_name, 
+                        sum(length) over (partition by scenario_rt_id, rt_variant_id 
+                                          order by from_position) as cumm_dist, 
+                        first_value(commodity_flow) over (partition by scenario_rt_id 
+                                                          order by rt_variant_id, from_position) as feedstock_as_fuel_flow
+                      from optimal_route_segments) ors
+                join od_pairs odp on odp.scenario_rt_id = ors.scenario_rt_id
+                left join tmp_feedstock_fuel_ratios ffr on (ffr.location_id = odp.from_location_id 
+                and ffr.feedstock_as_fuel_name = ors.commodity_name) 
+                group by ors.scenario_rt_id, ors.rt_variant_id, ors.from_position
+                order by ors.scenario_rt_id, ors.rt_variant_id, ors.from_position
+                ;"""
 
-        # iterate through the db and build the ratios
-        for row in db_cur:
-            scenario_rt_id = row[0]
-            rt_variant_id = row[1]
-            location_id = row[2]
-            feedstock_as_fuel_name = row[3]
-            feedstock_as_fuel_flow = row[4]
-
-            # now look up what feedstock came from that rmp_as_proc
-            feedstock_name = fuel_ratios[location_id][0][0]
-            feedstock_quant_and_units = fuel_ratios[location_id][0][1]
-            max_transport_distance = fuel_ratios[location_id][0][2]
-
-            # iterate through the feedstock_as_fuels to scale the right records
-            for feedstock_as_fuel in fuel_ratios[location_id][1]:
-                ratio_feedstock_as_fuel_name = feedstock_as_fuel[0]
-                feedstock_as_fuel_quant_and_units = feedstock_as_fuel[1]
-
-                if feedstock_as_fuel_name == ratio_feedstock_as_fuel_name:
-                    # this is the commodity we want to scale:
-                    feedstock_fuel_quant = float(feedstock_as_fuel_flow) * (
-                            feedstock_quant_and_units / feedstock_as_fuel_quant_and_units).magnitude
-                    update_list.append(
-                        [str(feedstock_name), str(feedstock_fuel_quant), float(max_transport_distance), scenario_rt_id,
-                         rt_variant_id, location_id, float(max_transport_distance)])
-
-    logger.debug("starting the execute many to update the list of feedstocks and scaled quantities from the RMPs")
     with sqlite3.connect(the_scenario.main_db) as db_con:
-        update_sql = """ 
-            UPDATE optimal_feedstock_flows 
-            set commodity_name = ?, commodity_flow = ?, max_transport_distance = ?
-            where scenario_rt_id = ? and rt_variant_id = ? and location_id = ? and cumm_dist <= ?
-           ;"""
-        db_con.executemany(update_sql, update_list)
+        db_con.execute("drop table if exists tmp_feedstock_fuel_ratios;")
+        db_con.execute("""create table tmp_feedstock_fuel_ratios(location_id integer, feedstock_as_fuel_name text, 
+                          feedstock_name text, ratio real, max_transport_distance real);""")
+        db_con.executemany("insert into tmp_feedstock_fuel_ratios values (?, ?, ?, ?, ?);", ratio_list)
+
+        logger.debug("drop the optimal_feedstock_flows table")
+        db_con.execute(sql1)  # drop the table
+        logger.debug("create the index on optimal_route_segments")
+        db_con.execute(sql2)  # create the index on optimal_route_segments
+        logger.debug("create the optimal_feedstock_flows table and add the records")
+        db_con.execute(sql3)  # create the table and add the records
+        db_con.execute("drop table if exists tmp_feedstock_fuel_ratios;")
         db_con.commit()
 
+    # then sum the flows by commodity
+    # then query the table for flows greater than the facility size but within
+    # the raw material transport distance
+    with sqlite3.connect(the_scenario.main_db) as db_con:
 
         sql = """drop table if exists candidates_aggregated_feedstock_flows;"""
         db_con.execute(sql)
@@ -0,0 +1,259 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: ftot_profiler.py
+#
+# Purpose: Optional profiling of an FTOT step. Records the wall time and call counts of every Python function,
+# the time spent in each SQL statement run against sqlite, and the peak memory of the step. The results are
+# stored in the profile tables of the main.db and written to a summary report in the debug directory.
+# Enabled with Profile_Steps in the scenario XML or the -profile command line option.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import os
+import re
+import time
+import pstats
+import sqlite3
+import cProfile
+import datetime
+
+import ftot_supporting
+
+
+# number of functions and SQL statements listed in the summary report
+REPORT_TOP_N = 30
+
+# SQL statements are grouped by their text, truncated to this many characters
+SQL_KEY_LENGTH = 300
+
+
+# ===================================================================================================
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that times its statements and fetches for the profiler"""
+
+    def _timed(self, sql_key, method, *args):
+        self.connection.current_sql_key = sql_key
+        self.sql_key = sql_key
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            record_sql(sql_key, time.perf_counter() - start, 1)
+
+    def execute(self, sql, *args):
+        return self._timed(get_sql_key(sql), super(ProfiledCursor, self).execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._timed(get_sql_key(sql), super(ProfiledCursor, self).executemany, sql, *args)
+
+    def executescript(self, sql_script):
+        return self._timed(get_sql_key(sql_script), super(ProfiledCursor, self).executescript, sql_script)
+
+    # sqlite runs a select as its rows are fetched, so fetch time is added to the statement
+    def _timed_fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            record_sql(getattr(self, 'sql_key', None), time.perf_counter() - start, 0)
+
+    def fetchone(self):
+        return self._timed_fetch(super(ProfiledCursor, self).fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed_fetch(super(ProfiledCursor, self).fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed_fetch(super(ProfiledCursor, self).fetchall)
+
+    def __next__(self):
+        return self._timed_fetch(super(ProfiledCursor, self).__next__)
+
+
+# ===================================================================================================
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose statements go through ProfiledCursor. A trace callback counts the statements sqlite
+    actually runs, e.g. once per row for executemany and once per statement for executescript."""
+
+    def __init__(self, *args, **kwargs):
+        super(ProfiledConnection, self).__init__(*args, **kwargs)
+        self.current_sql_key = None
+        self.set_trace_callback(self._trace_statement)
+
+    def _trace_statement(self, statement):
+        record_sql_execution(self.current_sql_key or get_sql_key(statement))
+
+    def cursor(self, factory=ProfiledCursor):
+        return super(ProfiledConnection, self).cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+# ===================================================================================================
+
+
+def get_sql_key(sql):
+    return re.sub(r'\s+', ' ', sql).strip()[:SQL_KEY_LENGTH]
+
+
+# connections opened during a profiled step may outlive it, so the records are dropped once it stops
+def record_sql(sql_key, seconds, calls):
+    if StepProfiler.active is not None and sql_key is not None:
+        stats = StepProfiler.active.sql_stats.setdefault(sql_key, [0, 0, 0.0])
+        stats[0] += calls
+        stats[2] += seconds
+
+
+def record_sql_execution(sql_key):
+    if StepProfiler.active is not None:
+        StepProfiler.active.sql_stats.setdefault(sql_key, [0, 0, 0.0])[1] += 1
+
+
+# ===================================================================================================
+
+
+class StepProfiler(object):
+    """Profiles one FTOT step. Call start() before the step and stop() after it."""
+
+    # the profiler of the running step; the sqlite classes report to it
+    active = None
+
+    def __init__(self, the_scenario, task, logger):
+        self.the_scenario = the_scenario
+        self.task = task
+        self.logger = logger
+        self.profile = cProfile.Profile()
+        self.sql_stats = {}
+        self.original_connect = None
+        self.start_time = None
+        self.wall_seconds = None
+
+    def start(self):
+        self.logger.info("start: profiling step {}".format(self.task))
+        StepProfiler.active = self
+
+        # every sqlite3.connect() in the step returns a profiled connection
+        self.original_connect = sqlite3.connect
+        original_connect = self.original_connect
+
+        def profiled_connect(*args, **kwargs):
+            kwargs.setdefault('factory', ProfiledConnection)
+            return original_connect(*args, **kwargs)
+
+        sqlite3.connect = profiled_connect
+
+        self.start_time = datetime.datetime.now()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.wall_seconds = (datetime.datetime.now() - self.start_time).total_seconds()
+        sqlite3.connect = self.original_connect
+        StepProfiler.active = None
+
+        peak_rss_mb = ftot_supporting.get_peak_memory_mb()
+        function_stats = self.get_function_stats()
+
+        self.save_profile_tables(function_stats, peak_rss_mb)
+        report_file = self.write_summary_report(function_stats, peak_rss_mb)
+
+        self.logger.metric("profile_peak_rss_mb", peak_rss_mb)
+        self.logger.info("finished: profiling step {}. Summary report: {}".format(self.task, report_file))
+
+    def get_function_stats(self):
+        # returns (file, line, function, calls, primitive calls, own seconds, cumulative seconds) for each function
+        stats = pstats.Stats(self.profile)
+        function_stats = []
+        for (file_name, line, function), (primitive_calls, calls, own_seconds, cumulative_seconds, callers) \
+                in stats.stats.items():
+            # leave out the profiler's own sqlite wrappers
+            if os.path.basename(file_name) == os.path.basename(__file__) or 'Profiled' in function:
+                continue
+            function_stats.append((file_name, line, function, calls, primitive_calls, own_seconds, cumulative_seconds))
+        function_stats.sort(key=lambda row: row[6], reverse=True)
+        return function_stats
+
+    def save_profile_tables(self, function_stats, peak_rss_mb):
+        # the latest profile of each step replaces the previous one
+        self.logger.debug("start: save_profile_tables")
+        with sqlite3.connect(self.the_scenario.main_db) as db_con:
+            db_con.executescript("""
+                create table if not exists profile_steps(
+                    step text primary key,
+                    run_timestamp text,
+                    wall_seconds real,
+                    peak_rss_mb real
+                    );
+                create table if not exists profile_functions(
+                    step text,
+                    file_name text,
+                    line integer,
+                    function text,
+                    calls integer,
+                    primitive_calls integer,
+                    own_seconds real,
+                    cumulative_seconds real
+                    );
+                create table if not exists profile_sql(
+                    step text,
+                    statement text,
+                    calls integer,
+                    executions integer,
+                    seconds real
+                    );
+                """)
+            for table_name in ['profile_steps', 'profile_functions', 'profile_sql']:
+                db_con.execute("delete from {} where step = ?".format(table_name), (self.task,))
+
+            db_con.execute("insert into profile_steps values (?, ?, ?, ?)",
+                           (self.task, self.start_time.strftime("%Y-%m-%d %H:%M:%S"), self.wall_seconds, peak_rss_mb))
+            db_con.executemany("insert into profile_functions values (?, ?, ?, ?, ?, ?, ?, ?)",
+                               [(self.task,) + row for row in function_stats])
+            db_con.executemany("insert into profile_sql values (?, ?, ?, ?, ?)",
+                               [(self.task, sql_key, stats[0], stats[1], stats[2])
+                                for sql_key, stats in self.sql_stats.items()])
+            db_con.commit()
+
+    def write_summary_report(self, function_stats, peak_rss_mb):
+        debug_directory = os.path.join(self.the_scenario.scenario_run_directory, "debug")
+        if not os.path.exists(debug_directory):
+            os.makedirs(debug_directory)
+        file_stem = os.path.join(debug_directory, "profile_{}_{}".format(
+            self.task, self.start_time.strftime("%Y_%m_%d_%H-%M-%S")))
+
+        # the raw profile can be opened with pstats or a viewer such as snakeviz
+        self.profile.dump_stats(file_stem + ".prof")
+
+        sql_seconds = sum(stats[2] for stats in self.sql_stats.values())
+        with open(file_stem + ".txt", 'w') as wf:
+            wf.write("FTOT step profile: {}\n".format(self.task))
+            wf.write("started: {}\n".format(self.start_time.strftime("%Y-%m-%d %H:%M:%S")))
+            wf.write("wall time (s): {:,.2f}\n".format(self.wall_seconds))
+            wf.write("peak memory (MB): {}\n".format(peak_rss_mb))
+            wf.write("time in sqlite (s): {:,.2f}\n".format(sql_seconds))
+            wf.write("note: work done in worker processes (e.g., parallel constraint build) is not included\n")
+
+            wf.write("\nTOP {} FUNCTIONS BY CUMULATIVE TIME\n".format(REPORT_TOP_N))
+            wf.write("{:>12} {:>12} {:>12}  {}\n".format("cumul (s)", "own (s)", "calls", "function"))
+            for file_name, line, function, calls, primitive_calls, own_seconds, cumulative_seconds \
+                    in function_stats[:REPORT_TOP_N]:
+                wf.write("{:>12,.2f} {:>12,.2f} {:>12,}  {} ({}:{})\n".format(
+                    cumulative_seconds, own_seconds, calls, function, os.path.basename(file_name), line))
+
+            wf.write("\nTOP {} SQL STATEMENTS BY TIME\n".format(REPORT_TOP_N))
+            wf.write("{:>12} {:>12} {:>12}  {}\n".format("time (s)", "calls", "executions", "statement"))
+            for sql_key, stats in sorted(self.sql_stats.items(), key=lambda item: item[1][2],
+                                         reverse=True)[:REPORT_TOP_N]:
+                wf.write("{:>12,.2f} {:>12,} {:>12,}  {}\n".format(stats[2], stats[0], stats[1], sql_key[:120]))
+
+        return file_stem + ".txt"
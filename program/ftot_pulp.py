@@ -10,6 +10,9 @@
 # ---------------------------------------------------------------------------------------------------
 
 import datetime
+import logging
+import math
+import multiprocessing
 import re
 import sqlite3
 from collections import defaultdict
@@ -17,6 +20,7 @@ import os
 from six import iteritems
 
 from pulp import *
+import networkx as nx
 
 import ftot_supporting
 from ftot_supporting import get_total_runtime_string
@@ -40,6 +44,9 @@ default_min_capacity = 0
 
 zero_threshold = 0.00001
 
+# flows and costs are multiplied by this factor and rounded to integers for the min-cost-flow solver
+mcf_scale_factor = 1000000
+
 
 def o1(the_scenario, logger):
     # create vertices, then edges for permitted modes, then set volume & capacity on edges
@@ -48,8 +55,15 @@ def o1(the_scenario, logger):
 
 def o2(the_scenario, logger):
     # create variables, problem to optimize, and constraints
-    prob = setup_pulp_problem(the_scenario, logger)
-    prob = solve_pulp_problem(prob, the_scenario, logger)
+    if the_scenario.solver == "mcf":
+        prob = solve_min_cost_flow_problem(the_scenario, logger)
+    elif the_scenario.decompose_problem:
+        prob = solve_decomposed_pulp_problem(the_scenario, logger)
+    elif the_scenario.capacityOn and the_scenario.lazyCapacityOn:
+        prob = solve_lazy_capacity_pulp_problem(the_scenario, logger)
+    else:
+        prob = setup_pulp_problem(the_scenario, logger)
+        prob = solve_pulp_problem(prob, the_scenario, logger)
     save_pulp_solution(the_scenario, prob, logger, zero_threshold)
     record_pulp_solution(the_scenario, logger)
     from ftot_supporting import post_optimization
@@ -460,12 +474,12 @@ def generate_all_vertices(the_scenario, schedule_dict, schedule_length, logger):
                 ifnull(c.supertype, c.commodity_name),
                 ifnull(s.source_facility_id, 0),
                 io,
-                fc.udp
+                ifnull(fc.udp, {})
                 from facility_commodities fc, commodities c
                 left outer join source_commodity_ref s 
                 on (fc.commodity_id = s.commodity_id and s.max_transport_distance_flag = 'Y')
                 where fc.facility_id = {}
-                and fc.commodity_id = c.commodity_id;""".format(facility_id))
+                and fc.commodity_id = c.commodity_id;""".format(the_scenario.unMetDemandPenalty, facility_id))
 
                 dest_data = dest_data.fetchall()
 
@@ -637,6 +651,7 @@ def generate_connector_and_storage_edges(the_scenario, logger):
         children_created text,
         edge_count_from_source integer,
         total_route_cost numeric,
+        prune_flag integer,
         CONSTRAINT unique_nx_subc_day UNIQUE(nx_edge_id, commodity_id, source_facility_id, o_vertex_id, d_vertex_id, start_day))
         ;
 
@@ -1951,6 +1966,191 @@ def set_edges_volume_capacity(the_scenario, logger):
 # ===============================================================================
 
 
+def prune_edges(the_scenario, logger):
+    # flags edges that cannot carry flow in an optimal solution so that create_flow_vars can skip them:
+    # 1) edges that no supply can reach, 2) edges from which no demand (or other sink) can be reached, and
+    # 3) when capacity is off, parallel edges that share all constraints with a cheaper edge.
+    # reachability is tracked by commodity and day; merging sources and modes at a node only keeps more edges,
+    # so the pass never removes an edge that could carry flow
+    logger.info("START: prune_edges")
+    start_time = datetime.datetime.now()
+
+    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+        db_cur = main_db_con.cursor()
+
+        # network nodes with a conservation of flow constraint
+        conserved_nodes = set(row[0] for row in db_cur.execute(
+            "select node_id from networkx_nodes where location_id is null;"))
+
+        # destinations only absorb flow if there is demand at that facility on that day
+        facility_day_demand = {}
+        for row in db_cur.execute("""select v.facility_id, v.schedule_day,
+        max(ifnull(v.demand, 0) * ifnull(v.activity_level, 1))
+        from vertices v, facility_type_id ft
+        where v.facility_type_id = ft.facility_type_id
+        and ft.facility_type = 'ultimate_destination'
+        and v.storage_vertex = 0
+        group by v.facility_id, v.schedule_day;"""):
+            facility_day_demand[(row[0], row[1])] = row[2]
+
+        # roots can send flow into the network, sinks can take flow out of it
+        # processors are treated as both, since outputs are tied to inputs by conversion ratios
+        roots = set()
+        sinks = set()
+        for row in db_cur.execute("""select v.vertex_id, v.storage_vertex, ft.facility_type, v.facility_id,
+        v.schedule_day, ifnull(v.supply, 0) * ifnull(v.activity_level, 1)
+        from vertices v, facility_type_id ft
+        where v.facility_type_id = ft.facility_type_id;"""):
+            vertex_id = row[0]
+            storage_vertex = row[1]
+            facility_type = row[2]
+            facility_id = row[3]
+            schedule_day = row[4]
+            available_supply = row[5]
+
+            if storage_vertex == 1:
+                # processor storage vertices can hold excess output
+                if facility_type == 'processor':
+                    sinks.add(('v', vertex_id))
+            elif facility_type == 'raw_material_producer':
+                if available_supply > 0:
+                    roots.add(('v', vertex_id))
+                sinks.add(('v', vertex_id))
+            elif facility_type == 'ultimate_destination':
+                roots.add(('v', vertex_id))
+                if facility_day_demand.get((facility_id, schedule_day), 0) > 0:
+                    sinks.add(('v', vertex_id))
+            else:
+                roots.add(('v', vertex_id))
+                sinks.add(('v', vertex_id))
+
+        edge_data = db_cur.execute("""select edge_id, o_vertex_id, d_vertex_id, from_node_id, to_node_id,
+        commodity_id, start_day, end_day
+        from edges;""").fetchall()
+
+        # each end of an edge is the vertex and/or network node whose constraint it appears in
+        # an end with no constraint can create or absorb flow freely
+        edge_tails = {}
+        edge_heads = {}
+        free_source_edges = []
+        free_sink_edges = []
+        out_edges = defaultdict(list)
+        in_edges = defaultdict(list)
+        for row in edge_data:
+            edge_id = row[0]
+            o_vertex_id = row[1]
+            d_vertex_id = row[2]
+            from_node_id = row[3]
+            to_node_id = row[4]
+            commodity_id = row[5]
+            start_day = row[6]
+            end_day = row[7]
+
+            tails = []
+            if o_vertex_id is not None:
+                tails.append(('v', o_vertex_id))
+            if from_node_id in conserved_nodes:
+                tails.append(('n', from_node_id, commodity_id, start_day))
+            heads = []
+            if d_vertex_id is not None:
+                heads.append(('v', d_vertex_id))
+            if to_node_id in conserved_nodes:
+                heads.append(('n', to_node_id, commodity_id, end_day))
+
+            edge_tails[edge_id] = tails
+            edge_heads[edge_id] = heads
+            if not tails:
+                free_source_edges.append(edge_id)
+            if not heads:
+                free_sink_edges.append(edge_id)
+            for tail in tails:
+                out_edges[tail].append(edge_id)
+            for head in heads:
+                in_edges[head].append(edge_id)
+        del edge_data
+
+        # forward pass: edges that can receive flow from a root
+        reachable_edges = set(free_source_edges)
+        reached_nodes = set(roots)
+        node_queue = list(roots)
+        for edge_id in free_source_edges:
+            node_queue.extend(edge_heads[edge_id])
+        while node_queue:
+            node = node_queue.pop()
+            for edge_id in out_edges.get(node, []):
+                if edge_id not in reachable_edges:
+                    reachable_edges.add(edge_id)
+                    for head in edge_heads[edge_id]:
+                        if head not in reached_nodes:
+                            reached_nodes.add(head)
+                            node_queue.append(head)
+
+        # backward pass: edges that can deliver flow to a sink
+        useful_edges = set(free_sink_edges)
+        reached_nodes = set(sinks)
+        node_queue = list(sinks)
+        for edge_id in free_sink_edges:
+            node_queue.extend(edge_tails[edge_id])
+        while node_queue:
+            node = node_queue.pop()
+            for edge_id in in_edges.get(node, []):
+                if edge_id not in useful_edges:
+                    useful_edges.add(edge_id)
+                    for tail in edge_tails[edge_id]:
+                        if tail not in reached_nodes:
+                            reached_nodes.add(tail)
+                            node_queue.append(tail)
+        del reached_nodes
+
+        unreachable_edges = [edge_id for edge_id in edge_tails if edge_id not in reachable_edges]
+        dead_end_edges = [edge_id for edge_id in edge_tails
+                          if edge_id in reachable_edges and edge_id not in useful_edges]
+        prune_list = unreachable_edges + dead_end_edges
+        pruned = set(prune_list)
+        logger.info("edges unreachable from supply: {:,}".format(len(unreachable_edges)))
+        logger.info("edges that cannot reach demand: {:,}".format(len(dead_end_edges)))
+
+        # dominance: with no capacity constraints, parallel edges between the same ends for the same commodity,
+        # source, days, and mode appear in exactly the same constraints, so only the cheapest one is needed
+        dominated_count = 0
+        if not the_scenario.capacityOn:
+            cheapest_parallel_edge = {}
+            for row in db_cur.execute("""select edge_id, edge_flow_cost, from_node_id, to_node_id, o_vertex_id,
+            d_vertex_id, commodity_id, source_facility_id, start_day, end_day, ifnull(mode, 'NULL')
+            from edges
+            where edge_flow_cost is not null
+            order by edge_id;"""):
+                edge_id = row[0]
+                edge_flow_cost = row[1]
+                if edge_id in pruned:
+                    continue
+                parallel_key = row[2:]
+                if parallel_key not in cheapest_parallel_edge:
+                    cheapest_parallel_edge[parallel_key] = (edge_flow_cost, edge_id)
+                    continue
+                kept_cost, kept_edge_id = cheapest_parallel_edge[parallel_key]
+                if edge_flow_cost < kept_cost:
+                    cheapest_parallel_edge[parallel_key] = (edge_flow_cost, edge_id)
+                    prune_list.append(kept_edge_id)
+                else:
+                    prune_list.append(edge_id)
+                dominated_count += 1
+            del cheapest_parallel_edge
+        logger.info("edges dominated by a cheaper parallel edge: {:,}".format(dominated_count))
+
+        main_db_con.execute("update edges set prune_flag = null;")
+        main_db_con.executemany("update edges set prune_flag = 1 where edge_id = ?;",
+                                [(edge_id,) for edge_id in prune_list])
+
+        logger.info("edges flagged as prunable: {:,} of {:,}".format(len(prune_list), len(edge_tails)))
+
+    logger.info("FINISH: prune_edges: Runtime (HMS): \t{}".format(get_total_runtime_string(start_time)))
+    return
+
+
+# ===============================================================================
+
+
 def pre_setup_pulp(logger, the_scenario):
     logger.info("START: pre_setup_pulp")
 
@@ -1980,6 +2180,16 @@ def pre_setup_pulp(logger, the_scenario):
 
     set_edges_volume_capacity(the_scenario, logger)
 
+    if the_scenario.prune_edges:
+        prune_edges(the_scenario, logger)
+    else:
+        logger.info("edge pruning is turned off: all edges get a flow variable")
+
+    # problem size for the run metrics
+    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+        logger.metric("num_vertices", main_db_con.execute("select count(*) from vertices;").fetchone()[0])
+        logger.metric("num_edges", main_db_con.execute("select count(*) from edges;").fetchone()[0])
+
     return
 
 
@@ -1996,8 +2206,12 @@ def create_flow_vars(the_scenario, logger):
 
     with sqlite3.connect(the_scenario.main_db) as main_db_con:
         db_cur = main_db_con.cursor()
+        # edges flagged by prune_edges cannot carry flow and get no variable
+        pruned_edge_count = db_cur.execute("select count(edge_id) from edges where prune_flag = 1;").fetchone()[0]
+        logger.info("flow variables removed for pruned edges: {:,.0f}".format(pruned_edge_count))
         edge_list_cur = db_cur.execute("""select edge_id--, commodity_id, start_day, source_facility_id
-        from edges;""")
+        from edges
+        where ifnull(prune_flag, 0) = 0;""")
         edge_list_data = edge_list_cur.fetchall()
         counter = 0
         for row in edge_list_data:
@@ -2132,7 +2346,8 @@ def create_opt_problem(logger, the_scenario, unmet_demand_vars, flow_vars, proce
     with sqlite3.connect(the_scenario.main_db) as main_db_con:
         db_cur = main_db_con.cursor()
         # Flow cost memory improvements: only get needed data; dict instead of list; narrow in lpsum
-        flow_cost_var = db_cur.execute("select edge_id, edge_flow_cost from edges e group by edge_id;")
+        flow_cost_var = db_cur.execute("select edge_id, edge_flow_cost from edges e "
+                                       "where ifnull(prune_flag, 0) = 0 group by edge_id;")
         flow_cost_data = flow_cost_var.fetchall()
         counter = 0
         for row in flow_cost_data:
@@ -2202,12 +2417,77 @@ def create_opt_problem(logger, the_scenario, unmet_demand_vars, flow_vars, proce
 # ===============================================================================
 
 
-def create_constraint_unmet_demand(logger, the_scenario, prob, flow_var, unmet_demand_var):
-    logger.debug("START: create_constraint_unmet_demand")
+def get_constraint_params(the_scenario):
+    # plain copy of the scenario settings needed to build the constraint rows
+    # pint quantities are reduced to magnitudes so that the dictionary can be passed to worker processes
+    constraint_params = {
+        'main_db': the_scenario.main_db,
+        'background_flow_modes': list(the_scenario.backgroundFlowModes),
+        'min_capacity_level': the_scenario.minCapacityLevel,
+        'truck_load_liquid': the_scenario.truck_load_liquid.magnitude,
+        'truck_load_solid': the_scenario.truck_load_solid.magnitude,
+        'railcar_load_liquid': the_scenario.railcar_load_liquid.magnitude,
+        'railcar_load_solid': the_scenario.railcar_load_solid.magnitude,
+        'barge_load_liquid': the_scenario.barge_load_liquid.magnitude,
+        'barge_load_solid': the_scenario.barge_load_solid.magnitude,
+        'kgal_to_default_liquid': Q_(1, "thousand_gallon").to(the_scenario.default_units_liquid_phase).magnitude
+    }
+    return constraint_params
+
+
+# ===============================================================================
 
-    # apply activity_level to get corresponding actual demand for var
 
+def get_pruned_edge_ids(the_scenario):
+    # edges flagged by prune_edges, which have no flow variable
     with sqlite3.connect(the_scenario.main_db) as main_db_con:
+        return set(row[0] for row in main_db_con.execute("select edge_id from edges where prune_flag = 1;"))
+
+
+# ===============================================================================
+
+
+def drop_pruned_edge_terms(name, terms, var_dicts, pruned_edge_ids):
+    # leaves out the terms of pruned edges; any other term without a variable is an error
+    kept_terms = []
+    for term in terms:
+        var_type, var_key = term[0], term[1]
+        if var_key in var_dicts[var_type]:
+            kept_terms.append(term)
+        elif not (var_type == 'flow' and var_key in pruned_edge_ids):
+            error = "constraint '{}' refers to a {} variable that does not exist: {}".format(name, var_type, var_key)
+            raise KeyError(error)
+    return kept_terms
+
+
+# ===============================================================================
+
+
+def add_constraint_rows(prob, constraint_rows, var_dicts, pruned_edge_ids=frozenset()):
+    # constraint rows are tuples of (name, terms, sense, rhs)
+    # terms is a list of (var_type, var_key, coefficient) where var_type is a key of var_dicts:
+    # 'flow', 'unmet', 'build', 'proc_flow', or 'xs'
+    # terms for the pruned edges in pruned_edge_ids are left out
+    for name, terms, sense, rhs in constraint_rows:
+        expression = LpAffineExpression()
+        for var_type, var_key, coefficient in drop_pruned_edge_terms(name, terms, var_dicts, pruned_edge_ids):
+            expression.addterm(var_dicts[var_type][var_key], coefficient)
+        prob += LpConstraint(expression, sense, name, rhs)
+
+    return prob
+
+
+# ===============================================================================
+
+
+def generate_unmet_demand_constraint_rows(constraint_params, logger):
+    logger.debug("START: generate_unmet_demand_constraint_rows")
+
+    constraint_rows = []
+
+    # apply activity_level to get corresponding actual demand for var
+
+    with sqlite3.connect(constraint_params['main_db']) as main_db_con:
         # var has form(facility_name, day, simple_fuel)
         # unmet demand commodity should be simple_fuel = supertype
 
@@ -2255,22 +2535,37 @@ def create_constraint_unmet_demand(logger, the_scenario, prob, flow_var, unmet_d
 
             # next get inbound edges, apply appropriate modifier proportion to get how much of var's demand they satisfy
             demand_met_dict[(facility_id, day, top_level_commodity, udp)].append(
-                flow_var[edge_id] * proportion_of_supertype)
+                ('flow', edge_id, proportion_of_supertype))
             actual_demand_dict[(facility_id, day, top_level_commodity, udp)] = var_actual_demand
 
-        for key in unmet_demand_var:
-            if key in demand_met_dict:
-                # then there are some edges in
-                prob += lpSum(demand_met_dict[key]) == actual_demand_dict[key] - unmet_demand_var[
-                    key], "constraint set unmet demand variable for facility {}, day {}, commodity {}".format(key[0],
-                                                                                                              key[1],
-                                                                                                              key[2])
-            else:
-                # no edges in, so unmet demand equals full demand
-                prob += actual_demand_dict[key] == unmet_demand_var[
-                    key], "constraint set unmet demand variable for facility {}, day {}, " \
-                          "commodity {} - no edges able to meet demand".format(
-                    key[0], key[1], key[2])
+    # keys of the unmet demand variables, (facility_id, day, top_level_commodity, udp)
+    for key in constraint_params['unmet_demand_keys']:
+        if key in demand_met_dict:
+            # then there are some edges in
+            constraint_rows.append(("constraint set unmet demand variable for facility {}, day {}, commodity {}".format(
+                key[0], key[1], key[2]), demand_met_dict[key] + [('unmet', key, 1)], LpConstraintEQ,
+                actual_demand_dict[key]))
+        else:
+            # no edges in, so unmet demand equals full demand
+            constraint_rows.append(("constraint set unmet demand variable for facility {}, day {}, "
+                                    "commodity {} - no edges able to meet demand".format(key[0], key[1], key[2]),
+                                    [('unmet', key, 1)], LpConstraintEQ, actual_demand_dict[key]))
+
+    logger.debug("FINISHED: generate_unmet_demand_constraint_rows")
+    return constraint_rows
+
+
+# ===============================================================================
+
+
+def create_constraint_unmet_demand(logger, the_scenario, prob, flow_var, unmet_demand_var,
+                                   pruned_edge_ids=frozenset()):
+    logger.debug("START: create_constraint_unmet_demand")
+
+    constraint_params = get_constraint_params(the_scenario)
+    constraint_params['unmet_demand_keys'] = list(unmet_demand_var.keys())
+    constraint_rows = generate_unmet_demand_constraint_rows(constraint_params, logger)
+    prob = add_constraint_rows(prob, constraint_rows, {'flow': flow_var, 'unmet': unmet_demand_var}, pruned_edge_ids)
 
     logger.debug("FINISHED: create_constraint_unmet_demand and return the prob ")
     return prob
@@ -2279,16 +2574,16 @@ def create_constraint_unmet_demand(logger, the_scenario, prob, flow_var, unmet_d
 # ===============================================================================
 
 
-def create_constraint_max_flow_out_of_supply_vertex(logger, the_scenario, prob, flow_var):
-    logger.debug("STARTING:  create_constraint_max_flow_out_of_supply_vertex")
-    logger.debug("Length of flow_var: {}".format(len(list(flow_var.items()))))
+def generate_max_flow_out_of_supply_vertex_constraint_rows(constraint_params, logger):
+    logger.debug("STARTING: generate_max_flow_out_of_supply_vertex_constraint_rows")
+
+    constraint_rows = []
 
-    # create_constraint_max_flow_out_of_supply_vertex
     # primary vertices only
     # flow out of a vertex <= supply of the vertex, true for every day and commodity
 
     # for each primary (non-storage) supply vertex
-    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+    with sqlite3.connect(constraint_params['main_db']) as main_db_con:
         db_cur = main_db_con.cursor()
         for row_a in db_cur.execute("""select vertex_id, activity_level, supply
         from vertices v, facility_type_id ft
@@ -2306,12 +2601,27 @@ def create_constraint_max_flow_out_of_supply_vertex(logger, the_scenario, prob,
             # should be a single connector edge
             for row_b in db_cur2.execute("select edge_id from edges where o_vertex_id = {};".format(supply_vertex_id)):
                 edge_id = row_b[0]
-                flow_out.append(flow_var[edge_id])
+                flow_out.append(('flow', edge_id, 1))
 
-            prob += lpSum(flow_out) <= actual_vertex_supply, "constraint max flow of {} out of origin vertex {}".format(
-                actual_vertex_supply, supply_vertex_id)
+            constraint_rows.append(("constraint max flow of {} out of origin vertex {}".format(
+                actual_vertex_supply, supply_vertex_id), flow_out, LpConstraintLE, actual_vertex_supply))
         # could easily add human-readable vertex info to this if desirable
 
+    logger.debug("FINISHED: generate_max_flow_out_of_supply_vertex_constraint_rows")
+    return constraint_rows
+
+
+# ===============================================================================
+
+
+def create_constraint_max_flow_out_of_supply_vertex(logger, the_scenario, prob, flow_var, pruned_edge_ids=frozenset()):
+    logger.debug("STARTING:  create_constraint_max_flow_out_of_supply_vertex")
+    logger.debug("Length of flow_var: {}".format(len(list(flow_var.items()))))
+
+    constraint_rows = generate_max_flow_out_of_supply_vertex_constraint_rows(get_constraint_params(the_scenario),
+                                                                             logger)
+    prob = add_constraint_rows(prob, constraint_rows, {'flow': flow_var}, pruned_edge_ids)
+
     logger.debug("FINISHED:  create_constraint_max_flow_out_of_supply_vertex")
     return prob
 
@@ -2319,18 +2629,19 @@ def create_constraint_max_flow_out_of_supply_vertex(logger, the_scenario, prob,
 # ===============================================================================
 
 
-def create_constraint_daily_processor_capacity(logger, the_scenario, prob, flow_var, processor_build_vars,
-                                               processor_daily_flow_vars):
-    logger.debug("STARTING: create_constraint_daily_processor_capacity")
+def generate_daily_processor_capacity_constraint_rows(constraint_params, logger):
+    logger.debug("STARTING: generate_daily_processor_capacity_constraint_rows")
     # primary vertices only
     # flow into vertex is capped at facility max_capacity per day
     # sum over all input commodities, grouped by day and facility
     # conservation of flow and ratios are handled in other methods
 
+    constraint_rows = []
+
     ### get primary processor vertex and its input quantity
     total_scenario_min_capacity = 0
 
-    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+    with sqlite3.connect(constraint_params['main_db']) as main_db_con:
         db_cur = main_db_con.cursor()
         sql = """select f.facility_id,
         ifnull(f.candidate, 0), ifnull(f.max_capacity_ratio, -1), v.schedule_day, v.activity_level,
@@ -2379,28 +2690,33 @@ def create_constraint_daily_processor_capacity(logger, the_scenario, prob, flow_
                 and fc.units = '{}'
                 group by edge_id""".format(day, facility_id, units)):
                     input_edge_id = row_b[0]
-                    flow_in.append(flow_var[input_edge_id])
-                
+                    flow_in.append(('flow', input_edge_id, 1))
+
                 logger.debug(
-                    "flow in for capacity constraint on processor facility {} day {} units {}: {}".format(facility_id, day, units, flow_in))
-                
+                    "flow in for capacity constraint on processor facility {} day {} units {}: {}".format(
+                        facility_id, day, units, [term[1] for term in flow_in]))
+
                 daily_inflow_min_capacity = 0
                 daily_inflow_max_capacity = "Unconstrained"
 
                 # capacity is set to -1 if there is no restriction, so should be no constraint
                 if min_capacity >= 0:
                     daily_inflow_min_capacity = float(min_capacity) * float(daily_activity_level)
-                    prob += lpSum(flow_in) >= daily_inflow_min_capacity * processor_daily_flow_vars[(facility_id, day)], \
-                        "constraint min flow into processor {}, day {}, units {}".format(facility_id, day, units)
+                    constraint_rows.append(("constraint min flow into processor {}, day {}, units {}".format(
+                        facility_id, day, units),
+                        flow_in + [('proc_flow', (facility_id, day), -daily_inflow_min_capacity)],
+                        LpConstraintGE, 0))
 
                 if max_capacity >= 0:
                     daily_inflow_max_capacity = float(max_capacity) * float(daily_activity_level)
-                    prob += lpSum(flow_in) <= daily_inflow_max_capacity * processor_daily_flow_vars[(facility_id, day)], \
+                    constraint_rows.append((
                         "constraint max flow into processor facility {}, day {}, units {}, flow var {}".format(
-                            facility_id, day, units, processor_daily_flow_vars[facility_id, day])
+                            facility_id, day, units, "ProcessorDailyFlow_{}".format((facility_id, day))),
+                        flow_in + [('proc_flow', (facility_id, day), -daily_inflow_max_capacity)],
+                        LpConstraintLE, 0))
                     if min_capacity < 0:
                         logger.debug("Minimum capacity for processor facility {} not specified, defaulting to no minimum".format(facility_id))
-                
+
                 logger.debug(
                     "processor {}, day {}, units {}, input capacity min: {} max: {}".format(facility_id, day, units, daily_inflow_min_capacity,
                                                                              daily_inflow_max_capacity))
@@ -2409,9 +2725,25 @@ def create_constraint_daily_processor_capacity(logger, the_scenario, prob, flow_
             if is_candidate == 1:
                 # forces processor build var to be correct
                 # if there is flow through a candidate processor then it has to be built
-                prob += processor_build_vars[facility_id] >= processor_daily_flow_vars[
-                    (facility_id, day)], "constraint forces processor build var to be correct {}, {}".format(
-                    facility_id, processor_build_vars[facility_id])
+                constraint_rows.append(("constraint forces processor build var to be correct {}, {}".format(
+                    facility_id, "BuildProcessor_{}".format(facility_id)),
+                    [('build', facility_id, 1), ('proc_flow', (facility_id, day), -1)],
+                    LpConstraintGE, 0))
+
+    logger.debug("FINISHED: generate_daily_processor_capacity_constraint_rows")
+    return constraint_rows
+
+
+# ===============================================================================
+
+
+def create_constraint_daily_processor_capacity(logger, the_scenario, prob, flow_var, processor_build_vars,
+                                               processor_daily_flow_vars, pruned_edge_ids=frozenset()):
+    logger.debug("STARTING: create_constraint_daily_processor_capacity")
+
+    constraint_rows = generate_daily_processor_capacity_constraint_rows(get_constraint_params(the_scenario), logger)
+    prob = add_constraint_rows(prob, constraint_rows, {'flow': flow_var, 'build': processor_build_vars,
+                                                       'proc_flow': processor_daily_flow_vars}, pruned_edge_ids)
 
     logger.debug("FINISHED: create_constraint_daily_processor_capacity")
     return prob
@@ -2420,13 +2752,15 @@ def create_constraint_daily_processor_capacity(logger, the_scenario, prob, flow_
 # ===============================================================================
 
 
-def create_primary_processor_vertex_constraints(logger, the_scenario, prob, flow_var):
-    logger.debug("STARTING: create_primary_processor_vertex_constraints - conservation of flow")
+def generate_primary_processor_vertex_constraint_rows(constraint_params, logger):
+    logger.debug("STARTING: generate_primary_processor_vertex_constraint_rows - conservation of flow")
     # for all of these vertices, flow in always  == flow out
     # node_counter = 0
     # node_constraint_counter = 0
 
-    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+    constraint_rows = []
+
+    with sqlite3.connect(constraint_params['main_db']) as main_db_con:
         db_cur = main_db_con.cursor()
 
         # total flow in == total flow out, subject to conversion;
@@ -2441,9 +2775,9 @@ def create_primary_processor_vertex_constraints(logger, the_scenario, prob, flow
 
         logger.debug("conservation of flow and commodity ratios, primary processor vertices:")
         sql = """select v.vertex_id,
-        (case when e.o_vertex_id = v.vertex_id then 'out' 
+        (case when e.o_vertex_id = v.vertex_id then 'out'
         when e.d_vertex_id = v.vertex_id then 'in' else 'error' end) in_or_out_edge,
-        (case when e.o_vertex_id = v.vertex_id then start_day 
+        (case when e.o_vertex_id = v.vertex_id then start_day
         when e.d_vertex_id = v.vertex_id then end_day else 0 end) constraint_day,
         e.commodity_id,
         e.mode,
@@ -2497,167 +2831,180 @@ def create_primary_processor_vertex_constraints(logger, the_scenario, prob, flow
             "fetchall processor primary vertices, with their in and out edges - Total Runtime (HMS): \t{} \t ".format(
                 get_total_runtime_string(fetchall_start_time)))
 
-        # Nested dictionaries
-        # flow_in_lists[primary_processor_vertex_id] = dict of commodities handled by that processor vertex
-
-        # flow_in_lists[primary_processor_vertex_id][commodity1] =
-        # list of edge ids that flow that commodity into that vertex
-
-        # flow_in_lists[vertex_id].values() to get all flow_in edges for all commodities, a list of lists
-        # if edge out commodity inherits transport distance, then source_facility id must match. if not, aggregate
-
-        flow_in_lists = {}
-        flow_out_lists = {}
-        inherit_max_transport = {}
-        # inherit_max_transport[commodity_id] = 'Y' or 'N'
-
-        for row_a in sql_data:
-
-            vertex_id = row_a[0]
-            in_or_out_edge = row_a[1]
-            # constraint_day = row_a[2]
-            commodity_id = row_a[3]
-            # mode = row_a[4]
-            edge_id = row_a[5]
-            # nx_edge_id = row_a[6]
-            quantity = float(row_a[7])
-            # facility_id = row_a[8]
-            # commodity_name = row_a[9]
-            # fc_io_commodity = row_a[10]
-            # activity_level = row_a[11]
-            # is_candidate = row_a[12]
-            edge_source_facility_id = row_a[13]
-            vertex_source_facility_id = row_a[14]
-            # v_commodity_id = row_a[15]
-            inherit_max_transport_distance = row_a[16]
-            if commodity_id not in inherit_max_transport.keys():
-                if inherit_max_transport_distance == 'Y':
-                    inherit_max_transport[commodity_id] = 'Y'
-                else:
-                    inherit_max_transport[commodity_id] = 'N'
-
-            if in_or_out_edge == 'in':
-                # if the vertex isn't in the main dict yet, add it
-                # could have multiple source facilities
-                # could also have more than one input commodity now
-                flow_in_lists.setdefault(vertex_id, {})
-                flow_in_lists[vertex_id].setdefault((commodity_id, quantity, edge_source_facility_id), []).append(flow_var[edge_id])
-                # flow_in_lists[vertex_id] is itself a dict keyed on commodity, quantity (ratio) and edge_source_facility;
-                # value is a list of edge ids into that vertex of that commodity and edge source
-
-            elif in_or_out_edge == 'out':
-                # for out-lists, could have multiple commodities as well as multiple sources
-                # some may have a max transport distance, inherited or independent, some may not
-                flow_out_lists.setdefault(vertex_id, {})  # if the vertex isn't in the main dict yet, add it
-                flow_out_lists[vertex_id].setdefault((commodity_id, quantity, edge_source_facility_id), []).append(flow_var[edge_id])
-
-            # Because we keyed on commodity, source facility tracking is merged as we pass through the processor vertex
-
-            # 1) for each output commodity, check against an input to ensure correct ratio - only need one input
-            # 2) for each input commodity, check against an output to ensure correct ratio - only need one output;
-            # 2a) first sum sub-flows over input commodity
-
-        # 1----------------------------------------------------------------------
-        constrained_input_flow_vars = set([])
-
-        for key, value in iteritems(flow_out_lists):
-            # value is a dictionary with commodity & source as keys
-            # set up a dictionary that will be filled with input lists to check ratio against
-            compare_input_dict = {}
-            compare_input_dict_commod = {}
-            vertex_id = key
-            zero_in = False
-            # value is a dictionary keyed on output commodity, quantity required, edge source
-            if vertex_id in flow_in_lists:
-                in_quantity = 0
-                in_commodity_id = 0
-                in_source_facility_id = -1
-                for ikey, ivalue in iteritems(flow_in_lists[vertex_id]):
-                    in_commodity_id = ikey[0]
-                    in_quantity = ikey[1]
-                    in_source = ikey[2]
-                    # list of edges
-                    compare_input_dict[in_source] = ivalue # this doesn't save all edges for a source if not source tracking
-                    # to accommodate and track multiple input commodities; does not keep sources separate
-                    # aggregate lists over sources, by commodity
-                    if (in_commodity_id, in_quantity) not in compare_input_dict_commod.keys():
-                        compare_input_dict_commod[(in_commodity_id, in_quantity)] = set([])
-                    for edge in ivalue:
-                        compare_input_dict_commod[(in_commodity_id, in_quantity)].add(edge)
+    # Nested dictionaries
+    # flow_in_lists[primary_processor_vertex_id] = dict of commodities handled by that processor vertex
+
+    # flow_in_lists[primary_processor_vertex_id][commodity1] =
+    # list of edge ids that flow that commodity into that vertex
+
+    # flow_in_lists[vertex_id].values() to get all flow_in edges for all commodities, a list of lists
+    # if edge out commodity inherits transport distance, then source_facility id must match. if not, aggregate
+
+    flow_in_lists = {}
+    flow_out_lists = {}
+    inherit_max_transport = {}
+    # inherit_max_transport[commodity_id] = 'Y' or 'N'
+
+    for row_a in sql_data:
+
+        vertex_id = row_a[0]
+        in_or_out_edge = row_a[1]
+        # constraint_day = row_a[2]
+        commodity_id = row_a[3]
+        # mode = row_a[4]
+        edge_id = row_a[5]
+        # nx_edge_id = row_a[6]
+        quantity = float(row_a[7])
+        # facility_id = row_a[8]
+        # commodity_name = row_a[9]
+        # fc_io_commodity = row_a[10]
+        # activity_level = row_a[11]
+        # is_candidate = row_a[12]
+        edge_source_facility_id = row_a[13]
+        vertex_source_facility_id = row_a[14]
+        # v_commodity_id = row_a[15]
+        inherit_max_transport_distance = row_a[16]
+        if commodity_id not in inherit_max_transport.keys():
+            if inherit_max_transport_distance == 'Y':
+                inherit_max_transport[commodity_id] = 'Y'
+            else:
+                inherit_max_transport[commodity_id] = 'N'
+
+        if in_or_out_edge == 'in':
+            # if the vertex isn't in the main dict yet, add it
+            # could have multiple source facilities
+            # could also have more than one input commodity now
+            flow_in_lists.setdefault(vertex_id, {})
+            flow_in_lists[vertex_id].setdefault((commodity_id, quantity, edge_source_facility_id), []).append(edge_id)
+            # flow_in_lists[vertex_id] is itself a dict keyed on commodity, quantity (ratio) and edge_source_facility;
+            # value is a list of edge ids into that vertex of that commodity and edge source
+
+        elif in_or_out_edge == 'out':
+            # for out-lists, could have multiple commodities as well as multiple sources
+            # some may have a max transport distance, inherited or independent, some may not
+            flow_out_lists.setdefault(vertex_id, {})  # if the vertex isn't in the main dict yet, add it
+            flow_out_lists[vertex_id].setdefault((commodity_id, quantity, edge_source_facility_id), []).append(edge_id)
+
+        # Because we keyed on commodity, source facility tracking is merged as we pass through the processor vertex
+
+        # 1) for each output commodity, check against an input to ensure correct ratio - only need one input
+        # 2) for each input commodity, check against an output to ensure correct ratio - only need one output;
+        # 2a) first sum sub-flows over input commodity
+
+    # 1----------------------------------------------------------------------
+    constrained_input_edges = set([])
+
+    for key, value in iteritems(flow_out_lists):
+        # value is a dictionary with commodity & source as keys
+        # set up a dictionary that will be filled with input lists to check ratio against
+        compare_input_dict = {}
+        compare_input_dict_commod = {}
+        vertex_id = key
+        zero_in = False
+        # value is a dictionary keyed on output commodity, quantity required, edge source
+        if vertex_id in flow_in_lists:
+            in_quantity = 0
+            in_commodity_id = 0
+            in_source_facility_id = -1
+            for ikey, ivalue in iteritems(flow_in_lists[vertex_id]):
+                in_commodity_id = ikey[0]
+                in_quantity = ikey[1]
+                in_source = ikey[2]
+                # list of edges
+                compare_input_dict[in_source] = ivalue # this doesn't save all edges for a source if not source tracking
+                # to accommodate and track multiple input commodities; does not keep sources separate
+                # aggregate lists over sources, by commodity
+                # keyed by edge id (rather than a set) so the constraint terms come out in a deterministic order
+                if (in_commodity_id, in_quantity) not in compare_input_dict_commod.keys():
+                    compare_input_dict_commod[(in_commodity_id, in_quantity)] = {}
+                for edge in ivalue:
+                    compare_input_dict_commod[(in_commodity_id, in_quantity)][edge] = True
+        else:
+            zero_in = True
+
+        # value is a dict - we loop once here for each output commodity and source at the vertex
+        for key2, value2 in iteritems(value):
+            out_commodity_id = key2[0]
+            out_quantity = key2[1]
+            out_source = key2[2]
+            edge_list = value2
+            # if we need to match source facility, there is only one set of input lists
+            # otherwise, use all input lists - this aggregates sources
+            # need to keep commodities separate, units may be different
+            # known issue -  we could have double-counting problems if only some outputs have to inherit max
+            # transport distance through this facility
+            match_source = inherit_max_transport[out_commodity_id]
+            compare_input_list = []
+            if match_source == 'Y':
+                if len(compare_input_dict_commod.keys()) > 1:
+                    error = "Multiple input commodities for processors and shared max transport distance are" \
+                            " not supported within the same scenario."
+                    logger.error(error)
+                    raise Exception(error)
+
+                if out_source in compare_input_dict.keys():
+                    compare_input_list = compare_input_dict[out_source]
+            # if no valid input edges - none for vertex, or if output needs to match source and there are no
+            # matching source
+            if zero_in or (match_source == 'Y' and len(compare_input_list) == 0):
+                constraint_rows.append(("processor flow, vertex {} has zero in so zero out of commodity {} "
+                                        "with source {} if applicable".format(vertex_id, out_commodity_id, out_source),
+                                        [('flow', edge_id, 1) for edge_id in edge_list], LpConstraintEQ, 0))
             else:
-                zero_in = True
-
-            # value is a dict - we loop once here for each output commodity and source at the vertex
-            for key2, value2 in iteritems(value):
-                out_commodity_id = key2[0]
-                out_quantity = key2[1]
-                out_source = key2[2]
-                # edge_list = value2
-                flow_var_list = value2
-                # if we need to match source facility, there is only one set of input lists
-                # otherwise, use all input lists - this aggregates sources
-                # need to keep commodities separate, units may be different
-                # known issue -  we could have double-counting problems if only some outputs have to inherit max
-                # transport distance through this facility
-                match_source = inherit_max_transport[out_commodity_id]
-                compare_input_list = []
                 if match_source == 'Y':
-                    if len(compare_input_dict_commod.keys()) > 1:
-                        error = "Multiple input commodities for processors and shared max transport distance are" \
-                                " not supported within the same scenario."
-                        logger.error(error)
-                        raise Exception(error)
-
-                    if out_source in compare_input_dict.keys():
-                        compare_input_list = compare_input_dict[out_source]
-                # if no valid input edges - none for vertex, or if output needs to match source and there are no
-                # matching source
-                if zero_in or (match_source == 'Y' and len(compare_input_list) == 0):
-                    prob += lpSum(
-                        flow_var_list) == 0, "processor flow, vertex {} has zero in so zero out of commodity {} " \
-                                             "with source {} if applicable".format(
-                        vertex_id, out_commodity_id, out_source)
+                    # ratio constraint for this output commodity relative to total input of each commodity
+                    # check against an input dict
+                    constraint_rows.append(("processor flow, vertex {}, source_facility {},"
+                                            " commodity {} output quantity"
+                                            " checked against single input commodity quantity".format(
+                                                vertex_id, out_source, out_commodity_id, in_commodity_id),
+                                            [('flow', edge_id, 1 / out_quantity) for edge_id in edge_list] +
+                                            [('flow', edge_id, -1 / in_quantity) for edge_id in compare_input_list],
+                                            LpConstraintEQ, 0))
+                    for edge_id in compare_input_list:
+                        constrained_input_edges.add(edge_id)
                 else:
-                    if match_source == 'Y':
+                    for k, v in iteritems(compare_input_dict_commod):
+                        # as long as the input source doesn't match an output that needs to inherit
+                        compare_input_list = list(v)
+                        in_commodity_id, in_quantity = k
                         # ratio constraint for this output commodity relative to total input of each commodity
-                        required_flow_out = lpSum(flow_var_list) / out_quantity
                         # check against an input dict
-                        prob += required_flow_out == lpSum(
-                            compare_input_list) / in_quantity, "processor flow, vertex {}, source_facility {}," \
-                                                               " commodity {} output quantity" \
-                                                               " checked against single input commodity quantity".format(
-                            vertex_id, out_source, out_commodity_id, in_commodity_id)
-                        for flow_var in compare_input_list:
-                            constrained_input_flow_vars.add(flow_var)
-                    else:
-                        for k, v in iteritems(compare_input_dict_commod):
-                            # as long as the input source doesn't match an output that needs to inherit
-                            compare_input_list = list(v)
-                            in_commodity_id, in_quantity = k
-                            # ratio constraint for this output commodity relative to total input of each commodity
-                            required_flow_out = lpSum(flow_var_list) / out_quantity
-                            # check against an input dict
-                            prob += required_flow_out == lpSum(
-                                compare_input_list) / in_quantity, "processor flow, vertex {}, source_facility {}," \
-                                                                   " commodity {} output quantity" \
-                                                                   " checked against commodity {} input quantity".format(
-                                vertex_id, out_source, out_commodity_id, in_commodity_id)
-                            for flow_var in compare_input_list:
-                                constrained_input_flow_vars.add(flow_var)
+                        constraint_rows.append(("processor flow, vertex {}, source_facility {},"
+                                                " commodity {} output quantity"
+                                                " checked against commodity {} input quantity".format(
+                                                    vertex_id, out_source, out_commodity_id, in_commodity_id),
+                                                [('flow', edge_id, 1 / out_quantity) for edge_id in edge_list] +
+                                                [('flow', edge_id, -1 / in_quantity) for edge_id in compare_input_list],
+                                                LpConstraintEQ, 0))
+                        for edge_id in compare_input_list:
+                            constrained_input_edges.add(edge_id)
+
+    for key, value in iteritems(flow_in_lists):
+        vertex_id = key
+        for key2, value2 in iteritems(value):
+            commodity_id = key2[0]
+            # out_quantity = key2[1]
+            source = key2[2]
+            edge_list = value2
+            for edge_id in edge_list:
+                if edge_id not in constrained_input_edges:
+                    constraint_rows.append(("processor flow, vertex {} has no matching out edges so zero in of "
+                                            "commodity {} with source {}".format(vertex_id, commodity_id, source),
+                                            [('flow', edge_id, 1)], LpConstraintEQ, 0))
+
+    logger.debug("FINISHED: generate_primary_processor_vertex_constraint_rows")
+    return constraint_rows
 
-        for key, value in iteritems(flow_in_lists):
-            vertex_id = key
-            for key2, value2 in iteritems(value):
-                commodity_id = key2[0]
-                # out_quantity = key2[1]
-                source = key2[2]
-                # edge_list = value2
-                flow_var_list = value2
-                for flow_var in flow_var_list:
-                    if flow_var not in constrained_input_flow_vars:
-                        prob += flow_var == 0, "processor flow, vertex {} has no matching out edges so zero in of " \
-                                               "commodity {} with source {}".format(
-                            vertex_id, commodity_id, source)
+
+# ===============================================================================
+
+
+def create_primary_processor_vertex_constraints(logger, the_scenario, prob, flow_var, pruned_edge_ids=frozenset()):
+    logger.debug("STARTING: create_primary_processor_vertex_constraints - conservation of flow")
+
+    constraint_rows = generate_primary_processor_vertex_constraint_rows(get_constraint_params(the_scenario), logger)
+    prob = add_constraint_rows(prob, constraint_rows, {'flow': flow_var}, pruned_edge_ids)
 
     logger.debug("FINISHED: create_primary_processor_conservation_of_flow_constraints")
     return prob
@@ -2666,22 +3013,24 @@ def create_primary_processor_vertex_constraints(logger, the_scenario, prob, flow
 # ===============================================================================
 
 
-def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var, processor_excess_vars):
-    logger.debug("STARTING: create_constraint_conservation_of_flow")
+def generate_conservation_of_flow_constraint_rows(constraint_params, logger):
+    logger.debug("STARTING: generate_conservation_of_flow_constraint_rows")
     # node_counter = 0
     node_constraint_counter = 0
     storage_vertex_constraint_counter = 0
 
-    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+    constraint_rows = []
+
+    with sqlite3.connect(constraint_params['main_db']) as main_db_con:
         db_cur = main_db_con.cursor()
 
         logger.info("conservation of flow, storage vertices:")
         # storage vertices, any facility type
         # these have at most one direction of transport edges, so no need to track mode
         sql = """select v.vertex_id,
-        (case when e.o_vertex_id = v.vertex_id then 'out' 
+        (case when e.o_vertex_id = v.vertex_id then 'out'
         when e.d_vertex_id = v.vertex_id then 'in' else 'error' end) in_or_out_edge,
-        (case when e.o_vertex_id = v.vertex_id then start_day 
+        (case when e.o_vertex_id = v.vertex_id then start_day
         when e.d_vertex_id = v.vertex_id then end_day else 0 end) constraint_day,
         v.commodity_id,
         e.edge_id,
@@ -2690,7 +3039,7 @@ def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var,
         ft.facility_type
 
         from vertices v, facility_type_id ft, commodities c, facilities f
-        join edges e on ((v.vertex_id = e.o_vertex_id or v.vertex_id = e.d_vertex_id) 
+        join edges e on ((v.vertex_id = e.o_vertex_id or v.vertex_id = e.d_vertex_id)
         and (e.o_vertex_id = v.vertex_id or e.d_vertex_id = v.vertex_id) and v.commodity_id = e.commodity_id)
 
         where  v.facility_id = f.facility_id
@@ -2742,10 +3091,10 @@ def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var,
 
             if in_or_out_edge == 'in':
                 flow_in_lists.setdefault((vertex_id, commodity_id, constraint_day, facility_type), []).append(
-                    flow_var[edge_id])
+                    ('flow', edge_id, -1))
             elif in_or_out_edge == 'out':
                 flow_out_lists.setdefault((vertex_id, commodity_id, constraint_day, facility_type), []).append(
-                    flow_var[edge_id])
+                    ('flow', edge_id, 1))
 
         logger.info("adding processor excess variabless to conservation of flow")
 
@@ -2762,27 +3111,25 @@ def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var,
             # day = key[2]
             facility_type = key[3]
             if facility_type == 'processor':
-                flow_out_lists.setdefault(key, []).append(processor_excess_vars[vertex_id])
+                flow_out_lists.setdefault(key, []).append(('xs', vertex_id, 1))
 
         for key, value in iteritems(flow_out_lists):
 
             if key in flow_in_lists:
-                prob += lpSum(flow_out_lists[key]) == lpSum(
-                    flow_in_lists[key]), "conservation of flow, vertex {}, commodity {},  day {}".format(key[0], key[1],
-                                                                                                         key[2])
+                constraint_rows.append(("conservation of flow, vertex {}, commodity {},  day {}".format(
+                    key[0], key[1], key[2]), flow_out_lists[key] + flow_in_lists[key], LpConstraintEQ, 0))
                 storage_vertex_constraint_counter = storage_vertex_constraint_counter + 1
             else:
-                prob += lpSum(flow_out_lists[key]) == lpSum(
-                    0), "conservation of flow (zero out),  vertex {}, commodity {},  day {}".format(key[0], key[1],
-                                                                                                    key[2])
+                constraint_rows.append(("conservation of flow (zero out),  vertex {}, commodity {},  day {}".format(
+                    key[0], key[1], key[2]), flow_out_lists[key], LpConstraintEQ, 0))
                 storage_vertex_constraint_counter = storage_vertex_constraint_counter + 1
 
         for key, value in iteritems(flow_in_lists):
 
             if key not in flow_out_lists:
-                prob += lpSum(flow_in_lists[key]) == lpSum(
-                    0), "conservation of flow (zero in),  vertex {}, commodity {},  day {}".format(key[0], key[1],
-                                                                                                   key[2])
+                constraint_rows.append(("conservation of flow (zero in),  vertex {}, commodity {},  day {}".format(
+                    key[0], key[1], key[2]), [(var_type, var_key, 1) for var_type, var_key, coefficient in value],
+                    LpConstraintEQ, 0))
                 storage_vertex_constraint_counter = storage_vertex_constraint_counter + 1
 
         logger.info(
@@ -2792,9 +3139,9 @@ def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var,
         # for each day, get all edges in and out of the node.
         # Sort edges by commodity and whether they're going in or out of the node
         sql = """select nn.node_id,
-            (case when e.from_node_id = nn.node_id then 'out' 
+            (case when e.from_node_id = nn.node_id then 'out'
             when e.to_node_id = nn.node_id then 'in' else 'error' end) in_or_out_edge,
-            (case when e.from_node_id = nn.node_id then start_day 
+            (case when e.from_node_id = nn.node_id then start_day
             when e.to_node_id = nn.node_id then end_day else 0 end) constraint_day,
             e.commodity_id,
             ifnull(mode, 'NULL'),
@@ -2807,7 +3154,7 @@ def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var,
             join edges e on (nn.node_id = e.from_node_id or nn.node_id = e.to_node_id)
             where nn.location_id is null
             order by nn.node_id, e.commodity_id,
-            (case when e.from_node_id = nn.node_id then start_day 
+            (case when e.from_node_id = nn.node_id then start_day
             when e.to_node_id = nn.node_id then end_day else 0 end),
             in_or_out_edge, e.source_facility_id, e.commodity_id
             ;"""
@@ -2853,18 +3200,18 @@ def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var,
                 if in_or_out_edge == 'in':
                     flow_in_lists.setdefault(
                         (node_id, intermodal, source_facility_id, constraint_day, commodity_id, mode), []).append(
-                        flow_var[edge_id])
+                        edge_id)
                 elif in_or_out_edge == 'out':
                     flow_out_lists.setdefault(
                         (node_id, intermodal, source_facility_id, constraint_day, commodity_id, mode), []).append(
-                        flow_var[edge_id])
+                        edge_id)
             else:
                 if in_or_out_edge == 'in':
                     flow_in_lists.setdefault((node_id, intermodal, source_facility_id, constraint_day, commodity_id),
-                                             []).append(flow_var[edge_id])
+                                             []).append(edge_id)
                 elif in_or_out_edge == 'out':
                     flow_out_lists.setdefault((node_id, intermodal, source_facility_id, constraint_day, commodity_id),
-                                              []).append(flow_var[edge_id])
+                                              []).append(edge_id)
 
         for key, value in iteritems(flow_out_lists):
             node_id = key[0]
@@ -2877,16 +3224,19 @@ def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var,
             else:
                 node_mode = 'intermodal'
             if key in flow_in_lists:
-                prob += lpSum(flow_out_lists[key]) == lpSum(flow_in_lists[
-                                                                key]), "conservation of flow, nx node {}, " \
-                                                                       "source facility {}, commodity {},  " \
-                                                                       "day {}, mode {}".format(
-                    node_id, source_facility_id, commodity_id, day, node_mode)
+                constraint_rows.append(("conservation of flow, nx node {}, source facility {}, commodity {},  "
+                                        "day {}, mode {}".format(node_id, source_facility_id, commodity_id, day,
+                                                                 node_mode),
+                                        [('flow', edge_id, 1) for edge_id in flow_out_lists[key]] +
+                                        [('flow', edge_id, -1) for edge_id in flow_in_lists[key]],
+                                        LpConstraintEQ, 0))
                 node_constraint_counter = node_constraint_counter + 1
             else:
-                prob += lpSum(flow_out_lists[key]) == lpSum(
-                    0), "conservation of flow (zero out), nx node {}, source facility {},  commodity {}, day {}," \
-                        " mode {}".format(node_id, source_facility_id, commodity_id, day, node_mode)
+                constraint_rows.append(("conservation of flow (zero out), nx node {}, source facility {},  "
+                                        "commodity {}, day {}, mode {}".format(node_id, source_facility_id,
+                                                                               commodity_id, day, node_mode),
+                                        [('flow', edge_id, 1) for edge_id in flow_out_lists[key]],
+                                        LpConstraintEQ, 0))
                 node_constraint_counter = node_constraint_counter + 1
 
         for key, value in iteritems(flow_in_lists):
@@ -2901,15 +3251,31 @@ def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var,
                 node_mode = 'intermodal'
 
             if key not in flow_out_lists:
-                prob += lpSum(flow_in_lists[key]) == lpSum(
-                    0), "conservation of flow (zero in), nx node {}, source facility {}, commodity {},  day {}," \
-                        " mode {}".format(node_id, source_facility_id, commodity_id, day, node_mode)
+                constraint_rows.append(("conservation of flow (zero in), nx node {}, source facility {}, "
+                                        "commodity {},  day {}, mode {}".format(node_id, source_facility_id,
+                                                                                commodity_id, day, node_mode),
+                                        [('flow', edge_id, 1) for edge_id in flow_in_lists[key]],
+                                        LpConstraintEQ, 0))
                 node_constraint_counter = node_constraint_counter + 1
 
         logger.info("total conservation of flow constraints created on nodes: {}".format(node_constraint_counter))
 
         # Note: no consesrvation of flow for primary vertices for supply & demand - they have unique constraints
 
+    logger.debug("FINISHED: generate_conservation_of_flow_constraint_rows")
+    return constraint_rows
+
+
+# ===============================================================================
+
+
+def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var, processor_excess_vars,
+                                           pruned_edge_ids=frozenset()):
+    logger.debug("STARTING: create_constraint_conservation_of_flow")
+
+    constraint_rows = generate_conservation_of_flow_constraint_rows(get_constraint_params(the_scenario), logger)
+    prob = add_constraint_rows(prob, constraint_rows, {'flow': flow_var, 'xs': processor_excess_vars}, pruned_edge_ids)
+
     logger.debug("FINISHED: create_constraint_conservation_of_flow")
 
     return prob
@@ -2918,9 +3284,9 @@ def create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_var,
 # ===============================================================================
 
 
-def create_constraint_max_route_capacity(logger, the_scenario, prob, flow_var):
-    logger.info("STARTING: create_constraint_max_route_capacity")
-    logger.info("modes with background flow turned on: {}".format(the_scenario.backgroundFlowModes))
+def generate_max_route_capacity_constraint_rows(constraint_params, logger):
+    logger.info("STARTING: generate_max_route_capacity_constraint_rows")
+    logger.info("modes with background flow turned on: {}".format(constraint_params['background_flow_modes']))
     # min_capacity_level must be a number from 0 to 1, inclusive
     # min_capacity_level is only relevant when background flows are turned on
     # it sets a floor to how much capacity can be reduced by volume.
@@ -2928,9 +3294,11 @@ def create_constraint_max_route_capacity(logger, the_scenario, prob, flow_var):
     # even if "volume" would otherwise restrict it further
     # min_capacity_level = 0 allows a route to be made unavailable for FTOT flow if base volume is too high
     # this currently applies to all modes
-    logger.info("minimum available capacity floor set at: {}".format(the_scenario.minCapacityLevel))
+    logger.info("minimum available capacity floor set at: {}".format(constraint_params['min_capacity_level']))
 
-    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+    constraint_rows = []
+
+    with sqlite3.connect(constraint_params['main_db']) as main_db_con:
         db_cur = main_db_con.cursor()
         # capacity for storage routes
         sql = """select
@@ -2964,19 +3332,18 @@ def create_constraint_max_route_capacity(logger, the_scenario, prob, flow_var):
             start_day = row_a[4]
 
             flow_lists.setdefault((route_id, aggregate_storage_capac, storage_route_name, start_day), []).append(
-                flow_var[edge_id])
+                ('flow', edge_id, 1))
 
         for key, flow in iteritems(flow_lists):
-            prob += lpSum(flow) <= key[1], "constraint max flow on storage route {} named {} for day {}".format(key[0],
-                                                                                                                key[2],
-                                                                                                                key[3])
+            constraint_rows.append(("constraint max flow on storage route {} named {} for day {}".format(
+                key[0], key[2], key[3]), flow, LpConstraintLE, key[1]))
 
         logger.debug("route_capacity constraints created for all storage routes")
 
         # capacity for transport routes
         # Assumption - all flowing material is in thousand_gallon, all flow is summed on a single non-pipeline nx edge
         sql = """select e.edge_id, e.nx_edge_id, e.max_edge_capacity, e.start_day, e.simple_mode, e.phase_of_matter,
-         e.capac_minus_volume_zero_floor, e.commodity_id, c.commodity_name, c.density
+         e.capac_minus_volume_zero_floor, e.commodity_id, c.commodity_name, c.density_value
         from edges e
         join commodities c
         on e.commodity_id = c.commodity_id
@@ -3010,10 +3377,11 @@ def create_constraint_max_route_capacity(logger, the_scenario, prob, flow_var):
             capac_minus_background_flow = max(row_a[6], 0)
             commodity = row_a[7]
             commod_name = row_a[8]
-            commod_density = Q_(row_a[9]) if row_a[9] else None
-            min_restricted_capacity = max(capac_minus_background_flow, nx_edge_capacity * the_scenario.minCapacityLevel)
+            commod_density = row_a[9]
+            min_restricted_capacity = max(capac_minus_background_flow,
+                                          nx_edge_capacity * constraint_params['min_capacity_level'])
 
-            if simple_mode in the_scenario.backgroundFlowModes:
+            if simple_mode in constraint_params['background_flow_modes']:
                 use_veh_capacity = min_restricted_capacity
             else:
                 use_veh_capacity = nx_edge_capacity
@@ -3029,28 +3397,42 @@ def create_constraint_max_route_capacity(logger, the_scenario, prob, flow_var):
             # multiply each _load_liquid by the commodity's density to get a load in mass units
             if simple_mode == 'road':
                 if phase_of_matter == 'liquid':
-                    multiplier = (the_scenario.truck_load_liquid * commod_density).magnitude
+                    multiplier = constraint_params['truck_load_liquid'] * commod_density
                 elif phase_of_matter == 'solid':
-                    multiplier = the_scenario.truck_load_solid.magnitude
+                    multiplier = constraint_params['truck_load_solid']
             elif simple_mode == 'water':
                 if phase_of_matter == 'liquid':
-                    multiplier = (the_scenario.barge_load_liquid * commod_density).magnitude
+                    multiplier = constraint_params['barge_load_liquid'] * commod_density
                 elif phase_of_matter == 'solid':
-                    multiplier = the_scenario.barge_load_solid.magnitude
+                    multiplier = constraint_params['barge_load_solid']
             elif simple_mode == 'rail':
                 if phase_of_matter == 'liquid':
-                    multiplier = (the_scenario.railcar_load_liquid * commod_density).magnitude
+                    multiplier = constraint_params['railcar_load_liquid'] * commod_density
                 elif phase_of_matter == 'solid':
-                    multiplier = the_scenario.railcar_load_solid.magnitude
+                    multiplier = constraint_params['railcar_load_solid']
 
             # add multiplier (vehicle capacity, in tons) and flow variables to separate lists
-            flow_lists.setdefault((nx_edge_id, use_veh_capacity, start_day),[]).append((flow_var[edge_id],1/multiplier))
+            flow_lists.setdefault((nx_edge_id, use_veh_capacity, start_day), []).append(('flow', edge_id, 1/multiplier))
 
         for key, flow in iteritems(flow_lists):
-            prob += lpSum(flow[i][0] * flow[i][1] for i in range(len(flow))) <= key[1], "constraint max flow on nx edge {} for day {}".format(key[0], key[2])
+            constraint_rows.append(("constraint max flow on nx edge {} for day {}".format(key[0], key[2]),
+                                    flow, LpConstraintLE, key[1]))
 
         logger.debug("route_capacity constraints created for all non-pipeline  transport routes")
 
+    logger.debug("FINISHED: generate_max_route_capacity_constraint_rows")
+    return constraint_rows
+
+
+# ===============================================================================
+
+
+def create_constraint_max_route_capacity(logger, the_scenario, prob, flow_var, pruned_edge_ids=frozenset()):
+    logger.info("STARTING: create_constraint_max_route_capacity")
+
+    constraint_rows = generate_max_route_capacity_constraint_rows(get_constraint_params(the_scenario), logger)
+    prob = add_constraint_rows(prob, constraint_rows, {'flow': flow_var}, pruned_edge_ids)
+
     logger.debug("FINISHED: create_constraint_max_route_capacity")
     return prob
 
@@ -3058,21 +3440,22 @@ def create_constraint_max_route_capacity(logger, the_scenario, prob, flow_var):
 # ===============================================================================
 
 
-def create_constraint_pipeline_capacity(logger, the_scenario, prob, flow_var):
-    logger.debug("STARTING: create_constraint_pipeline_capacity")
-    logger.debug("Length of flow_var: {}".format(len(list(flow_var.items()))))
-    logger.info("modes with background flow turned on: {}".format(the_scenario.backgroundFlowModes))
-    logger.info("minimum available capacity floor set at: {}".format(the_scenario.minCapacityLevel))
+def generate_pipeline_capacity_constraint_rows(constraint_params, logger):
+    logger.debug("STARTING: generate_pipeline_capacity_constraint_rows")
+    logger.info("modes with background flow turned on: {}".format(constraint_params['background_flow_modes']))
+    logger.info("minimum available capacity floor set at: {}".format(constraint_params['min_capacity_level']))
 
-    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+    constraint_rows = []
+
+    with sqlite3.connect(constraint_params['main_db']) as main_db_con:
         db_cur = main_db_con.cursor()
 
         # capacity for pipeline tariff routes
         # with sasc, may have multiple flows per segment, slightly diff commodities
-        sql = """select e.edge_id, e.tariff_id, l.link_id, l.capac, e.start_day, l.capac-l.background_flow allowed_flow, 
-        l.source, e.mode, instr(e.mode, l.source), e.commodity_id, c.density
+        sql = """select e.edge_id, e.tariff_id, l.link_id, l.capac, e.start_day, l.capac-l.background_flow allowed_flow,
+        l.source, e.mode, instr(e.mode, l.source), e.commodity_id, c.density_value
         from edges e
-        JOIN pipeline_mapping pm 
+        JOIN pipeline_mapping pm
         on e.tariff_id = pm.id
         JOIN
         (select id_field_name, cn.source_OID as link_id, min(cn.capacity) capac,
@@ -3085,7 +3468,7 @@ def create_constraint_pipeline_capacity(logger, the_scenario, prob, flow_var):
         JOIN commodities c
         on e.commodity_id = c.commodity_id
 
-        where 
+        where
         pm.id_field_name = 'tariff_ID'
         and pm.mapping_id_field_name = 'MASTER_OID'
         and l.id_field_name = 'MASTER_OID'
@@ -3119,32 +3502,48 @@ def create_constraint_pipeline_capacity(logger, the_scenario, prob, flow_var):
             start_day = row_a[4]
             capac_minus_background_flow_kgal = max(THOUSAND_GALLONS_PER_THOUSAND_BARRELS * row_a[5], 0)
             min_restricted_capacity = max(capac_minus_background_flow_kgal,
-                                          link_capacity_kgal_per_day * the_scenario.minCapacityLevel)
+                                          link_capacity_kgal_per_day * constraint_params['min_capacity_level'])
 
             # capacity_nodes_mode_source = row_a[6]
             edge_mode = row_a[7]
             # mode_match_check = row_a[8]
-            if 'pipeline' in the_scenario.backgroundFlowModes:
+            if 'pipeline' in constraint_params['background_flow_modes']:
                 link_use_capacity_sans_unit = min_restricted_capacity
             else:
                 link_use_capacity_sans_unit = link_capacity_kgal_per_day
 
-            # use Pint to confirm
-            link_use_capacity = Q_(str(link_use_capacity_sans_unit) + " thousand_gallon").to(the_scenario.default_units_liquid_phase)
+            # convert from thousand_gallon to the default liquid units
+            link_use_capacity = link_use_capacity_sans_unit * constraint_params['kgal_to_default_liquid']
 
             ## Use commodity density so that each commodity should contributes to volume-based capacity
             commodity = row_a[9]
             commod_density = row_a[10]
-            multiplier = 1/Q_(commod_density).magnitude
+            multiplier = 1/commod_density
 
             # add flow from all relevant edges, for one start; may be multiple tariffs
-            flow_lists.setdefault((link_id, link_use_capacity.magnitude, start_day, edge_mode), []).append((flow_var[edge_id],multiplier))
+            flow_lists.setdefault((link_id, link_use_capacity, start_day, edge_mode), []).append(
+                ('flow', edge_id, multiplier))
 
         for key, flow in iteritems(flow_lists):
-            prob += lpSum(flow[i][0] * flow[i][1] for i in range(len(flow))) <= key[1], "constraint max flow on pipeline link {} for mode {} for day {}".format(key[0], key[3], key[2])
+            constraint_rows.append(("constraint max flow on pipeline link {} for mode {} for day {}".format(
+                key[0], key[3], key[2]), flow, LpConstraintLE, key[1]))
 
         logger.debug("pipeline capacity constraints created for all transport routes")
 
+    logger.debug("FINISHED: generate_pipeline_capacity_constraint_rows")
+    return constraint_rows
+
+
+# ===============================================================================
+
+
+def create_constraint_pipeline_capacity(logger, the_scenario, prob, flow_var, pruned_edge_ids=frozenset()):
+    logger.debug("STARTING: create_constraint_pipeline_capacity")
+    logger.debug("Length of flow_var: {}".format(len(list(flow_var.items()))))
+
+    constraint_rows = generate_pipeline_capacity_constraint_rows(get_constraint_params(the_scenario), logger)
+    prob = add_constraint_rows(prob, constraint_rows, {'flow': flow_var}, pruned_edge_ids)
+
     logger.debug("FINISHED: create_constraint_pipeline_capacity")
     return prob
 
@@ -3152,6 +3551,76 @@ def create_constraint_pipeline_capacity(logger, the_scenario, prob, flow_var):
 # ===============================================================================
 
 
+# constraint families in the order they are added to the problem
+constraint_row_generators = {
+    'unmet_demand': generate_unmet_demand_constraint_rows,
+    'max_flow_out_of_supply_vertex': generate_max_flow_out_of_supply_vertex_constraint_rows,
+    'daily_processor_capacity': generate_daily_processor_capacity_constraint_rows,
+    'primary_processor_vertex': generate_primary_processor_vertex_constraint_rows,
+    'conservation_of_flow': generate_conservation_of_flow_constraint_rows,
+    'max_route_capacity': generate_max_route_capacity_constraint_rows,
+    'pipeline_capacity': generate_pipeline_capacity_constraint_rows
+}
+
+
+# ===============================================================================
+
+
+def get_constraint_families(the_scenario):
+    constraint_families = ['unmet_demand', 'max_flow_out_of_supply_vertex', 'daily_processor_capacity',
+                           'primary_processor_vertex', 'conservation_of_flow']
+    if the_scenario.capacityOn:
+        constraint_families.extend(['max_route_capacity', 'pipeline_capacity'])
+    return constraint_families
+
+
+# ===============================================================================
+
+
+def multi_constraint_rows(stuff_to_pass):
+    # worker process: build the rows for one constraint family
+    # the worker does not share the parent's log handlers, so it logs to the named logger only
+    constraint_family, constraint_params = stuff_to_pass
+    return constraint_family, constraint_row_generators[constraint_family](constraint_params,
+                                                                           logging.getLogger('log'))
+
+
+# ===============================================================================
+
+
+def generate_constraint_rows_parallel(constraint_params, constraint_families, logger):
+    logger.info("START: generate_constraint_rows_parallel")
+    start_time = datetime.datetime.now()
+
+    stuff_to_pass = [[constraint_family, constraint_params] for constraint_family in constraint_families]
+
+    # Allow multiprocessing, with no more than 75% of cores to be used, rounding down if necessary
+    processors_to_save = int(math.ceil(multiprocessing.cpu_count() * 0.25))
+    processors_to_use = max(1, min(multiprocessing.cpu_count() - processors_to_save, len(constraint_families)))
+    logger.info("number of CPUs to use = {}".format(processors_to_use))
+
+    pool = multiprocessing.Pool(processes=processors_to_use)
+    try:
+        # pool.map returns results in the order of the constraint families, so the merge is deterministic
+        results = pool.map(multi_constraint_rows, stuff_to_pass)
+    except Exception as e:
+        pool.close()
+        pool.terminate()
+        logger.error("FAIL: {} ".format(e))
+        raise Exception("FAIL: {}".format(e))
+    pool.close()
+    pool.join()
+
+    constraint_rows = dict(results)
+
+    logger.info("FINISH: generate_constraint_rows_parallel: Runtime (HMS): \t{}".format(
+        get_total_runtime_string(start_time)))
+    return constraint_rows
+
+
+# ===============================================================================
+
+
 def setup_pulp_problem(the_scenario, logger):
     logger.info("START: setup PuLP problem")
 
@@ -3177,24 +3646,46 @@ def setup_pulp_problem(the_scenario, logger):
 
     prob = create_opt_problem(logger, the_scenario, unmet_demand_vars, flow_vars, processor_build_vars)
 
-    prob = create_constraint_unmet_demand(logger, the_scenario, prob, flow_vars, unmet_demand_vars)
+    if the_scenario.parallel_constraint_build:
+        # build the rows of each constraint family in a worker process and merge them in the serial order
+        constraint_families = get_constraint_families(the_scenario)
 
-    prob = create_constraint_max_flow_out_of_supply_vertex(logger, the_scenario, prob, flow_vars)
+        constraint_params = get_constraint_params(the_scenario)
+        constraint_params['unmet_demand_keys'] = list(unmet_demand_vars.keys())
+        constraint_rows = generate_constraint_rows_parallel(constraint_params, constraint_families, logger)
 
-    # This constraint is being excluded because 1) it is not used in current scenarios and 2) it is not supported by
-    # this version - it conflicts with the change permitting multiple inputs
-    # adding back 12/2020
-    prob = create_constraint_daily_processor_capacity(logger, the_scenario, prob, flow_vars, processor_build_vars,
-                                                      processor_vertex_flow_vars)
+        var_dicts = {'flow': flow_vars, 'unmet': unmet_demand_vars, 'build': processor_build_vars,
+                     'proc_flow': processor_vertex_flow_vars, 'xs': processor_excess_vars}
+        pruned_edge_ids = get_pruned_edge_ids(the_scenario)
+        for constraint_family in constraint_families:
+            logger.info("adding {:,} {} constraints".format(len(constraint_rows[constraint_family]),
+                                                           constraint_family))
+            prob = add_constraint_rows(prob, constraint_rows[constraint_family], var_dicts, pruned_edge_ids)
+            del constraint_rows[constraint_family]
 
-    prob = create_primary_processor_vertex_constraints(logger, the_scenario, prob, flow_vars)
+    else:
+        pruned_edge_ids = get_pruned_edge_ids(the_scenario)
 
-    prob = create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_vars, processor_excess_vars)
+        prob = create_constraint_unmet_demand(logger, the_scenario, prob, flow_vars, unmet_demand_vars,
+                                              pruned_edge_ids)
 
-    if the_scenario.capacityOn:
-        prob = create_constraint_max_route_capacity(logger, the_scenario, prob, flow_vars)
+        prob = create_constraint_max_flow_out_of_supply_vertex(logger, the_scenario, prob, flow_vars, pruned_edge_ids)
 
-        prob = create_constraint_pipeline_capacity(logger, the_scenario, prob, flow_vars)
+        # This constraint is being excluded because 1) it is not used in current scenarios and 2) it is not supported by
+        # this version - it conflicts with the change permitting multiple inputs
+        # adding back 12/2020
+        prob = create_constraint_daily_processor_capacity(logger, the_scenario, prob, flow_vars, processor_build_vars,
+                                                          processor_vertex_flow_vars, pruned_edge_ids)
+
+        prob = create_primary_processor_vertex_constraints(logger, the_scenario, prob, flow_vars, pruned_edge_ids)
+
+        prob = create_constraint_conservation_of_flow(logger, the_scenario, prob, flow_vars, processor_excess_vars,
+                                                      pruned_edge_ids)
+
+        if the_scenario.capacityOn:
+            prob = create_constraint_max_route_capacity(logger, the_scenario, prob, flow_vars, pruned_edge_ids)
+
+            prob = create_constraint_pipeline_capacity(logger, the_scenario, prob, flow_vars, pruned_edge_ids)
 
     del unmet_demand_vars
 
@@ -3210,7 +3701,36 @@ def setup_pulp_problem(the_scenario, logger):
 # ===============================================================================
 
 
-def solve_pulp_problem(prob_final, the_scenario, logger):
+# the min-cost-flow solver falls back to CBC for problems that are not pure network problems
+solver_display_names = {'cbc': 'CBC', 'highs': 'HiGHS', 'mcf': 'CBC'}
+
+
+def get_solver_time_limit_seconds(the_scenario):
+    # plain number of seconds, or None when the solver runs without a time limit
+    if the_scenario.time_limit == "none":
+        return None
+    return the_scenario.time_limit.magnitude
+
+
+# ===============================================================================
+
+
+def get_pulp_solver(solver_name, time_limit_seconds, msg=1, warm_start=False):
+    # warm_start passes the current variable values to CBC as a starting solution; HiGHS does not use it
+    if solver_name == "highs":
+        if time_limit_seconds is None:
+            return HiGHS(msg=msg)
+        return HiGHS(msg=msg, timeLimit=time_limit_seconds)
+    else:
+        if time_limit_seconds is None:
+            return PULP_CBC_CMD(msg=msg, warmStart=warm_start)
+        return PULP_CBC_CMD(msg=msg, timeLimit=time_limit_seconds, warmStart=warm_start)
+
+
+# ===============================================================================
+
+
+def solve_pulp_problem(prob_final, the_scenario, logger, warm_start=False):
     logger.info("START: solve_pulp_problem")
     start_time = datetime.datetime.now()
     from os import dup, dup2, close
@@ -3219,20 +3739,12 @@ def solve_pulp_problem(prob_final, the_scenario, logger):
     dup2(f.fileno(), 1)
         
     # The problem is solved using user's choice of Solver
-    if the_scenario.solver == "cbc":
-        if the_scenario.time_limit == "none":
-            logger.info("Solver = CBC, NO time limit")
-            solver = PULP_CBC_CMD(msg=1)
-        else:
-            logger.info("Solver = CBC, time limit = " + str(the_scenario.time_limit))
-            solver = PULP_CBC_CMD(msg=1, timeLimit=the_scenario.time_limit.magnitude)
-    elif the_scenario.solver == "highs":
-        if the_scenario.time_limit == "none":
-            logger.info("Solver = HiGHS, NO time limit")
-            solver = HiGHS(msg=1)
-        else:
-            logger.info("Solver = HiGHS, time limit = " + str(the_scenario.time_limit))
-            solver = HiGHS(msg=1, timeLimit=the_scenario.time_limit.magnitude)
+    if the_scenario.time_limit == "none":
+        logger.info("Solver = {}, NO time limit".format(solver_display_names[the_scenario.solver]))
+    else:
+        logger.info("Solver = {}, time limit = ".format(solver_display_names[the_scenario.solver]) +
+                    str(the_scenario.time_limit))
+    solver = get_pulp_solver(the_scenario.solver, get_solver_time_limit_seconds(the_scenario), warm_start=warm_start)
     status = prob_final.solve(solver)
     
     logger.info('Completion code: %d; Solution status: %s; Best obj value found: %s' % (
@@ -3256,6 +3768,9 @@ def solve_pulp_problem(prob_final, the_scenario, logger):
     ##LpStatusUnbounded    ?Unbounded?    -2
     ##LpStatusUndefined    ?Undefined?    -3
     logger.result("prob.Status: \t {}".format(LpStatus[prob_final.status]))
+    logger.metric("solver_status", LpStatus[prob_final.status])
+    logger.metric("num_variables", prob_final.numVariables())
+    logger.metric("num_constraints", prob_final.numConstraints())
 
     if value(prob_final.objective) is None:
         error = "There is no optimal objective value. Please ensure that your facilities are connected to the network" \
@@ -3272,6 +3787,618 @@ def solve_pulp_problem(prob_final, the_scenario, logger):
 
 # ===============================================================================
 
+
+def setup_pulp_problem_rows(the_scenario, logger):
+    # same variables, objective and constraints as setup_pulp_problem, but the constraints are returned as rows
+    # by constraint family rather than added to the problem, for solvers that work on pieces of the problem
+    flow_vars = create_flow_vars(the_scenario, logger)
+    unmet_demand_vars = create_unmet_demand_vars(the_scenario, logger)
+    processor_build_vars = create_candidate_processor_build_vars(the_scenario, logger)
+    processor_vertex_flow_vars = create_binary_processor_vertex_flow_vars(the_scenario, logger)
+    processor_excess_vars = create_processor_excess_output_vars(the_scenario, logger)
+    var_dicts = {'flow': flow_vars, 'unmet': unmet_demand_vars, 'build': processor_build_vars,
+                 'proc_flow': processor_vertex_flow_vars, 'xs': processor_excess_vars}
+
+    prob = create_opt_problem(logger, the_scenario, unmet_demand_vars, flow_vars, processor_build_vars)
+    # variables without an objective cost (e.g., processor tracking variables) still need to be reported
+    for var_type, var_dict in iteritems(var_dicts):
+        prob.addVariables(list(var_dict.values()))
+
+    constraint_families = get_constraint_families(the_scenario)
+    constraint_params = get_constraint_params(the_scenario)
+    constraint_params['unmet_demand_keys'] = list(unmet_demand_vars.keys())
+    if the_scenario.parallel_constraint_build:
+        constraint_rows_by_family = generate_constraint_rows_parallel(constraint_params, constraint_families, logger)
+    else:
+        constraint_rows_by_family = {constraint_family: constraint_row_generators[constraint_family](
+            constraint_params, logger) for constraint_family in constraint_families}
+
+    # leave out terms for pruned edges, which have no flow variable
+    pruned_edge_ids = get_pruned_edge_ids(the_scenario)
+    for constraint_family in constraint_families:
+        constraint_rows_by_family[constraint_family] = [
+            (name, drop_pruned_edge_terms(name, terms, var_dicts, pruned_edge_ids), sense, rhs)
+            for name, terms, sense, rhs in constraint_rows_by_family[constraint_family]]
+
+    return prob, var_dicts, constraint_families, constraint_rows_by_family
+
+
+# ===============================================================================
+
+
+def report_stitched_solution(prob, num_variables, num_constraints, logger):
+    # logs the status, size, and objective of a problem whose variable values were set outside of prob.solve()
+    # num_variables and num_constraints are summed across the pieces that were actually solved
+    logger.result("prob.Status: \t {}".format(LpStatus[prob.status]))
+    logger.metric("solver_status", LpStatus[prob.status])
+    logger.metric("num_variables", num_variables)
+    logger.metric("num_constraints", num_constraints)
+
+    if value(prob.objective) is None:
+        error = "There is no optimal objective value. Please ensure that your facilities are connected to the network" \
+                " or that there is no other issue with your PulP optimization problem"
+        logger.error(error)
+        raise Exception(error)
+
+    logger.result(
+        "Optimal Objective Value: \t {0:,.0f}".format(
+            float(value(prob.objective))))
+
+
+# ===============================================================================
+
+
+def find_independent_blocks(constraint_rows, var_dicts, logger):
+    logger.info("START: find_independent_blocks")
+    # union-find over variable names: two variables are in the same component if they share a constraint row
+    # returns a dict of variable name -> component root
+    parent = {}
+    for var_type, var_dict in iteritems(var_dicts):
+        for var in var_dict.values():
+            parent[var.name] = var.name
+
+    def find(var_name):
+        root = var_name
+        while parent[root] != root:
+            root = parent[root]
+        # path compression
+        while parent[var_name] != root:
+            parent[var_name], var_name = root, parent[var_name]
+        return root
+
+    for name, terms, sense, rhs in constraint_rows:
+        if len(terms) < 2:
+            continue
+        first_root = find(var_dicts[terms[0][0]][terms[0][1]].name)
+        for var_type, var_key, coefficient in terms[1:]:
+            root = find(var_dicts[var_type][var_key].name)
+            if root != first_root:
+                parent[root] = first_root
+
+    components = {var_name: find(var_name) for var_name in parent}
+    logger.info("number of independent components: {:,}".format(len(set(components.values()))))
+    logger.info("FINISH: find_independent_blocks")
+    return components
+
+
+# ===============================================================================
+
+
+def multi_solve_block(stuff_to_pass):
+    # worker process: solve one block of the decomposed problem
+    # returns the block id, solution status and the values of the block variables keyed by variable name
+    block_id, block_prob_dict, solver_name, time_limit_seconds = stuff_to_pass
+    block_vars, block_prob = LpProblem.from_dict(block_prob_dict)
+    block_prob.solve(get_pulp_solver(solver_name, time_limit_seconds, msg=0))
+    return block_id, block_prob.status, {name: var.varValue for name, var in iteritems(block_vars)}
+
+
+# ===============================================================================
+
+
+def solve_decomposed_pulp_problem(the_scenario, logger):
+    # builds the same variables, objective and constraints as setup_pulp_problem, then splits the problem into
+    # blocks of variables that do not share a constraint (e.g., by commodity and day for uncapacitated scenarios
+    # without processors) and solves the blocks in parallel. the block solutions are written back to the
+    # variables of the full problem so that save_pulp_solution records the same variable names.
+    logger.info("START: solve_decomposed_pulp_problem")
+    start_time = datetime.datetime.now()
+
+    prob, var_dicts, constraint_families, constraint_rows_by_family = setup_pulp_problem_rows(the_scenario, logger)
+    constraint_rows = []
+    for constraint_family in constraint_families:
+        constraint_rows.extend(constraint_rows_by_family.pop(constraint_family))
+
+    components = find_independent_blocks(constraint_rows, var_dicts, logger)
+    component_roots = sorted(set(components.values()))
+
+    if len(component_roots) < 2:
+        logger.info("problem has a single connected component, solving without decomposition")
+        prob = add_constraint_rows(prob, constraint_rows, var_dicts)
+        prob.writeLP(os.path.join(the_scenario.scenario_run_directory, "debug", "LP_output_c2.lp"))
+        return solve_pulp_problem(prob, the_scenario, logger)
+
+    # Allow multiprocessing, with no more than 75% of cores to be used, rounding down if necessary
+    processors_to_save = int(math.ceil(multiprocessing.cpu_count() * 0.25))
+    processors_to_use = max(1, min(multiprocessing.cpu_count() - processors_to_save, len(component_roots)))
+    logger.info("number of CPUs to use = {}".format(processors_to_use))
+
+    # pack the components into one block per process, largest component first onto the smallest block
+    component_sizes = defaultdict(int)
+    for var_name, root in iteritems(components):
+        component_sizes[root] += 1
+    block_sizes = [0] * processors_to_use
+    component_block = {}
+    for root in sorted(component_roots, key=lambda r: (-component_sizes[r], r)):
+        block_id = block_sizes.index(min(block_sizes))
+        component_block[root] = block_id
+        block_sizes[block_id] += component_sizes[root]
+    logger.info("variables per block: {}".format(block_sizes))
+
+    # split the objective and the constraint rows across the blocks
+    block_probs = [LpProblem("Flow_assignment_block_{}".format(block_id), LpMinimize)
+                   for block_id in range(processors_to_use)]
+    block_objectives = [LpAffineExpression() for block_id in range(processors_to_use)]
+    for var, coefficient in prob.objective.items():
+        block_objectives[component_block[components[var.name]]].addterm(var, coefficient)
+    for block_id in range(processors_to_use):
+        block_probs[block_id] += block_objectives[block_id], "Total Cost of Transport, storage, " \
+                                                             "facility building, and penalties"
+
+    block_rows = [[] for block_id in range(processors_to_use)]
+    for row in constraint_rows:
+        terms = row[1]
+        if terms:
+            block_id = component_block[components[var_dicts[terms[0][0]][terms[0][1]].name]]
+        else:
+            block_id = 0
+        block_rows[block_id].append(row)
+    del constraint_rows
+
+    stuff_to_pass = []
+    num_variables = 0
+    num_constraints = 0
+    for block_id in range(processors_to_use):
+        block_probs[block_id] = add_constraint_rows(block_probs[block_id], block_rows[block_id], var_dicts)
+        num_variables += block_probs[block_id].numVariables()
+        num_constraints += block_probs[block_id].numConstraints()
+        block_probs[block_id].writeLP(os.path.join(the_scenario.scenario_run_directory, "debug",
+                                                   "LP_output_c2_block_{}.lp".format(block_id)))
+        stuff_to_pass.append([block_id, block_probs[block_id].to_dict(), the_scenario.solver,
+                              get_solver_time_limit_seconds(the_scenario)])
+    del block_rows
+    del block_probs
+
+    if the_scenario.time_limit == "none":
+        logger.info("Solver = {}, NO time limit".format(solver_display_names[the_scenario.solver]))
+    else:
+        logger.info("Solver = {}, time limit per block = ".format(solver_display_names[the_scenario.solver]) +
+                    str(the_scenario.time_limit))
+
+    solve_start_time = datetime.datetime.now()
+    pool = multiprocessing.Pool(processes=processors_to_use)
+    try:
+        results = pool.map(multi_solve_block, stuff_to_pass)
+    except Exception as e:
+        pool.close()
+        pool.terminate()
+        logger.error("FAIL: {} ".format(e))
+        raise Exception("FAIL: {}".format(e))
+    pool.close()
+    pool.join()
+    logger.info("FINISH: solve blocks: Runtime (HMS): \t{}".format(get_total_runtime_string(solve_start_time)))
+
+    # stitch the block solutions back into the full problem
+    solution_values = {}
+    prob.status = LpStatusOptimal
+    for block_id, block_status, block_values in results:
+        logger.info("block {} solution status: {}".format(block_id, LpStatus[block_status]))
+        if block_status != LpStatusOptimal and prob.status == LpStatusOptimal:
+            prob.status = block_status
+        solution_values.update(block_values)
+    for var in prob.variables():
+        var.varValue = solution_values.get(var.name)
+
+    report_stitched_solution(prob, num_variables, num_constraints, logger)
+
+    logger.info("FINISH: solve_decomposed_pulp_problem: Runtime (HMS): \t{}".format(
+        get_total_runtime_string(start_time)))
+    return prob
+
+
+# ===============================================================================
+
+
+def build_min_cost_flow_network(prob, var_dicts, constraint_rows_by_family, logger):
+    # translates the constraint rows of a pure network problem into a networkx graph for network simplex
+    # returns None if the problem has side constraints that a min-cost-flow solver cannot represent
+    logger.info("START: build_min_cost_flow_network")
+
+    for constraint_family in ['daily_processor_capacity', 'primary_processor_vertex', 'max_route_capacity',
+                              'pipeline_capacity']:
+        if constraint_rows_by_family.get(constraint_family):
+            logger.info("problem has {} constraints".format(constraint_family))
+            return None
+    if var_dicts['build'] or var_dicts['xs']:
+        logger.info("problem has processor variables")
+        return None
+
+    costs = {var.name: coefficient for var, coefficient in prob.objective.items()}
+
+    # each flow variable is an arc from the row it leaves (coefficient 1) to the row it enters (coefficient -1)
+    arc_tails = {}
+    arc_heads = {}
+    node_supply = defaultdict(float)
+    unmet_arcs = {}
+    forced_zero = set()
+
+    def set_arc_end(arc_ends, var_name, node):
+        if var_name in arc_ends:
+            return False
+        arc_ends[var_name] = node
+        return True
+
+    # destinations: flow in + unmet demand = demand
+    for name, terms, sense, rhs in constraint_rows_by_family['unmet_demand']:
+        node_supply[name] -= rhs
+        for var_type, var_key, coefficient in terms:
+            var_name = var_dicts[var_type][var_key].name
+            if var_type == 'unmet':
+                unmet_arcs[var_name] = name
+            elif coefficient != 1 or not set_arc_end(arc_heads, var_name, name):
+                logger.info("unmet demand constraint {} is not a network constraint".format(name))
+                return None
+
+    # origins: flow out <= supply, the remainder goes to the excess sink
+    for name, terms, sense, rhs in constraint_rows_by_family['max_flow_out_of_supply_vertex']:
+        node_supply[name] += rhs
+        for var_type, var_key, coefficient in terms:
+            if coefficient != 1 or not set_arc_end(arc_tails, var_dicts[var_type][var_key].name, name):
+                logger.info("supply constraint {} is not a network constraint".format(name))
+                return None
+
+    # transshipment: flow out - flow in = 0
+    conservation_rows = []
+    for name, terms, sense, rhs in constraint_rows_by_family['conservation_of_flow']:
+        if sense != LpConstraintEQ or rhs != 0:
+            logger.info("conservation of flow constraint {} is not a network constraint".format(name))
+            return None
+        if all(coefficient > 0 for var_type, var_key, coefficient in terms) or \
+                all(coefficient < 0 for var_type, var_key, coefficient in terms):
+            # zero in or zero out: every variable in the row is fixed at zero
+            for var_type, var_key, coefficient in terms:
+                forced_zero.add(var_dicts[var_type][var_key].name)
+        else:
+            conservation_rows.append((name, terms))
+    for name, terms in conservation_rows:
+        for var_type, var_key, coefficient in terms:
+            var_name = var_dicts[var_type][var_key].name
+            if var_name in forced_zero:
+                continue
+            if coefficient == 1:
+                arc_end_set = set_arc_end(arc_tails, var_name, name)
+            elif coefficient == -1:
+                arc_end_set = set_arc_end(arc_heads, var_name, name)
+            else:
+                arc_end_set = False
+            if not arc_end_set:
+                logger.info("conservation of flow constraint {} is not a network constraint".format(name))
+                return None
+
+    # quantities and costs are scaled to integers, as network simplex is not exact for floating point data
+    mcf_graph = nx.MultiDiGraph()
+    total_supply = 0
+    total_demand = 0
+    for node, supply in iteritems(node_supply):
+        scaled_supply = int(round(supply * mcf_scale_factor))
+        mcf_graph.add_node(node, demand=-scaled_supply)
+        if scaled_supply > 0:
+            total_supply += scaled_supply
+            mcf_graph.add_edge(node, 'excess_sink', key='excess_{}'.format(node), weight=0)
+        else:
+            total_demand -= scaled_supply
+    mcf_graph.add_node('unmet_source', demand=-total_demand)
+    mcf_graph.add_node('excess_sink', demand=total_supply)
+    mcf_graph.add_edge('unmet_source', 'excess_sink', key='unused_unmet_demand', weight=0)
+
+    for var_name, node in iteritems(unmet_arcs):
+        mcf_graph.add_edge('unmet_source', node, key=var_name,
+                           weight=int(round(costs.get(var_name, 0) * mcf_scale_factor)))
+
+    for var in var_dicts['flow'].values():
+        if var.name in forced_zero:
+            continue
+        if var.name in arc_tails and var.name in arc_heads:
+            mcf_graph.add_edge(arc_tails[var.name], arc_heads[var.name], key=var.name,
+                               weight=int(round(costs.get(var.name, 0) * mcf_scale_factor)))
+        elif var.name in arc_tails or var.name in arc_heads or costs.get(var.name, 0) < 0:
+            logger.info("flow variable {} does not connect two network nodes".format(var.name))
+            return None
+
+    logger.info("min-cost-flow network: {:,} nodes, {:,} arcs".format(mcf_graph.number_of_nodes(),
+                                                                    mcf_graph.number_of_edges()))
+    logger.info("FINISH: build_min_cost_flow_network")
+    return mcf_graph
+
+
+# ===============================================================================
+
+
+def solve_min_cost_flow_problem(the_scenario, logger):
+    # uncapacitated scenarios without processors reduce to a transportation problem with unmet demand slack,
+    # which network simplex solves directly. the arc flows are written to the PuLP variables of the full problem
+    # so that save_pulp_solution records the same variable names.
+    logger.info("START: solve_min_cost_flow_problem")
+    start_time = datetime.datetime.now()
+
+    prob, var_dicts, constraint_families, constraint_rows_by_family = setup_pulp_problem_rows(the_scenario, logger)
+
+    mcf_graph = build_min_cost_flow_network(prob, var_dicts, constraint_rows_by_family, logger)
+
+    if mcf_graph is None:
+        logger.warning("The optimization problem is not a pure network problem (e.g., processors, candidate "
+                       "processors, or capacity constraints are present). Defaulting to CBC solver.")
+        for constraint_family in constraint_families:
+            prob = add_constraint_rows(prob, constraint_rows_by_family.pop(constraint_family), var_dicts)
+        prob.writeLP(os.path.join(the_scenario.scenario_run_directory, "debug", "LP_output_c2.lp"))
+        return solve_pulp_problem(prob, the_scenario, logger)
+
+    # the network simplex problem has one arc per flow variable and one node balance per network node
+    num_variables = mcf_graph.number_of_edges()
+    num_constraints = mcf_graph.number_of_nodes()
+    del constraint_rows_by_family
+
+    logger.info("Solver = network simplex")
+    solve_start_time = datetime.datetime.now()
+    try:
+        flow_cost, flow_dict = nx.network_simplex(mcf_graph)
+    except (nx.NetworkXUnfeasible, nx.NetworkXUnbounded) as e:
+        error = "min-cost-flow solver failed: {}".format(e)
+        logger.error(error)
+        raise Exception(error)
+    logger.info("FINISH: network simplex: Runtime (HMS): \t{}".format(get_total_runtime_string(solve_start_time)))
+
+    solution_values = {}
+    for tail, heads in iteritems(flow_dict):
+        for head, arcs in iteritems(heads):
+            for key, flow in iteritems(arcs):
+                solution_values[key] = float(flow) / mcf_scale_factor
+
+    # variables that are not arcs in the network (fixed at zero) carry no flow
+    for var in prob.variables():
+        var.varValue = solution_values.get(var.name, 0)
+    prob.status = LpStatusOptimal
+
+    report_stitched_solution(prob, num_variables, num_constraints, logger)
+
+    logger.info("FINISH: solve_min_cost_flow_problem: Runtime (HMS): \t{}".format(
+        get_total_runtime_string(start_time)))
+    return prob
+
+
+# ===============================================================================
+
+
+def get_violated_constraint_rows(constraint_rows, var_dicts):
+    # rows whose left hand side, evaluated at the current variable values, exceeds the right hand side
+    violated_rows = []
+    for row in constraint_rows:
+        name, terms, sense, rhs = row
+        lhs = 0
+        for var_type, var_key, coefficient in terms:
+            var_value = var_dicts[var_type][var_key].varValue
+            if var_value:
+                lhs += coefficient * var_value
+        if lhs > rhs + max(zero_threshold, abs(rhs) * 1e-9):
+            violated_rows.append(row)
+    return violated_rows
+
+
+# ===============================================================================
+
+
+def solve_lazy_capacity_pulp_problem(the_scenario, logger):
+    # most route capacity constraints are slack at the optimum. solve without them, add only the constraints that
+    # the solution violates, and re-solve (warm started from the previous solution) until none are violated
+    logger.info("START: solve_lazy_capacity_pulp_problem")
+    start_time = datetime.datetime.now()
+
+    prob, var_dicts, constraint_families, constraint_rows_by_family = setup_pulp_problem_rows(the_scenario, logger)
+
+    for constraint_family in constraint_families:
+        if constraint_family != 'max_route_capacity':
+            prob = add_constraint_rows(prob, constraint_rows_by_family.pop(constraint_family), var_dicts)
+    lazy_rows = constraint_rows_by_family.pop('max_route_capacity')
+    total_lazy_rows = len(lazy_rows)
+    logger.info("route capacity constraints held back: {:,}".format(total_lazy_rows))
+
+    iteration = 0
+    while True:
+        iteration += 1
+        logger.info("lazy route capacity iteration {}".format(iteration))
+        prob = solve_pulp_problem(prob, the_scenario, logger, warm_start=(iteration > 1))
+
+        violated_rows = get_violated_constraint_rows(lazy_rows, var_dicts)
+        logger.info("violated route capacity constraints: {:,}".format(len(violated_rows)))
+        if not violated_rows:
+            break
+
+        if iteration >= the_scenario.lazyCapacityMaxIterations:
+            logger.warning("route capacity constraints are still violated after {} iterations. Adding all {:,} "
+                           "remaining route capacity constraints for a final solve.".format(iteration,
+                                                                                            len(lazy_rows)))
+            prob = add_constraint_rows(prob, lazy_rows, var_dicts)
+            lazy_rows = []
+            prob = solve_pulp_problem(prob, the_scenario, logger, warm_start=True)
+            break
+
+        prob = add_constraint_rows(prob, violated_rows, var_dicts)
+        violated_names = set(row[0] for row in violated_rows)
+        lazy_rows = [row for row in lazy_rows if row[0] not in violated_names]
+
+    logger.info("route capacity constraints added: {:,} of {:,}".format(total_lazy_rows - len(lazy_rows),
+                                                                        total_lazy_rows))
+
+    # The final problem data is written to an .lp file
+    prob.writeLP(os.path.join(the_scenario.scenario_run_directory, "debug", "LP_output_c2.lp"))
+
+    logger.info("FINISH: solve_lazy_capacity_pulp_problem: Runtime (HMS): \t{}".format(
+        get_total_runtime_string(start_time)))
+    return prob
+
+
+# ===============================================================================
+
+
+def multi_solve_udp_probes(stuff_to_pass):
+    # worker process: solve the problem once for each unmet demand penalty scaling factor in the chunk
+    # only the objective coefficients of the unmet demand variables change between probes, so each solve after the
+    # first is warm started from the solution of the previous (neighboring) scaling factor
+    probe_list, prob_dict, unmet_var_info, solver_name, time_limit_seconds = stuff_to_pass
+    prob_vars, prob = LpProblem.from_dict(prob_dict)
+
+    probe_results = []
+    for probe_count, (probe_id, scaling_factor) in enumerate(probe_list):
+        for var_name, (udp, top_level_commodity) in iteritems(unmet_var_info):
+            prob.objective[prob_vars[var_name]] = udp * scaling_factor
+        prob.solve(get_pulp_solver(solver_name, time_limit_seconds, msg=0, warm_start=(probe_count > 0)))
+
+        objective_value = value(prob.objective)
+        penalty_cost = 0
+        flow_cost = 0
+        unmet_demand = defaultdict(float)
+        for var, coefficient in prob.objective.items():
+            var_value = var.varValue or 0
+            if var.name in unmet_var_info:
+                penalty_cost += coefficient * var_value
+                unmet_demand[unmet_var_info[var.name][1]] += var_value
+            elif var.name.startswith("Edge"):
+                flow_cost += coefficient * var_value
+        probe_results.append([probe_id, scaling_factor, LpStatus[prob.status], objective_value, flow_cost,
+                              penalty_cost, dict(unmet_demand)])
+
+    return probe_results
+
+
+# ===============================================================================
+
+
+def solve_udp_sensitivity(the_scenario, logger):
+    # builds the o2 problem once and re-solves it for each unmet demand penalty (UDP) scaling factor listed in the
+    # udp_sensitivity_probes table. the probes are split into chunks of neighboring scaling factors that are solved
+    # in parallel. one row per probe and top level commodity is written to the udp_sensitivity_results table.
+    # must be run after o1. the o2 solution tables are not changed.
+    logger.info("START: solve_udp_sensitivity")
+    start_time = datetime.datetime.now()
+
+    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+        sql = "SELECT name FROM sqlite_master WHERE type='table' AND name = 'udp_sensitivity_probes';"
+        if len(main_db_con.execute(sql).fetchall()) == 0:
+            error = "The udp_sensitivity_probes table does not exist. Add the UDP scaling factors to solve for to " \
+                    "the udp_sensitivity_probes (probe_id, scaling_factor) table of the main.db"
+            logger.error(error)
+            raise Exception(error)
+        probe_list = main_db_con.execute("select probe_id, scaling_factor from udp_sensitivity_probes "
+                                         "order by scaling_factor, probe_id;").fetchall()
+
+        # units of the demand of each top level commodity. the model holds liquids in solid units, so liquid
+        # demand is converted back with the commodity density, as in record_pulp_solution
+        commodity_densities = defaultdict(set)
+        for top_level_commodity, phase_of_matter, density_value in main_db_con.execute(
+                "select ifnull(supertype, commodity_name), phase_of_matter, density_value from commodities;"):
+            commodity_densities[top_level_commodity].add(density_value if phase_of_matter == 'liquid' else None)
+        commodity_units = {}
+        for top_level_commodity, densities in iteritems(commodity_densities):
+            density_value = list(densities)[0] if len(densities) == 1 else None
+            if density_value:
+                commodity_units[top_level_commodity] = (str(the_scenario.default_units_liquid_phase), density_value)
+            else:
+                if len(densities) > 1:
+                    logger.warning("the commodities of {} have different phases of matter or densities. its UDP "
+                                   "sensitivity results are reported in {}".format(
+                                       top_level_commodity, the_scenario.default_units_solid_phase))
+                commodity_units[top_level_commodity] = (str(the_scenario.default_units_solid_phase), 1.0)
+
+    if not probe_list:
+        error = "The udp_sensitivity_probes table is empty"
+        logger.error(error)
+        raise Exception(error)
+    logger.info("number of UDP scaling factors to solve: {}".format(len(probe_list)))
+
+    prob, var_dicts, constraint_families, constraint_rows_by_family = setup_pulp_problem_rows(the_scenario, logger)
+
+    # the full demand of each unmet demand variable is the right hand side of its unmet demand constraint
+    total_demand = defaultdict(float)
+    for name, terms, sense, rhs in constraint_rows_by_family['unmet_demand']:
+        for var_type, var_key, coefficient in terms:
+            if var_type == 'unmet':
+                total_demand[var_key[2]] += rhs
+    for constraint_family in constraint_families:
+        prob = add_constraint_rows(prob, constraint_rows_by_family.pop(constraint_family), var_dicts)
+
+    # unmet demand variable name -> (udp, top level commodity); unmet demand variable keys are
+    # (facility_id, day, top_level_commodity, udp)
+    unmet_var_info = {var.name: (key[3], key[2]) for key, var in iteritems(var_dicts['unmet'])}
+
+    # Allow multiprocessing, with no more than 75% of cores to be used, rounding down if necessary
+    processors_to_save = int(math.ceil(multiprocessing.cpu_count() * 0.25))
+    processors_to_use = max(1, min(multiprocessing.cpu_count() - processors_to_save, len(probe_list)))
+    logger.info("number of CPUs to use = {}".format(processors_to_use))
+
+    # contiguous chunks of the sorted scaling factors, so that warm starts come from a nearby solution
+    chunk_size = int(math.ceil(len(probe_list) / float(processors_to_use)))
+    prob_dict = prob.to_dict()
+    stuff_to_pass = [[probe_list[i:i + chunk_size], prob_dict, unmet_var_info, the_scenario.solver,
+                      get_solver_time_limit_seconds(the_scenario)] for i in range(0, len(probe_list), chunk_size)]
+    del prob_dict
+
+    pool = multiprocessing.Pool(processes=processors_to_use)
+    try:
+        results = pool.map(multi_solve_udp_probes, stuff_to_pass)
+    except Exception as e:
+        pool.close()
+        pool.terminate()
+        logger.error("FAIL: {} ".format(e))
+        raise Exception("FAIL: {}".format(e))
+    pool.close()
+    pool.join()
+
+    results_list = []
+    for probe_results in results:
+        for probe_id, scaling_factor, status, objective_value, flow_cost, penalty_cost, unmet_demand in probe_results:
+            logger.info("UDP scaling factor {}: solution status: {}, objective value: {}".format(
+                scaling_factor, status, objective_value))
+            for top_level_commodity in sorted(total_demand):
+                demand_units, density_value = commodity_units.get(
+                    top_level_commodity, (str(the_scenario.default_units_solid_phase), 1.0))
+                results_list.append([probe_id, scaling_factor, status, objective_value, flow_cost, penalty_cost,
+                                     top_level_commodity, total_demand[top_level_commodity] / density_value,
+                                     unmet_demand.get(top_level_commodity, 0) / density_value,
+                                     demand_units, the_scenario.default_units_currency])
+
+    with sqlite3.connect(the_scenario.main_db) as main_db_con:
+        main_db_con.execute("drop table if exists udp_sensitivity_results;")
+        main_db_con.execute("""create table udp_sensitivity_results(
+        probe_id integer,
+        scaling_factor real,
+        solver_status text,
+        objective_value real,
+        flow_cost real,
+        unmet_demand_penalty_cost real,
+        commodity_name text,
+        total_demand real,
+        unmet_demand real,
+        demand_units text,
+        cost_units text);""")
+        main_db_con.executemany("insert into udp_sensitivity_results values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                                results_list)
+
+    logger.info("FINISH: solve_udp_sensitivity: Runtime (HMS): \t{}".format(get_total_runtime_string(start_time)))
+
+
+# ===============================================================================
+
+
 def save_pulp_solution(the_scenario, prob, logger, zero_threshold):
     import datetime
     start_time = datetime.datetime.now()
@@ -3488,34 +4615,14 @@ def record_pulp_solution(the_scenario, logger):
     with sqlite3.connect(the_scenario.main_db) as db_con:
         
         # get corresponding density for each row in optimal_variables
+        # if density exists, divide out value. If not, keep current value.
         logger.debug("optimal_variables table: If originally liquid units, converting solid variable_value back to liquid")
-        extract_density_sql = """
-            select ov.variable_name, ov.variable_value, c.density
-            from commodities c
-            join optimal_variables ov
-            on c.commodity_ID = ov.commodity_ID
-        """
-
-        update_list = []
-        rows = db_con.execute(extract_density_sql).fetchall()
-        for row in rows:
-            variable_name = row[0] # unique identifier used to update table
-            variable_value = row[1]
-            density = Q_(row[2]).magnitude if row[2] else None
-            
-            # if density exists, divide out value. If not, keep current value. round for precision
-            reconverted_variable_value = variable_value / density if density else variable_value
-            
-            # add to list that will update the existing optimal_variables table
-            update_list.append((reconverted_variable_value, variable_name))
-        
-        # update table to be pre-optimization value
-        change_variable_value_sql = """
+        db_con.execute("""
             UPDATE optimal_variables
-            SET variable_value = ? -- if density exists, divide variable_value / density, otherwise just variable_value
-            WHERE variable_name = ?
-        """
-        db_con.executemany(change_variable_value_sql, update_list)
+            SET variable_value = variable_value /
+                (select c.density_value from commodities c where c.commodity_ID = optimal_variables.commodity_ID)
+            WHERE commodity_ID in (select c.commodity_ID from commodities c where c.density_value > 0)
+            ;""")
 
     logger.info("FINISH: record_pulp_solution")
 
@@ -1776,7 +1776,7 @@ def create_constraint_conservation_of_flow_endcap_nodes(logger, the_scenario, pr
         # second key is output commodity id; value is list  with preferred process:
         # # process_id,input quant, output quantity, output ratio, with the largest output ratio for that commodity pair
         # list each output with its input to key on
-        sql = """select cpc.process_id, cpc.commodity_id, cpc.quantity, cpc.units, c.density
+        sql = """select cpc.process_id, cpc.commodity_id, cpc.quantity, cpc.units, c.density_value
         from candidate_process_commodities cpc
         join commodities c on cpc.commodity_id = c.commodity_id
         where cpc.io = 'i';"""
@@ -1789,17 +1789,15 @@ def create_constraint_conservation_of_flow_endcap_nodes(logger, the_scenario, pr
             orig_quantity = row[2]
             units = row[3]
             if units == the_scenario.default_units_liquid_phase:
-                orig_quantity_units = Q_(f"{orig_quantity} {units}")
-                density = Q_(row[4])
-                quantity_units = orig_quantity_units * density
-                if str(quantity_units.units) == the_scenario.default_units_solid_phase:
-                    quantity = quantity_units.magnitude
+                # density is stored in default solid units per default liquid unit
+                density = row[4]
+                quantity = orig_quantity * density
             else:
                 quantity = orig_quantity
             process_dict.setdefault(commodity_id, [process_id, quantity])
             process_dict[commodity_id] = [process_id, quantity]
 
-        sql = """select o.process_id, o.commodity_id, o.quantity, i.commodity_id, c.units, c.density
+        sql = """select o.process_id, o.commodity_id, o.quantity, i.commodity_id, c.units, c.density_value
         from candidate_process_commodities o
         join candidate_process_commodities i on i.process_id = o.process_id
         join commodities c on o.commodity_id = c.commodity_id
@@ -1816,11 +1814,9 @@ def create_constraint_conservation_of_flow_endcap_nodes(logger, the_scenario, pr
             units = row[4]
 
             if units == the_scenario.default_units_liquid_phase:
-                orig_quantity_units = Q_(f"{orig_quantity} {units}")
-                density = Q_(row[5])
-                quantity_units = orig_quantity_units * density
-                if str(quantity_units.units) == the_scenario.default_units_solid_phase:
-                    quantity = quantity_units.magnitude
+                # density is stored in default solid units per default liquid unit
+                density = row[5]
+                quantity = orig_quantity * density
             else:
                 quantity = orig_quantity
 
@@ -2395,34 +2391,14 @@ def record_pulp_candidate_gen_solution(the_scenario, logger, zero_threshold):
     with sqlite3.connect(the_scenario.main_db) as db_con:
         
         # get corresponding density for each row in optimal_variables
+        # if density exists, divide out value. If not, keep current value.
         logger.debug("candidate optimal_variables table: If originally liquid units, converting solid variable_value back to liquid")
-        extract_density_sql = """
-            select ov.variable_name, ov.variable_value, c.density
-            from commodities c
-            join optimal_variables ov
-            on c.commodity_ID = ov.commodity_ID
-        """
-
-        update_list = []
-        rows = db_con.execute(extract_density_sql).fetchall()
-        for row in rows:
-            variable_name = row[0] # unique identifier used to update table
-            variable_value = row[1]
-            density = Q_(row[2]).magnitude if row[2] else None
-            
-            # if density exists, divide out value. If not, keep current value. round for precision
-            reconverted_variable_value = variable_value / density if density else variable_value
-            
-            # add to list that will update the existing optimal_variables table
-            update_list.append((reconverted_variable_value, variable_name))
-        
-        # update table to be pre-optimization value
-        change_variable_value_sql = """
+        db_con.execute("""
             UPDATE optimal_variables
-            SET variable_value = ? -- if density exists, divide variable_value / density, otherwise just variable_value
-            WHERE variable_name = ?
-        """
-        db_con.executemany(change_variable_value_sql, update_list)
+            SET variable_value = variable_value /
+                (select c.density_value from commodities c where c.commodity_ID = optimal_variables.commodity_ID)
+            WHERE commodity_ID in (select c.commodity_ID from commodities c where c.density_value > 0)
+            ;""")
 
 
     logger.info("FINISH: record_pulp_candidate_gen_solution")
@@ -15,11 +15,10 @@ import zipfile
 import sqlite3
 import csv
 from ftot_supporting_gis import zipgdb, get_commodity_vehicle_attributes_dict
-from ftot_supporting import clean_file_name
+from ftot_supporting import clean_file_name, load_run_metrics
 from shutil import copy
 
 from ftot import FTOT_VERSION
-from ftot import Q_
 
 TIMESTAMP = datetime.datetime.now()
 
@@ -191,6 +190,109 @@ def prepare_tableau_assets(timestamp_directory, the_scenario, logger):
 # ==============================================================================================
 
 
+def create_report_base_tables(the_scenario, logger):
+
+    logger.info("start: create_report_base_tables")
+    # materialize the joins shared by the summary reports once, so each summary reads small indexed tables
+    # instead of re-joining optimal_route_segments, networkx_nodes, and facilities
+
+    with sqlite3.connect(the_scenario.main_db) as db_con:
+
+        # facility name and type of each facility
+        db_con.executescript("""
+            drop table if exists report_facilities;
+            create table report_facilities as
+            select fac.facility_id, fac.facility_name, fti.facility_type, fac.location_id
+            from facilities fac
+            left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id;
+            create index report_facilities_index on report_facilities(facility_id);
+            """)
+
+        # network nodes at each facility location
+        db_con.executescript("""
+            drop table if exists report_facility_nodes;
+            create table report_facility_nodes as
+            select fac.facility_name, fac.facility_type, nn.node_id
+            from report_facilities fac
+            left join networkx_nodes nn on fac.location_id = nn.location_id;
+            create index report_facility_nodes_index on report_facility_nodes(node_id);
+            """)
+
+        # mode of each NDR route and whether the optimal solution uses it
+        if the_scenario.ndrOn:
+            db_con.executescript("""
+                drop table if exists report_route_modes;
+                create table report_route_modes as
+                select rr.scenario_rt_id,
+                case when m.modes_list like "%,%" then "multimodal" else m.modes_list end as mode,
+                case when ors.scenario_rt_id is NULL then "N" else "Y" end as in_solution
+                from (select distinct scenario_rt_id from route_reference) rr
+                left join (select re.scenario_rt_id, group_concat(distinct(nx_e.mode_source)) as modes_list
+                           from route_edges re
+                           left join networkx_edges nx_e on re.edge_id = nx_e.edge_id
+                           group by re.scenario_rt_id) m on rr.scenario_rt_id = m.scenario_rt_id
+                left join (select distinct scenario_rt_id from optimal_route_segments) ors
+                on rr.scenario_rt_id = ors.scenario_rt_id;
+                create index report_route_modes_index on report_route_modes(scenario_rt_id);
+                """)
+
+        # optimal flows on artificial links, attributed to the facility at one end of the link
+        db_con.executescript("""
+            drop table if exists report_artificial_link_flows;
+            create table report_artificial_link_flows as
+            select
+            case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_name
+            when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_name
+            else 'NA' end as facility_name,
+            case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_type
+            when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_type
+            else 'NA' end as facility_type,
+            ors.commodity_name as commodity,
+            ors.network_source_id as mode,
+            ors.length as length,
+            ors.commodity_flow as commodity_flow,
+            ors.link_transport_cost,
+            ors.link_routing_cost,
+            ors.link_access_cost
+            from optimal_route_segments ors
+            left join report_facility_nodes fac1 on ors.from_node_id = fac1.node_id
+            left join report_facility_nodes fac2 on ors.to_node_id = fac2.node_id
+            where ors.artificial = 1;
+            create index report_artificial_link_flows_index on report_artificial_link_flows(mode, commodity);
+            """)
+
+        # optimal flow and cost totals by mode, commodity, and link type (artificial)
+        db_con.executescript("""
+            drop table if exists report_segment_costs;
+            create table report_segment_costs as
+            select
+            ors.network_source_id as mode,
+            ors.commodity_name,
+            ors.phase_of_matter,
+            c.density_value,
+            ors.units,
+            ors.artificial,
+            sum(ors.commodity_flow * ors.link_transport_cost) as transport,
+            sum(ors.commodity_flow * ors.link_routing_cost_transport - ors.commodity_flow * ors.link_transport_cost - ors.commodity_flow * ors.link_access_cost) as route_add,
+            sum(ors.commodity_flow * ors.link_transload_cost) as transload,
+            sum(ors.commodity_flow * ors.link_co2_cost) as carbon,
+            sum(ors.commodity_flow * ors.link_access_cost) as access_cost,
+            sum(ors.length) as tot_edge_length,
+            sum(ors.commodity_flow) as tot_commodity_flow,
+            sum(ors.length * ors.commodity_flow) as tot_flow_length,
+            count(distinct(ors.network_source_oid)) as num_unique_edges
+            from optimal_route_segments ors
+            left join commodities c
+            on ors.commodity_name = c.commodity_name
+            group by ors.network_source_id, ors.commodity_name, ors.artificial;
+            """)
+
+    logger.info("finish: create_report_base_tables")
+
+
+# ==============================================================================================
+
+
 def generate_edges_from_routes_summary(timestamp_directory, the_scenario, logger):
 
     logger.info("start: generate_edges_from_routes_summary")
@@ -228,53 +330,39 @@ def generate_edges_from_routes_summary(timestamp_directory, the_scenario, logger
 
         db_cur = db_con.cursor()
         if the_scenario.report_with_artificial:
-            summary_route_data = db_con.execute("""select rr.route_id, f1.facility_name as from_facility, fti1.facility_type as from_facility_type,
-                f2.facility_name as to_facility, fti2.facility_type as to_facility_type,
-                c.commodity_name, c.phase_of_matter, c.density, m.mode, rr.transport_cost, rr.cost, nec1.access_cost + nec2.access_cost as access_cost, rr.length, rr.co2, rr.time,
-                case when ors.scenario_rt_id is NULL then "N" else "Y" end as in_solution
+            summary_route_data = db_con.execute("""select rr.route_id, f1.facility_name as from_facility, f1.facility_type as from_facility_type,
+                f2.facility_name as to_facility, f2.facility_type as to_facility_type,
+                c.commodity_name, c.phase_of_matter, c.density_value, m.mode, rr.transport_cost, rr.cost, nec1.access_cost + nec2.access_cost as access_cost, rr.length, rr.co2, rr.time,
+                m.in_solution
                 from route_reference rr
-                join facilities f1 on rr.from_facility_id = f1.facility_id
-                join facility_type_id fti1 on f1.facility_type_id = fti1.facility_type_id
-                join facilities f2 on rr.to_facility_id = f2.facility_id
-                join facility_type_id fti2 on f2.facility_type_id = fti2.facility_type_id
+                join report_facilities f1 on rr.from_facility_id = f1.facility_id
+                join report_facilities f2 on rr.to_facility_id = f2.facility_id
                 join networkx_edge_costs nec1 on rr.first_nx_edge_id = nec1.edge_id and rr.phase_of_matter = nec1.phase_of_matter_id
                 join networkx_edge_costs nec2 on rr.last_nx_edge_id = nec2.edge_id and rr.phase_of_matter = nec2.phase_of_matter_id
                 join commodities c on rr.commodity_id = c.commodity_ID
-                left join (select temp.scenario_rt_id, case when temp.modes_list like "%,%" then "multimodal" else temp.modes_list end as mode
-                           from (select re.scenario_rt_id, group_concat(distinct(nx_e.mode_source)) as modes_list
-                                 from route_edges re
-                                 left join networkx_edges nx_e on re.edge_id = nx_e.edge_id
-                                 group by re.scenario_rt_id) temp) m on rr.scenario_rt_id = m.scenario_rt_id
-                left join (select distinct scenario_rt_id from optimal_route_segments) ors on rr.scenario_rt_id = ors.scenario_rt_id;""")
+                join report_route_modes m on rr.scenario_rt_id = m.scenario_rt_id;""")
 
         else:
             # subtract artificial link values from results, except for routing cost
-            summary_route_data = db_con.execute("""select rr.route_id, f1.facility_name as from_facility, fti1.facility_type as from_facility_type,
-                f2.facility_name as to_facility, fti2.facility_type as to_facility_type,
-                c.commodity_name, c.phase_of_matter, c.density, m.mode,
+            summary_route_data = db_con.execute("""select rr.route_id, f1.facility_name as from_facility, f1.facility_type as from_facility_type,
+                f2.facility_name as to_facility, f2.facility_type as to_facility_type,
+                c.commodity_name, c.phase_of_matter, c.density_value, m.mode,
                 rr.transport_cost - (nec1.transport_cost + nec2.transport_cost) as transport_cost,
                 rr.cost, -- always keep artificial links in routing cost
                 nec1.access_cost + nec2.access_cost as access_cost, -- sum from artificial links on either end
                 rr.length - (ne1.length + ne2.length) as length,
                 round(rr.co2 - (nec1.co2_cost + nec2.co2_cost) / {}, 8) as co2,
                 rr.time - (ne1.length / ne1.speed + ne2.length / ne2.speed) as time,
-                case when ors.scenario_rt_id is NULL then "N" else "Y" end as in_solution
+                m.in_solution
                 from route_reference rr
-                join facilities f1 on rr.from_facility_id = f1.facility_id
-                join facility_type_id fti1 on f1.facility_type_id = fti1.facility_type_id
-                join facilities f2 on rr.to_facility_id = f2.facility_id
-                join facility_type_id fti2 on f2.facility_type_id = fti2.facility_type_id
+                join report_facilities f1 on rr.from_facility_id = f1.facility_id
+                join report_facilities f2 on rr.to_facility_id = f2.facility_id
                 join commodities c on rr.commodity_id = c.commodity_ID
                 join networkx_edge_costs nec1 on rr.first_nx_edge_id = nec1.edge_id and rr.phase_of_matter = nec1.phase_of_matter_id
                 join networkx_edge_costs nec2 on rr.last_nx_edge_id = nec2.edge_id and rr.phase_of_matter = nec2.phase_of_matter_id
                 join networkx_edges ne1 on rr.first_nx_edge_id = ne1.edge_id
                 join networkx_edges ne2 on rr.last_nx_edge_id = ne2.edge_id
-                left join (select temp.scenario_rt_id, case when temp.modes_list like "%,%" then "multimodal" else temp.modes_list end as mode
-                           from (select re.scenario_rt_id, group_concat(distinct(nx_e.mode_source)) as modes_list
-                                 from route_edges re
-                                 left join networkx_edges nx_e on re.edge_id = nx_e.edge_id
-                                 group by re.scenario_rt_id) temp) m on rr.scenario_rt_id = m.scenario_rt_id
-                left join (select distinct scenario_rt_id from optimal_route_segments) ors on rr.scenario_rt_id = ors.scenario_rt_id;""".format(the_scenario.co2_unit_cost.magnitude))
+                join report_route_modes m on rr.scenario_rt_id = m.scenario_rt_id;""".format(the_scenario.co2_unit_cost.magnitude))
         
         summary_route_data =  summary_route_data.fetchall()
         
@@ -303,8 +391,7 @@ def generate_edges_from_routes_summary(timestamp_directory, the_scenario, logger
                 time = row[14]
                 in_solution = row[15]
 
-                # convert density to numerical if it exists, then use to convert costs back to original liquid
-                density = Q_(density).magnitude if density else None
+                # density is numerical (default units) if it exists, use to convert costs back to original liquid
 
                 # append to list for batch update of DB table
                 all_routes_list.append([the_scenario.scenario_name, route_id, from_facility, from_facility_type, to_facility, to_facility_type,
@@ -382,27 +469,24 @@ def generate_cost_breakdown_summary(timestamp_directory, the_scenario, logger):
             route_cost_scaling = float(row[1])
             artificial_impedances[mode] = route_cost_scaling - 1
 
-        # get segment cost data from DB
-        sql_segment_costs = """select 
-                                ors.network_source_id,
-                                ors.commodity_name,
-                                ors.phase_of_matter,
-                                c.density,
-                                ors.units,
-                                ors.artificial,
-                                sum(ors.commodity_flow * ors.link_transport_cost) as transport,
-                                sum(ors.commodity_flow * ors.link_routing_cost_transport - ors.commodity_flow * ors.link_transport_cost - ors.commodity_flow * ors.link_access_cost) as route_add,
-                                sum(ors.commodity_flow * ors.link_transload_cost) as transload,
-                                sum(ors.commodity_flow * ors.link_co2_cost) as carbon,
-                                sum(ors.commodity_flow * ors.link_access_cost) as access_cost,
-                                sum(ors.length) as tot_edge_length,
-                                sum(ors.commodity_flow) as tot_commodity_flow,
-                                sum(ors.length * ors.commodity_flow) as tot_flow_length,
-                                count(distinct(ors.network_source_oid)) as num_unique_edges
-                                from optimal_route_segments ors
-                                left join commodities c
-                                on ors.commodity_name = c.commodity_name
-                                group by ors.network_source_id, ors.commodity_name, ors.artificial"""
+        # get segment cost data from the report base table
+        sql_segment_costs = """select
+                                mode,
+                                commodity_name,
+                                phase_of_matter,
+                                density_value,
+                                units,
+                                artificial,
+                                transport,
+                                route_add,
+                                transload,
+                                carbon,
+                                access_cost,
+                                tot_edge_length,
+                                tot_commodity_flow,
+                                tot_flow_length,
+                                num_unique_edges
+                                from report_segment_costs"""
         con_segment_costs = db_con.execute(sql_segment_costs)
         segment_cost_data = con_segment_costs.fetchall()
 
@@ -505,8 +589,8 @@ def generate_cost_breakdown_summary(timestamp_directory, the_scenario, logger):
                               "" as mode,
                               "unmet_demand" as cost_family,
                               "unmet_demand_penalty" as cost_component,
-                              (osr1.value - ifnull(osr2.value, 0)) * fc.udp as udp_cost,
-                              (osr1.value - ifnull(osr2.value, 0)) * fc.udp as scaled_udp_cost,
+                              (osr1.value - ifnull(osr2.value, 0)) * ifnull(fc.udp, {udp}) as udp_cost,
+                              (osr1.value - ifnull(osr2.value, 0)) * ifnull(fc.udp, {udp}) as scaled_udp_cost,
                               1.0 as scalar
                               from (select f1.facility_name, f1.facility_id from facilities f1
                               join facility_type_id fti on f1.facility_type_id = fti.facility_type_id
@@ -527,7 +611,7 @@ def generate_cost_breakdown_summary(timestamp_directory, the_scenario, logger):
                               and c.commodity_id = fc.commodity_id
                               ) temp
                             group by commodity, mode, cost_family, cost_component, scalar
-                            ;"""
+                            ;""".format(udp=the_scenario.unMetDemandPenalty)
         db_con.execute(sql_UDP)
 
     with open(report_file, 'w', newline='') as wf:
@@ -644,92 +728,19 @@ def generate_artificial_link_summary(timestamp_directory, the_scenario, logger):
 
         # transport and routing costs on artificial links only
         logger.debug("start: calculate transport and routing costs for artificial links")
-        sql_transport_costs_art = """ -- artificial link transport cost
-                                  insert into artificial_link_results
-                                  select facility_name, facility_type, commodity,
-                                  'transport_cost', mode, 'Y',
-                                  sum(commodity_flow*link_transport_cost),
-                                  '{}'
-                                  from (select
-                                        case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_name
-                                        when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_name
-                                        else 'NA' end as facility_name,
-                                        case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_type
-                                        when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_type
-                                        else 'NA' end as facility_type,
-                                        ors.commodity_name as commodity,
-                                        ors.network_source_id as mode,
-                                        ors.commodity_flow,
-                                        ors.link_transport_cost
-                                        from optimal_route_segments ors
-                                        left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                        left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                        left join networkx_nodes nn on fac.location_id = nn.location_id) fac1 on ors.from_node_id = fac1.node_id
-                                        left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                        left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                        left join networkx_nodes nn on fac.location_id = nn.location_id) fac2 on ors.to_node_id = fac2.node_id
-                                        where ors.artificial = 1)
-                                  group by facility_name, facility_type, commodity, mode
-                                  ;""".format(the_scenario.default_units_currency)
-        db_con.execute(sql_transport_costs_art)
-
-        sql_routing_costs_art = """ -- artificial link routing cost
-                                insert into artificial_link_results
-                                select facility_name, facility_type, commodity,
-                                'routing_cost', mode, 'Y',
-                                sum(commodity_flow*link_routing_cost),
-                                '{}'
-                                from (select
-                                      case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_name
-                                      when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_name
-                                      else 'NA' end as facility_name,
-                                      case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_type
-                                      when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_type
-                                      else 'NA' end as facility_type,
-                                      ors.commodity_name as commodity,
-                                      ors.network_source_id as mode,
-                                      ors.commodity_flow,
-                                      ors.link_routing_cost
-                                      from optimal_route_segments ors
-                                      left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                      left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                      left join networkx_nodes nn on fac.location_id = nn.location_id) fac1 on ors.from_node_id = fac1.node_id
-                                      left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                      left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                      left join networkx_nodes nn on fac.location_id = nn.location_id) fac2 on ors.to_node_id = fac2.node_id
-                                      where ors.artificial = 1)
-                                group by facility_name, facility_type, commodity, mode
-                                ;""".format(the_scenario.default_units_currency)
-        db_con.execute(sql_routing_costs_art)
-
-        sql_access_costs_art = """ -- artificial link access cost
-                                insert into artificial_link_results
-                                select facility_name, facility_type, commodity,
-                                'access_cost', mode, 'Y',
-                                sum(commodity_flow*link_access_cost),
-                                '{}'
-                                from (select
-                                      case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_name
-                                      when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_name
-                                      else 'NA' end as facility_name,
-                                      case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_type
-                                      when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_type
-                                      else 'NA' end as facility_type,
-                                      ors.commodity_name as commodity,
-                                      ors.network_source_id as mode,
-                                      ors.commodity_flow,
-                                      ors.link_access_cost
-                                      from optimal_route_segments ors
-                                      left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                      left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                      left join networkx_nodes nn on fac.location_id = nn.location_id) fac1 on ors.from_node_id = fac1.node_id
-                                      left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                      left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                      left join networkx_nodes nn on fac.location_id = nn.location_id) fac2 on ors.to_node_id = fac2.node_id
-                                      where ors.artificial = 1)
-                                group by facility_name, facility_type, commodity, mode
-                                ;""".format(the_scenario.default_units_currency)
-        db_con.execute(sql_access_costs_art)
+        for measure, cost_field in [('transport_cost', 'link_transport_cost'),
+                                    ('routing_cost', 'link_routing_cost'),
+                                    ('access_cost', 'link_access_cost')]:
+            sql_costs_art = """ -- artificial link costs
+                            insert into artificial_link_results
+                            select facility_name, facility_type, commodity,
+                            '{}', mode, 'Y',
+                            sum(commodity_flow*{}),
+                            '{}'
+                            from report_artificial_link_flows
+                            group by facility_name, facility_type, commodity, mode
+                            ;""".format(measure, cost_field, the_scenario.default_units_currency)
+            db_con.execute(sql_costs_art)
         logger.debug("end: calculate transport and routing costs for artificial links")
 
         # length of network used on artificial links only
@@ -738,27 +749,10 @@ def generate_artificial_link_summary(timestamp_directory, the_scenario, logger):
                                insert into artificial_link_results
                                select distinct facility_name, facility_type, commodity,
                                'network_used', mode, 'Y',
-                               length,
+                               round(length, 3),
                                '{}'
-                               from (select
-                                     case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_name
-                                     when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_name
-                                     else 'NA' end as facility_name,
-                                     case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_type
-                                     when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_type
-                                     else 'NA' end as facility_type,
-                                     ors.commodity_name as commodity,
-                                     ors.network_source_id as mode,
-                                     round(ors.length, 3) as length
-                                     from optimal_route_segments ors
-                                     left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                     left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                     left join networkx_nodes nn on fac.location_id = nn.location_id) fac1 on ors.from_node_id = fac1.node_id
-                                     left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                     left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                     left join networkx_nodes nn on fac.location_id = nn.location_id) fac2 on ors.to_node_id = fac2.node_id
-                                     where ors.artificial = 1)
-                                  ;""".format(the_scenario.default_units_distance)
+                               from report_artificial_link_flows
+                               ;""".format(the_scenario.default_units_distance)
         db_con.execute(sql_network_used_art)
         logger.debug("end: calculate network used for artificial links")
 
@@ -788,25 +782,7 @@ def generate_artificial_link_summary(timestamp_directory, the_scenario, logger):
                           'co2', mode, 'Y',
                           sum({} * length * commodity_flow/{}), -- value (emissions scalar * vmt)
                           'grams'
-                          from (select
-                                case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_name
-                                when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_name
-                                else 'NA' end as facility_name,
-                                case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_type
-                                when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_type
-                                else 'NA' end as facility_type,
-                                ors.commodity_name as commodity,
-                                ors.network_source_id as mode,
-                                ors.length as length,
-                                ors.commodity_flow as commodity_flow
-                                from optimal_route_segments ors
-                                left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                left join networkx_nodes nn on fac.location_id = nn.location_id) fac1 on ors.from_node_id = fac1.node_id
-                                left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                left join networkx_nodes nn on fac.location_id = nn.location_id) fac2 on ors.to_node_id = fac2.node_id
-                                where ors.artificial == 1)
+                          from report_artificial_link_flows
                           where mode = '{}' and commodity = '{}'
                           group by facility_name, facility_type, commodity, mode
                           ;""".format(co2_val, vehicle_payload, mode, commodity_name)
@@ -834,25 +810,7 @@ def generate_artificial_link_summary(timestamp_directory, the_scenario, logger):
                               'vehicle-distance_traveled', mode, 'Y',
                               sum(length * commodity_flow/{}),
                               'vehicle-{}'
-                              from (select
-                                    case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_name
-                                    when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_name
-                                    else 'NA' end as facility_name,
-                                    case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_type
-                                    when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_type
-                                    else 'NA' end as facility_type,
-                                    ors.commodity_name as commodity,
-                                    ors.network_source_id as mode,
-                                    ors.length as length,
-                                    ors.commodity_flow as commodity_flow
-                                    from optimal_route_segments ors
-                                    left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                    left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                    left join networkx_nodes nn on fac.location_id = nn.location_id) fac1 on ors.from_node_id = fac1.node_id
-                                    left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                    left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                    left join networkx_nodes nn on fac.location_id = nn.location_id) fac2 on ors.to_node_id = fac2.node_id
-                                    where ors.artificial == 1)
+                              from report_artificial_link_flows
                               where mode = '{}' and commodity = '{}'
                               group by facility_name, facility_type, commodity, mode
                               ;""".format(vehicle_payload, the_scenario.default_units_distance,
@@ -884,25 +842,7 @@ def generate_artificial_link_summary(timestamp_directory, the_scenario, logger):
                                     'fuel_burn', mode, 'Y',
                                     sum(length * commodity_flow / {}),
                                     'gallons'
-                                    from (select
-                                          case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_name
-                                          when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_name
-                                          else 'NA' end as facility_name,
-                                          case when fac1.facility_name is not null and fac2.facility_name is null then fac1.facility_type
-                                          when fac1.facility_name is null and fac2.facility_name is not null then fac2.facility_type
-                                          else 'NA' end as facility_type,
-                                          ors.commodity_name as commodity,
-                                          ors.network_source_id as mode,
-                                          ors.length as length,
-                                          ors.commodity_flow as commodity_flow
-                                          from optimal_route_segments ors
-                                          left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                          left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                          left join networkx_nodes nn on fac.location_id = nn.location_id) fac1 on ors.from_node_id = fac1.node_id
-                                          left join (select fac.facility_name, fti.facility_type, nn.node_id from facilities fac
-                                          left join facility_type_id fti on fac.facility_type_id = fti.facility_type_id
-                                          left join networkx_nodes nn on fac.location_id = nn.location_id) fac2 on ors.to_node_id = fac2.node_id
-                                          where ors.artificial == 1)
+                                    from report_artificial_link_flows
                                     where mode = '{}' and commodity = '{}'
                                     group by facility_name, facility_type, commodity, mode
                                     ;""".format(fuel_efficiency,
@@ -1096,24 +1036,36 @@ def generate_reports(the_scenario, logger):
                       'COMMODITY': 'Commodity Summary',
                       'FACILITY': 'Facility Summary'}
 
+    # structured records written by the logger (see ftot_supporting.RunMetricsHandler)
+    # log files from runs without a run metrics record are parsed line by line instead
+    run_metrics = load_run_metrics(the_scenario.scenario_run_directory)
+
     for i in range(0, last_index_to_include + 1):
 
-        in_file = os.path.join(the_scenario.scenario_run_directory, "logs", most_recent_log_file_set[i][0])
+        log_file_name = most_recent_log_file_set[i][0]
 
         # s, p, b, r
-        record_src = most_recent_log_file_set[i][0].split("_",1)[0].upper()
+        record_src = log_file_name.split("_",1)[0].upper()
 
-        with open(in_file, 'r') as rf:
-            for line in rf:
-                recs = line.strip()[19:].split(' ', 1)
-                if recs[0] in message_dict:                    
+        if log_file_name in run_metrics:
+            log_records = [(metrics_record['level'], metrics_record['message']) for metrics_record in run_metrics[log_file_name]]
+        else:
+            log_records = []
+            in_file = os.path.join(the_scenario.scenario_run_directory, "logs", log_file_name)
+            with open(in_file, 'r') as rf:
+                for line in rf:
+                    recs = line.strip()[19:].split(' ', 1)
                     if len(recs) > 1: # RE: Issue #182 - exceptions at the end of the log will cause this to fail
-                        if recs[1].split('_',2)[0].strip() in subheader_dict:
-                            # Separate out section name
-                            recs_parsed = recs[1].split('_',2)
-                            message_dict[recs[0]].append((record_src, recs_parsed[2].strip(), subheader_dict[recs_parsed[0].strip()]))
-                        else:
-                            message_dict[recs[0]].append((record_src, recs[1].strip(), None))
+                        log_records.append((recs[0], recs[1]))
+
+        for level, message in log_records:
+            if level in message_dict:
+                if message.split('_',2)[0].strip() in subheader_dict:
+                    # Separate out section name
+                    recs_parsed = message.split('_',2)
+                    message_dict[level].append((record_src, recs_parsed[2].strip(), subheader_dict[recs_parsed[0].strip()]))
+                else:
+                    message_dict[level].append((record_src, message.strip(), None))
 
     # dump to file
     # ---------------
@@ -1309,6 +1261,9 @@ def generate_reports(the_scenario, logger):
     
     # -------------------------------------------------------------
 
+    # shared base tables for the summaries below
+    create_report_base_tables(the_scenario, logger)
+
     # artificial link summary
     generate_artificial_link_summary(timestamp_directory, the_scenario, logger)
 
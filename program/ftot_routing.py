@@ -263,61 +263,6 @@ def delete_old_artificial_link(the_scenario, logger):
 # ===============================================================================
 
 
-def cut_lines(line_list, point_list, split_lines, scenario_proj):
-    for line in line_list:
-        is_cut = "Not Cut"
-        if line.length > 0.0:  # Make sure it's not an empty geometry.
-            for point in point_list:
-                # Even "coincident" points can show up as spatially non-coincident in their
-                # floating-point XY values, so we set up a tolerance.
-                if line.distanceTo(point) < 1.0:
-                    # To ensure coincidence, snap the point to the line before proceeding.
-                    snap_point = line.snapToLine(point).firstPoint
-                    # Make sure the point isn't on a line endpoint, otherwise cutting will produce
-                    # an empty geometry.
-                    if not (snap_point.equals(line.lastPoint) and snap_point.equals(line.firstPoint)):
-                        # Cut the line. Try it a few different ways to try increase the likelihood it will actually cut
-                        cut_line_1, cut_line_2 = line.cut(arcpy.Polyline(arcpy.Array(
-                            [arcpy.Point(snap_point.X + 10.0, snap_point.Y + 10.0),
-                             arcpy.Point(snap_point.X - 10.0, snap_point.Y - 10.0)]), scenario_proj))
-                        if cut_line_1.length == 0 or cut_line_2.length == 0:
-                            cut_line_1, cut_line_2 = line.cut(arcpy.Polyline(arcpy.Array(
-                                [arcpy.Point(snap_point.X - 10.0, snap_point.Y + 10.0),
-                                 arcpy.Point(snap_point.X + 10.0, snap_point.Y - 10.0)]), scenario_proj))
-                        if cut_line_1.length == 0 or cut_line_2.length == 0:
-                            cut_line_1, cut_line_2 = line.cut(arcpy.Polyline(arcpy.Array(
-                                [arcpy.Point(snap_point.X + 10.0, snap_point.Y),
-                                 arcpy.Point(snap_point.X - 10.0, snap_point.Y)]), scenario_proj))
-                        if cut_line_1.length == 0 or cut_line_2.length == 0:
-                            cut_line_1, cut_line_2 = line.cut(arcpy.Polyline(arcpy.Array(
-                                [arcpy.Point(snap_point.X, snap_point.Y + 10.0),
-                                 arcpy.Point(snap_point.X, snap_point.Y - 10.0)]), scenario_proj))
-                        # Make sure both descendents have non-zero geometry.
-                        if cut_line_1.length > 0.0 and cut_line_2.length > 0.0:
-                            # Feed the cut lines back into the "line" list as candidates to be cut again.
-                            line_list.append(cut_line_1)
-                            line_list.append(cut_line_2)
-                            line_list.remove(line)
-                            # The cut loop will only exit when all lines cannot be cut smaller without producing
-                            # zero-length geometries
-                            is_cut = "Cut"
-                            # break the loop because we've cut a line into two now and need to start over.
-                            break
-                point_list.remove(point)
-
-        if is_cut == "Not Cut" and len(point_list) == 0:
-            split_lines.append(line)
-            line_list.remove(line)
-
-        if len(line_list) == 0 and len(point_list) == 0:
-            continue_iteration = 'done'
-        else:
-            continue_iteration = 'continue running'
-        return line_list, point_list, split_lines, continue_iteration
-
-# ===============================================================================
-
-
 def hook_locations_into_network(the_scenario, logger):
 
     # Add artificial links from the locations feature class into the network
@@ -366,18 +311,24 @@ def hook_locations_into_network(the_scenario, logger):
     from ftot_networkx import check_permitted_modes
     check_permitted_modes(the_scenario, logger)
 
+    # the GDAL backend snaps and splits with shapely instead of the arcpy near and split tools
+    if the_scenario.artificial_link_backend == 'gdal':
+        add_links = locations_add_links_gdal
+    else:
+        add_links = locations_add_links
+
     if 'road' in the_scenario.permittedModes:
-        locations_add_links(logger, the_scenario, "road", road_max_artificial_link_distance_miles)
+        add_links(logger, the_scenario, "road", road_max_artificial_link_distance_miles)
     if 'rail' in the_scenario.permittedModes:
-        locations_add_links(logger, the_scenario, "rail", rail_max_artificial_link_distance_miles)
+        add_links(logger, the_scenario, "rail", rail_max_artificial_link_distance_miles)
     if 'water' in the_scenario.permittedModes:
-        locations_add_links(logger, the_scenario, "water", water_max_artificial_link_distance_miles)
+        add_links(logger, the_scenario, "water", water_max_artificial_link_distance_miles)
     if 'pipeline_crude_trf_rts' in the_scenario.permittedModes:
-        locations_add_links(logger, the_scenario, "pipeline_crude_trf_rts",
-                            pipeline_crude_max_artificial_link_distance_miles)
+        add_links(logger, the_scenario, "pipeline_crude_trf_rts",
+                  pipeline_crude_max_artificial_link_distance_miles)
     if 'pipeline_prod_trf_rts' in the_scenario.permittedModes:
-        locations_add_links(logger, the_scenario, "pipeline_prod_trf_rts",
-                            pipeline_prod_max_artificial_link_distance_miles)
+        add_links(logger, the_scenario, "pipeline_prod_trf_rts",
+                  pipeline_prod_max_artificial_link_distance_miles)
 
     # ADD THE SOURCE AND SOURCE_OID FIELDS SO WE CAN MAP THE LINKS IN THE NETWORK TO THE GRAPH EDGES.
     # -----------------------------------------------------------------------------------------------
@@ -670,11 +621,6 @@ def locations_add_links(logger, the_scenario, modal_layer_name, max_artificial_l
     # 3) then we split the old link, and use insert cursor to populate mode specific data into fc for the two new links.
     # 4) then we delete the old unsplit link.
     logger.debug("start:  split links")
-    if arcpy.ProductInfo() != "ArcInfo":
-        # Adding warning here rather than within the search cursor loop
-        logger.warning(
-            "The Advanced/ArcInfo license level of ArcGIS Pro is not available. Modified split links process "
-            "is being automatically run.")
 
     # Below allows road process to hook into non-limited access roads first, and then limited access roads as fallback
     if modal_layer_name == 'road':
@@ -724,53 +670,46 @@ def locations_add_links(logger, the_scenario, modal_layer_name, max_artificial_l
         else:
             logger.info("{} facilities hooking into the {} network".format(count//2, modal_layer_name))
 
-    # STEP 2 -- get mode specific data from the link
-    # ----------------------------------------------
-    if 'pipeline' not in modal_layer_name:
+    # STEP 2 -- get mode specific data from the links
+    # ------------------------------------------------
+    if 'pipeline' not in modal_layer_name and len(seenids) > 0:
+
+        # Get field objects from source FC
+        dsc = arcpy.Describe(os.path.join(scenario_gdb, modal_layer_name))
+        fields = dsc.fields
+
+        # List all field names except the OID field and geometry fields
+        # Replace 'SHAPE' with 'SHAPE@'
+        out_fields = [dsc.OIDFieldName, dsc.lengthFieldName, dsc.areaFieldName]
+        fieldnames = [field.name if field.name.lower() != 'shape' else 'SHAPE@' for field in fields if field.name not in out_fields]
+        # Make sure SHAPE@ is in front so we specifically know where it is
+        fieldnames.insert(0, fieldnames.pop(fieldnames.index('SHAPE@')))
+        fieldnames.insert(1, fieldnames.pop(fieldnames.index('Length')))
+        fieldnames.insert(2, fieldnames.pop(fieldnames.index('SPLIT_LINK')))
+
+        # read all of the links to split in one pass, the OID goes last so it isn't inherited by the new links
+        search_rows = {}
+        with arcpy.da.SearchCursor(os.path.join(scenario_gdb, modal_layer_name), fieldnames + ['OID@']) as scursor:
+            for search_row in scursor:
+                if str(search_row[-1]) in seenids:
+                    search_rows[str(search_row[-1])] = search_row
+
+        # STEP 3: Split each link once at all of its points and populate with mode specific data from old link
+        # ------------------------------------------------------------------------------------------------------
+        split_ids = []
+        if modal_layer_name in ['road', 'rail', 'water']:
+            icursor = arcpy.da.InsertCursor(os.path.join(scenario_gdb, modal_layer_name), fieldnames)
+        else:
+            icursor = None
 
         for theIdToGet in seenids:
 
-            # Get field objects from source FC
-            dsc = arcpy.Describe(os.path.join(scenario_gdb, modal_layer_name))
-            fields = dsc.fields
-
-            # List all field names except the OID field and geometry fields
-            # Replace 'SHAPE' with 'SHAPE@'
-            out_fields = [dsc.OIDFieldName, dsc.lengthFieldName, dsc.areaFieldName]
-            fieldnames = [field.name if field.name.lower() != 'shape' else 'SHAPE@' for field in fields if field.name not in out_fields]
-            # Make sure SHAPE@ is in front so we specifically know where it is
-            fieldnames.insert(0, fieldnames.pop(fieldnames.index('SHAPE@')))
-            fieldnames.insert(1, fieldnames.pop(fieldnames.index('Length')))
-            fieldnames.insert(2, fieldnames.pop(fieldnames.index('SPLIT_LINK')))
-
-            # Create cursors and insert new rows
-
-            for search_row in arcpy.da.SearchCursor(os.path.join(scenario_gdb, modal_layer_name),
-                                                    [fieldnames],
-                                                    where_clause=id_fieldname + " = " + theIdToGet):
-                in_line = search_row[0]
-
-            # STEP 3: Split and populate with mode specific data from old link
-            # ----------------------------------------------------------------
-            if arcpy.ProductInfo() == "ArcInfo":
-                split_lines = arcpy.management.SplitLineAtPoint(in_line, seenids[theIdToGet], arcpy.Geometry(), 1)
-
-            else:
-                # This is the alternative approach for those without an Advanced/ArcInfo license
-                point_list = seenids[theIdToGet]
-                line_list = [in_line]
-                split_lines = []
-                continue_iteration = 'continue running'
-
-                while continue_iteration == 'continue running':
-                    line_list, point_list, split_lines, continue_iteration = cut_lines(line_list, point_list, split_lines, scenario_proj)
+            search_row = search_rows[theIdToGet]
+            split_lines = ftot_supporting_gis.cut_lines(search_row[0], seenids[theIdToGet])
 
             if not len(split_lines) == 1:
 
-                if modal_layer_name in ['road', 'rail', 'water']:
-
-                    icursor = arcpy.da.InsertCursor(os.path.join(scenario_gdb, modal_layer_name),
-                                                    fieldnames)
+                if icursor is not None:
 
                     # Insert new links that include the mode-specific attributes
                     for new_line in split_lines:
@@ -784,18 +723,10 @@ def locations_add_links(logger, the_scenario, modal_layer_name, max_artificial_l
                         icursor.insertRow(
                             new_line_values)
 
-                    # Delete cursor object
-                    del icursor
-
                 else:
                     logger.warning("Modal_layer_name: {} is not supported.".format(modal_layer_name))
 
-                # STEP 4:  Delete old unsplit data
-                # --------------------------------
-                with arcpy.da.UpdateCursor(os.path.join(scenario_gdb, modal_layer_name), ['OID@'],
-                                           where_clause=id_fieldname + " = " + theIdToGet) as ucursor:
-                    for row in ucursor:
-                        ucursor.deleteRow()
+                split_ids.append(theIdToGet)
 
             # if the split doesn't work
             else:
@@ -805,6 +736,17 @@ def locations_add_links(logger, the_scenario, modal_layer_name, max_artificial_l
                     "Could just be an artifact from the near result being the end of a line.".format(
                         theIdToGet))
 
+        # Delete cursor object
+        del icursor
+
+        # STEP 4:  Delete old unsplit data
+        # --------------------------------
+        split_ids = set(split_ids)
+        with arcpy.da.UpdateCursor(os.path.join(scenario_gdb, modal_layer_name), ['OID@']) as ucursor:
+            for row in ucursor:
+                if str(row[0]) in split_ids:
+                    ucursor.deleteRow()
+
     edit.stopOperation()
     edit.stopEditing(True)
 
@@ -855,6 +797,8 @@ def locations_add_links(logger, the_scenario, modal_layer_name, max_artificial_l
     location_id_name_dict = get_location_id_name_dict(the_scenario, logger)
     connected_location_ids = []
     connected_location_id_names = []
+    artificial_link_count = 0
+    artificial_link_length = 0
     logger.debug("start:  search cursor on tmp_near_2")
     with arcpy.da.SearchCursor(os.path.join(scenario_gdb, "tmp_near_2"),
                                ["FROM_X", "FROM_Y", "NEAR_X", "NEAR_Y", "NEAR_DIST", "IN_FID"]) as scursor:
@@ -882,6 +826,8 @@ def locations_add_links(logger, the_scenario, modal_layer_name, max_artificial_l
 
                 # insert artificial link attributes
                 icursor.insertRow([polyline, 1, modal_layer_name, len_in_default_units, location_id, location_id_name])
+                artificial_link_count += 1
+                artificial_link_length += len_in_default_units
 
             else:
                 logger.warning("Artificial Link code: Ignoring NEAR_FID {} with NEAR_DIST {}".format(row[0], row[4]))
@@ -923,12 +869,266 @@ def locations_add_links(logger, the_scenario, modal_layer_name, max_artificial_l
         if arcpy.Exists(modal_layer_name + "_points"):
             arcpy.Delete_management(modal_layer_name + "_points")
 
+    logger.info("{:,} artificial links added to the {} network, total length {:,.2f} {}".format(
+        artificial_link_count, modal_layer_name, artificial_link_length, the_scenario.default_units_distance))
     logger.debug("finish: locations_add_links")
 
 
 # ==============================================================================
 
 
+def locations_add_links_gdal(logger, the_scenario, modal_layer_name, max_artificial_link_distance_miles):
+
+    # ADD LINKS LOGIC -- GDAL/OGR and shapely version of locations_add_links, does not require arcpy
+    # first we snap all locations to the nearest link (or pipeline end point) of the mode in one STRtree query.
+    # then we split each link once at all of the snap points on that link and preserve the data of that link.
+    # then we snap the locations to the nearest snap point with a second STRtree query.
+    # we ignore locations with near dist == 0.
+    # then we add the artificial link and note which locations got links.
+    # then we set the connects_to field if the location was connected.
+
+    logger.debug("start: locations_add_links_gdal for mode: {}".format(modal_layer_name))
+
+    try:
+        from osgeo import ogr
+        import numpy as np
+        import shapely
+        from shapely.ops import substring
+    except ImportError:
+        logger.error("locations_add_links_gdal requires GDAL/OGR and shapely 2.0 or later")
+        raise ImportError("locations_add_links_gdal requires GDAL/OGR and shapely 2.0 or later")
+
+    ogr.UseExceptions()
+    gdb = ogr.Open(the_scenario.main_gdb, 1)
+    if gdb is None:
+        logger.error("Unable to open {}".format(the_scenario.main_gdb))
+        raise RuntimeError("Unable to open {}".format(the_scenario.main_gdb))
+
+    modal_layer = gdb.GetLayerByName(modal_layer_name)
+    locations_layer = gdb.GetLayerByName(os.path.basename(the_scenario.locations_fc))
+    modal_geom_type = modal_layer.GetGeomType()
+
+    def to_shapely(ogr_geom):
+        ogr_geom = ogr_geom.Clone()
+        ogr_geom.FlattenTo2D()
+        return shapely.from_wkb(bytes(ogr_geom.ExportToWkb()))
+
+    def to_ogr(shapely_geom):
+        return ogr.ForceTo(ogr.CreateGeometryFromWkb(shapely_geom.wkb), modal_geom_type)
+
+    # reset the location fields on the mode
+    field_list = [("LOCATION_ID", ogr.OFTInteger, None),
+                  ("LOCATION_ID_NAME", ogr.OFTString, None),
+                  ("SPLIT_LINK", ogr.OFTInteger, ogr.OFSTInt16)]  # for flagging links that end up being split
+    for field_name, field_type, field_subtype in field_list:
+        field_index = modal_layer.GetLayerDefn().GetFieldIndex(field_name)
+        if field_index >= 0:
+            modal_layer.DeleteField(field_index)
+        field_defn = ogr.FieldDefn(field_name, field_type)
+        if field_subtype is not None:
+            field_defn.SetSubType(field_subtype)
+        modal_layer.CreateField(field_defn)
+
+    max_distance = Q_(max_artificial_link_distance_miles).to("meters").magnitude
+    if max_distance < 0.0000001:
+        logger.warning("Note: ignoring mode {}. User specified artificial link distance of {}".format(
+            modal_layer_name, max_artificial_link_distance_miles))
+        logger.debug("No links will be considered for the near analysis")
+
+    logger.debug("adding links between locations_fc and mode {} with max dist of {}".format(modal_layer_name,
+                                                                                            Q_(max_artificial_link_distance_miles).to(the_scenario.default_units_distance)))
+
+    # the locations, keyed on position so results of the bulk queries can be mapped back
+    location_fids = []
+    location_id_names = []
+    location_geoms = []
+    locations_layer.SetAttributeFilter(None)
+    for feature in locations_layer:
+        location_fids.append(feature.GetFID())
+        location_id_names.append(feature.GetField("location_id_name"))
+        location_geoms.append(to_shapely(feature.GetGeometryRef()))
+    location_geoms = np.array(location_geoms, dtype=object)
+
+    # Below allows road process to hook into non-limited access roads first, and then limited access roads as fallback
+    if modal_layer_name == 'road':
+        near_query_list = ["Artificial = 0 and (Limited_Access = 0 or Limited_Access IS NULL or Limited_Access = -9999)",
+                           "Artificial = 0 and Limited_Access = 1"]
+    else:
+        near_query_list = ["Artificial = 0"]
+
+    seenids = {}
+    neared_facilities = {}
+
+    logger.debug("start:  bulk near and split links")
+    for near_query_index, near_query in enumerate(near_query_list):
+
+        # STEP 1: find the nearest link (or pipeline end point) for every location at once
+        # ---------------------------------------------------------------------------------
+        near_fids = []
+        near_geoms = []
+        if max_distance >= 0.0000001:
+            modal_layer.SetAttributeFilter(near_query)
+            if "pipeline" in modal_layer_name:
+                # limit near to the end points of the pipeline links, dissolving points shared by more than one
+                # tariff so that we don't create duplicate art links
+                seen_points = {}
+                for feature in modal_layer:
+                    line = shapely.line_merge(to_shapely(feature.GetGeometryRef()))
+                    for end_point in shapely.get_parts(shapely.boundary(line)):
+                        xy = (round(end_point.x, 3), round(end_point.y, 3))
+                        if xy not in seen_points:
+                            seen_points[xy] = True
+                            near_fids.append(len(near_fids))
+                            near_geoms.append(end_point)
+            else:
+                for feature in modal_layer:
+                    near_fids.append(feature.GetFID())
+                    near_geoms.append(to_shapely(feature.GetGeometryRef()))
+            modal_layer.SetAttributeFilter(None)
+
+        count = 0
+        if len(near_geoms) > 0 and len(location_geoms) > 0:
+            tree = shapely.STRtree(near_geoms)
+            (location_index, tree_index), near_dist = tree.query_nearest(location_geoms, max_distance=max_distance,
+                                                                        return_distance=True, all_matches=False)
+            neared_lines = tree.geometries.take(tree_index)
+            neared_points = location_geoms.take(location_index)
+            near_points = shapely.line_interpolate_point(neared_lines,
+                                                         shapely.line_locate_point(neared_lines, neared_points)) \
+                if "pipeline" not in modal_layer_name else neared_lines
+
+            for i, t, dist, near_point in zip(location_index, tree_index, near_dist, near_points):
+
+                in_fid = location_fids[i]
+                if in_fid in neared_facilities:
+                    continue
+                neared_facilities[in_fid] = True
+                count += 1
+
+                # if the near distance is 0, then its connected and we don't need to split the line
+                if dist == 0:
+                    # only give debug warning if not pipeline
+                    if "pipeline" not in modal_layer_name:
+                        logger.warning(
+                            "Split links code: LOCATION MIGHT BE ON THE NETWORK. Ignoring location {} on link "
+                            "OBJECTID {} with NEAR_DIST {}".format(location_id_names[i], near_fids[t], dist))
+                else:
+                    if near_fids[t] not in seenids:
+                        seenids[near_fids[t]] = []
+                    seenids[near_fids[t]].append(near_point)
+
+        if modal_layer_name == 'road':
+            if near_query_index == 0:
+                logger.info("{} facilities hooking into the non-highway (or full, if limited access not defined) road network".format(count//2))
+            else:
+                logger.info("{} facilities hooking into the limited access road network because a non-limited access road is not within the artificial link distance".format(count//2))
+        else:
+            logger.info("{} facilities hooking into the {} network".format(count//2, modal_layer_name))
+
+    # STEP 2 -- split each link once at all of its snap points and copy the mode specific data from the link
+    # -------------------------------------------------------------------------------------------------------
+    if 'pipeline' not in modal_layer_name:
+
+        for theIdToGet in seenids:
+
+            old_feature = modal_layer.GetFeature(theIdToGet)
+            in_line = shapely.line_merge(to_shapely(old_feature.GetGeometryRef()))
+
+            split_lines = []
+            if in_line.geom_type == 'LineString':
+                measure_list = [in_line.project(point) for point in seenids[theIdToGet]]
+                split_lines = [substring(in_line, start, end)
+                               for start, end in ftot_supporting_gis.get_split_intervals(in_line.length, measure_list)]
+                split_lines = [new_line for new_line in split_lines if new_line.length > 0.0]
+
+            if len(split_lines) > 1:
+
+                # STEP 3: insert new links that include the mode-specific attributes
+                # -------------------------------------------------------------------
+                for new_line in split_lines:
+                    new_feature = ogr.Feature(modal_layer.GetLayerDefn())
+                    new_feature.SetFrom(old_feature)
+                    new_feature.SetGeometry(to_ogr(new_line))
+                    new_feature.SetField("Length", Q_(new_line.length, "meters").to(the_scenario.default_units_distance).magnitude)
+                    new_feature.SetField("SPLIT_LINK", 1)
+                    modal_layer.CreateFeature(new_feature)
+
+                # STEP 4:  Delete old unsplit data
+                # --------------------------------
+                modal_layer.DeleteFeature(theIdToGet)
+
+            # if the split doesn't work
+            else:
+                logger.detailed_debug(
+                    "the line split didn't work for ID: {}. "
+                    "Might want to investigate. "
+                    "Could just be an artifact from the near result being the end of a line.".format(
+                        theIdToGet))
+
+    # add artificial links
+    # now that the lines have been split add lines from the from points to the nearest node
+    # --------------------------------------------------------------------------------------
+    logger.debug("start:  add artificial links")
+    node_geoms = [point for point_list in seenids.values() for point in point_list]
+
+    connected_location_id_names = {}
+    artificial_link_count = 0
+    artificial_link_length = 0
+    if len(node_geoms) > 0 and len(location_geoms) > 0:
+        tree = shapely.STRtree(node_geoms)
+        (location_index, tree_index), near_dist = tree.query_nearest(location_geoms, max_distance=max_distance,
+                                                                    return_distance=True, all_matches=False)
+
+        for i, t, dist in zip(location_index, tree_index, near_dist):
+
+            if not dist == 0:
+
+                # use the location_id_name of the location to set the flow restrictions appropriately.
+                location_id_name = location_id_names[i]
+                location_id = location_id_name.split("_")[0]
+                connected_location_id_names[location_id_name] = True
+
+                polyline = shapely.LineString([location_geoms[i], node_geoms[t]])
+                len_in_default_units = Q_(polyline.length, "meters").to(the_scenario.default_units_distance).magnitude
+
+                # insert artificial link attributes
+                new_feature = ogr.Feature(modal_layer.GetLayerDefn())
+                new_feature.SetGeometry(to_ogr(polyline))
+                new_feature.SetField("Artificial", 1)
+                new_feature.SetField("Mode_Type", modal_layer_name)
+                new_feature.SetField("Length", len_in_default_units)
+                new_feature.SetField("LOCATION_ID", int(location_id))
+                new_feature.SetField("LOCATION_ID_NAME", location_id_name)
+                modal_layer.CreateFeature(new_feature)
+                artificial_link_count += 1
+                artificial_link_length += len_in_default_units
+
+            else:
+                logger.warning("Artificial Link code: Ignoring location {} (OBJECTID {}) with NEAR_DIST {}".format(
+                    location_id_names[i], location_fids[i], dist))
+
+    modal_layer.SyncToDisk()
+
+    # ALSO SET CONNECTS_X FIELD IN POINT LAYER
+    # -----------------------------------------
+    logger.debug("start:  connect_x")
+    locations_layer.ResetReading()
+    for feature in locations_layer:
+        if feature.GetField("location_id_name") in connected_location_id_names:
+            feature.SetField("connects_" + modal_layer_name, 1)
+            locations_layer.SetFeature(feature)
+    locations_layer.SyncToDisk()
+
+    gdb = None
+
+    logger.info("{:,} artificial links added to the {} network, total length {:,.2f} {}".format(
+        artificial_link_count, modal_layer_name, artificial_link_length, the_scenario.default_units_distance))
+    logger.debug("finish: locations_add_links_gdal")
+
+
+# ==============================================================================
+
+
 def ignore_locations_not_connected_to_network(the_scenario, logger):
     logger.info("start: ignore_locations_not_connected_to_network")
     logger.debug("flag locations which don't connect to the network")
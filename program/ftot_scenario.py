@@ -348,6 +348,12 @@ def load_scenario_config_file(fullPathToXmlConfigFile, fullPathToXmlSchemaFile,
         if len(xmlScenarioFile.getElementsByTagName('Report_With_Artificial_Links')):
             if xmlScenarioFile.getElementsByTagName('Report_With_Artificial_Links')[0].firstChild.data == "True":
                 scenario.report_with_artificial = True
+
+        # library used to hook locations into the network; default to arcpy
+        scenario.artificial_link_backend = 'arcpy'
+        if len(xmlScenarioFile.getElementsByTagName('Artificial_Link_Backend')):
+            if xmlScenarioFile.getElementsByTagName('Artificial_Link_Backend')[0].firstChild.data == "GDAL":
+                scenario.artificial_link_backend = 'gdal'
                 
     except Exception as e:
         logger.error("FAIL: {} ".format(e))
@@ -412,6 +418,15 @@ def load_scenario_config_file(fullPathToXmlConfigFile, fullPathToXmlSchemaFile,
 
     scenario.minCapacityLevel = float(xmlScenarioFile.getElementsByTagName('Minimum_Capacity_Level')[0].firstChild.data)
 
+    # lazy route capacity constraints; default to adding all route capacity constraints up front
+    scenario.lazyCapacityOn = False
+    if len(xmlScenarioFile.getElementsByTagName('Lazy_Capacity_Constraints')):
+        if xmlScenarioFile.getElementsByTagName('Lazy_Capacity_Constraints')[0].firstChild.data == "True":
+            scenario.lazyCapacityOn = True
+    scenario.lazyCapacityMaxIterations = 10
+    if len(xmlScenarioFile.getElementsByTagName('Lazy_Capacity_Max_Iterations')):
+        scenario.lazyCapacityMaxIterations = int(xmlScenarioFile.getElementsByTagName('Lazy_Capacity_Max_Iterations')[0].firstChild.data)
+
     # CO2 optimization options
     # FTOT defaults to routing cost only and will overwrite the hardcoded variables below if elements are included in the XML
     scenario.transport_cost_scalar = 1.0
@@ -450,6 +465,8 @@ def load_scenario_config_file(fullPathToXmlConfigFile, fullPathToXmlSchemaFile,
                 scenario.solver = 'cbc'
             elif solver_input == "highs":
                 scenario.solver = 'highs'
+            elif solver_input == "mcf":
+                scenario.solver = 'mcf'
             else:
                 logger.warning("Solver name not recognized. Defaulting to CBC solver.")
                 scenario.solver = 'cbc'
@@ -465,6 +482,24 @@ def load_scenario_config_file(fullPathToXmlConfigFile, fullPathToXmlSchemaFile,
         else: # set to none to represent no time limit
             scenario.time_limit = "none"
 
+        # build the constraint families in parallel worker processes; default to serial
+        scenario.parallel_constraint_build = False
+        if len(xmlScenarioFile.getElementsByTagName('Parallel_Constraint_Build')):
+            if xmlScenarioFile.getElementsByTagName('Parallel_Constraint_Build')[0].firstChild.data == "True":
+                scenario.parallel_constraint_build = True
+
+        # solve independent blocks of the optimization problem in parallel; default to a single problem
+        scenario.decompose_problem = False
+        if len(xmlScenarioFile.getElementsByTagName('Decompose_Problem')):
+            if xmlScenarioFile.getElementsByTagName('Decompose_Problem')[0].firstChild.data == "True":
+                scenario.decompose_problem = True
+
+        # flag edges that cannot carry flow at the end of o1 so o2 does not create their variables; default off
+        scenario.prune_edges = False
+        if len(xmlScenarioFile.getElementsByTagName('Prune_Edges')):
+            if xmlScenarioFile.getElementsByTagName('Prune_Edges')[0].firstChild.data == "True":
+                scenario.prune_edges = True
+
         logger.debug("PASS: setting the solver configuration passed")
 
     except Exception as e:
@@ -473,6 +508,12 @@ def load_scenario_config_file(fullPathToXmlConfigFile, fullPathToXmlSchemaFile,
 
     scenario.unMetDemandPenalty = float(xmlScenarioFile.getElementsByTagName('Unmet_Demand_Penalty')[0].firstChild.data)
 
+    # profile each step; default to no profiling. can also be turned on with the -profile command line option
+    scenario.profile_steps = False
+    if len(xmlScenarioFile.getElementsByTagName('Profile_Steps')):
+        if xmlScenarioFile.getElementsByTagName('Profile_Steps')[0].firstChild.data == "True":
+            scenario.profile_steps = True
+
     # OTHER
     # ----------------------------------------------------------------------------------------
 
@@ -552,6 +593,7 @@ def dump_scenario_info_to_report(the_scenario, logger):
     logger.config("xml_pipeline_crude_max_artificial_link_dist: \t{}".format(the_scenario.pipeline_crude_max_artificial_link_dist))
     logger.config("xml_pipeline_prod_max_artificial_link_dist: \t{}".format(the_scenario.pipeline_prod_max_artificial_link_dist))
     logger.config("xml_report_with_artificial_links: \t{}".format(the_scenario.report_with_artificial))
+    logger.config("xml_artificial_link_backend: \t{}".format(the_scenario.artificial_link_backend))
 
     logger.config("xml_rail_short_haul_penalty: \t{}".format(the_scenario.rail_short_haul_penalty))
     logger.config("xml_water_short_haul_penalty: \t{}".format(the_scenario.water_short_haul_penalty))
@@ -572,12 +614,18 @@ def dump_scenario_info_to_report(the_scenario, logger):
     logger.config("xml_capacityOn: \t{}".format(the_scenario.capacityOn))
     logger.config("xml_backgroundFlowModes: \t{}".format(the_scenario.backgroundFlowModes))
     logger.config("xml_minCapacityLevel: \t{}".format(the_scenario.minCapacityLevel))
+    logger.config("xml_lazyCapacityOn: \t{}".format(the_scenario.lazyCapacityOn))
+    logger.config("xml_lazyCapacityMaxIterations: \t{}".format(the_scenario.lazyCapacityMaxIterations))
     logger.config("xml_transport_cost_scalar: \t{}".format(the_scenario.transport_cost_scalar))
     logger.config("xml_co2_cost_scalar: \t{}".format(the_scenario.co2_cost_scalar))
     logger.config("xml_co2_unit_cost: \t{}".format(the_scenario.co2_unit_cost))
     logger.config("xml_solver: \t{}".format(the_scenario.solver))
     logger.config("xml_solver_time_limit: \t{}".format(the_scenario.time_limit))
+    logger.config("xml_parallel_constraint_build: \t{}".format(the_scenario.parallel_constraint_build))
+    logger.config("xml_decompose_problem: \t{}".format(the_scenario.decompose_problem))
+    logger.config("xml_prune_edges: \t{}".format(the_scenario.prune_edges))
     logger.config("xml_unMetDemandPenalty (default): \t{}".format(the_scenario.unMetDemandPenalty))
+    logger.config("xml_profile_steps: \t{}".format(the_scenario.profile_steps))
 
 
 #=======================================================================================================================
@@ -8,7 +8,7 @@
 import os
 import datetime
 import sqlite3
-from shutil import rmtree
+from shutil import rmtree, copytree, ignore_patterns
 
 import ftot_supporting
 import ftot_supporting_gis
@@ -118,6 +118,59 @@ def create_main_gdb(logger, the_scenario):
     # create the GIS geodatabase main.gdb
     # -----------------------------------
     logger.info("start: create_main_gdb")
+
+    # the GDAL backend copies and validates the network with GDAL/OGR so the s step runs without arcpy
+    if the_scenario.artificial_link_backend == 'gdal':
+        copy_main_gdb_gdal(the_scenario, logger)
+    else:
+        copy_main_gdb(the_scenario, logger)
+   
+    # Check for impedance weights csv
+    if the_scenario.impedance_weights_data == "None":
+        logger.info('Impedance weights file not specified; no impedances will be applied to the network')
+    else:
+        if not os.path.exists(the_scenario.impedance_weights_data):
+            error = ("Error: cannot find impedance_weights_data file: {}. ".format(the_scenario.impedance_weights_data) +
+                     "Please specify an existing file path.")
+            logger.error(error)
+            raise Exception(error)
+
+    # Check for disruption csv--if one exists, this is where we remove links in the network that are fully disrupted
+    # and flag the availability of links that are partially disrupted
+    if the_scenario.disruption_data == "None":
+        logger.info('Disruption file not specified; no disruption to the network will be applied')
+    else:
+        if not os.path.exists(the_scenario.disruption_data):
+            error = ("Error: cannot find disruption_data file: {}. ".format(the_scenario.disruption_data) +
+                     "Please specify an existing file path.")
+            logger.error(error)
+            raise Exception(error)
+        else:
+            # Check that it is actually a csv
+            if not the_scenario.disruption_data.endswith("csv"):
+                error = ("Error: disruption_data file {} is not a csv file. ".format(the_scenario.disruption_data) +
+                         "Please use valid disruption_data csv.")
+                logger.error(error)
+                raise Exception(error)
+            else:
+                logger.info("disruption csv to be applied to the network: {}".format(the_scenario.disruption_data))
+                apply_network_disruption(the_scenario, logger)
+
+    # double check the artificial links for intermodal facilities are set to 2
+    # Note that this should be deprecated once network spec has matured and
+    # all circulating FTOT networks have artificial links already set to 2
+    # -------------------------------------------------------------------------
+    if the_scenario.artificial_link_backend == 'gdal':
+        set_intermodal_links_gdal(the_scenario, logger)
+    else:
+        ftot_supporting_gis.set_intermodal_links(the_scenario, logger)
+
+
+# ==============================================================================
+
+
+def copy_main_gdb(the_scenario, logger):
+    # copies the base network to main.gdb and validates it with arcpy
     scenario_gdb = the_scenario.main_gdb
 
     import arcpy
@@ -243,66 +296,316 @@ def create_main_gdb(logger, the_scenario):
                     arcpy.CalculateField_management(lyr, field, -9999)
 
     logger.debug("finished: validating network geodatabase")
-   
-    # Check for impedance weights csv
-    if the_scenario.impedance_weights_data == "None":
-        logger.info('Impedance weights file not specified; no impedances will be applied to the network')
-    else:
-        if not os.path.exists(the_scenario.impedance_weights_data):
-            error = ("Error: cannot find impedance_weights_data file: {}. ".format(the_scenario.impedance_weights_data) +
-                     "Please specify an existing file path.")
-            logger.error(error)
-            raise Exception(error)
 
-    # Check for disruption csv--if one exists, this is where we remove links in the network that are fully disrupted
-    if the_scenario.disruption_data == "None":
-        logger.info('Disruption file not specified; no disruption to the network will be applied')
-    else:
-        if not os.path.exists(the_scenario.disruption_data):
-            error = ("Error: cannot find disruption_data file: {}. ".format(the_scenario.disruption_data) +
-                     "Please specify an existing file path.")
+
+# ==============================================================================
+
+
+def copy_main_gdb_gdal(the_scenario, logger):
+    # GDAL/OGR version of copy_main_gdb, does not require arcpy. a file geodatabase is a folder, so it is copied
+    # as one and then validated and updated with the OpenFileGDB driver (GDAL 3.6 or later).
+    try:
+        from osgeo import ogr
+    except ImportError:
+        logger.error("copy_main_gdb_gdal requires GDAL/OGR: http://www.gdal.org/")
+        raise ImportError("copy_main_gdb_gdal requires GDAL/OGR: http://www.gdal.org/")
+
+    scenario_gdb = the_scenario.main_gdb
+
+    if os.path.exists(scenario_gdb):
+        logger.debug("start: delete existing main.gdb")
+        logger.debug("main.gdb file location: " + scenario_gdb)
+        try:
+            rmtree(scenario_gdb)
+        except:
+            logger.error("couldn't delete " + scenario_gdb)
+            raise Exception("couldn't delete " + scenario_gdb)
+
+    # copy in the base network from the baseline data
+    # -----------------------------------------------
+
+    if not os.path.isdir(the_scenario.base_network_gdb):
+        error = "can't find base network gdb {}".format(the_scenario.base_network_gdb)
+        raise IOError(error)
+
+    logger.info("start: copy base network to main.gdb")
+    logger.debug("copy Scenario Base Network: \t{}".format(the_scenario.base_network_gdb))
+    copytree(the_scenario.base_network_gdb, scenario_gdb, ignore=ignore_patterns('*.lock'))
+
+    gdb = ogr.Open(scenario_gdb, 1)
+    if gdb is None:
+        error = "Unable to open {} for update. GDAL 3.6 or later is required to write file geodatabases.".format(scenario_gdb)
+        logger.error(error)
+        raise RuntimeError(error)
+
+    # Check that feature dataset exists called network
+    root_group = gdb.GetRootGroup()
+    if root_group is not None and "network" not in (root_group.GetGroupNames() or []):
+        error = ("The scenario network geodatabase must contain a feature dataset named 'network'. Please ensure " +
+                 "that {} includes all network components inside that feature dataset.".format(the_scenario.base_network_gdb))
+        logger.error(error)
+        raise IOError(error)
+
+    logger.info("start: validating network geodatabase")
+
+    scenario_proj = None
+    for mode in the_scenario.permittedModes:
+        mode_layer = gdb.GetLayerByName(mode)
+        if mode_layer is None:
+            error = ("The scenario network geodatabase must contain a feature class representing the {} mode ".format(mode) +
+                     "called '{}'. Please ensure that it is included within the 'network' feature dataset ".format(mode) +
+                     "in {} or set the corresponding scenario XML permitted mode parameter to False.".format(the_scenario.base_network_gdb))
             logger.error(error)
-            raise Exception(error)
-        else:
-            # Check that it is actually a csv
-            if not the_scenario.disruption_data.endswith("csv"):
-                error = ("Error: disruption_data file {} is not a csv file. ".format(the_scenario.disruption_data) +
-                         "Please use valid disruption_data csv.")
+            raise IOError(error)
+
+        # Check that a meters-based coordinate system is associated with the network
+        if scenario_proj is None:
+            scenario_proj = mode_layer.GetSpatialRef()
+            if scenario_proj is None or scenario_proj.GetLinearUnits() != 1.0:
+                error = ("The scenario network geodatabase must be in a meter-based coordinate system. Please ensure " +
+                         "that {} is in a meter-based coordinate system.".format(the_scenario.base_network_gdb))
                 logger.error(error)
                 raise Exception(error)
-            else:
-                logger.info("disruption csv to be applied to the network: {}".format(the_scenario.disruption_data))
-                with open(the_scenario.disruption_data, 'r', encoding='utf-8-sig') as rf:
-                    line_num = 1
-                    for line in rf:
-                        csv_row = line.rstrip('\n').split(',')
-                        if line_num == 1:
-                            if csv_row[0] != 'mode' or csv_row[1] != 'unique_link_id' or csv_row[2] != 'link_availability':
-                                error = "Error: disruption_data file {} does not match the appropriate disruption "\
-                                        "data schema. Please check that the first three columns are 'mode', "\
-                                        "'unique_link_id' and 'link_availability'.".format(the_scenario.disruption_data)
-                                logger.error(error)
-                                raise Exception(error)
-                        if line_num > 1:
-                            mode = csv_row[0]
-                            link = csv_row[1]
-                            link_availability = float(csv_row[2])
-                            if link_availability == 0:  # 0 = 100% disruption
-                                with arcpy.da.UpdateCursor(os.path.join(scenario_gdb, "network/" + mode), ['OBJECTID'], "OBJECTID = {}".format(link)) as ucursor:
-                                    for gis_row in ucursor:
-                                        ucursor.deleteRow()
-                                        logger.info("Disruption scenario removed OID {} from {} network".format(link, mode))
-                                del ucursor
+            logger.info(("The scenario projection utilized by the base_network_gdb is {}, ".format(scenario_proj.GetName()) +
+                         "WKID {} with units of {}.".format(scenario_proj.GetAuthorityCode(None),
+                                                            scenario_proj.GetLinearUnitsName().lower())))
+
+        # Check for required fields in the GIS network and give error if not there. OGR reports the OBJECTID
+        # and SHAPE fields as the feature id and geometry rather than as fields.
+        layer_defn = mode_layer.GetLayerDefn()
+        check_fields = [layer_defn.GetFieldDefn(i).GetName().lower() for i in range(layer_defn.GetFieldCount())]
+
+        required_fields = ["Mode_Type", "Artificial"]
+        if mode in ["road", "water", "rail"]:
+            required_fields.append("Length")
+        if mode in ["pipeline_crude_trf_rts", "pipeline_prod_trf_rts"]:
+            required_fields.extend(["Base_Rate", "Tariff_ID", "Dir_Flag"])
+        for field in required_fields:
+            if field.lower() not in check_fields:
+                error = ("The mode feature class {} must have the following field: {}. ".format(mode, field) +
+                         "Ensure your network matches the FTOT Network Specification.")
+                logger.error(error)
+                raise Exception(error)
+
+        # Add any optional fields if not already in there--these will not be populated with any data
+        # but ensures program will not need to check for their existence later on
+        optional_fields = []
+        if mode in ["road", "water", "rail"]:
+            optional_fields.extend([("Link_Type", ogr.OFTString, ogr.OFSTNone), ("Name", ogr.OFTString, ogr.OFSTNone),
+                                    ("Dir_Flag", ogr.OFTInteger, ogr.OFSTInt16), ("Volume", ogr.OFTReal, ogr.OFSTNone),
+                                    ("Capacity", ogr.OFTReal, ogr.OFSTNone), ("VCR", ogr.OFTReal, ogr.OFSTNone)])
+        if mode in ["road"]:
+            optional_fields.extend([("Urban_Rural", ogr.OFTInteger, ogr.OFSTInt16),
+                                    ("Limited_Access", ogr.OFTInteger, ogr.OFSTInt16),
+                                    ("Free_Speed", ogr.OFTReal, ogr.OFSTNone)])
+        for field, field_type, field_subtype in optional_fields:
+            if field.lower() not in check_fields:
+                field_defn = ogr.FieldDefn(field, field_type)
+                field_defn.SetSubType(field_subtype)
+                mode_layer.CreateField(field_defn)
+                logger.debug("added {} field to {}".format(field, mode))
+
+        # For Urban_Rural, Limited_Access, and Free_Speed fields, convert any nulls to -9999
+        #     so that nulls do not become 0s when converted to shapefile
+        # Do not need to do this for Dir_Flag as any nulls will automatically become 0 (two-way)
+        if mode in ["road"]:
+            for field in ["Urban_Rural", "Limited_Access", "Free_Speed"]:
+                mode_layer.SetAttributeFilter(field + " IS NULL")
+                selected_features = 0
+                mode_layer.StartTransaction()
+                for feature in mode_layer:
+                    feature.SetField(field, -9999)
+                    mode_layer.SetFeature(feature)
+                    selected_features += 1
+                mode_layer.CommitTransaction()
+                mode_layer.SetAttributeFilter(None)
+                if selected_features > 0:
+                    logger.debug('updated {} null values for {} in mode {} to -9999'.format(selected_features, field, mode))
+
+    gdb = None
+    logger.debug("finished: validating network geodatabase")
+
+
+# ==============================================================================
+
+
+def set_intermodal_links_gdal(the_scenario, logger):
+    # GDAL/OGR version of ftot_supporting_gis.set_intermodal_links. sets the artificial link field to 2
+    # so that it does not have flow restrictions applied to it
+    from osgeo import ogr
+
+    logger.info("start: set_intermodal_links")
+
+    gdb = ogr.Open(the_scenario.main_gdb, 1)
+    for mode in the_scenario.permittedModes:
+        mode_layer = gdb.GetLayerByName(mode)
+        mode_layer.SetAttributeFilter("Artificial = 1")
+        mode_layer.StartTransaction()
+        for feature in mode_layer:
+            feature.SetField("Artificial", 2)
+            mode_layer.SetFeature(feature)
+        mode_layer.CommitTransaction()
+        mode_layer.SetAttributeFilter(None)
+    gdb = None
+
+
+# ==============================================================================
+
+
+def load_disruption_data(the_scenario, logger):
+    # returns a dictionary keyed off mode, with the link availability keyed off the link OBJECTID
+    disruption_dict = {}
+    with open(the_scenario.disruption_data, 'r', encoding='utf-8-sig') as rf:
+        line_num = 1
+        for line in rf:
+            csv_row = line.rstrip('\n').split(',')
+            if line_num == 1:
+                if csv_row[0] != 'mode' or csv_row[1] != 'unique_link_id' or csv_row[2] != 'link_availability':
+                    error = "Error: disruption_data file {} does not match the appropriate disruption "\
+                            "data schema. Please check that the first three columns are 'mode', "\
+                            "'unique_link_id' and 'link_availability'.".format(the_scenario.disruption_data)
+                    logger.error(error)
+                    raise Exception(error)
+            elif len(csv_row) >= 3 and csv_row[0] != '':
+                mode = csv_row[0]
+                link = int(csv_row[1])
+                link_availability = float(csv_row[2])
+                if link_availability < 0 or link_availability > 1:
+                    logger.warning("Warning: link availability must be between 0 and 1. " +
+                                   "Ignoring availability of {} specified on OID {} from {} network.".format(link_availability, link, mode))
+                else:
+                    disruption_dict.setdefault(mode, {})[link] = link_availability
+            line_num += 1
+
+    return disruption_dict
+
+
+# ==============================================================================
+
+
+def apply_network_disruption(the_scenario, logger):
+    # links with zero availability (100% disruption) are removed from the network.
+    # partially available links keep their availability in an Availability field and have their capacity
+    # scaled by it. the volume on the link is unchanged, so its VCR (volume / capacity) is divided by the
+    # availability. the availability is applied to the routing cost of the link in the g step.
+    logger.info("start: apply_network_disruption")
+
+    disruption_dict = load_disruption_data(the_scenario, logger)
+
+    if the_scenario.artificial_link_backend == 'gdal':
+        apply_network_disruption_gdal(the_scenario, disruption_dict, logger)
+        return
+
+    import arcpy
+
+    for mode, link_availability in disruption_dict.items():
+        mode_fc = os.path.join(the_scenario.main_gdb, "network", mode)
+        if not arcpy.Exists(mode_fc):
+            logger.warning("Warning: disruption scenario specifies links on the {} network, ".format(mode) +
+                           "which is not in the scenario network. Ignoring these links.")
+            continue
+
+        disrupted_links = set(oid for oid, availability in link_availability.items() if availability == 0)
+        partial_links = dict((oid, availability) for oid, availability in link_availability.items() if 0 < availability < 1)
+
+        field_names = [field.name.lower() for field in arcpy.ListFields(mode_fc)]
+        if partial_links and "availability" not in field_names:
+            arcpy.management.AddField(mode_fc, "Availability", "Double")
+        fields = ['OID@']
+        if partial_links:
+            fields.append('Availability')
+            for field in ['Capacity', 'VCR']:
+                if field.lower() in field_names:
+                    fields.append(field)
+
+        # one pass over the mode feature class removes and updates all of its disrupted links
+        removed_count = 0
+        partial_count = 0
+        with arcpy.da.UpdateCursor(mode_fc, fields) as ucursor:
+            for gis_row in ucursor:
+                oid = gis_row[0]
+                if oid in disrupted_links:
+                    ucursor.deleteRow()
+                    removed_count += 1
+                    logger.debug("Disruption scenario removed OID {} from {} network".format(oid, mode))
+                elif oid in partial_links:
+                    gis_row[1] = partial_links[oid]
+                    for index in range(2, len(fields)):
+                        if gis_row[index] is not None:
+                            if fields[index] == 'Capacity':
+                                gis_row[index] = gis_row[index] * partial_links[oid]
                             else:
-                                logger.warning("Warning: disruption scenario only allows zero availability links for now. " +
-                                               "Ignoring partial availability specified on OID {} from {} network.".format(link, mode))
-                        line_num += 1
+                                gis_row[index] = gis_row[index] / partial_links[oid]
+                    ucursor.updateRow(gis_row)
+                    partial_count += 1
+        del ucursor
 
-    # double check the artificial links for intermodal facilities are set to 2
-    # Note that this should be deprecated once network spec has matured and
-    # all circulating FTOT networks have artificial links already set to 2
-    # -------------------------------------------------------------------------
-    ftot_supporting_gis.set_intermodal_links(the_scenario, logger)
+        logger.info("Disruption scenario removed {} links from {} network".format(removed_count, mode))
+        if partial_count > 0:
+            logger.info("Disruption scenario set partial availability on {} links from {} network".format(partial_count, mode))
+
+    logger.debug("finish: apply_network_disruption")
+
+
+# ==============================================================================
+
+
+def apply_network_disruption_gdal(the_scenario, disruption_dict, logger):
+    # GDAL/OGR version of apply_network_disruption, does not require arcpy
+    # the OBJECTID of a file geodatabase feature is its OGR feature id
+    try:
+        from osgeo import ogr
+    except ImportError:
+        logger.error("apply_network_disruption_gdal requires GDAL/OGR: http://www.gdal.org/")
+        raise ImportError("apply_network_disruption_gdal requires GDAL/OGR: http://www.gdal.org/")
+
+    gdb = ogr.Open(the_scenario.main_gdb, 1)
+    if gdb is None:
+        logger.error("Unable to open {}".format(the_scenario.main_gdb))
+        raise RuntimeError("Unable to open {}".format(the_scenario.main_gdb))
+
+    for mode, link_availability in disruption_dict.items():
+        mode_layer = gdb.GetLayerByName(mode)
+        if mode_layer is None:
+            logger.warning("Warning: disruption scenario specifies links on the {} network, ".format(mode) +
+                           "which is not in the scenario network. Ignoring these links.")
+            continue
+
+        disrupted_links = [oid for oid, availability in link_availability.items() if availability == 0]
+        partial_links = dict((oid, availability) for oid, availability in link_availability.items() if 0 < availability < 1)
+
+        layer_defn = mode_layer.GetLayerDefn()
+        if partial_links and layer_defn.GetFieldIndex("Availability") == -1:
+            mode_layer.CreateField(ogr.FieldDefn("Availability", ogr.OFTReal))
+        has_capacity = layer_defn.GetFieldIndex("Capacity") > -1
+        has_vcr = layer_defn.GetFieldIndex("VCR") > -1
+
+        removed_count = 0
+        partial_count = 0
+        mode_layer.StartTransaction()
+        for oid in disrupted_links:
+            if mode_layer.DeleteFeature(oid) == ogr.OGRERR_NONE:
+                removed_count += 1
+                logger.debug("Disruption scenario removed OID {} from {} network".format(oid, mode))
+        for oid, availability in partial_links.items():
+            feature = mode_layer.GetFeature(oid)
+            if feature is None:
+                continue
+            feature.SetField("Availability", availability)
+            if has_capacity and feature.GetField("Capacity") is not None:
+                feature.SetField("Capacity", feature.GetField("Capacity") * availability)
+            if has_vcr and feature.GetField("VCR") is not None:
+                feature.SetField("VCR", feature.GetField("VCR") / availability)
+            mode_layer.SetFeature(feature)
+            partial_count += 1
+        mode_layer.CommitTransaction()
+
+        logger.info("Disruption scenario removed {} links from {} network".format(removed_count, mode))
+        if partial_count > 0:
+            logger.info("Disruption scenario set partial availability on {} links from {} network".format(partial_count, mode))
+
+    gdb = None
+    logger.debug("finish: apply_network_disruption")
 
 
 # ==============================================================================
@@ -9,7 +9,9 @@ import math
 
 import logging
 import datetime
+import json
 import sqlite3
+from functools import lru_cache
 from ftot import ureg, Q_
 from six import iteritems
 
@@ -54,6 +56,9 @@ def create_loggers(dirLocation, task):
     logger.result = lambda msg, *args: logger._log(logging.RESULT, msg, args)
     logger.config = lambda msg, *args: logger._log(logging.CONFIG, msg, args)
     logger.detailed_debug = lambda msg, *args: logger._log(logging.DETAILED_DEBUG, msg, args)
+    # structured values (e.g., row counts, solver status) for the run metrics file; also written to the file log
+    logger.metric = lambda name, value: logger._log(logging.DEBUG, "metric {}: \t{}".format(name, value), (),
+                                                    extra={'metric': name, 'metric_value': value})
 
     # FILE LOG
     # ------------------------------------------------------------------------------
@@ -76,10 +81,18 @@ def create_loggers(dirLocation, task):
     console_log_format = logging.Formatter('%(asctime)s %(levelname)-8s %(message)s', datefmt='%m-%d %H:%M:%S')
     console.setFormatter(console_log_format)
 
+    # RUN METRICS LOG
+    # structured copy of the RESULT, CONFIG, RUNTIME, WARNING, and ERROR records and metrics,
+    # read by the reports and tools instead of parsing the log files
+    # ------------------------------------------------------------------------------
+    run_metrics = RunMetricsHandler(os.path.join(loggingLocation, RUN_METRICS_FILE), task, logFileName)
+    run_metrics.setLevel(logging.DEBUG)
+
     # ADD THE HANDLERS
     # ----------------
     logger.addHandler(file_log)
     logger.addHandler(console)
+    logger.addHandler(run_metrics)
 
     # NOTE: with these custom levels you can now do the following
     # test this out once the handlers have been added
@@ -91,6 +104,105 @@ def create_loggers(dirLocation, task):
 # ==============================================================================
 
 
+RUN_METRICS_FILE = "run_metrics.jsonl"
+
+
+class RunMetricsHandler(logging.FileHandler):
+    """Appends report-level log records and metrics to a JSON lines file, one record per line.
+    The file is kept open for the run and flushed after each record, so readers see every record written."""
+
+    metric_levels = ['RESULT', 'CONFIG', 'RUNTIME', 'WARNING', 'ERROR', 'CRITICAL']
+
+    def __init__(self, metrics_file, step, log_file_name):
+        logging.FileHandler.__init__(self, metrics_file, mode='a')
+        self.metrics_file = metrics_file
+        self.step = step
+        self.log_file_name = log_file_name
+
+    def emit(self, record):
+        is_metric = hasattr(record, 'metric')
+        if record.levelname not in self.metric_levels and not is_metric:
+            return
+        try:
+            metrics_record = {'step': self.step,
+                              'log_file': self.log_file_name,
+                              'timestamp': datetime.datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S.%f"),
+                              'level': record.levelname,
+                              'message': record.getMessage(),
+                              'peak_rss_mb': get_peak_memory_mb()}
+            if is_metric:
+                metrics_record['metric'] = record.metric
+                metrics_record['value'] = record.metric_value
+            self.stream.write(json.dumps(metrics_record, default=str) + "\n")
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+# ==============================================================================
+
+
+def get_peak_memory_mb():
+    """Returns the peak resident memory of this process in MB, or None if it can't be determined"""
+    try:
+        if os.name == 'nt':
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD),
+                            ('PageFaultCount', wintypes.DWORD),
+                            ('PeakWorkingSetSize', ctypes.c_size_t),
+                            ('WorkingSetSize', ctypes.c_size_t),
+                            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                            ('PagefileUsage', ctypes.c_size_t),
+                            ('PeakPagefileUsage', ctypes.c_size_t)]
+
+            get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+            get_current_process.restype = wintypes.HANDLE
+            get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+            get_process_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            if not get_process_memory_info(get_current_process(), ctypes.byref(counters), counters.cb):
+                return None
+            return round(counters.PeakWorkingSetSize / 1024.0 / 1024.0, 1)
+        else:
+            import resource
+            # ru_maxrss is reported in KB on Linux
+            return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+    except Exception:
+        return None
+
+
+# ==============================================================================
+
+
+def load_run_metrics(scenario_run_directory):
+    """Returns the run metrics records keyed by log file name, in the order they were written"""
+    run_metrics = {}
+    metrics_file = os.path.join(scenario_run_directory, "logs", RUN_METRICS_FILE)
+    if not os.path.exists(metrics_file):
+        return run_metrics
+
+    with open(metrics_file, 'r') as mf:
+        for line in mf:
+            try:
+                metrics_record = json.loads(line)
+            except ValueError:
+                continue  # e.g., a partial line from a run that was killed mid-write
+            run_metrics.setdefault(metrics_record['log_file'], []).append(metrics_record)
+
+    return run_metrics
+
+
+# ==============================================================================
+
+
 def clean_file_name(value):
     deletechars = r'\/:*?"<>|'
     for c in deletechars:
@@ -125,6 +237,53 @@ def euclidean_distance(xCoord, yCoord, xCoord2, yCoord2):
     return math.sqrt(math.pow((xCoord - xCoord2), 2) + math.pow((yCoord - yCoord2), 2))
 
 
+# =============================================================================
+# Unit conversion cache
+# pint parses a unit string in tens of microseconds, which dominates loops that convert
+# every row of a table. These helpers parse each distinct string once; callers then apply
+# the cached float with a plain multiply. pint errors (e.g., DimensionalityError,
+# UndefinedUnitError) are not cached and are raised exactly as the uncached call would.
+# =============================================================================
+
+
+@lru_cache(maxsize=None)
+def get_conversion_factor(from_units, to_units):
+    """Returns the multiplier that converts a magnitude in from_units into to_units"""
+
+    return Q_(1, from_units).to(to_units).magnitude
+
+
+# =============================================================================
+
+
+@lru_cache(maxsize=None)
+def parse_quantity_string(quantity_string):
+    """Splits a pint string such as '3.33 ton / thousand_gallon' into (magnitude, units string)"""
+
+    quantity = Q_(quantity_string)
+    return quantity.magnitude, str(quantity.units)
+
+
+# =============================================================================
+
+
+@lru_cache(maxsize=None)
+def get_units_dimensionality(units):
+    """Returns the dimensionality of a unit string as a string, e.g., '[mass]' or '[length] ** 3'"""
+
+    return str(ureg(units).dimensionality)
+
+
+# =============================================================================
+
+
+@lru_cache(maxsize=None)
+def check_units_dimensionality(units, dimension):
+    """Returns True if the unit string matches the dimension, e.g., 'usd / [mass]'"""
+
+    return Q_(1, units).check(dimension)
+
+
 # =============================================================================
 
 class CropData:
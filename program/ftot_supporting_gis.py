@@ -8,7 +8,6 @@
 import os
 import math
 import itertools
-import arcpy
 import sqlite3
 import numpy as np
 from ftot import Q_
@@ -492,7 +491,9 @@ def get_commodity_vehicle_attributes_dict(the_scenario, logger):
         mode text,
         attribute text,
         link_type text,
-        value text, -- incl. units, no need to separate out in this table
+        value text, -- incl. units
+        value_magnitude numeric, -- magnitude of value in its own units (value_units), not converted
+        value_units text,
         constraint unique_elements unique(commodity, mode, attribute, link_type))
         ;""")
 
@@ -503,9 +504,9 @@ def get_commodity_vehicle_attributes_dict(the_scenario, logger):
                         value = attribute_dict[commodity][mode][attribute]
 
                         sql_nonemissions = """insert into commodity_vehicle_attrs
-                                              (commodity, mode, attribute, link_type, value)
-                                              values ('{}', '{}', '{}', NULL, '{}')
-                                              ;""".format(commodity, mode, attribute, value)
+                                              (commodity, mode, attribute, link_type, value, value_magnitude, value_units)
+                                              values ('{}', '{}', '{}', NULL, '{}', {}, '{}')
+                                              ;""".format(commodity, mode, attribute, value, value.magnitude, value.units)
                         db_con.execute(sql_nonemissions)
                         
                     else:
@@ -514,9 +515,9 @@ def get_commodity_vehicle_attributes_dict(the_scenario, logger):
                             value = attribute_dict[commodity][mode][attribute][link_type]
 
                             sql_emissions = """insert into commodity_vehicle_attrs
-                                               (commodity, mode, attribute, link_type, value)
-                                               values ('{}', '{}', '{}', '{}', '{}')
-                                               ;""".format(commodity, mode, attribute, link_type, value)
+                                               (commodity, mode, attribute, link_type, value, value_magnitude, value_units)
+                                               values ('{}', '{}', '{}', '{}', '{}', {}, '{}')
+                                               ;""".format(commodity, mode, attribute, link_type, value, value.magnitude, value.units)
                             db_con.execute(sql_emissions)
 
     return attribute_dict  # Keyed off of commodity name, then mode, then vehicle attribute, then link type (unless Fuel_Efficiency)
@@ -598,7 +599,41 @@ def get_state_abb_from_state_fips(input_fips):
 # =====================================================================================================================
 
 
+def get_split_intervals(line_length, measure_list):
+    # returns the (start, end) measures of the sub-segments of a line cut at all of the measures in one pass.
+    # measures are sorted along the line and de-duplicated. Cutting at a line end point would produce an empty
+    # geometry, so only measures inside the line are used.
+    cut_measures = sorted(set([measure for measure in measure_list if 0.0 < measure < line_length]))
+    bounds = [0.0] + cut_measures + [line_length]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# =====================================================================================================================
+
+
+def cut_lines(in_line, point_list):
+    # split an arcpy polyline at all of the points in point_list
+    if not in_line.length > 0.0:  # Make sure it's not an empty geometry.
+        return [in_line]
+
+    # Even "coincident" points can show up as spatially non-coincident in their
+    # floating-point XY values, so we set up a tolerance.
+    measure_list = [in_line.measureOnLine(point) for point in point_list if in_line.distanceTo(point) < 1.0]
+
+    split_lines = []
+    for start, end in get_split_intervals(in_line.length, measure_list):
+        new_line = in_line.segmentAlongLine(start, end)
+        # Make sure the descendents have non-zero geometry.
+        if new_line.length > 0.0:
+            split_lines.append(new_line)
+    return split_lines
+
+
+# =====================================================================================================================
+
+
 def assign_pipeline_costs(the_scenario, logger, include_pipeline):
+    import arcpy
     scenario_gdb = os.path.join(the_scenario.scenario_run_directory, "main.gdb")
     # calc the cost for pipeline
     # ---------------------
@@ -638,6 +673,7 @@ def assign_pipeline_costs(the_scenario, logger, include_pipeline):
 
 
 def set_intermodal_links(the_scenario, logger):
+    import arcpy
     scenario_gdb = the_scenario.main_gdb
     # set the artificial link field to 2 so that it
     # does not have flow restrictions applied to it
@@ -671,6 +707,7 @@ def load_afpat_data_to_memory(fullPathToTable, logger):
     """load afpat data to memory"""
 
     logger.debug("START: load_afpat_data_to_memory")
+    import arcpy
 
     crop_yield_dict = {}  # keyed off crop name --> crop yield (e.g., kg/ha/yr)
     fuel_yield_dict = {}  # keyed off crop name + processing type --> fuel yields (e.g., jet, diesel, total biomass)
@@ -896,7 +933,7 @@ def persist_AFPAT_tables(the_scenario,  logger):
 
 
 def get_coordinate_system(the_scenario):
-
+    import arcpy
     feature_dataset = os.path.join(the_scenario.main_gdb, "network")
     scenario_proj = arcpy.Describe(feature_dataset).spatialReference
 
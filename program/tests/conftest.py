@@ -0,0 +1,19 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: conftest.py
+#
+# Purpose: pytest setup for the FTOT tests. The FTOT modules import each other by module name from the
+# program directory, and the tools from the tools directory, so both are put on the path.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import os
+import sys
+
+PROGRAM_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for directory in [PROGRAM_DIRECTORY, os.path.join(PROGRAM_DIRECTORY, "tools")]:
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+# ftot_supporting imports the unit registry from ftot, so it is imported first to avoid a circular import
+import ftot_supporting  # noqa: E402,F401
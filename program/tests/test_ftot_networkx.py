@@ -0,0 +1,139 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: test_ftot_networkx.py
+#
+# Purpose: tests the streamed o-d pair shortest path tasks against the o-d pair dictionary they replace.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import re
+import logging
+import sqlite3
+
+import pytest
+
+nx = pytest.importorskip("networkx")
+import ftot_networkx  # noqa: E402
+
+
+logger = logging.getLogger("test_ftot_networkx")
+
+
+# ===================================================================================================
+
+
+def make_network():
+    # a grid of road links with a rail line across the top row. returns the graph and the edge_id_dict.
+    G = nx.MultiDiGraph()
+    edge_id_dict = {}
+    edge_id = 0
+    links = []
+    for row in range(4):
+        for col in range(4):
+            node = row * 4 + col
+            if col < 3:
+                links.append((node, node + 1, 'road', 1.0 + 0.1 * row))
+            if row < 3:
+                links.append((node, node + 4, 'road', 1.0 + 0.2 * col))
+    links.extend([(0, 3, 'rail', 1.5), (3, 15, 'rail', 2.0)])
+    for a, b, mode, cost in links:
+        for from_node, to_node in [(a, b), (b, a)]:
+            edge_id += 1
+            G.add_edge(from_node, to_node, solid_weight=cost, Length=cost, Mode_Type=mode)
+            edge_id_dict.setdefault(to_node, {}).setdefault(from_node, []).append([edge_id, mode, cost])
+    return G, edge_id_dict
+
+
+def make_od_pairs_db(od_pairs):
+    db_con = sqlite3.connect(":memory:")
+    db_con.execute("""create table od_pairs(scenario_rt_id INTEGER PRIMARY KEY, commodity_id integer,
+                      phase_of_matter text, from_node_id INTEGER, to_node_id INTEGER);""")
+    db_con.execute("""create table route_edges (from_node_id INT, to_node_id INT, edge_id INT,
+                      scenario_rt_id INT, rt_order_ind INT);""")
+    db_con.executemany("insert into od_pairs (commodity_id, phase_of_matter, from_node_id, to_node_id) "
+                       "values (?, 'solid', ?, ?);", od_pairs)
+    return db_con
+
+
+def make_commodity_subgraph_dict(G):
+    # commodity 1 uses all modes and is solved by target, commodity 2 uses road within a max transport
+    # distance of 2.5 and is solved by source
+    road = nx.MultiDiGraph(((a, b, attr) for a, b, attr in G.edges(data=True) if attr['Mode_Type'] == 'road'))
+    commodity_subgraph_dict = {1: {'modes': ['rail', 'road'], 'subgraph': G},
+                               2: {'modes': ['road'], 'subgraph': road, 'MTD': 2.5, 'facility_subgraphs': {}}}
+    for source in [0, 5, 12]:
+        distances = nx.single_source_dijkstra_path_length(road, source, cutoff=2.5, weight='Length')
+        commodity_subgraph_dict[2]['facility_subgraphs'][source] = road.subgraph(distances.keys()).copy()
+    return commodity_subgraph_dict
+
+
+def dict_shortest_paths(db_con, commodity_st, commodity_subgraph_dict, edge_id_dict):
+    # the shortest paths found from the full o-d pair dictionary, as presolve_network did before streaming
+    od_pairs = {}
+    for target, source, rt_id, commodity_id in db_con.execute(
+            "select to_node_id, from_node_id, scenario_rt_id, commodity_id from od_pairs;"):
+        if commodity_st[commodity_id] == 'target':
+            od_pairs.setdefault((commodity_id, target, 'target'), {}).setdefault(source, []).append(rt_id)
+        else:
+            od_pairs.setdefault((commodity_id, source, 'source'), {}).setdefault(target, []).append(rt_id)
+
+    route_edges = []
+    no_path_pairs = []
+    for (commodity_id, node, st), node_pairs in od_pairs.items():
+        G = ftot_networkx.get_shortest_path_graph(commodity_subgraph_dict, commodity_id, node, st)
+        ftot_networkx.node_shortest_paths([G, node_pairs, node, edge_id_dict, 'solid',
+                                           commodity_subgraph_dict[commodity_id]['modes'], st],
+                                          route_edges, no_path_pairs)
+    return route_edges, no_path_pairs
+
+
+# ===================================================================================================
+
+
+def test_streamed_tasks_match_od_pair_dict(monkeypatch, caplog):
+    # small fetches and chunks so nodes span fetches and chunks span nodes and commodities
+    monkeypatch.setattr(ftot_networkx, "OD_PAIRS_FETCH_SIZE", 3)
+    monkeypatch.setattr(ftot_networkx, "OD_PAIRS_CHUNK_SIZE", 4)
+
+    G, edge_id_dict = make_network()
+    commodity_subgraph_dict = make_commodity_subgraph_dict(G)
+    commodity_st = {1: 'target', 2: 'source'}
+    od_pairs = [(1, source, target) for source in [0, 1, 4, 9] for target in [15, 14, 7]]
+    od_pairs += [(2, source, target) for source in [0, 5, 12] for target in [1, 2, 6, 10, 13, 15]]
+    od_pairs += [(2, 0, 2)]
+    db_con = make_od_pairs_db(od_pairs)
+
+    expected_route_edges, expected_no_path_pairs = dict_shortest_paths(db_con, commodity_st,
+                                                                       commodity_subgraph_dict, edge_id_dict)
+
+    ftot_networkx.init_shortest_path_worker(edge_id_dict, commodity_subgraph_dict)
+    no_path_pairs = []
+    with caplog.at_level(logging.DEBUG, logger=logger.name):
+        chunks = list(ftot_networkx.stream_od_pair_tasks(db_con, commodity_st, commodity_subgraph_dict, logger))
+    for chunk in chunks:
+        ftot_networkx.save_shortest_paths(db_con, ftot_networkx.multi_shortest_paths(chunk), no_path_pairs)
+    route_edges = db_con.execute("select * from route_edges;").fetchall()
+
+    # pairs outside the max transport distance are logged, one line per pair, instead of being routed
+    outside_mtd_pairs = [tuple(int(value) for value in re.findall(r"\d+", record.getMessage()))
+                         for record in caplog.records if "outside the max transport distance" in record.getMessage()
+                         and record.levelno == logging.DEBUG]
+
+    assert len(chunks) > 1
+    assert sorted(route_edges) == sorted(expected_route_edges)
+    assert len(outside_mtd_pairs) > 0
+    assert sorted(no_path_pairs + outside_mtd_pairs) == sorted(expected_no_path_pairs)
+
+
+def test_chunks_do_not_split_nodes(monkeypatch):
+    monkeypatch.setattr(ftot_networkx, "OD_PAIRS_FETCH_SIZE", 2)
+    monkeypatch.setattr(ftot_networkx, "OD_PAIRS_CHUNK_SIZE", 5)
+
+    G, edge_id_dict = make_network()
+    commodity_subgraph_dict = make_commodity_subgraph_dict(G)
+    od_pairs = [(1, source, target) for source in [0, 1, 4] for target in [15, 14, 7, 11]]
+    db_con = make_od_pairs_db(od_pairs)
+
+    chunks = list(ftot_networkx.stream_od_pair_tasks(db_con, {1: 'source'}, commodity_subgraph_dict, logger))
+    nodes = [task[1] for chunk in chunks for task in chunk]
+    assert sorted(nodes) == [0, 1, 4]
+    assert [sum(len(rt_ids) for task in chunk for rt_ids in task[2].values()) for chunk in chunks] == [8, 4]
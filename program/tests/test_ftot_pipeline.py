@@ -0,0 +1,92 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: test_ftot_pipeline.py
+#
+# Purpose: tests that the g step fingerprint used to group batch scenarios only changes with the inputs of
+# the s, f, c, and g steps, and not with the folder the inputs are in.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import logging
+from types import SimpleNamespace
+
+import ftot_pipeline
+
+
+logger = logging.getLogger("test_ftot_pipeline")
+
+SCENARIO_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<Scenario xmlns="Schema_v8.0.0">
+    <Scenario_Name>{name}</Scenario_Name>
+    <Scenario_Inputs>
+        <Common_Data_Folder>{folder}</Common_Data_Folder>
+        <Base_RMP_Layer>{folder}/rmp.shp</Base_RMP_Layer>
+        <Destinations_Commodity_Data>{folder}/dest.csv</Destinations_Commodity_Data>
+    </Scenario_Inputs>
+    <Assumptions>
+        <Unmet_Demand_Penalty>{udp}</Unmet_Demand_Penalty>
+    </Assumptions>
+</Scenario>
+"""
+
+
+# ===================================================================================================
+
+
+def make_scenario(folder, udp=5000, name="scenario"):
+    os.makedirs(folder, exist_ok=True)
+    for extension in ['.shp', '.dbf', '.shx']:
+        with open(os.path.join(folder, 'rmp' + extension), 'w') as wf:
+            wf.write("rmp" + extension)
+    with open(os.path.join(folder, 'dest.csv'), 'w') as wf:
+        wf.write("facility_name,value,commodity,units,phase_of_matter,io\ndest_1,10,crude,kgal,liquid,i\n")
+    return write_xml(folder, udp, name)
+
+
+def write_xml(folder, udp, name):
+    xml = os.path.join(folder, 'scenario.xml')
+    with open(xml, 'w') as wf:
+        wf.write(SCENARIO_XML.format(folder=folder, udp=udp, name=name))
+    the_scenario = SimpleNamespace(base_rmp_layer=os.path.join(folder, 'rmp.shp'),
+                                   destinations_commodity_data=os.path.join(folder, 'dest.csv'))
+    return the_scenario, xml
+
+
+def get_fingerprints(the_scenario, xml):
+    return ftot_pipeline.get_step_fingerprints(the_scenario, xml, "2025.1", logger)
+
+
+# ===================================================================================================
+
+
+def test_copied_inputs_have_the_same_g_fingerprint(tmp_path):
+    the_scenario, xml = make_scenario(str(tmp_path / "a"))
+    fingerprints = get_fingerprints(the_scenario, xml)
+
+    # the same inputs copied to another folder
+    shutil.copytree(str(tmp_path / "a"), str(tmp_path / "b"))
+    copy_scenario, copy_xml = write_xml(str(tmp_path / "b"), 5000, "scenario")
+    assert get_fingerprints(copy_scenario, copy_xml) == fingerprints
+
+
+def test_g_fingerprint_ignores_downstream_inputs(tmp_path):
+    the_scenario, xml = make_scenario(str(tmp_path / "a"))
+    fingerprints = get_fingerprints(the_scenario, xml)
+
+    # the UDP is applied in o1 and the scenario name is only used in d
+    other_scenario, other_xml = make_scenario(str(tmp_path / "b"), udp=1000, name="other scenario")
+    other_fingerprints = get_fingerprints(other_scenario, other_xml)
+    assert other_fingerprints['g'] == fingerprints['g']
+    assert other_fingerprints['o1'] != fingerprints['o1']
+
+
+def test_g_fingerprint_changes_with_input_content(tmp_path):
+    the_scenario, xml = make_scenario(str(tmp_path / "a"))
+    fingerprints = get_fingerprints(the_scenario, xml)
+
+    with open(str(tmp_path / "a" / "rmp.dbf"), 'w') as wf:
+        wf.write("changed")
+    changed_fingerprints = get_fingerprints(the_scenario, xml)
+    assert changed_fingerprints['f'] != fingerprints['f']
+    assert changed_fingerprints['s'] == fingerprints['s']
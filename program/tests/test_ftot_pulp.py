@@ -0,0 +1,145 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: test_ftot_pulp.py
+#
+# Purpose: tests that the edges flagged by prune_edges can be left out of the optimization problem
+# without changing its optimal objective, that only the terms of pruned edges are left out, and that the UDP
+# sensitivity results report liquid demand in liquid units.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import logging
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+pulp = pytest.importorskip("pulp")
+import ftot_pulp  # noqa: E402
+
+
+logger = logging.getLogger("test_ftot_pulp")
+
+UNMET_DEMAND_PENALTY = 100.0
+
+# edge_id: (o_vertex_id, d_vertex_id, from_node_id, to_node_id, edge_flow_cost)
+# vertex 1 is a supply of 10 and vertex 2 a demand of 10, joined through network nodes 10 and 11
+EDGES = {1: (1, None, None, 10, 1.0),
+         2: (None, None, 10, 11, 1.0),
+         3: (None, None, 10, 11, 2.0),  # dominated by the cheaper parallel edge 2
+         4: (None, 2, 11, None, 1.0),
+         5: (None, None, 10, 12, 0.5),  # dead end: nothing leaves node 12
+         6: (None, None, 13, 11, 0.1)}  # unreachable: nothing enters node 13
+
+
+# ===================================================================================================
+
+
+def make_main_db(tmp_path):
+    main_db = str(tmp_path / "main.db")
+    with sqlite3.connect(main_db) as main_db_con:
+        main_db_con.executescript("""
+        create table facility_type_id (facility_type_id integer, facility_type text);
+        insert into facility_type_id values (1, 'raw_material_producer'), (2, 'ultimate_destination');
+        create table networkx_nodes (node_id integer, location_id text);
+        insert into networkx_nodes values (10, null), (11, null), (12, null), (13, null);
+        create table vertices (vertex_id integer, facility_id integer, facility_type_id integer,
+        schedule_day integer, storage_vertex integer, supply numeric, demand numeric, activity_level numeric);
+        insert into vertices values (1, 1, 1, 1, 0, 10, null, 1), (2, 2, 2, 1, 0, null, 10, 1);
+        create table edges (edge_id integer, o_vertex_id integer, d_vertex_id integer, from_node_id integer,
+        to_node_id integer, commodity_id integer, source_facility_id integer, start_day integer, end_day integer,
+        mode text, edge_flow_cost numeric, prune_flag integer);
+        """)
+        main_db_con.executemany("insert into edges values (?, ?, ?, ?, ?, 1, 1, 1, 1, 'road', ?, null);",
+                                [(edge_id,) + edge for edge_id, edge in EDGES.items()])
+    return main_db
+
+
+def make_constraint_rows():
+    # supply, demand and conservation of flow rows in the form built by the generate_*_constraint_rows functions
+    rows = [("supply", [('flow', 1, 1)], pulp.LpConstraintLE, 10),
+            ("demand", [('flow', 4, 1), ('unmet', 2, 1)], pulp.LpConstraintEQ, 10)]
+    for node_id in [10, 11, 12, 13]:
+        terms = [('flow', edge_id, 1) for edge_id, edge in EDGES.items() if edge[3] == node_id]
+        terms += [('flow', edge_id, -1) for edge_id, edge in EDGES.items() if edge[2] == node_id]
+        rows.append(("conservation of flow, node {}".format(node_id), terms, pulp.LpConstraintEQ, 0))
+    return rows
+
+
+def solve(edge_ids, pruned_edge_ids):
+    prob = pulp.LpProblem("prune_test", pulp.LpMinimize)
+    var_dicts = {'flow': pulp.LpVariable.dicts("Edge", edge_ids, 0, None),
+                 'unmet': pulp.LpVariable.dicts("UnmetDemand", [2], 0, None)}
+    prob += (pulp.lpSum(EDGES[edge_id][4] * var for edge_id, var in var_dicts['flow'].items()) +
+             UNMET_DEMAND_PENALTY * var_dicts['unmet'][2])
+    prob = ftot_pulp.add_constraint_rows(prob, make_constraint_rows(), var_dicts, pruned_edge_ids)
+    prob.solve(pulp.PULP_CBC_CMD(msg=False))
+    assert pulp.LpStatus[prob.status] == 'Optimal'
+    return pulp.value(prob.objective)
+
+
+# ===================================================================================================
+
+
+def test_pruned_problem_has_same_objective(tmp_path):
+    the_scenario = SimpleNamespace(main_db=make_main_db(tmp_path), capacityOn=False)
+    ftot_pulp.prune_edges(the_scenario, logger)
+    pruned_edge_ids = ftot_pulp.get_pruned_edge_ids(the_scenario)
+
+    assert pruned_edge_ids == {3, 5, 6}
+    full_objective = solve(list(EDGES), set())
+    pruned_objective = solve([edge_id for edge_id in EDGES if edge_id not in pruned_edge_ids], pruned_edge_ids)
+    assert full_objective == pytest.approx(30.0)
+    assert pruned_objective == pytest.approx(full_objective)
+
+
+def test_add_constraint_rows_raises_on_missing_variables():
+    prob = pulp.LpProblem("prune_test", pulp.LpMinimize)
+    var_dicts = {'flow': pulp.LpVariable.dicts("Edge", [1, 2], 0, None), 'unmet': {}}
+    rows = [("row", [('flow', 1, 1), ('flow', 3, 1)], pulp.LpConstraintLE, 10)]
+
+    # the term for edge 3 is only left out when edge 3 is a pruned edge
+    prob = ftot_pulp.add_constraint_rows(prob, rows, var_dicts, {3})
+    assert prob.numConstraints() == 1
+    with pytest.raises(KeyError):
+        ftot_pulp.add_constraint_rows(prob, rows, var_dicts)
+    with pytest.raises(KeyError):
+        ftot_pulp.add_constraint_rows(prob, [("row", [('unmet', 3, 1)], pulp.LpConstraintLE, 10)],
+                                      var_dicts, {3})
+
+
+def test_udp_sensitivity_reports_liquid_demand_in_liquid_units(tmp_path, monkeypatch):
+    # the model holds the liquid demand of 10 kgal as 30 tonnes with a density of 3 tonnes per kgal
+    main_db = str(tmp_path / "main.db")
+    with sqlite3.connect(main_db) as main_db_con:
+        main_db_con.executescript("""
+        create table commodities (commodity_name text, supertype text, phase_of_matter text, density_value numeric);
+        insert into commodities values ('jet', null, 'liquid', 3.0);
+        create table udp_sensitivity_probes (probe_id integer, scaling_factor real);
+        insert into udp_sensitivity_probes values (1, 1.0);
+        """)
+
+    def setup_pulp_problem_rows(the_scenario, logger):
+        unmet_key = (2, 1, 'jet', UNMET_DEMAND_PENALTY)
+        var_dicts = {'flow': pulp.LpVariable.dicts("Edge", [1], 0, None),
+                     'unmet': {unmet_key: pulp.LpVariable("UnmetDemand_2", 0, None)}}
+        prob = pulp.LpProblem("udp_test", pulp.LpMinimize)
+        prob += 1.0 * var_dicts['flow'][1] + UNMET_DEMAND_PENALTY * var_dicts['unmet'][unmet_key]
+        rows = {'supply': [("supply", [('flow', 1, 1)], pulp.LpConstraintLE, 12)],
+                'unmet_demand': [("demand", [('flow', 1, 1), ('unmet', unmet_key, 1)], pulp.LpConstraintEQ, 30)]}
+        return prob, var_dicts, ['supply', 'unmet_demand'], rows
+
+    monkeypatch.setattr(ftot_pulp, "setup_pulp_problem_rows", setup_pulp_problem_rows)
+    the_scenario = SimpleNamespace(main_db=main_db, solver="cbc", time_limit="none",
+                                   default_units_solid_phase="tonne", default_units_liquid_phase="kgal",
+                                   default_units_currency="usd")
+    ftot_pulp.solve_udp_sensitivity(the_scenario, logger)
+
+    with sqlite3.connect(main_db) as main_db_con:
+        results = main_db_con.execute("select commodity_name, total_demand, unmet_demand, demand_units "
+                                      "from udp_sensitivity_results;").fetchall()
+    # 12 of the 30 tonnes are delivered, leaving 18 tonnes (6 kgal) unmet
+    assert len(results) == 1
+    assert results[0][0] == 'jet'
+    assert results[0][1] == pytest.approx(10.0)
+    assert results[0][2] == pytest.approx(6.0)
+    assert results[0][3] == 'kgal'
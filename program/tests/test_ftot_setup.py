@@ -0,0 +1,52 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: test_ftot_setup.py
+#
+# Purpose: tests the disruption data loading and that the GDAL backend of the s step does not need arcpy.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import sys
+import logging
+from types import SimpleNamespace
+
+import ftot_setup
+
+
+logger = logging.getLogger("test_ftot_setup")
+
+
+# ===================================================================================================
+
+
+def write_disruption_csv(tmp_path):
+    disruption_csv = tmp_path / "disruption.csv"
+    disruption_csv.write_text("mode,unique_link_id,link_availability\n"
+                              "road,10,0\n"
+                              "road,11,0.5\n"
+                              "rail,3,1.5\n"
+                              "rail,4,0.25\n"
+                              ",,\n")
+    return str(disruption_csv)
+
+
+def test_load_disruption_data(tmp_path):
+    the_scenario = SimpleNamespace(disruption_data=write_disruption_csv(tmp_path))
+    disruption_dict = ftot_setup.load_disruption_data(the_scenario, logger)
+    # availability outside 0 to 1 is ignored
+    assert disruption_dict == {'road': {10: 0.0, 11: 0.5}, 'rail': {4: 0.25}}
+
+
+def test_gdal_backend_does_not_need_arcpy(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ftot_setup, "copy_main_gdb_gdal", lambda the_scenario, logger: calls.append('copy'))
+    monkeypatch.setattr(ftot_setup, "apply_network_disruption_gdal",
+                        lambda the_scenario, disruption_dict, logger: calls.append(('disrupt', disruption_dict)))
+    monkeypatch.setattr(ftot_setup, "set_intermodal_links_gdal", lambda the_scenario, logger: calls.append('intermodal'))
+    # any import of arcpy fails
+    monkeypatch.setitem(sys.modules, "arcpy", None)
+
+    the_scenario = SimpleNamespace(artificial_link_backend='gdal', impedance_weights_data="None",
+                                   disruption_data=write_disruption_csv(tmp_path), main_gdb=str(tmp_path / "main.gdb"))
+    ftot_setup.create_main_gdb(logger, the_scenario)
+
+    assert calls == ['copy', ('disrupt', {'road': {10: 0.0, 11: 0.5}, 'rail': {4: 0.25}}), 'intermodal']
@@ -0,0 +1,64 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: test_ftot_supporting_gis.py
+#
+# Purpose: tests that network links are split once at all of their artificial link snap points, including
+# points at the line ends, duplicate points, and points off the line within the snapping tolerance.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import pytest
+
+import ftot_supporting_gis
+
+
+# ===================================================================================================
+
+
+class ShapelyPolyline(object):
+    # the arcpy Polyline methods used by cut_lines, backed by a shapely line
+    def __init__(self, line):
+        self.line = line
+        self.length = line.length
+
+    def measureOnLine(self, point):
+        return self.line.project(point)
+
+    def distanceTo(self, point):
+        return self.line.distance(point)
+
+    def segmentAlongLine(self, start, end):
+        from shapely.ops import substring
+        return ShapelyPolyline(substring(self.line, start, end))
+
+
+# ===================================================================================================
+
+
+def test_split_intervals_cover_the_line():
+    assert ftot_supporting_gis.get_split_intervals(10.0, [7.0, 2.5]) == [(0.0, 2.5), (2.5, 7.0), (7.0, 10.0)]
+    assert ftot_supporting_gis.get_split_intervals(10.0, []) == [(0.0, 10.0)]
+
+
+def test_split_intervals_skip_line_ends():
+    # cutting at either end of the line would leave an empty segment
+    assert ftot_supporting_gis.get_split_intervals(10.0, [0.0, 10.0]) == [(0.0, 10.0)]
+    assert ftot_supporting_gis.get_split_intervals(10.0, [0.0, 4.0, 10.0]) == [(0.0, 4.0), (4.0, 10.0)]
+
+
+def test_split_intervals_skip_duplicate_measures():
+    assert ftot_supporting_gis.get_split_intervals(10.0, [4.0, 4.0, 6.0, 4.0]) == [(0.0, 4.0), (4.0, 6.0),
+                                                                                  (6.0, 10.0)]
+
+
+def test_cut_lines_uses_points_within_tolerance():
+    shapely = pytest.importorskip("shapely")
+    in_line = ShapelyPolyline(shapely.LineString([(0, 0), (10, 0)]))
+    # on the line, 0.5 off the line (within the 1.0 tolerance), a duplicate of the first point, 2.0 off the line,
+    # and at the line end
+    points = [shapely.Point(3, 0), shapely.Point(6, 0.5), shapely.Point(3, 0), shapely.Point(8, 2.0),
+              shapely.Point(10, 0)]
+
+    split_lines = ftot_supporting_gis.cut_lines(in_line, points)
+    assert [list(split_line.line.coords) for split_line in split_lines] == [[(0, 0), (3, 0)],
+                                                                            [(3, 0), (6, 0)],
+                                                                            [(6, 0), (10, 0)]]
@@ -0,0 +1,77 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: test_network_disruption_tool.py
+#
+# Purpose: tests the exposure grid sampling of the network disruption tool against the distance from each
+# network line to each exposed grid cell.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+np = pytest.importorskip("numpy")
+shapely = pytest.importorskip("shapely")
+import network_disruption_tool  # noqa: E402
+
+
+# ===================================================================================================
+
+
+def make_exposure_grid(path, grid):
+    # 2 x 2 meter cells with the upper left corner at (100, 300) and -1 as nodata
+    raster = gdal.GetDriverByName("GTiff").Create(path, grid.shape[1], grid.shape[0], 1, gdal.GDT_Float64)
+    raster.SetGeoTransform((100.0, 2.0, 0, 300.0, 0, -2.0))
+    band = raster.GetRasterBand(1)
+    band.SetNoDataValue(-1)
+    band.WriteArray(grid)
+    raster = None
+
+
+def get_expected_exposure(grid, line, tolerance):
+    # maximum exposure of the cells that the line crosses or that are within the tolerance of the line
+    exposure = 0
+    for row in range(grid.shape[0]):
+        for col in range(grid.shape[1]):
+            cell = shapely.box(100 + 2 * col, 300 - 2 * (row + 1), 100 + 2 * (col + 1), 300 - 2 * row)
+            if grid[row, col] > 0 and line.distance(cell) <= tolerance:
+                exposure = max(exposure, grid[row, col])
+    return exposure
+
+
+# ===================================================================================================
+
+
+@pytest.mark.parametrize("window_cells", [4, 7, 2048])
+@pytest.mark.parametrize("tolerance", [0, 3, 7.5])
+def test_sample_exposure_grid(tmp_path, monkeypatch, window_cells, tolerance):
+    rng = np.random.default_rng(1)
+    grid = rng.integers(0, 5, (37, 53)).astype(np.float64)
+    grid[rng.random(grid.shape) < 0.1] = -1
+    grid_path = str(tmp_path / "exposure.tif")
+    make_exposure_grid(grid_path, grid)
+    lines = [shapely.LineString(rng.uniform([90, 210], [220, 310], (3, 2))) for i in range(30)]
+
+    # small windows so that the lines cross several of them
+    monkeypatch.setattr(network_disruption_tool, "WINDOW_CELLS", window_cells)
+    network_lines = {'link_ids': list(range(len(lines))), 'lines': np.array(lines), 'spatial_ref': None}
+    link_ids, link_exposure = network_disruption_tool.sample_exposure_grid(grid_path, network_lines,
+                                                                           "{} meters".format(tolerance))
+
+    assert link_ids == list(range(len(lines)))
+    assert link_exposure == [get_expected_exposure(grid, line, tolerance) for line in lines]
+
+
+def test_search_tolerance_is_a_distance(tmp_path):
+    # the exposed cell is diagonal to the cell under the line. it is in the square box of the search tolerance
+    # around the line, but farther away than the tolerance
+    grid = np.zeros((5, 5))
+    grid[0, 0] = 1
+    grid_path = str(tmp_path / "exposure.tif")
+    make_exposure_grid(grid_path, grid)
+    network_lines = {'link_ids': [1], 'lines': np.array([shapely.LineString([(105, 295), (105, 291)])]),
+                     'spatial_ref': None}
+
+    link_ids, link_exposure = network_disruption_tool.sample_exposure_grid(grid_path, network_lines, "3 meters")
+    assert link_exposure == [0]
+    link_ids, link_exposure = network_disruption_tool.sample_exposure_grid(grid_path, network_lines, "4.5 meters")
+    assert link_exposure == [1]
@@ -0,0 +1,100 @@
+# ---------------------------------------------------------------------------------------------------
+# Name: test_synthetic_benchmark_tool.py
+#
+# Purpose: smoke tests of the synthetic network and scenario generator of the synthetic benchmark tool.
+#
+# ---------------------------------------------------------------------------------------------------
+
+import os
+import random
+import sqlite3
+
+import pytest
+
+import ftot_supporting
+import synthetic_benchmark_tool as sbt
+
+
+# ===================================================================================================
+
+
+def count_components(num_nodes, links):
+    parent = list(range(num_nodes))
+
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for i, j in links:
+        parent[find(i)] = find(j)
+    return len(set(find(i) for i in range(num_nodes)))
+
+
+# ===================================================================================================
+
+
+def test_grid_network():
+    nodes, links = sbt.make_grid_network(10)
+    assert len(nodes) == 10
+    # a 4 wide grid of 10 nodes: 7 horizontal and 6 vertical links
+    assert len(links) == 13
+    assert all(0 <= i < 10 and 0 <= j < 10 and i != j for i, j in links)
+    assert count_components(10, links) == 1
+
+
+def test_random_network_is_connected():
+    nodes, links = sbt.make_random_network(200, random.Random(7))
+    assert len(nodes) == 200
+    assert len(set(links)) == len(links)
+    assert count_components(200, links) == 1
+
+
+def test_make_facilities():
+    nodes, links = sbt.make_grid_network(25)
+    facilities = sbt.make_facilities(nodes, 5, 2, random.Random(1))
+    facility_types = [facility['facility_type'] for facility in facilities]
+    assert facility_types.count('raw_material_producer') == 3
+    assert facility_types.count('ultimate_destination') == 2
+    assert len(set(facility['node'] for facility in facilities)) == 5
+    assert all(len(facility['quantities']) == 2 for facility in facilities)
+
+
+def test_generated_inputs_load(tmp_path):
+    # the scenario XML passes the schema and the main.db holds the facilities and commodities
+    from ftot_scenario import load_scenario_config_file
+
+    num_days = 3
+    nodes, links = sbt.make_grid_network(16)
+    facilities = sbt.make_facilities(nodes, 4, 2, random.Random(3))
+    scen_path = str(tmp_path / "synthetic")
+    os.makedirs(scen_path)
+    input_dir = sbt.write_input_csvs(scen_path, facilities, 2, num_days)
+    xml_path = sbt.write_scenario_xml(scen_path, input_dir, "synthetic")
+    main_db = sbt.write_main_db(scen_path, facilities, 2, num_days)
+
+    logger = ftot_supporting.create_loggers(scen_path, "test")
+    xsd = os.path.join(os.path.dirname(sbt.TEMPLATE_XML), "Master_FTOT_Schema.xsd")
+    the_scenario = load_scenario_config_file(xml_path, xsd, logger)
+    assert the_scenario.permittedModes == ['road']
+    assert the_scenario.rmp_commodity_data == os.path.join(input_dir, 'rmp.csv')
+
+    with sqlite3.connect(main_db) as db_con:
+        assert db_con.execute("select count(*) from facilities;").fetchone()[0] == 4
+        assert db_con.execute("select count(*) from facility_commodities;").fetchone()[0] == 8
+        assert db_con.execute("select count(*) from schedules;").fetchone()[0] == num_days + 1
+        assert db_con.execute("select count(*) from facility_commodities where io = 'i' and udp is null;").fetchone()[0] == 0
+
+
+def test_generate_synthetic_scenario(tmp_path):
+    pytest.importorskip("osgeo")
+    from osgeo import ogr
+
+    scen_path = str(tmp_path / "synthetic")
+    xml_path = sbt.generate_synthetic_scenario(scen_path, 'grid', 16, 4, 2, 3, seed=5)
+    assert os.path.exists(xml_path)
+
+    gdb = ogr.Open(os.path.join(scen_path, 'main.gdb'))
+    # 24 grid links and an artificial link for the _IN and _OUT location of each facility
+    assert gdb.GetLayerByName('road').GetFeatureCount() == 24 + 8
+    assert gdb.GetLayerByName('locations').GetFeatureCount() == 8
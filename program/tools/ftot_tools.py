@@ -3,12 +3,14 @@ import lxml_upgrade_tool
 import run_upgrade_tool
 import input_csv_templates_tool
 import scenario_compare_tool
-# import gridded_data_tool
+import gridded_data_tool
 import xml_text_replacement_tool
 import network_disruption_tool
 import network_validation_tool as nvt
 import scenario_setup_conversion_tool as ssct
 import udp_sensitivity_tool
+import solver_benchmark_tool
+import synthetic_benchmark_tool
 from six.moves import input
 
 FTOT_VERSION = "2025.4"
@@ -55,10 +57,10 @@ def compare_tool():
     input("Press [Enter] to continue...")
 
 
-# def raster_tool():
-#     print("You called the aggregate raster data tool")
-#     gridded_data_tool.run()
-#     input("Press [Enter] to continue...")
+def raster_tool():
+    print("You called the aggregate raster data tool")
+    gridded_data_tool.run()
+    input("Press [Enter] to continue...")
 
 
 def disrupt_tool():
@@ -85,6 +87,18 @@ def run_udp_sensitivity_tool():
     input("Press [Enter] to continue...")
 
 
+def run_solver_benchmark_tool():
+    print("You called the solver benchmark tool")
+    solver_benchmark_tool.run()
+    input("Press [Enter] to continue...")
+
+
+def run_synthetic_benchmark_tool():
+    print("You called the synthetic benchmark tool")
+    synthetic_benchmark_tool.run()
+    input("Press [Enter] to continue...")
+
+
 def help_tool():
     print("-----------------------------------------")
     print("xml_tool:")
@@ -111,10 +125,10 @@ def help_tool():
     print("This tool combines results from multiple scenarios into a single Tableau workbook.")
     print("-----------------------------------------")
 
-#    print("-----------------------------------------")
-#    print("aggregate_raster_data:")
-#    print("This tool aggregates grid cell production data at a county level.")
-#    print("-----------------------------------------")
+    print("-----------------------------------------")
+    print("aggregate_raster_data:")
+    print("This tool aggregates grid cell production data at a county level and writes a raw material producer CSV for each raster.")
+    print("-----------------------------------------")
 
     print("-----------------------------------------")
     print("network_disruption_tool:")
@@ -137,6 +151,16 @@ def help_tool():
     print("This tool allows you to perform a sensitivity analysis on the unmet demand penalty (UDP) parameter to weigh the tradeoff between maximizing demand delivery and the cost of that transport.")
     print("-----------------------------------------")
 
+    print("-----------------------------------------")
+    print("solver_benchmark_tool:")
+    print("This tool re-runs the o2 step of existing scenarios with the CBC, HiGHS, and min-cost-flow (MCF) solvers and compares their objective values and runtimes.")
+    print("-----------------------------------------")
+
+    print("-----------------------------------------")
+    print("synthetic_benchmark_tool:")
+    print("This tool generates a synthetic road network scenario of a chosen size and records the wall time, peak memory, and model size of each FTOT step.")
+    print("-----------------------------------------")
+
     input("Press [Enter] to continue...")
 
 
@@ -146,11 +170,13 @@ menuItems = [
     {"generate_template_csv_files": csv_tool},
     {"replace_xml_text": replace_xml_text_tool},
     {"scenario_compare_tool": compare_tool},
-#    {"aggregate_raster_data": raster_tool},
+    {"aggregate_raster_data": raster_tool},
     {"network_disruption_tool": disrupt_tool},
     {"network_validation_tool": network_validation_tool},
     {"scenario_setup_conversion_tool": scenario_setup_conversion_tool},
     {"udp_sensitivity_tool": run_udp_sensitivity_tool},
+    {"solver_benchmark_tool": run_solver_benchmark_tool},
+    {"synthetic_benchmark_tool": run_synthetic_benchmark_tool},
     {"help": help_tool},
     {"exit": exit}
 ]
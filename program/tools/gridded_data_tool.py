@@ -1,30 +1,229 @@
-import arcpy
 import os
+import tempfile
+from shutil import rmtree
 from six.moves import input
 
 # THIS SCRIPT IS USED TO AGGREGATE GRID CELL PRODUCTION DATA, E.G., FBEP OR USDA, BY COUNTY
+# The county polygons are rasterized onto each input grid with GDAL and the cell values are summed by county
+# with numpy, reading the grid in blocks of rows so memory use does not grow with the size of the grid.
 countyLyr = r"C:\FTOT\scenarios\common_data\base_layers\cb_2024_us_county_500k.shp"
 
+# lower 48 states, in decimal degrees (xmin ymin xmax ymax)
+rectangle = "-124.848974 24.396308 -66.885444 49.384358"
+
+# 5 arc-minute is about 10 square kilometers
+sqKilometersPer5ArcMinute = 10
+hectaresPerSqKilometer = 100
+hectareArea = sqKilometersPer5ArcMinute * hectaresPerSqKilometer
+
+# number of grid rows read at a time
+ROWS_PER_BLOCK = 1024
+
 
 # ==============================================================================
 
 def get_user_input():
     print("start: get_user_input")
-    return input(">>> input raster: ")
+    input_rasters = []
+    while len(input_rasters) == 0:
+        print("input raster(s), separate multiple rasters with a comma:")
+        value = input(">>> input raster: ")
+        input_rasters = [r.strip().strip('\"') for r in value.split(',') if r.strip() != '']
+        for input_raster in input_rasters:
+            if not os.path.exists(input_raster):
+                print("Path is not valid: {}".format(input_raster))
+                input_rasters = []
+                break
+
+    print("county layer (press Enter for {}):".format(countyLyr))
+    county_layer = input(">>> county layer: ").strip().strip('\"')
+    if county_layer == "":
+        county_layer = countyLyr
+
+    print("multiplier applied to each cell value (press Enter for {}, the hectares in a 5 arc-minute cell):".format(hectareArea))
+    cell_multiplier = None
+    while cell_multiplier is None:
+        value = input(">>> cell multiplier: ").strip()
+        if value == "":
+            cell_multiplier = hectareArea
+            break
+        try:
+            cell_multiplier = float(value)
+        except ValueError:
+            print("must be a number")
+
+    return input_rasters, county_layer, cell_multiplier
+
+
+# ==============================================================================
+
+def get_clip_window(raster):
+    # returns the (xoff, yoff, xsize, ysize) window of the raster inside the lower 48 rectangle
+    from osgeo import osr
+
+    geotransform = raster.GetGeoTransform()
+    xmin, ymin, xmax, ymax = [float(v) for v in rectangle.split()]
+
+    corners = [(xmin, ymin), (xmin, ymax), (xmax, ymin), (xmax, ymax)]
+    raster_srs = raster.GetSpatialRef()
+    if raster_srs is not None:
+        wgs84 = osr.SpatialReference()
+        wgs84.ImportFromEPSG(4326)
+        wgs84.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        raster_srs = raster_srs.Clone()
+        raster_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        if not raster_srs.IsSame(wgs84):
+            transform = osr.CoordinateTransformation(wgs84, raster_srs)
+            corners = [transform.TransformPoint(x, y)[:2] for x, y in corners]
+
+    # convert to column and row, assuming a north-up grid
+    columns = [(x - geotransform[0]) / geotransform[1] for x, y in corners]
+    rows = [(y - geotransform[3]) / geotransform[5] for x, y in corners]
+    xoff = max(0, int(min(columns)))
+    yoff = max(0, int(min(rows)))
+    xend = min(raster.RasterXSize, int(max(columns)) + 1)
+    yend = min(raster.RasterYSize, int(max(rows)) + 1)
+    if xend <= xoff or yend <= yoff:
+        raise Exception("The raster does not overlap the lower 48 states")
+    return xoff, yoff, xend - xoff, yend - yoff
+
+
+# ==============================================================================
+
+def rasterize_counties(county_layer, raster, window, temp_folder):
+    # burns the county polygons onto the grid of the raster window, one zone number per county (0 outside the
+    # counties). a cell belongs to a county when its center is inside the county. returns the path of the zone
+    # grid and the GEOID of each zone number.
+    from osgeo import gdal, ogr, osr
+
+    print("start: rasterize_counties")
+    counties = ogr.Open(county_layer)
+    if counties is None:
+        raise Exception("Unable to open {}".format(county_layer))
+    in_layer = counties.GetLayer(0)
+    if in_layer.GetLayerDefn().GetFieldIndex("GEOID") < 0:
+        raise Exception("The county layer {} must have a GEOID field".format(county_layer))
+
+    raster_srs = raster.GetSpatialRef()
+    transform = None
+    if raster_srs is not None and in_layer.GetSpatialRef() is not None:
+        county_srs = in_layer.GetSpatialRef().Clone()
+        raster_srs = raster_srs.Clone()
+        county_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        raster_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        if not county_srs.IsSame(raster_srs):
+            transform = osr.CoordinateTransformation(county_srs, raster_srs)
+
+    # in-memory copy of the counties in the raster projection with an integer zone number
+    zone_ds = ogr.GetDriverByName('Memory').CreateDataSource('zones')
+    zone_layer = zone_ds.CreateLayer('zones', raster_srs, ogr.wkbMultiPolygon)
+    zone_layer.CreateField(ogr.FieldDefn('zone', ogr.OFTInteger))
+    geoids = [None]
+    for feature in in_layer:
+        geom = feature.GetGeometryRef()
+        # counties without a GEOID have no facility name, so their cells are not assigned to a zone
+        if geom is None or feature.GetField("GEOID") is None:
+            continue
+        geom = geom.Clone()
+        if transform is not None:
+            geom.Transform(transform)
+        zone_feature = ogr.Feature(zone_layer.GetLayerDefn())
+        zone_feature.SetGeometry(geom)
+        zone_feature.SetField('zone', len(geoids))
+        zone_layer.CreateFeature(zone_feature)
+        geoids.append(str(feature.GetField("GEOID")))
+
+    xoff, yoff, xsize, ysize = window
+    geotransform = list(raster.GetGeoTransform())
+    geotransform[0] += xoff * geotransform[1] + yoff * geotransform[2]
+    geotransform[3] += xoff * geotransform[4] + yoff * geotransform[5]
+
+    # the zone grid is written to disk so it can be read in blocks like the input raster
+    zone_grid = os.path.join(temp_folder, "zones_{}.tif".format(len(os.listdir(temp_folder))))
+    zone_raster = gdal.GetDriverByName('GTiff').Create(zone_grid, xsize, ysize, 1, gdal.GDT_Int32,
+                                                       options=['TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=IF_SAFER'])
+    zone_raster.SetGeoTransform(geotransform)
+    if raster_srs is not None:
+        zone_raster.SetSpatialRef(raster_srs)
+    gdal.RasterizeLayer(zone_raster, [1], zone_layer, options=['ATTRIBUTE=zone'])
+    zone_raster = None
+    zone_ds = None
+    counties = None
+
+    return zone_grid, geoids
+
+
+# ==============================================================================
+
+def sum_by_zone(raster, zone_grid, window, zone_count):
+    # sums the valid cell values of each zone, reading ROWS_PER_BLOCK rows at a time.
+    # returns the sum and the number of valid cells of each zone.
+    from osgeo import gdal
+    import numpy as np
+
+    band = raster.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+    # keep the zone dataset referenced while its band is read
+    zone_raster = gdal.Open(zone_grid)
+    zone_band = zone_raster.GetRasterBand(1)
+
+    xoff, yoff, xsize, ysize = window
+    zone_sums = np.zeros(zone_count, dtype=np.float64)
+    zone_cells = np.zeros(zone_count, dtype=np.int64)
+    for row in range(0, ysize, ROWS_PER_BLOCK):
+        rows = min(ROWS_PER_BLOCK, ysize - row)
+        values = band.ReadAsArray(xoff, yoff + row, xsize, rows).astype(np.float64)
+        zones = zone_band.ReadAsArray(0, row, xsize, rows)
+
+        valid = (zones > 0) & np.isfinite(values)
+        if nodata is not None:
+            valid &= values != nodata
+        zone_sums += np.bincount(zones[valid], weights=values[valid], minlength=zone_count)
+        zone_cells += np.bincount(zones[valid], minlength=zone_count)
+
+    zone_band = None
+    zone_raster = None
+
+    return zone_sums, zone_cells
 
 
 # ==============================================================================
 
-def cleanup(gdb):
-    print("start: cleanup")
-    if arcpy.Exists(gdb):
+def write_county_facilities(county_layer, out_gdb):
+    # copies the counties into a gdb with the Facility_Name field used by the facility csv
+    from osgeo import ogr
+
+    print("start: ...\\create_output_counties_fc")
+    if os.path.exists(out_gdb):
         print("start: delete existing gdb")
-        print("gdb file location: " + gdb)
+        print("gdb file location: " + out_gdb)
         try:
-            arcpy.Delete_management(gdb)
+            rmtree(out_gdb)
         except:
-            print("could not delete " + gdb)
-            raise Exception("could not delete " + gdb)
+            print("could not delete " + out_gdb)
+            raise Exception("could not delete " + out_gdb)
+
+    counties = ogr.Open(county_layer)
+    in_layer = counties.GetLayer(0)
+    gdb = ogr.GetDriverByName('OpenFileGDB').CreateDataSource(out_gdb)
+    if gdb is None:
+        raise Exception("Unable to create {}. GDAL 3.6 or later is required to write file geodatabases.".format(out_gdb))
+    out_layer = gdb.CreateLayer("rmp_counties", in_layer.GetSpatialRef(), ogr.wkbMultiPolygon)
+    out_layer.CreateField(ogr.FieldDefn("GEOID", ogr.OFTString))
+    out_layer.CreateField(ogr.FieldDefn("Facility_Name", ogr.OFTString))
+
+    gdb.StartTransaction(force=True)
+    for feature in in_layer:
+        out_feature = ogr.Feature(out_layer.GetLayerDefn())
+        geom = feature.GetGeometryRef()
+        if geom is not None:
+            out_feature.SetGeometry(ogr.ForceToMultiPolygon(geom.Clone()))
+        out_feature.SetField("GEOID", feature.GetField("GEOID"))
+        out_feature.SetField("Facility_Name", "rmp_" + str(feature.GetField("GEOID")))
+        out_layer.CreateFeature(out_feature)
+    gdb.CommitTransaction()
+    gdb = None
+    counties = None
 
 
 # ==============================================================================
@@ -33,81 +232,63 @@ def aggregate_raster():
 
     """aggregates the rasters by county"""
     print("start: aggregate_raster")
-    inputRaster = get_user_input()
-    outFolder = os.path.dirname(inputRaster)
-    raster_name = str(os.path.basename(inputRaster))
-    outGdbName = str(raster_name + ".gdb")
-    tempGdb = os.path.join(outFolder, outGdbName)
-    outputCounties = str(os.path.join(tempGdb,raster_name))
-
-    cleanup(tempGdb)
-    if not arcpy.Exists(tempGdb):
-        arcpy.CreateFileGDB_management(outFolder, outGdbName)
-    outPoints = os.path.join(tempGdb, "outPoints")
-    clippedRaster = os.path.join(tempGdb, "clippedFBEP")
-    joinOutput = os.path.join(tempGdb, "joinOutput")
-
-    # 5 arc-minute is about 10 square kilometers
-    sqKilometersPer5ArcMinute = 10
-    hectaresPerSqKilometer = 100
-    hectareArea = sqKilometersPer5ArcMinute * hectaresPerSqKilometer
-
-    rectangle = "-124.848974 24.396308 -66.885444 49.384358"
-    print("start: clip_management")
-    arcpy.Clip_management(inputRaster, rectangle, clippedRaster)
-
-    print("start: raster_to_point_conversion")
-    arcpy.RasterToPoint_conversion(clippedRaster, outPoints)
-
-    print("start: project_management")
-    arcpy.Project_management(countyLyr, os.path.join(tempGdb, "counties_projected"), arcpy.Describe(outPoints).spatialReference)
-
-    print("start: spatial_join")
-    arcpy.SpatialJoin_analysis(outPoints, os.path.join(tempGdb, "counties_projected"), joinOutput, "JOIN_ONE_TO_ONE",
-                               "KEEP_COMMON", "", "COMPLETELY_WITHIN")
-
-    # countyProdDict[FIPS] = total tons
-    countyProdDict = {}
-    print("start: raster_output")
-    print("start: ...\\create_county_production_dictionary loop")
-    for row in arcpy.da.SearchCursor(joinOutput, ["GEOID", "grid_code"]):
-        if row[0] not in countyProdDict:
-            countyProdDict[row[0]] = row[1] * hectareArea
-        else:
-            countyProdDict[row[0]] += row[1] * hectareArea
+    try:
+        from osgeo import gdal
+        import numpy as np
+    except ImportError:
+        error = "GDAL and numpy are required to run this tool"
+        print(error)
+        raise ImportError(error)
 
-    print("start: ...\\create_output_counties_fc")
-    arcpy.CopyFeatures_management(countyLyr, outputCounties)
+    input_rasters, county_layer, cell_multiplier = get_user_input()
+    outFolder = os.path.dirname(input_rasters[0])
 
-    print("start: ...\\add_fields_to_county_output_fc")
-    arcpy.AddField_management(outputCounties, "Facility_Name", "TEXT")
+    temp_folder = tempfile.mkdtemp(prefix="gridded_data_", dir=outFolder)
 
-    print("start: ...\\calculate_field_for_facility_name")
-    arcpy.CalculateField_management(in_table=outputCounties, field="Facility_Name",
-                                    expression="'rmp_'+!GEOID!", expression_type="PYTHON_9.3", code_block="")
+    # rasters on the same grid share one zone grid
+    zone_grids = {}
 
-    print("start: create_csv")
-    filename = str("rmp_" + commodity + ".csv")
     facility_type = "raw_material_producer"
     units = "kg"
     phase_of_matter = "solid"
 
-    a_filename = os.path.join(outFolder, filename)
-    with open(a_filename, 'w') as wf:
-        # write the header line
-        header_line = "facility_name,facility_type,commodity,value,units,phase_of_matter,io"
-        wf.write(str(header_line + "\n"))
-        for key in countyProdDict:
-            record = "{},{},{},{},{},{},{}".format(str("rmp_"+key), facility_type, raster_name, countyProdDict[key],
-                                                   units,
-                                                   phase_of_matter, 'o')
-            wf.write(str(record + "\n"))
-
-    print("start: delete_temp_layers")
-    arcpy.Delete_management(outPoints)
-    arcpy.Delete_management(clippedRaster)
-    arcpy.Delete_management(joinOutput)
-    arcpy.Delete_management(counties_projected)
+    try:
+        for inputRaster in input_rasters:
+            raster_name = os.path.splitext(os.path.basename(inputRaster))[0]
+            print("start: {}".format(raster_name))
+            raster = gdal.Open(inputRaster)
+            if raster is None:
+                raise Exception("Unable to open {}".format(inputRaster))
+
+            window = get_clip_window(raster)
+            grid_key = (raster.GetGeoTransform(), raster.RasterXSize, raster.RasterYSize,
+                        raster.GetProjectionRef(), window)
+            if grid_key not in zone_grids:
+                zone_grids[grid_key] = rasterize_counties(county_layer, raster, window, temp_folder)
+            zone_grid, geoids = zone_grids[grid_key]
+
+            print("start: sum_by_zone")
+            zone_sums, zone_cells = sum_by_zone(raster, zone_grid, window, len(geoids))
+            raster = None
+
+            print("start: create_csv")
+            a_filename = os.path.join(outFolder, "rmp_" + raster_name + ".csv")
+            with open(a_filename, 'w') as wf:
+                # write the header line
+                header_line = "facility_name,facility_type,commodity,value,units,phase_of_matter,io"
+                wf.write(str(header_line + "\n"))
+                for zone in np.nonzero(zone_cells)[0]:
+                    record = "{},{},{},{},{},{},{}".format("rmp_" + geoids[zone], facility_type, raster_name,
+                                                           zone_sums[zone] * cell_multiplier, units,
+                                                           phase_of_matter, 'o')
+                    wf.write(str(record + "\n"))
+            print("facility csv: {}".format(a_filename))
+
+        write_county_facilities(county_layer, os.path.join(outFolder, "rmp_counties.gdb"))
+
+    finally:
+        print("start: delete_temp_layers")
+        rmtree(temp_folder, ignore_errors=True)
 
     print("finish: aggregate_raster")
     return
@@ -117,4 +298,3 @@ def aggregate_raster():
 
 def run():
     aggregate_raster()
-
@@ -1,14 +1,31 @@
-import arcpy
 import os
 import datetime
 import csv
+import math
 
-# The following code takes a GIS-based raster dataset representing exposure data (such as a flood depth grid dataset
+# The following code takes GIS-based raster datasets representing exposure data (such as a flood depth grid dataset
 # from HAZUS or some other source) and determines the maximum exposure value for each network segment
 # within a user-specified tolerance. This is then converted to a level of disruption (defined as link
 # availability). The current version of the tool simply has a binary result (link is either fully exposed or not
 # exposed). Segments with no exposure are not included in the output. This output can also be generated manually if it
 # is easier to manually identify exposed segments. This tool only currently works with the rail and road modes.
+# The exposure grids are read with GDAL and sampled along the network lines with numpy and shapely, so the tool
+# does not require arcpy or the Spatial Analyst extension.
+
+
+# ==============================================================================
+
+# conversion of the search tolerance units to meters
+TOLERANCE_UNITS = {'meter': 1.0, 'meters': 1.0, 'm': 1.0,
+                   'kilometer': 1000.0, 'kilometers': 1000.0, 'km': 1000.0,
+                   'foot': 0.3048, 'feet': 0.3048, 'ft': 0.3048,
+                   'mile': 1609.344, 'miles': 1609.344, 'mi': 1609.344}
+
+# approximate length of a degree, for exposure grids in a geographic coordinate system
+METERS_PER_DEGREE = 111320.0
+
+# the exposure grid is read in square windows of this many cells (plus the search tolerance around them)
+WINDOW_CELLS = 2048
 
 
 # ==============================================================================
@@ -19,10 +36,12 @@ def run_network_disruption_tool():
     print("")
     print("")
 
-    if arcpy.CheckExtension("Spatial") == "Available":
-        print("Spatial Analyst is available. Network Disruption tool will run.")
-    else:
-        error = ("Unable to get ArcGIS Pro spatial analyst extension, which is required to run this tool")
+    try:
+        from osgeo import gdal, ogr, osr
+        import numpy as np
+        import shapely
+    except ImportError:
+        error = ("GDAL, numpy and shapely 2.0 or later are required to run this tool")
         raise Exception(error)
 
     network_disruption_prep()
@@ -49,7 +68,7 @@ def network_disruption_prep():
     if rail_y_n == 'y':
         mode_list.append("rail")
 
-    input_exposure_grid = get_input_exposure_data()
+    input_exposure_grids = get_input_exposure_data()
 
     input_exposure_grid_field = get_input_exposure_data_field()
 
@@ -63,100 +82,201 @@ def network_disruption_prep():
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    output_gdb = 'disruption_analysis.gdb'
-    full_path_to_output_gdb = os.path.join(output_dir, output_gdb)
-
-    if arcpy.Exists(full_path_to_output_gdb):
-        arcpy.Delete_management(full_path_to_output_gdb)
-        print('Deleted existing ' + full_path_to_output_gdb)
-    arcpy.CreateFileGDB_management(output_dir, output_gdb)
-
-    arcpy.env.workspace = full_path_to_output_gdb
-
     # MAIN
     # ---------------------------------------------------------------------------
 
     txt_output_fields = ['mode', 'unique_link_id', 'link_availability', input_exposure_grid_field]
 
-    # Export to txt file
-    csv_out = os.path.join(output_dir, "disruption.csv")
+    # read the network lines once, they are sampled against every exposure grid
+    network_lines = {}
+    for mode in mode_list:
+        print('Reading network lines for mode: {}...'.format(mode))
+        network_lines[mode] = read_network_lines(network, mode)
 
-    with open(csv_out, "w", newline='') as f:
-        wr = csv.writer(f)
-        wr.writerow(txt_output_fields)
+    for input_exposure_grid in input_exposure_grids:
 
-    for mode in mode_list:
+        # one disruption csv per exposure grid
+        if len(input_exposure_grids) == 1:
+            csv_out = os.path.join(output_dir, "disruption.csv")
+        else:
+            grid_name = os.path.splitext(os.path.basename(input_exposure_grid.rstrip('\\/')))[0]
+            csv_out = os.path.join(output_dir, "disruption_{}.csv".format(grid_name))
 
-        # Extract raster cells that overlap the modes of interest
-        print('Extracting exposure values that overlap network for mode: {}...'.format(mode))
-        arcpy.CheckOutExtension("Spatial")
-        output_extract_by_mask = arcpy.sa.ExtractByMask(input_exposure_grid, os.path.join(network, mode))
-        output_extract_by_mask.save(mode + "_exposure_grid_extract")
-        arcpy.CheckInExtension("Spatial")
+        with open(csv_out, "w", newline='') as f:
+            wr = csv.writer(f)
+            wr.writerow(txt_output_fields)
 
-        # Export raster to point
-        print('Converting raster to point for mode: {}...'.format(mode))
-        arcpy.RasterToPoint_conversion(mode + "_exposure_grid_extract", os.path.join(
-            full_path_to_output_gdb, mode + "_exposure_grid_points"), input_exposure_grid_field)
+            for mode in mode_list:
 
-        # Setup field mapping so that maximum exposure at each network segment is captured
-        fms = arcpy.FieldMappings()
+                # Find the highest exposure value within the search tolerance of each network segment
+                print('Identifying maximum exposure value for each network segment for mode: {} in {}...'.format(mode, input_exposure_grid))
+                link_ids, link_exposure = sample_exposure_grid(input_exposure_grid, network_lines[mode], search_tolerance)
 
-        fm = arcpy.FieldMap()
-        fm.addInputField(mode + "_exposure_grid_points", "grid_code")
-        fm.mergeRule = 'Maximum'
+                if link_availability_approach == 'binary':
+                    # 0 = full exposure/not traversable, 1 = no exposure/link fully available
+                    link_availability = [0 if exposure > 0 else 1 for exposure in link_exposure]
 
-        fms.addFieldMap(fm)
+                # Only worry about disrupted links--
+                # anything with a link availability of 1 is not disrupted and doesn't need to be included
+                print('Finalizing outputs... for mode: {}...'.format(mode))
+                for link_id, availability, exposure in zip(link_ids, link_availability, link_exposure):
+                    if availability != 1:
+                        wr.writerow([mode, link_id, availability, exposure])
 
-        # Spatial join to network, selecting highest exposure value for each network segment
-        print('Identifying maximum exposure value for each network segment for mode: {}...'.format(mode))
-        arcpy.SpatialJoin_analysis(os.path.join(network, mode), mode + "_exposure_grid_points",
-                                   mode + "_with_exposure",
-                                   "JOIN_ONE_TO_ONE", "KEEP_ALL",
-                                   fms,
-                                   "WITHIN_A_DISTANCE_GEODESIC", search_tolerance)
+        print("Disruption data written to {}".format(csv_out))
 
-        # Add new field to store extent of exposure
-        print('Calculating exposure levels for mode: {}...'.format(mode))
+    end_time = datetime.datetime.now()
+    total_run_time = end_time - start_time
+    print("\nEnd at {}. Total run time {}".format(end_time, total_run_time))
 
-        arcpy.AddField_management(mode + "_with_exposure", "link_availability", "Float")
-        arcpy.AddField_management(mode + "_with_exposure", "comments", "Text")
 
-        arcpy.MakeFeatureLayer_management(mode + "_with_exposure", mode + "_with_exposure_lyr")
+# ==============================================================================
+
+def read_network_lines(network, mode):
+    # returns the OBJECTIDs, the shapely lines and the spatial reference of the mode feature class
+    from osgeo import ogr
+    import shapely
+
+    gdb = ogr.Open(network)
+    if gdb is None:
+        raise Exception("Unable to open {}".format(network))
+    layer = gdb.GetLayerByName(mode)
+    if layer is None:
+        raise Exception("The network {} does not contain a {} feature class".format(network, mode))
+
+    link_ids = []
+    wkb_list = []
+    for feature in layer:
+        geom = feature.GetGeometryRef()
+        if geom is None:
+            continue
+        geom = geom.GetLinearGeometry()
+        geom.FlattenTo2D()
+        link_ids.append(feature.GetFID())
+        wkb_list.append(bytes(geom.ExportToWkb()))
 
-        # Convert NULLS to 0 first
-        arcpy.SelectLayerByAttribute_management(mode + "_with_exposure_lyr", "NEW_SELECTION", "grid_code IS NULL")
-        arcpy.CalculateField_management(mode + "_with_exposure_lyr", "grid_code", 0, "PYTHON_9.3")
-        arcpy.SelectLayerByAttribute_management(mode + "_with_exposure_lyr", "CLEAR_SELECTION")
+    spatial_ref = layer.GetSpatialRef().Clone() if layer.GetSpatialRef() is not None else None
+    gdb = None
+    return {'link_ids': link_ids, 'lines': shapely.from_wkb(wkb_list), 'spatial_ref': spatial_ref}
 
-        if link_availability_approach == 'binary':
-            # 0 = full exposure/not traversable, 1 = no exposure/link fully available
-            arcpy.SelectLayerByAttribute_management(mode + "_with_exposure_lyr", "NEW_SELECTION", "grid_code > 0")
-            arcpy.CalculateField_management(mode + "_with_exposure_lyr", "link_availability", 0, "PYTHON_9.3")
-            arcpy.SelectLayerByAttribute_management(mode + "_with_exposure_lyr", "SWITCH_SELECTION")
-            arcpy.CalculateField_management(mode + "_with_exposure_lyr", "link_availability", 1, "PYTHON_9.3")
 
-        print('Finalizing outputs... for mode: {}...'.format(mode))
+# ==============================================================================
 
-        # Rename grid_code back to the original exposure grid field provided in raster dataset
-        arcpy.AlterField_management(mode + "_with_exposure", 'grid_code', input_exposure_grid_field)
+def sample_exposure_grid(input_exposure_grid, network_lines, search_tolerance):
+    # samples the exposure grid along every network line by indexing the grid cells the lines pass through.
+    # the lines are densified to half a grid cell so no cell along a line is skipped, and the cells whose nearest edge
+    # is within the search tolerance of a densified vertex are included. since the vertices are at most a quarter cell
+    # from the line, the search distance is accurate to a quarter cell. the grid is read one window at a time, and only
+    # the windows the network passes through are read. returns the link ids and the maximum exposure of each link.
+    from osgeo import gdal, osr
+    import numpy as np
+    import shapely
+
+    raster = gdal.Open(input_exposure_grid)
+    if raster is None:
+        raise Exception("Unable to open {}".format(input_exposure_grid))
+    band = raster.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+    x_origin, cell_width, x_skew, y_origin, y_skew, cell_height = raster.GetGeoTransform()
+    if x_skew != 0 or y_skew != 0:
+        raise Exception("Rotated exposure grids are not supported: {}".format(input_exposure_grid))
+
+    link_ids = network_lines['link_ids']
+    link_exposure = np.zeros(len(link_ids))
+    if len(link_ids) == 0:
+        return link_ids, link_exposure.tolist()
+
+    # project the lines to the coordinate system of the exposure grid
+    lines = network_lines['lines']
+    raster_ref = osr.SpatialReference(wkt=raster.GetProjection()) if raster.GetProjection() else None
+    line_ref = network_lines['spatial_ref']
+    if raster_ref is not None and line_ref is not None and not raster_ref.IsSame(line_ref):
+        raster_ref.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        line_ref.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        transform = osr.CoordinateTransformation(line_ref, raster_ref)
+        lines = shapely.transform(lines, lambda xy: np.array(transform.TransformPoints(xy.tolist()))[:, :2])
+
+    # densify the lines and map every vertex to its grid cell
+    cell_size = min(abs(cell_width), abs(cell_height))
+    coords, line_index = shapely.get_coordinates(shapely.segmentize(lines, cell_size / 2.0), return_index=True)
+    cols = np.floor((coords[:, 0] - x_origin) / cell_width).astype(np.int64)
+    rows = np.floor((coords[:, 1] - y_origin) / cell_height).astype(np.int64)
+
+    # the cell offsets around a sampled cell that can be within the search tolerance
+    tolerance = get_tolerance_in_grid_units(search_tolerance, raster_ref)
+    tolerance_cells = int(math.ceil(tolerance / cell_size)) if tolerance > 0 else 0
+    offsets = [(col_offset, row_offset)
+               for col_offset in range(-tolerance_cells, tolerance_cells + 1)
+               for row_offset in range(-tolerance_cells, tolerance_cells + 1)
+               if math.hypot(max(abs(col_offset) - 1, 0) * abs(cell_width),
+                             max(abs(row_offset) - 1, 0) * abs(cell_height)) <= tolerance]
+
+    # group the vertices by the window of the grid that their cell falls in. vertices off the grid go to the nearest
+    # window, since cells within the search tolerance can still be on the grid
+    window_cols = (raster.RasterXSize + WINDOW_CELLS - 1) // WINDOW_CELLS
+    window_rows = (raster.RasterYSize + WINDOW_CELLS - 1) // WINDOW_CELLS
+    windows = (np.clip(rows // WINDOW_CELLS, 0, window_rows - 1) * window_cols +
+               np.clip(cols // WINDOW_CELLS, 0, window_cols - 1))
+    order = np.argsort(windows, kind='stable')
+    window_list, window_starts = np.unique(windows[order], return_index=True)
+    window_ends = np.append(window_starts[1:], len(order))
+
+    for window, window_start, window_end in zip(window_list, window_starts, window_ends):
+        vertices = order[window_start:window_end]
+        vertex_x = coords[vertices, 0]
+        vertex_y = coords[vertices, 1]
+        vertex_lines = line_index[vertices]
+
+        # read the window and the search tolerance around it
+        col_min = max(int(window % window_cols) * WINDOW_CELLS - tolerance_cells, 0)
+        col_max = min(int(window % window_cols + 1) * WINDOW_CELLS + tolerance_cells, raster.RasterXSize)
+        row_min = max(int(window // window_cols) * WINDOW_CELLS - tolerance_cells, 0)
+        row_max = min(int(window // window_cols + 1) * WINDOW_CELLS + tolerance_cells, raster.RasterYSize)
+        grid = band.ReadAsArray(col_min, row_min, col_max - col_min, row_max - row_min).astype(np.float64)
+        grid_invalid = ~np.isfinite(grid)
+        if nodata is not None:
+            grid_invalid |= grid == nodata
+        grid[grid_invalid] = 0
+
+        for col_offset, row_offset in offsets:
+            sample_cols = cols[vertices] + col_offset
+            sample_rows = rows[vertices] + row_offset
+            in_grid = (sample_cols >= col_min) & (sample_cols < col_max) & (sample_rows >= row_min) & (sample_rows < row_max)
+            if col_offset != 0 or row_offset != 0:
+                # distance from the vertex to the nearest edge of the cell
+                cell_x = np.sort(np.stack([x_origin + sample_cols * cell_width,
+                                           x_origin + (sample_cols + 1) * cell_width]), axis=0)
+                cell_y = np.sort(np.stack([y_origin + sample_rows * cell_height,
+                                           y_origin + (sample_rows + 1) * cell_height]), axis=0)
+                dx = np.maximum(np.maximum(cell_x[0] - vertex_x, vertex_x - cell_x[1]), 0)
+                dy = np.maximum(np.maximum(cell_y[0] - vertex_y, vertex_y - cell_y[1]), 0)
+                in_grid &= np.hypot(dx, dy) <= tolerance
+            np.maximum.at(link_exposure, vertex_lines[in_grid],
+                          grid[sample_rows[in_grid] - row_min, sample_cols[in_grid] - col_min])
+
+    raster = None
+    return link_ids, link_exposure.tolist()
 
-        fields = ['OBJECTID', 'link_availability', input_exposure_grid_field]
 
-        # Only worry about disrupted links--
-        # anything with a link availability of 1 is not disrupted and doesn't need to be included
-        arcpy.SelectLayerByAttribute_management(mode + "_with_exposure_lyr", "NEW_SELECTION", "link_availability <> 1")
+# ==============================================================================
 
-        with open(csv_out, "a", newline='') as csv_file:
-            with arcpy.da.SearchCursor(mode + "_with_exposure_lyr", fields) as cursor:
-                for row in cursor:
-                    converted_list = [str(element) for element in row]
-                    joined_string = ",".join(converted_list)
-                    csv_file.write("{},{}\n".format(mode, joined_string))
+def get_tolerance_in_grid_units(search_tolerance, raster_ref):
+    # converts a search tolerance such as "50 meters" to the linear units of the exposure grid
+    tolerance_parts = search_tolerance.split()
+    tolerance_value = float(tolerance_parts[0])
+    if len(tolerance_parts) > 1:
+        units = tolerance_parts[1].lower()
+        if units not in TOLERANCE_UNITS:
+            raise Exception("Search tolerance units {} are not recognized. Use one of: {}".format(units, ", ".join(TOLERANCE_UNITS)))
+        tolerance_meters = tolerance_value * TOLERANCE_UNITS[units]
+    else:
+        tolerance_meters = tolerance_value
 
-    end_time = datetime.datetime.now()
-    total_run_time = end_time - start_time
-    print("\nEnd at {}. Total run time {}".format(end_time, total_run_time))
+    if raster_ref is None:
+        return tolerance_meters
+    if raster_ref.IsGeographic():
+        return tolerance_meters / METERS_PER_DEGREE
+    return tolerance_meters / raster_ref.GetLinearUnits()
 
 
 # ==============================================================================
@@ -214,22 +334,26 @@ def get_mode_list():
     # ==============================================================================
 
 def get_input_exposure_data():
+    from osgeo import gdal
     while True:
         # Network Disruption Tool Input Exposure Data
         print("network disruption tool | step 3/6:")
         print("-------------------------------")
         print("FTOT gridded disruption data: ")
         print("Determines the disruption data to be used for the disruption analysis (e.g., gridded flood exposure data)")
+        print("Separate multiple exposure grids with commas; a disruption csv is written for each")
         exposure_data = input('----------------------> ')
         print("USER INPUT: the FTOT network exposure data: {}".format(exposure_data))
-        if not arcpy.Exists(exposure_data):
+        exposure_data_list = [path.strip() for path in exposure_data.split(',') if path.strip() != '']
+        invalid_paths = [path for path in exposure_data_list if gdal.Open(path) is None]
+        if not exposure_data_list or invalid_paths:
             print("The following path is not valid. Please enter a valid path to an FTOT disruption dataset.")
-            print("arcpy.exists == False for: {}".format(exposure_data))
+            print("gdal.Open failed for: {}".format(invalid_paths))
         else:
             # Valid value
             break
 
-    return exposure_data
+    return exposure_data_list
 
 
 # ==============================================================================
@@ -240,6 +364,7 @@ def get_input_exposure_data_field():
     print("-------------------------------")
     print("Name of field which stores disruption data: ")
     print("Typically this is Value but it may be something else")
+    print("The exposure values are read from the first band of the grid; this name is used for the exposure column of the csv")
     exposure_data_field = input('----------------------> ')
     print("USER INPUT: the FTOT network exposure data field: {}".format(exposure_data_field))
 
@@ -30,7 +30,7 @@ def get_network_path():
 def validate_connectivity_config():
 
     while True:
-        print("Validate connectivity of full network plus road, rail, water subnetworks? Y/N (Can increase run times from ~ one minute to 30+ minutes):")
+        print("Validate connectivity of full network plus road, rail, water subnetworks? Y/N (Can increase run times by a few minutes on large networks):")
         # Only allowing this tool to work on road/rail for now
         validate_connectivity = input('----------------------> ')
         print("USER INPUT: validate connectivity: {}".format(validate_connectivity))
@@ -219,12 +219,176 @@ def network_validation():
     return
 
 
+# ==============================================================================
+
+def get_connectivity_settings():
+
+    print("Snapping tolerance in meters for link endpoints to be considered connected (press Enter for 0.01):")
+    snap_tolerance = None
+    while snap_tolerance is None:
+        value = input('----------------------> ').strip()
+        print("USER INPUT: snapping tolerance: {}".format(value))
+        if value == "":
+            snap_tolerance = 0.01
+            break
+        try:
+            snap_tolerance = float(value)
+        except ValueError:
+            snap_tolerance = None
+        if snap_tolerance is None or snap_tolerance <= 0:
+            print("must be a positive number")
+            snap_tolerance = None
+
+    print("Optional: feature class or shapefile of facility points to check for isolation (press Enter to skip):")
+    facility_path = input('----------------------> ').strip('\"').strip()
+    print("USER INPUT: facilities: {}".format(facility_path))
+
+    facility_search_distance = None
+    if facility_path != "":
+        print("Facility search distance in miles, normally the Max_Artificial_Link_Distance of the scenario (press Enter for 5):")
+        while facility_search_distance is None:
+            value = input('----------------------> ').strip()
+            print("USER INPUT: facility search distance: {}".format(value))
+            if value == "":
+                facility_search_distance = 5.0
+                break
+            try:
+                facility_search_distance = float(value)
+            except ValueError:
+                facility_search_distance = None
+            if facility_search_distance is None or facility_search_distance <= 0:
+                print("must be a positive number")
+                facility_search_distance = None
+        # network is meters-based (checked above)
+        facility_search_distance = facility_search_distance * 1609.344
+
+    return snap_tolerance, facility_path, facility_search_distance
+
+
+# ==============================================================================
+
+def open_point_layer(facility_path):
+    # returns the datasource and layer for either a shapefile or a feature class inside a file geodatabase
+    from osgeo import ogr
+
+    layer_name = None
+    datasource_path = facility_path
+    if ".gdb" in facility_path.lower() and not facility_path.lower().rstrip("\\/").endswith(".gdb"):
+        split_at = facility_path.lower().index(".gdb") + 4
+        datasource_path = facility_path[:split_at]
+        layer_name = os.path.basename(os.path.normpath(facility_path[split_at:]))
+
+    datasource = ogr.Open(datasource_path)
+    if datasource is None:
+        raise IOError("Unable to open {}".format(datasource_path))
+    layer = datasource.GetLayerByName(layer_name) if layer_name else datasource.GetLayer(0)
+    if layer is None:
+        raise IOError("Unable to find feature class {} in {}".format(layer_name, datasource_path))
+    return datasource, layer
+
+
+# ==============================================================================
+
+def find_connectivity_groups(network_gdb, mode_list, snap_tolerance):
+    # builds the endpoint graph of the links in mode_list: each endpoint is hashed to a grid cell the size of the
+    # snapping tolerance, and is compared with the endpoints in its cell and the neighboring cells. links with
+    # endpoints within the snapping tolerance of each other are joined with a union-find. returns the group of each
+    # link (numbered by size, so group 1 is the largest), the link lengths, and the links that have an endpoint no
+    # other link touches.
+    from osgeo import ogr
+
+    parent = []
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        # path compression
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    link_lengths = []
+    dangling = []
+    endpoint_cells = {}
+
+    gdb = ogr.Open(network_gdb)
+    for mode in mode_list:
+        layer = gdb.GetLayerByName(mode)
+        if layer is None:
+            continue
+        has_length = layer.GetLayerDefn().GetFieldIndex('Length') >= 0
+        for feature in layer:
+            link_index = len(parent)
+            parent.append(link_index)
+            dangling.append(False)
+
+            geom = feature.GetGeometryRef()
+            if geom is None or geom.IsEmpty():
+                link_lengths.append(0)
+                continue
+            geom = geom.GetLinearGeometry()
+            # multipart links are treated as connected through every part's endpoints
+            parts = [geom.GetGeometryRef(i) for i in range(geom.GetGeometryCount())] if geom.GetGeometryCount() > 0 else [geom]
+
+            length = feature.GetField('Length') if has_length else None
+            link_lengths.append(length if length is not None else 0)
+
+            for part in parts:
+                if part.GetPointCount() == 0:
+                    continue
+                for x, y in [part.GetPoint_2D(0), part.GetPoint_2D(part.GetPointCount() - 1)]:
+                    # endpoint is [x, y, link_index, touched by another link]
+                    endpoint = [x, y, link_index, False]
+                    cell_x, cell_y = int(x // snap_tolerance), int(y // snap_tolerance)
+                    for i in [cell_x - 1, cell_x, cell_x + 1]:
+                        for j in [cell_y - 1, cell_y, cell_y + 1]:
+                            for other in endpoint_cells.get((i, j), []):
+                                if other[2] == link_index or ((other[0] - x) ** 2 + (other[1] - y) ** 2) ** 0.5 > snap_tolerance:
+                                    continue
+                                endpoint[3] = True
+                                other[3] = True
+                                root_a = find(link_index)
+                                root_b = find(other[2])
+                                if root_a != root_b:
+                                    parent[root_a] = root_b
+                    endpoint_cells.setdefault((cell_x, cell_y), []).append(endpoint)
+    gdb = None
+
+    # number the groups by size, largest first
+    roots = [find(i) for i in range(len(parent))]
+    group_sizes = {}
+    for root in roots:
+        group_sizes[root] = group_sizes.get(root, 0) + 1
+    group_number = {}
+    for number, root in enumerate(sorted(group_sizes, key=lambda r: (-group_sizes[r], r)), start=1):
+        group_number[root] = number
+
+    groups = [group_number[root] for root in roots]
+    segment_counts = {group_number[root]: size for root, size in group_sizes.items()}
+    for endpoint_list in endpoint_cells.values():
+        for x, y, link_index, touched in endpoint_list:
+            if not touched:
+                dangling[link_index] = True
+
+    return {'groups': groups, 'segment_counts': segment_counts, 'lengths': link_lengths, 'dangling': dangling}
+
+
 # ==============================================================================
 
 def network_connectivity(gdb_path):
 
     print('\nChecking network connectivity.')
 
+    try:
+        from osgeo import ogr
+    except ImportError:
+        error = "GDAL 3.6 or later is required to check network connectivity"
+        print(error)
+        raise ImportError(error)
+
+    snap_tolerance, facility_path, facility_search_distance = get_connectivity_settings()
+
     dir_name = os.path.dirname(gdb_path)
 
     # Uniquely name connectivity reports based on network gdb name
@@ -234,158 +398,185 @@ def network_connectivity(gdb_path):
     out_overview = os.path.join(dir_name, base_name_clean + '_connectivity_report.csv')
 
     with open(out_overview, 'w') as wf:
-        wf.write("MODE,NUMBER_OF_GROUPS,LENGTH,NUMBER_OF_SEGMENTS\n")
+        wf.write("MODE,NUMBER_OF_GROUPS,LENGTH,NUMBER_OF_SEGMENTS,NUMBER_OF_DANGLING_SEGMENTS\n")
+
+    # All connectivity groups are written to a single gdb with one feature class per mode plus the full network
+    out_gdb = os.path.join(dir_name, base_name_clean + "_connectivity_analysis.gdb")
+    if os.path.exists(out_gdb):
+        rmtree(out_gdb)
+    out_ds = ogr.GetDriverByName('OpenFileGDB').CreateDataSource(out_gdb)
+    if out_ds is None:
+        raise Exception("Unable to create {}. GDAL 3.6 or later is required to write file geodatabases.".format(out_gdb))
+
+    network_gdb = gdb_path
+    in_ds = ogr.Open(network_gdb)
+    # skipping 'pipeline_crude_trf_rts', 'pipeline_prod_trf_rts' for now as this complicates analysis dramatically
+    all_modes = [mode for mode in ['road', 'rail', 'water'] if in_ds.GetLayerByName(mode) is not None]
+    network_srs = in_ds.GetLayerByName(all_modes[0]).GetSpatialRef() if all_modes else None
+
+    # facility check uses the full network, hashing link segments to the cells of the search distance they cross
+    facility_cells = {}
+
+    connectivity_modes = {'full_network': all_modes, 'road': ['road'], 'rail': ['rail'], 'water': ['water']}
+    for mode in ['full_network', 'road', 'rail', 'water']:
+
+        mode_list = [m for m in connectivity_modes[mode] if m in all_modes]
+        if not mode_list:
+            continue
 
-    connectivity_modes = ['full_network', 'road', 'rail', 'water']
-    for mode in connectivity_modes:
+        print("Processing " + mode + " connectivity...")
+        result = find_connectivity_groups(network_gdb, mode_list, snap_tolerance)
+        total_segment_count = len(result['groups'])
+
+        out_layer = out_ds.CreateLayer(mode, network_srs, ogr.wkbMultiLineString, options=['FEATURE_DATASET=network'])
+        for field_name, field_type in [('Mode_Type', ogr.OFTString), ('source_OID', ogr.OFTInteger),
+                                       ('Length', ogr.OFTReal), ('connectivity_group', ogr.OFTInteger),
+                                       ('percentage', ogr.OFTReal), ('dangling', ogr.OFTInteger)]:
+            out_layer.CreateField(ogr.FieldDefn(field_name, field_type))
+
+        # Copy the links with their connectivity group and the percentage of segments in that group
+        out_ds.StartTransaction(force=True)
+        link_index = 0
+        for network_component in mode_list:
+            in_layer = in_ds.GetLayerByName(network_component)
+            in_layer.ResetReading()
+            for feature in in_layer:
+                group = result['groups'][link_index]
+                out_feature = ogr.Feature(out_layer.GetLayerDefn())
+                geom = feature.GetGeometryRef()
+                if geom is not None:
+                    geom = ogr.ForceToMultiLineString(geom.GetLinearGeometry())
+                    out_feature.SetGeometry(geom)
+                out_feature.SetField('Mode_Type', network_component)
+                out_feature.SetField('source_OID', feature.GetFID())
+                out_feature.SetField('Length', result['lengths'][link_index])
+                out_feature.SetField('connectivity_group', group)
+                out_feature.SetField('percentage',
+                                     (result['segment_counts'][group] * 1.0 / total_segment_count * 1.0) * 100)
+                out_feature.SetField('dangling', 1 if result['dangling'][link_index] else 0)
+                out_layer.CreateFeature(out_feature)
+
+                if mode == 'full_network' and facility_path != "" and geom is not None:
+                    # segments no longer than the search distance, so each one only covers a few cells
+                    segments = geom.Clone()
+                    segments.Segmentize(facility_search_distance)
+                    for part_index in range(segments.GetGeometryCount()):
+                        points = segments.GetGeometryRef(part_index).GetPoints() or []
+                        for (x1, y1), (x2, y2) in zip([point[:2] for point in points[:-1]],
+                                                      [point[:2] for point in points[1:]]):
+                            for i in range(int(min(x1, x2) // facility_search_distance),
+                                           int(max(x1, x2) // facility_search_distance) + 1):
+                                for j in range(int(min(y1, y2) // facility_search_distance),
+                                               int(max(y1, y2) // facility_search_distance) + 1):
+                                    facility_cells.setdefault((i, j), []).append((x1, y1, x2, y2, group))
+
+                link_index += 1
+        out_ds.CommitTransaction()
+
+        dangling_count = sum(1 for d in result['dangling'] if d)
+        print("{}: {} connectivity groups, {} dangling segments".format(mode, len(result['segment_counts']),
+                                                                        dangling_count))
+
+        # Summarize the number of connectivity groups for each mode in a csv (this is the
+        # broad level overview of each mode).
+        # --------------------------------------------------------------------------------------
+
+        with open(out_overview, 'a') as wf:
+            wf.write('{},{},{},{},{}\n'.format(
+                mode, len(result['segment_counts']), sum(result['lengths']), total_segment_count, dangling_count)
+                )
+
+    out_ds = None
+    in_ds = None
+
+    if facility_path != "":
+        check_facility_isolation(facility_path, facility_search_distance, facility_cells, network_srs,
+                                 os.path.join(dir_name, base_name_clean + '_facility_connectivity_report.csv'))
 
-        out_gdb = gdb_path.replace(".gdb", "_connectivity_analysis_" + mode + ".gdb")
+    print("Connectivity Report Complete... Open {} to review the connectivity report which lists the number of connectivity groups by mode".format(dir_name))
+    print("The GIS data identifying distinct connectivity groups is saved in {} with one feature class for each mode plus the full network (road, rail, and water)".format(out_gdb))
+    print("Connectivity group 1 is the largest group. Links with dangling = 1 have an endpoint that no other link touches")
+    print("Note that some disconnected portions of the network may be expected-- e.g., islands, isolated rail networks, and navigable waterways separated from other waterways by dams")
 
-        if os.path.exists(out_gdb):
-            rmtree(out_gdb)
 
-        arcpy.Copy_management(gdb_path, out_gdb)
+# ==============================================================================
 
-        arcpy.env.workspace = out_gdb
+def get_point_to_segment_distance(x, y, x1, y1, x2, y2):
+    # distance from the point (x, y) to the line segment from (x1, y1) to (x2, y2)
+    dx, dy = x2 - x1, y2 - y1
+    segment_length_squared = dx * dx + dy * dy
+    t = 0.0
+    if segment_length_squared > 0:
+        t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / segment_length_squared))
+    return ((x1 + t * dx - x) ** 2 + (y1 + t * dy - y) ** 2) ** 0.5
 
-        feature_dataset = os.path.join(out_gdb, "network")
 
-        mode_fc = os.path.join(feature_dataset, mode)
+# ==============================================================================
+
+def check_facility_isolation(facility_path, facility_search_distance, facility_cells, network_srs, out_report):
+    # flags facilities with no network link within the search distance, and facilities whose nearest link is
+    # outside the largest connectivity group of the full network. facility_cells holds the network segments
+    # (x1, y1, x2, y2, group) by each grid cell of the search distance that they cross
+    from osgeo import ogr, osr
+
+    print("\nChecking facility connectivity...")
+
+    datasource, layer = open_point_layer(facility_path)
+
+    transform = None
+    facility_srs = layer.GetSpatialRef()
+    if facility_srs is not None and network_srs is not None and not facility_srs.IsSame(network_srs):
+        facility_srs = facility_srs.Clone()
+        target_srs = network_srs.Clone()
+        facility_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        target_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        transform = osr.CoordinateTransformation(facility_srs, target_srs)
+
+    name_index = -1
+    for name_field in ['facility_name', 'location_id_name', 'Name']:
+        name_index = layer.GetLayerDefn().GetFieldIndex(name_field)
+        if name_index >= 0:
+            break
+
+    isolated_count = 0
+    off_main_count = 0
+    with open(out_report, 'w') as wf:
+        wf.write("OBJECTID,FACILITY_NAME,NEAREST_CONNECTIVITY_GROUP,DISTANCE_TO_NETWORK,ISOLATED,NOT_ON_LARGEST_GROUP\n")
+        for feature in layer:
+            geom = feature.GetGeometryRef()
+            if geom is None or geom.IsEmpty():
+                continue
+            geom = geom.Clone()
+            if transform is not None:
+                geom.Transform(transform)
+            x, y = geom.Centroid().GetPoint_2D(0)
+
+            nearest_group = None
+            nearest_distance = None
+            cell_x, cell_y = int(x // facility_search_distance), int(y // facility_search_distance)
+            for i in [cell_x - 1, cell_x, cell_x + 1]:
+                for j in [cell_y - 1, cell_y, cell_y + 1]:
+                    for x1, y1, x2, y2, group in facility_cells.get((i, j), []):
+                        distance = get_point_to_segment_distance(x, y, x1, y1, x2, y2)
+                        if distance <= facility_search_distance and (nearest_distance is None or distance < nearest_distance):
+                            nearest_group = group
+                            nearest_distance = distance
+
+            isolated = nearest_group is None
+            off_main = not isolated and nearest_group != 1
+            isolated_count += isolated
+            off_main_count += off_main
+            name = feature.GetField(name_index) if name_index >= 0 else ""
+            wf.write('{},"{}",{},{},{},{}\n'.format(
+                feature.GetFID(), name, nearest_group if nearest_group is not None else "",
+                nearest_distance if nearest_distance is not None else "", int(isolated), int(off_main)))
+
+    datasource = None
+    print("{} facilities have no network link within the search distance".format(isolated_count))
+    print("{} facilities are nearest to a link outside the largest connectivity group".format(off_main_count))
+    print("Open {} to review the facility connectivity report".format(out_report))
 
-        # Prep a full network combined feature class for easier connectivity analysis
-        if mode == 'full_network':
-            list_of_modes = []
-            all_modes = ['road', 'rail', 'water']
-            # skipping 'pipeline_crude_trf_rts', 'pipeline_prod_trf_rts' for now as this complicates analysis dramatically
-            for network_component in all_modes:
-                network_component_fc = os.path.join(feature_dataset, network_component)
-                if arcpy.Exists(network_component_fc):
-                    list_of_modes.append(network_component_fc)
-            arcpy.management.Merge(list_of_modes, os.path.join(feature_dataset, 'full_network'))
-
-        # Delete everything but the modal layer (since we copied the whole gdb)
-        # This cleans up the gdb for the actual network connectivity work
-        for fc in arcpy.ListFeatureClasses(feature_dataset="network"):
-            if fc != mode:
-                arcpy.Delete_management(fc)
-        for fc in arcpy.ListFeatureClasses():
-            if fc != mode:
-                arcpy.Delete_management(fc)
-        for table in arcpy.ListTables():
-            if table != mode:
-                arcpy.Delete_management(table)
-
-        if arcpy.Exists(mode_fc):
-
-            network = os.path.join(feature_dataset, mode)
-
-            # Add fields to store ID connectivity_group and segment percentage
-            arcpy.AddField_management(mode_fc, "connectivity_group", "SHORT")
-            arcpy.AddField_management(mode_fc, "percentage", "DOUBLE")
-
-            print("Creating " + mode + " trace network...")
-            # Create trace network
-            arcpy.tn.CreateTraceNetwork(feature_dataset, "trace_nw_" + mode, None, [[mode, "SIMPLE_EDGE"]])
-
-            print("Enabling " + mode + " topology...")
-            # Note that due to arcpy defect, have to disable and then enable network topology.
-            # However, this doesn't seem to be working around issue,
-            # so now there are separate geodatabases for each trace network
-            # See https://community.esri.com/t5/trace-network-questions/trace-network-enabling-problem/td-p/714268
-            arcpy.tn.DisableNetworkTopology(os.path.join(feature_dataset, 'trace_nw_' + mode))
-            arcpy.tn.EnableNetworkTopology(os.path.join(feature_dataset, 'trace_nw_' + mode), 1000000)
-            print("Finished " + mode + " topology...")
-
-            print("Processing " + mode + " connectivity...")
-            # Reset connectivity group and length for each mode
-            connectivity_group = 1
-            length = 0
-
-            # Search cursor to iterate through each row of the network to check connectivity
-            # --------------------------------------------------------------------------------------
-
-            # Prep for search cursor, first identifying the feature class that you will be iterating through and
-            # counting # of segments in each fc (the denominator for percentages)
-
-            in_features = os.path.join(out_gdb, mode_fc)
-            count_result = arcpy.GetCount_management(in_features)
-            total_segment_count = int(count_result.getOutput(0))
-
-            print("Summing " + mode + " length...")
-            # Sum length of each connectivity group
-            with arcpy.da.SearchCursor(in_features, ['Length']) as scursor_length:
-                for row in scursor_length:
-                    if not row[0] is None:
-                        length += row[0]
-                    else:
-                        print('null lengths encountered')
-
-            print("Connectivity Grouping for " + mode + "...")
-            # Initiate search cursor
-            with arcpy.da.SearchCursor(in_features, ['SHAPE@', 'connectivity_group']) as scursor_group:
-                for row in scursor_group:
-
-                    # If no connectivity group is already assigned
-                    if row[1] is None:
-
-                        # Create blank fc for connectivity group x
-                        arcpy.CreateFeatureclass_management(
-                                os.path.join(out_gdb, "network"),
-                                mode + "_connectivity_group_" + str(connectivity_group),
-                                "Point", "", "No", "No", network)
-
-                        # ID a point along the current feature
-                        point_x = row[0].firstPoint.X
-                        point_y = row[0].firstPoint.Y
-                        point = (arcpy.Point(point_x, point_y))
-
-                        # Insert that point into the new connectivity group point fc
-                        with arcpy.da.InsertCursor(os.path.join(out_gdb, "network", mode + "_connectivity_group_" + str(connectivity_group)),
-                                                   ['SHAPE@']) as icursor:
-
-                            icursor.insertRow([point])
-                        arcpy.Trace_tn("network/trace_nw_" + mode, "CONNECTED",
-                                       os.path.join(out_gdb, "network", mode + "_connectivity_group_" + str(connectivity_group)),
-                                       validate_consistency='DO_NOT_VALIDATE_CONSISTENCY',
-                                       result_types=['NETWORK_LAYERS'],
-                                       out_network_layer='trace_con_lyr')
-
-                        arcpy.CalculateField_management(
-                                'trace_con_lyr/' + mode,
-                                "connectivity_group",
-                                connectivity_group,
-                                'PYTHON_9.3')
-
-                        # Count number of segments in the connectivity group for reporting
-                        result = arcpy.GetCount_management('trace_con_lyr/' + mode)
-                        group_segment_count = int(result.getOutput(0))
-
-                        # Using the total fc feature count and group feature count, calculate the percentage of segments
-                        # for each connectivity group and add this value to the relevant segments in the feature class
-
-                        pct = (group_segment_count * 1.0 / total_segment_count * 1.0) * 100
-                        arcpy.CalculateField_management('trace_con_lyr/' + mode, "percentage", pct, 'PYTHON_9.3')
-
-                        arcpy.Delete_management('trace_con_lyr')
-
-                        # Go to next connectivity group
-                        connectivity_group += 1
-
-            # Summarize the number of connectivity groups for each mode in a csv (this is the
-            # broad level overview of each mode).  Note that actual number of connectivity
-            # groups will always be one less than the counter based on current script
-            # --------------------------------------------------------------------------------------
-
-            with open(out_overview, 'a') as wf:
-                wf.write('{},{},{},{}\n'.format(
-                    mode, connectivity_group-1, length, total_segment_count)
-                    )
-            # Delete the trace network so that it does not cause issues when subsequent trace networks are created...
-            arcpy.Delete_management(os.path.join(feature_dataset, "trace_nw_" + mode))
 
-    print("Connectivity Report Complete... Open {} to review the connectivity report which lists the number of connectivity groups by mode".format(dir_name))
-    print("The GIS data identifying distinct connectivity groups is saved in separate geodatabases for each mode plus the full network (road, rail, and water)")
-    print("Note that some disconnected portions of the network may be expected-- e.g., islands, isolated rail networks, and navigable waterways separated from other waterways by dams")
 # ==============================================================================
 
 
@@ -1,13 +1,12 @@
 # -------------------------------------------------------------------------------
 # Name:        FTOT Scenario Compare Tool
-# Purpose:     Concatenates Tableau reports and gdb contained in multiple directories.
+# Purpose:     Merges the Tableau reports, main.db results and gdb contained in multiple directories.
 
 # It is a command-line-interface (CLI) tool that prompts the user for the following information:
 # - Location of scenarios to compare
 # - Location of directory in which to store scenario comparison output
 # -------------------------------------------------------------------------------
 
-import arcpy
 import os
 import csv
 import sys
@@ -15,9 +14,24 @@ import zipfile
 import datetime
 import ntpath
 import glob
+import sqlite3
+import multiprocessing
 from shutil import copy, rmtree
 from six.moves import input
 
+# main.db tables carried into the comparison database, keyed by scenario name
+COMPARE_TABLES = ['optimal_scenario_results', 'optimal_facilities', 'optimal_route_segments', 'optimal_variables',
+                  'detailed_emissions', 'artificial_link_results']
+
+# report CSVs packaged in the Tableau workbook, with the header the workbook expects
+REPORT_CSVS = {'tableau_report': 'scenario_name,table_name,commodity,facility_name,measure,mode,value,units,notes',
+               'costs': 'scenario_name,commodity,mode,cost_family,cost_component,unscaled_cost,scaled_cost,scalar',
+               'all_routes': 'scenario_name,route_id,from_facility,from_facility_type,to_facility,to_facility_type,commodity_name,phase,mode,transport_cost,routing_cost,access_cost,length,co2,time,in_solution'}
+
+# feature classes merged into the Tableau gdb when geometry is included
+COMPARE_FCS = ["facilities_merge", "optimized_route_segments_dissolved", "optimized_route_segments"]
+
+
 # ==============================================================================
 
 def run_scenario_compare_prep_tool():
@@ -38,165 +52,93 @@ def scenario_compare_prep():
     # open for user
     os.startfile(output_dir)
 
-    # create output gdb
-    print("start: create tableau gdb")
-    output_gdb_name = "tableau_output"
-    os.path.join(output_dir, "tableau_output")
-    arcpy.CreateFileGDB_management(out_folder_path=output_dir,
-                                   out_name=output_gdb_name, out_version="CURRENT")
-    output_gdb = os.path.join(output_dir, output_gdb_name + ".gdb")
-
-    # create output report csv
-    print("start: Tableau results report")
-    report_file_name = 'tableau_report.csv'
-    report_file = os.path.join(output_dir, report_file_name)
-    wf = open(report_file, 'w')
-    header_line = 'scenario_name,table_name,commodity,facility_name,measure,mode,value,units,notes\n'
-    wf.write(header_line)
-
-    # create costs csv
-    cost_file_name = 'costs.csv'
-    cost_file = os.path.join(output_dir, cost_file_name)
-    cf = open(cost_file, 'w')
-    costs_header = 'scenario_name,commodity,mode,cost_family,cost_component,unscaled_cost,scaled_cost,scalar\n'
-    cf.write(costs_header)
-
-    # create output all_routes csv
-    routes_file_name = 'all_routes.csv'
-    routes_file = os.path.join(output_dir, routes_file_name)
-    rf = open(routes_file, 'w')
-    routes_header = 'scenario_name,route_id,from_facility,from_facility_type,to_facility,to_facility_type,commodity_name,phase,mode,transport_cost,routing_cost,access_cost,length,co2,time,in_solution\n'
-    rf.write(routes_header)
-
     # get user directory to search
     # returns list of dirs
     scenario_dirs = get_input_dirs()
 
-    # for each dir, get all of the report folders matching the pattern
-    for a_dir in scenario_dirs:
-        print("processing: {}".format(a_dir))
-        report_dirs = glob.glob(os.path.join(a_dir, "reports", \
-            "reports_*_*_*_*-*-*"))
-
-        # skip empty scenarios without report folders
-        if len(report_dirs) == 0:
-            print("skipping: {}".format(a_dir))
-            continue
-
-        report_dir_dict = []
-        for report in report_dirs:
-
-            # skip the csv files... we just want the report folders
-            if report.endswith('.csv'):
+    include_geometry = get_include_geometry()
+    if include_geometry:
+        try:
+            from osgeo import ogr
+        except ImportError:
+            raise ImportError("GDAL 3.6 or later is required to merge the scenario map layers: http://www.gdal.org/")
+
+    temp_root = os.path.join(output_dir, "temp")
+    if os.path.exists(temp_root):
+        rmtree(temp_root)
+    os.makedirs(temp_root)
+
+    # each scenario is unpacked and loaded into its own sqlite db by a worker process
+    print("start: reading {} scenarios".format(len(scenario_dirs)))
+    jobs = [(a_dir, os.path.join(temp_root, "scenario_{}".format(i)), include_geometry)
+            for i, a_dir in enumerate(scenario_dirs)]
+    processes = max(1, min(len(jobs), multiprocessing.cpu_count()))
+    pool = multiprocessing.Pool(processes)
+    try:
+        scenario_results = []
+        for result in pool.imap(prep_scenario_for_compare, jobs):
+            if result is None:
                 continue
+            print("processed: {}".format(result['scenario_dir']))
+            scenario_results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    if len(scenario_results) == 0:
+        print("warning: none of the scenarios have report folders. nothing to compare.")
+        rmtree(temp_root)
+        return
+
+    # merge the scenario dbs into one comparison db
+    print("start: merge scenario comparison db")
+    compare_db = os.path.join(output_dir, "scenario_compare.db")
+    merge_scenario_dbs(compare_db, scenario_results)
+
+    # copy the TWB from the first unzipped packaged workbook to the scenario compare output folder
+    print("copying the template twb")
+    twb_found = False
+    for result in scenario_results:
+        source_loc = os.path.join(result['temp_folder'], "tableau_dashboard.twb")
+        if os.path.exists(source_loc):
+            copy(source_loc, os.path.join(output_dir, "tableau_dashboard.twb"))
+            twb_found = True
+            break
+    if not twb_found:
+        print("warning: tableau_dashboard.twb does not exist.")
+
+    # write the report CSVs the workbook reads from the comparison db
+    print("start: Tableau results report")
+    write_report_csvs(compare_db, output_dir)
 
-            # inspect the reports folder
-            path_to, the_file_name = ntpath.split(report)
-
-            the_date = datetime.datetime.strptime(the_file_name[7:], "_%Y_%m_%d_%H-%M-%S")
-
-            report_dir_dict.append((the_file_name, the_date))
+    if include_geometry:
+        # create output gdb
+        print("start: create tableau gdb")
+        output_gdb = os.path.join(output_dir, "tableau_output.gdb")
+        merge_scenario_gdbs(output_gdb, [result['gdb'] for result in scenario_results])
 
-        # find the newest reports folder
-        # sort by datetime so the most recent is first
-        report_dir_dict = sorted(report_dir_dict, key=lambda tup: tup[1], reverse=True)
-        most_recent_report_file = os.path.join(path_to, report_dir_dict[0][0])
+        # package up the concat files into a compare.twbx
+        # create the zip file for writing compressed data
+        print('creating archive')
+        zip_gdb_filename = output_gdb + ".zip"
+        zf = zipfile.ZipFile(zip_gdb_filename, 'w', zipfile.ZIP_DEFLATED)
 
-        # unzip twbx locally to a temp folder
-        temp_folder = os.path.join(most_recent_report_file, "temp")
-        with zipfile.ZipFile(os.path.join(most_recent_report_file, 'tableau_dashboard.twbx'), 'r') as zipObj:
-            # extract all the contents of zip file in current directory
-            zipObj.extractall(temp_folder)
+        zipgdb(output_gdb, zf)
+        zf.close()
+        print('all done zipping')
 
-        # copy the TWB from the unzipped packaged workbook to the scenario compare output folder
-        print("copying the template twb")
-        source_loc = os.path.join(temp_folder, "tableau_dashboard.twb")
-        dest_loc = os.path.join(output_dir, "tableau_dashboard.twb")
-        try:
-            copy(source_loc, dest_loc)
-        except:
-            print("warning: tableau_dashboard.twb does not exist.")
-
-        # concat tableau_report.csv
-        print("time to look at the csv file and import ")
-        csv_in = open(os.path.join(temp_folder,"tableau_report.csv"))
-        for line in csv_in:
-            if line.startswith(header_line):
-                continue
-            wf.write(line)
-        csv_in.close()
-
-        # concat costs.csv
-        print("look at the cost csv and import ")
-        cf_in = open(os.path.join(temp_folder,"costs.csv"))
-        for line in cf_in:
-            if line.startswith(costs_header):
-                continue
-            cf.write(line)
-        cf_in.close()
+        # now delete the unzipped gdb
+        rmtree(output_gdb)
+        print("deleted unzipped gdb")
 
-        # concat all_routes.csv
-        print("look at routes csv and import")
-        rf_in = open(os.path.join(temp_folder,"all_routes.csv"))
+    # remove the temp folder
+    print("cleaning up temp folder")
+    rmtree(temp_root)
 
-        for line in rf_in:
-            if line.startswith(routes_header):
-                continue
-            else:
-                rf.write(line)
-        rf_in.close()
-
-         # unzip gdb.zip locally
-        with zipfile.ZipFile(os.path.join(temp_folder, 'tableau_output.gdb.zip'),
-                         'r') as zipObj:
-            # extract all the contents of zip file in current directory
-            zipObj.extractall(os.path.join(temp_folder,'tableau_output.gdb'))
-
-        # concat the fc into the output gdb
-        input_gdb = os.path.join(temp_folder,'tableau_output.gdb')
-        input_fcs = ["facilities_merge", "optimized_route_segments_dissolved", "optimized_route_segments"]
-        # try to append the facilities_merge fc
-        # if it throws ExecuteError, the FC doesn't exist yet, so do a copy instead
-        # the copy only need to be done once to create the first fc
-        for fc in input_fcs:
-            print("processing fc: {}".format(fc))
-            try:
-                # print("try processing fc with append: {} for scenario {}".format(fc, a_dir))
-                arcpy.Append_management(os.path.join(input_gdb, fc),
-                                        os.path.join(output_gdb, fc), "NO_TEST")
-            except arcpy.ExecuteError:
-                # print("except processing fc with copy: {} for scenario {} ".format(fc, a_dir))
-                arcpy.CopyFeatures_management(os.path.join(input_gdb, fc),
-                                       os.path.join(output_gdb, fc))
-
-        # remove the temp folder
-        print("cleaning up temp folder")
-        if arcpy.Exists(input_gdb):
-            try:
-                arcpy.Delete_management(input_gdb)
-            except:
-                raise Exception("couldn't delete " + input_gdb)
-        rmtree(temp_folder)
-
-    # close merged csvs
-    wf.close()
-    cf.close()
-    rf.close()
-
-    # package up the concat files into a compare.twbx
-    # create the zip file for writing compressed data
-
-    print('creating archive')
-    zip_gdb_filename = output_gdb + ".zip"
-    zf = zipfile.ZipFile(zip_gdb_filename, 'w', zipfile.ZIP_DEFLATED)
-
-    zipgdb(output_gdb, zf)
-    zf.close()
-    print('all done zipping')
-
-    # now delete the unzipped gdb
-    arcpy.Delete_management(output_gdb)
-    print("deleted unzipped gdb")
+    if not include_geometry or not twb_found:
+        print("The Tableau workbook is only packaged when map layers are included. The merged report CSVs and {} are in {}".format(
+            os.path.basename(compare_db), output_dir))
+        return
 
     twbx_dashboard_filename = os.path.join(output_dir, "tableau_dashboard.twbx")
     zipObj = zipfile.ZipFile(twbx_dashboard_filename, 'w', zipfile.ZIP_DEFLATED)
@@ -216,6 +158,238 @@ def scenario_compare_prep():
     # close the zip file
     zipObj.close()
 
+    print("The merged scenario tables are in {}".format(compare_db))
+
+
+# ==============================================================================
+
+def prep_scenario_for_compare(job):
+    # runs in a worker process. unpacks the newest report of one scenario and loads its report CSVs and main.db
+    # tables into a sqlite db in the temp folder. returns None for scenarios without report folders.
+    a_dir, temp_folder, include_geometry = job
+
+    report_dirs = glob.glob(os.path.join(a_dir, "reports", "reports_*_*_*_*-*-*"))
+
+    report_dir_dict = []
+    for report in report_dirs:
+
+        # skip the csv files... we just want the report folders
+        if report.endswith('.csv'):
+            continue
+
+        # inspect the reports folder
+        path_to, the_file_name = ntpath.split(report)
+
+        the_date = datetime.datetime.strptime(the_file_name[7:], "_%Y_%m_%d_%H-%M-%S")
+
+        report_dir_dict.append((report, the_date))
+
+    # skip empty scenarios without report folders
+    if len(report_dir_dict) == 0:
+        print("skipping: {}".format(a_dir))
+        return None
+
+    # find the newest reports folder
+    # sort by datetime so the most recent is first
+    report_dir_dict = sorted(report_dir_dict, key=lambda tup: tup[1], reverse=True)
+    most_recent_report_file = report_dir_dict[0][0]
+
+    # unzip twbx locally to a temp folder
+    with zipfile.ZipFile(os.path.join(most_recent_report_file, 'tableau_dashboard.twbx'), 'r') as zipObj:
+        zipObj.extractall(temp_folder)
+
+    scenario_db = os.path.join(temp_folder, "scenario_compare.db")
+    scenario_name = os.path.basename(os.path.normpath(a_dir))
+    with sqlite3.connect(scenario_db) as db_con:
+
+        # load the report CSVs
+        for table_name in REPORT_CSVS:
+            csv_path = os.path.join(temp_folder, table_name + ".csv")
+            if not os.path.exists(csv_path):
+                continue
+            with open(csv_path, 'r') as rf:
+                reader = csv.reader(rf)
+                header = next(reader, None)
+                if header is None:
+                    continue
+                # text columns keep the CSV values as written (e.g., IDs with leading zeros), since the merged
+                # tables are only written back out to CSV
+                db_con.execute("create table {} ({})".format(
+                    table_name, ", ".join('"{}" TEXT'.format(column) for column in header)))
+                db_con.executemany("insert into {} values ({})".format(table_name, ", ".join("?" * len(header))),
+                                   (row for row in reader if len(row) == len(header)))
+
+        # the scenario name in the reports is the key for this scenario
+        if table_name_exists(db_con, 'tableau_report'):
+            row = db_con.execute("select scenario_name from tableau_report limit 1").fetchone()
+            if row is not None and row[0] not in (None, ''):
+                scenario_name = str(row[0])
+
+        # copy the main.db result tables
+        main_db = os.path.join(a_dir, "main.db")
+        if os.path.exists(main_db):
+            db_con.execute("attach database ? as scenario_main", (main_db,))
+            for table_name in COMPARE_TABLES:
+                if table_name_exists(db_con, table_name, "scenario_main"):
+                    db_con.execute("create table {0} as select * from scenario_main.{0}".format(table_name))
+            db_con.commit()
+            db_con.execute("detach database scenario_main")
+
+    # unzip gdb.zip locally
+    gdb = None
+    if include_geometry:
+        gdb = os.path.join(temp_folder, 'tableau_output.gdb')
+        with zipfile.ZipFile(os.path.join(temp_folder, 'tableau_output.gdb.zip'), 'r') as zipObj:
+            zipObj.extractall(gdb)
+
+    return {'scenario_dir': a_dir, 'scenario_name': scenario_name, 'temp_folder': temp_folder,
+            'scenario_db': scenario_db, 'gdb': gdb}
+
+
+# ==============================================================================
+
+def table_name_exists(db_con, table_name, schema="main"):
+    sql = "select count(*) from {}.sqlite_master where type='table' and name=?".format(schema)
+    return db_con.execute(sql, (table_name,)).fetchone()[0] > 0
+
+
+# ==============================================================================
+
+def get_table_columns(db_con, table_name, schema="main"):
+    # returns (name, declared type) for each column of the table
+    return [(row[1], row[2]) for row in db_con.execute("pragma {}.table_info({})".format(schema, table_name))]
+
+
+# ==============================================================================
+
+def merge_scenario_dbs(compare_db, scenario_results):
+    # appends each scenario db into the comparison db, keyed by scenario name. tables are matched by name and
+    # columns by name, so scenarios run with different FTOT versions can be compared: a column missing from
+    # a scenario is left null and a column new to a scenario is added to the comparison table.
+
+    if os.path.exists(compare_db):
+        os.remove(compare_db)
+
+    scenario_names = set()
+    with sqlite3.connect(compare_db) as db_con:
+        db_con.execute("create table scenarios (scenario_name text primary key, scenario_dir text)")
+
+        for result in scenario_results:
+
+            # keep the keys unique if two scenarios share a name
+            scenario_name = result['scenario_name']
+            if scenario_name in scenario_names:
+                scenario_name = "{} ({})".format(scenario_name, os.path.basename(os.path.normpath(result['scenario_dir'])))
+                print("warning: duplicate scenario name, using {}".format(scenario_name))
+            scenario_names.add(scenario_name)
+            db_con.execute("insert into scenarios values (?, ?)", (scenario_name, result['scenario_dir']))
+
+            db_con.execute("attach database ? as scenario_db", (result['scenario_db'],))
+            table_names = [row[0] for row in db_con.execute(
+                "select name from scenario_db.sqlite_master where type='table'")]
+
+            for table_name in table_names:
+                source_columns = get_table_columns(db_con, table_name, "scenario_db")
+
+                if not table_name_exists(db_con, table_name):
+                    db_con.execute('create table {} (scenario_name text)'.format(table_name))
+                existing_columns = [column for column, column_type in get_table_columns(db_con, table_name)]
+                for column, column_type in source_columns:
+                    if column not in existing_columns:
+                        db_con.execute('alter table {} add column "{}" {}'.format(table_name, column, column_type))
+
+                # the report CSVs already carry a scenario_name column; it is replaced with the key
+                columns = [column for column, column_type in source_columns if column != 'scenario_name']
+                insert_columns = ", ".join('"{}"'.format(column) for column in columns)
+                db_con.execute('insert into {0} (scenario_name{1}) select ?{1} from scenario_db.{0}'.format(
+                    table_name, ", " + insert_columns if columns else ""), (scenario_name,))
+
+            db_con.commit()
+            db_con.execute("detach database scenario_db")
+
+        # index every table on the scenario key
+        table_names = [row[0] for row in db_con.execute(
+            "select name from sqlite_master where type='table' and name != 'scenarios'")]
+        for table_name in table_names:
+            db_con.execute("create index {0}_scenario_index on {0} (scenario_name)".format(table_name))
+        db_con.commit()
+
+
+# ==============================================================================
+
+def write_report_csvs(compare_db, output_dir):
+    # writes the merged tableau_report, costs, and all_routes CSVs in the layout the Tableau workbook expects
+
+    with sqlite3.connect(compare_db) as db_con:
+        for table_name, header_line in REPORT_CSVS.items():
+            header = header_line.split(',')
+            with open(os.path.join(output_dir, table_name + ".csv"), 'w', newline='') as wf:
+                writer = csv.writer(wf)
+                writer.writerow(header)
+                if not table_name_exists(db_con, table_name):
+                    continue
+                existing_columns = [column for column, column_type in get_table_columns(db_con, table_name)]
+                select_columns = ", ".join('"{}"'.format(column) if column in existing_columns else "null"
+                                           for column in header)
+                for row in db_con.execute("select {} from {} order by rowid".format(select_columns, table_name)):
+                    writer.writerow(['' if value is None else value for value in row])
+
+
+# ==============================================================================
+
+def merge_scenario_gdbs(output_gdb, input_gdbs):
+    # appends the map layers of each scenario into the output gdb with GDAL
+
+    try:
+        from osgeo import ogr
+    except ImportError:
+        raise ImportError("GDAL 3.6 or later is required to merge the scenario map layers: http://www.gdal.org/")
+
+    if os.path.exists(output_gdb):
+        rmtree(output_gdb)
+    out_ds = ogr.GetDriverByName('OpenFileGDB').CreateDataSource(output_gdb)
+    if out_ds is None:
+        raise Exception("Unable to create {}. GDAL 3.6 or later is required to write file geodatabases.".format(output_gdb))
+
+    for input_gdb in input_gdbs:
+        in_ds = ogr.Open(input_gdb)
+        if in_ds is None:
+            print("warning: unable to open {}".format(input_gdb))
+            continue
+        for fc in COMPARE_FCS:
+            print("processing fc: {}".format(fc))
+            in_layer = in_ds.GetLayerByName(fc)
+            if in_layer is None:
+                continue
+            out_layer = out_ds.GetLayerByName(fc)
+            # the copy only need to be done once to create the first fc
+            if out_layer is None:
+                out_ds.CopyLayer(in_layer, fc)
+                continue
+            out_defn = out_layer.GetLayerDefn()
+            out_ds.StartTransaction(force=True)
+            for feature in in_layer:
+                out_feature = ogr.Feature(out_defn)
+                out_feature.SetFrom(feature)
+                out_layer.CreateFeature(out_feature)
+            out_ds.CommitTransaction()
+        in_ds = None
+
+    out_ds = None
+
+
+# ==============================================================================
+
+def get_include_geometry():
+    while True:
+        print("Include map layers in the comparison? Y/N (requires GDAL; the Tableau workbook is only packaged with map layers):")
+        include_geometry = input('----------------------> ')
+        print("USER INPUT: include map layers: {}".format(include_geometry))
+        if include_geometry not in ["y", "n", "Y", "N"]:
+            print("must type y or n")
+            continue
+        return include_geometry.lower() == 'y'
+
 
 # ==============================================================================
 
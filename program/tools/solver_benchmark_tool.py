@@ -0,0 +1,202 @@
+# -------------------------------------------------------------------------------
+# Name:        Solver Benchmark Tool
+# Purpose:     Re-runs the o2 step of existing FTOT scenarios with each available solver
+#               and compares the objective values and runtimes
+# -------------------------------------------------------------------------------
+
+import os
+import re
+import csv
+import shutil
+import time
+from xml.dom import minidom
+
+# To run script, run C:\FTOT\python3_env\python.exe C:\FTOT\program\tools\ftot_tools.py
+
+
+# ======================================================================================================================
+
+
+# Define FTOT filepaths
+PYTHON = r"C:\FTOT\python3_env\python.exe"
+FTOT = r"C:\FTOT\program\ftot.py"
+
+# solvers to compare, as entered in the Solver element of the scenario XML
+SOLVERS = ["CBC", "HIGHS", "MCF"]
+
+BENCHMARK_XML = "scenario_solver_benchmark.xml"
+BACKUP_DB = "main_solver_benchmark_backup.db"
+
+
+# ==============================================================================
+
+
+def get_scenarios_dir():
+    print("Provide a directory path containing the FTOT scenarios to benchmark (e.g., C:\\FTOT\\scenarios\\reference_scenarios)")
+    print("Each scenario must already be run through the o1 step")
+    scenarios_dir = ""
+    scenarios_dir = input('----------------------> ')
+    print(f"USER INPUT: the scenarios directory path provided is {scenarios_dir}")
+
+    if not os.path.exists(scenarios_dir):
+        raise Exception("This scenarios directory path does not exist. Please specify an existing directory path.")
+
+    return scenarios_dir
+
+
+# ==============================================================================
+
+
+def find_scenarios(scenarios_dir):
+    # any folder (searched recursively) with a scenario.xml and a main.db from a previous run
+    scenario_paths = []
+    for root, dirs, files in os.walk(scenarios_dir):
+        if 'scenario.xml' in files:
+            if 'main.db' in files:
+                scenario_paths.append(root)
+            else:
+                print(f"skipping {root}: no main.db found, run the scenario through the o1 step first")
+    return sorted(scenario_paths)
+
+
+# ==============================================================================
+
+
+def write_benchmark_xml(scen_path, solver):
+    # copy of scenario.xml in the same folder (so that outputs go to the same scenario) with the solver replaced
+    xmlScenarioFile = minidom.parse(os.path.join(scen_path, 'scenario.xml'))
+    route_optimization = xmlScenarioFile.getElementsByTagName('Route_Optimization_Script')[0]
+
+    if len(xmlScenarioFile.getElementsByTagName('Solver_Options')):
+        solver_options = xmlScenarioFile.getElementsByTagName('Solver_Options')[0]
+    else:
+        solver_options = xmlScenarioFile.createElement('Solver_Options')
+        route_optimization.insertBefore(solver_options,
+                                        xmlScenarioFile.getElementsByTagName('Unmet_Demand_Penalty')[0])
+
+    if len(solver_options.getElementsByTagName('Solver')):
+        solver_options.getElementsByTagName('Solver')[0].firstChild.data = solver
+    else:
+        solver_element = xmlScenarioFile.createElement('Solver')
+        solver_element.appendChild(xmlScenarioFile.createTextNode(solver))
+        solver_options.insertBefore(solver_element, solver_options.firstChild)
+
+    xml_path = os.path.join(scen_path, BENCHMARK_XML)
+    with open(xml_path, 'w') as f:
+        xmlScenarioFile.writexml(f)
+
+    return xml_path
+
+
+# ==============================================================================
+
+
+def get_latest_log(scen_path, step):
+    log_path = os.path.join(scen_path, 'logs')
+    log_list = sorted([log for log in os.listdir(log_path) if re.match(f'{step}_log_', log)])
+    if not log_list:
+        return None
+    return os.path.join(log_path, log_list[-1])
+
+
+# ==============================================================================
+
+
+def read_o2_log(log_file):
+    # returns the objective value, the o2 runtime string, and whether the solver fell back to CBC
+    objective = None
+    runtime = None
+    fallback = False
+    objective_pattern = r"Optimal Objective Value: \s*([0-9,.\-]+)"
+    runtime_pattern = r"o2 Step - Total Runtime \(HMS\): \s*([0-9]+(:[0-9]+)+)"
+    with open(log_file, 'r') as textfile:
+        for line in textfile:
+            match = re.search(objective_pattern, line)
+            if match:
+                objective = float(match.group(1).replace(',', ''))
+            match = re.search(runtime_pattern, line)
+            if match:
+                runtime = match.group(1)
+            if "Defaulting to CBC solver" in line:
+                fallback = True
+    return objective, runtime, fallback
+
+
+# ==============================================================================
+
+
+def run_solver_benchmark_tool():
+    scenarios_dir = get_scenarios_dir()
+    scenario_paths = find_scenarios(scenarios_dir)
+    if not scenario_paths:
+        raise Exception("No scenarios with a scenario.xml and main.db were found in this directory.")
+
+    results_file = os.path.join(scenarios_dir, 'solver_benchmark_results.csv')
+    results = []
+
+    for scen_path in scenario_paths:
+        print(f"Benchmarking {scen_path}")
+        db_path = os.path.join(scen_path, 'main.db')
+        backup_db_path = os.path.join(scen_path, BACKUP_DB)
+
+        # keep the original optimization results so the scenario can be post-processed as before
+        shutil.copy(db_path, backup_db_path)
+
+        try:
+            for solver in SOLVERS:
+                print(f"Running o2 with solver {solver}")
+                xml_path = write_benchmark_xml(scen_path, solver)
+                previous_log = get_latest_log(scen_path, 'o2')
+
+                start_time = time.time()
+                cmd = PYTHON + ' ' + FTOT + ' ' + xml_path + ' o2'
+                os.system(cmd)
+                wall_seconds = time.time() - start_time
+
+                log_file = get_latest_log(scen_path, 'o2')
+                if log_file is None or log_file == previous_log:
+                    print(f"WARNING: no new o2 log file found for solver {solver}")
+                    objective, runtime, fallback = None, None, False
+                else:
+                    objective, runtime, fallback = read_o2_log(log_file)
+
+                results.append({'scenario': os.path.relpath(scen_path, scenarios_dir),
+                                'solver': solver,
+                                'objective_value': objective,
+                                'o2_runtime_hms': runtime,
+                                'wall_clock_seconds': round(wall_seconds, 1),
+                                'note': 'not a pure network problem, solved with CBC' if fallback else ''})
+                print(results[-1])
+        finally:
+            shutil.copy(backup_db_path, db_path)
+            os.remove(backup_db_path)
+            if os.path.exists(os.path.join(scen_path, BENCHMARK_XML)):
+                os.remove(os.path.join(scen_path, BENCHMARK_XML))
+
+        # flag solvers whose objective differs from CBC
+        scenario_results = [r for r in results if r['scenario'] == os.path.relpath(scen_path, scenarios_dir)]
+        cbc_objective = scenario_results[0]['objective_value']
+        for r in scenario_results[1:]:
+            if cbc_objective is not None and r['objective_value'] is not None and \
+                    abs(r['objective_value'] - cbc_objective) > max(1, abs(cbc_objective) * 1e-6):
+                print(f"WARNING: {r['solver']} objective {r['objective_value']} differs from CBC objective {cbc_objective}")
+
+        with open(results_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['scenario', 'solver', 'objective_value', 'o2_runtime_hms',
+                                                   'wall_clock_seconds', 'note'])
+            writer.writeheader()
+            writer.writerows(results)
+
+    print(f"Results written to {results_file}")
+
+
+# ==============================================================================
+
+
+def run():
+    os.system('cls')
+    print("FTOT Solver Benchmark Tool")
+    print("-------------------------------")
+    print("")
+    print("")
+    run_solver_benchmark_tool()
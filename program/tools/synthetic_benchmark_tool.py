@@ -0,0 +1,616 @@
+# -------------------------------------------------------------------------------
+# Name:        Synthetic Benchmark Tool
+# Purpose:     Generates synthetic FTOT scenarios of configurable size directly into
+#               main.db and main.gdb, runs the FTOT steps on them and records the
+#               wall time, peak memory and model size of each step
+# -------------------------------------------------------------------------------
+
+import os
+import csv
+import json
+import math
+import random
+import shutil
+import sqlite3
+import subprocess
+import time
+import datetime
+from xml.dom import minidom
+
+# To run script, run C:\FTOT\python3_env\python.exe C:\FTOT\program\tools\ftot_tools.py
+
+
+# ======================================================================================================================
+
+
+# Define FTOT filepaths
+PYTHON = r"C:\FTOT\python3_env\python.exe"
+FTOT = r"C:\FTOT\program\ftot.py"
+
+TEMPLATE_XML = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'lib', 'v8_temp_Scenario.xml')
+
+# steps timed on each synthetic scenario, in run order
+BENCHMARK_STEPS = ['g', 'o1', 'o2', 'p', 'd']
+
+# steps that still use arcpy; all other steps, including g, are run with -skip_arcpy_check
+ARCPY_STEPS = ['p', 'd']
+
+# network geometry, in the meters of the projected coordinate system
+NETWORK_EPSG = 5070  # NAD83 / Conus Albers
+NETWORK_ORIGIN = (1000000.0, 1500000.0)
+NODE_SPACING = 1609.344  # one mile
+LOCATION_OFFSET = 0.25 * NODE_SPACING
+CO_LOCATION_OFFSET = 0.1
+METERS_PER_MILE = 1609.344
+
+UNMET_DEMAND_PENALTY = 5000
+
+RESULTS_FIELDS = ['run_timestamp', 'scenario', 'network_type', 'network_nodes', 'facilities', 'commodities', 'days',
+                  'step', 'status', 'wall_clock_seconds', 'peak_memory_mb', 'num_vertices', 'num_edges',
+                  'num_variables', 'num_constraints']
+
+
+# ==============================================================================
+
+
+def get_user_input(prompt, default, cast):
+    value = input('{} [{}] ----------------------> '.format(prompt, default))
+    if value.strip() == '':
+        value = default
+    try:
+        value = cast(value)
+    except ValueError:
+        raise Exception("{} is not a valid entry for: {}".format(value, prompt))
+    print("USER INPUT: {}: {}".format(prompt, value))
+    return value
+
+
+# ==============================================================================
+
+
+def get_benchmark_settings():
+    print("Provide a directory path where the synthetic scenarios and the benchmark results will be written "
+          "(e.g., C:\\FTOT\\scenarios\\benchmarks)")
+    benchmark_dir = input('----------------------> ')
+    print(f"USER INPUT: the benchmark directory path provided is {benchmark_dir}")
+    if not os.path.exists(benchmark_dir):
+        os.makedirs(benchmark_dir)
+
+    network_type = get_user_input("Network type (grid or random)", 'grid', str).lower()
+    if network_type not in ['grid', 'random']:
+        raise Exception("The network type must be grid or random.")
+
+    settings = {'benchmark_dir': benchmark_dir,
+                'network_type': network_type,
+                'network_nodes': get_user_input("Number of network nodes", 400, int),
+                'facilities': get_user_input("Number of facilities (N)", 20, int),
+                'commodities': get_user_input("Number of commodities (M)", 2, int),
+                'days': get_user_input("Number of schedule days (D)", 1, int),
+                'seed': get_user_input("Random seed", 1, int)}
+
+    if settings['facilities'] < 2:
+        raise Exception("At least two facilities are needed, a raw material producer and a destination.")
+    if settings['facilities'] > settings['network_nodes']:
+        raise Exception("The number of facilities cannot exceed the number of network nodes.")
+    if settings['commodities'] < 1 or settings['days'] < 1:
+        raise Exception("The number of commodities and the number of days must be at least one.")
+
+    return settings
+
+
+# ==============================================================================
+
+
+def make_grid_network(num_nodes):
+    # square grid, links between horizontal and vertical neighbors
+    side = int(math.ceil(math.sqrt(num_nodes)))
+    nodes = []
+    for i in range(num_nodes):
+        row, col = divmod(i, side)
+        nodes.append((NETWORK_ORIGIN[0] + col * NODE_SPACING, NETWORK_ORIGIN[1] + row * NODE_SPACING))
+
+    links = []
+    for i in range(num_nodes):
+        row, col = divmod(i, side)
+        if col + 1 < side and i + 1 < num_nodes:
+            links.append((i, i + 1))
+        if i + side < num_nodes:
+            links.append((i, i + side))
+    return nodes, links
+
+
+# ==============================================================================
+
+
+def make_random_network(num_nodes, rand):
+    # random geometric graph: nodes placed uniformly at the grid density, linked to every node within the radius
+    extent = NODE_SPACING * math.sqrt(num_nodes)
+    radius = 1.5 * NODE_SPACING
+    nodes = [(NETWORK_ORIGIN[0] + rand.uniform(0, extent), NETWORK_ORIGIN[1] + rand.uniform(0, extent))
+             for i in range(num_nodes)]
+
+    # bucket the nodes by radius-sized cells so only neighboring cells are compared
+    cells = {}
+    for i, (x, y) in enumerate(nodes):
+        cells.setdefault((int((x - NETWORK_ORIGIN[0]) // radius), int((y - NETWORK_ORIGIN[1]) // radius)), []).append(i)
+
+    links = []
+    for (cx, cy), cell_nodes in cells.items():
+        for dx in [-1, 0, 1]:
+            for dy in [-1, 0, 1]:
+                for i in cell_nodes:
+                    for j in cells.get((cx + dx, cy + dy), []):
+                        if i < j and math.dist(nodes[i], nodes[j]) <= radius:
+                            links.append((i, j))
+
+    # join any disconnected components so every facility can reach every other
+    parent = list(range(num_nodes))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in links:
+        parent[find(i)] = find(j)
+
+    components = {}
+    for i in range(num_nodes):
+        components.setdefault(find(i), i)
+    component_nodes = sorted(components.values(), key=lambda i: nodes[i])
+    for i, j in zip(component_nodes[:-1], component_nodes[1:]):
+        links.append((i, j))
+
+    return nodes, links
+
+
+# ==============================================================================
+
+
+def make_facilities(nodes, num_facilities, num_commodities, rand):
+    # half of the facilities (rounded up) are raw material producers, the rest are destinations
+    # every facility handles every commodity, so the model grows with N x M x D
+    num_rmps = int(math.ceil(num_facilities / 2.0))
+    facility_nodes = rand.sample(range(len(nodes)), num_facilities)
+
+    facilities = []
+    for index, node in enumerate(facility_nodes):
+        if index < num_rmps:
+            facility_type = 'raw_material_producer'
+            facility_name = 'rmp_{}'.format(index + 1)
+            quantities = [round(rand.uniform(100, 1000), 2) for c in range(num_commodities)]
+        else:
+            facility_type = 'ultimate_destination'
+            facility_name = 'dest_{}'.format(index - num_rmps + 1)
+            quantities = [round(rand.uniform(50, 500), 2) for c in range(num_commodities)]
+        x = nodes[node][0] + LOCATION_OFFSET
+        y = nodes[node][1] + LOCATION_OFFSET
+        facilities.append({'location_id': index + 1,
+                           'facility_name': facility_name,
+                           'facility_type': facility_type,
+                           'node': node,
+                           'x': round(x, 2),
+                           'y': round(y, 2),
+                           'quantities': quantities})
+    return facilities
+
+
+# ==============================================================================
+
+
+def write_input_csvs(scen_path, facilities, num_commodities, num_days):
+    input_dir = os.path.join(scen_path, 'input_data')
+    if not os.path.exists(input_dir):
+        os.makedirs(input_dir)
+
+    for file_name, facility_type, io in [('rmp.csv', 'raw_material_producer', 'o'),
+                                         ('dest.csv', 'ultimate_destination', 'i')]:
+        with open(os.path.join(input_dir, file_name), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['facility_name', 'facility_type', 'commodity', 'value', 'units', 'phase_of_matter', 'io'])
+            for facility in facilities:
+                if facility['facility_type'] == facility_type:
+                    for c in range(num_commodities):
+                        writer.writerow([facility['facility_name'], facility_type, 'commodity_{}'.format(c + 1),
+                                         facility['quantities'][c], 'tons', 'solid', io])
+
+    with open(os.path.join(input_dir, 'schedule.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['schedule', 'day', 'availability'])
+        writer.writerow(['default', 0, 1])
+        for day in range(1, num_days + 1):
+            writer.writerow(['default', day, 1])
+
+    return input_dir
+
+
+# ==============================================================================
+
+
+def write_scenario_xml(scen_path, input_dir, scenario_name):
+    xmlScenarioFile = minidom.parse(TEMPLATE_XML)
+
+    def set_text(tag_name, value, parent=xmlScenarioFile):
+        parent.getElementsByTagName(tag_name)[0].firstChild.data = str(value)
+
+    main_gdb = os.path.join(scen_path, 'main.gdb')
+    set_text('Scenario_Name', scenario_name)
+    set_text('Scenario_Description', 'Synthetic benchmark scenario')
+    set_text('Common_Data_Folder', scen_path)
+    set_text('Base_Network_Gdb', main_gdb)
+    set_text('Base_RMP_Layer', os.path.join(main_gdb, 'raw_material_producers'))
+    set_text('Base_Destination_Layer', os.path.join(main_gdb, 'ultimate_destinations'))
+    set_text('RMP_Commodity_Data', os.path.join(input_dir, 'rmp.csv'))
+    set_text('Destinations_Commodity_Data', os.path.join(input_dir, 'dest.csv'))
+    set_text('Schedule_Data', os.path.join(input_dir, 'schedule.csv'))
+    set_text('Unmet_Demand_Penalty', UNMET_DEMAND_PENALTY)
+
+    # the synthetic network is road only
+    permitted_modes = xmlScenarioFile.getElementsByTagName('Permitted_Modes')[0]
+    for mode in ['Road', 'Rail', 'Water', 'Pipeline_Crude', 'Pipeline_Prod']:
+        set_text(mode, 'True' if mode == 'Road' else 'False', permitted_modes)
+
+    xml_path = os.path.join(scen_path, 'scenario.xml')
+    with open(xml_path, 'w') as f:
+        xmlScenarioFile.writexml(f)
+
+    return xml_path
+
+
+# ==============================================================================
+
+
+def write_main_gdb(scen_path, nodes, links, facilities, rand):
+    # the network and locations as they are after the c step: artificial links already hooked in,
+    # and the source and source_OID fields populated
+    try:
+        from osgeo import ogr, osr
+    except ImportError:
+        raise ImportError("The synthetic benchmark tool requires GDAL: http://www.gdal.org/")
+
+    main_gdb = os.path.join(scen_path, 'main.gdb')
+    if os.path.exists(main_gdb):
+        shutil.rmtree(main_gdb)
+
+    driver = ogr.GetDriverByName('OpenFileGDB')
+    gdb = driver.CreateDataSource(main_gdb)
+    if gdb is None:
+        raise Exception("Unable to create {}. GDAL 3.6 or later is required to write file geodatabases.".format(main_gdb))
+
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(NETWORK_EPSG)
+
+    def create_layer(name, geometry_type, fields, options=None):
+        layer = gdb.CreateLayer(name, srs, geometry_type, options=options or [])
+        for field_name, field_type in fields:
+            layer.CreateField(ogr.FieldDefn(field_name, field_type))
+        return layer
+
+    # road links
+    # ---------------------------------------------------------
+    road = create_layer('road', ogr.wkbLineString,
+                        [('Mode_Type', ogr.OFTString), ('Artificial', ogr.OFTInteger), ('Dir_Flag', ogr.OFTInteger),
+                         ('Length', ogr.OFTReal), ('Link_Type', ogr.OFTString), ('Volume', ogr.OFTReal),
+                         ('VCR', ogr.OFTReal), ('Capacity', ogr.OFTReal), ('Urban_Rural', ogr.OFTInteger),
+                         ('Limited_Access', ogr.OFTInteger), ('LOCATION_ID', ogr.OFTInteger),
+                         ('LOCATION_ID_NAME', ogr.OFTString), ('source', ogr.OFTString),
+                         ('source_OID', ogr.OFTInteger)],
+                        ['FEATURE_DATASET=network'])
+
+    source_oid = 0
+
+    def add_road_link(from_point, to_point, artificial, location_id=None, location_id_name=None):
+        nonlocal source_oid
+        source_oid += 1
+        line = ogr.Geometry(ogr.wkbLineString)
+        line.AddPoint_2D(*from_point)
+        line.AddPoint_2D(*to_point)
+        feature = ogr.Feature(road.GetLayerDefn())
+        feature.SetGeometry(line)
+        feature.SetField('Mode_Type', 'road')
+        feature.SetField('Artificial', artificial)
+        feature.SetField('Dir_Flag', 0)
+        feature.SetField('Length', line.Length() / METERS_PER_MILE)
+        if artificial == 0:
+            feature.SetField('Link_Type', 'Local')
+            feature.SetField('Volume', 0)
+            feature.SetField('VCR', 0)
+            feature.SetField('Capacity', 0)
+            feature.SetField('Urban_Rural', rand.randint(0, 1))
+            feature.SetField('Limited_Access', 0)
+        else:
+            feature.SetField('LOCATION_ID', location_id)
+            feature.SetField('LOCATION_ID_NAME', location_id_name)
+        feature.SetField('source', 'road')
+        feature.SetField('source_OID', source_oid)
+        road.CreateFeature(feature)
+
+    road.StartTransaction()
+    for i, j in links:
+        add_road_link(nodes[i], nodes[j], 0)
+    for facility in facilities:
+        node_point = nodes[facility['node']]
+        for suffix, offset in [('_OUT', CO_LOCATION_OFFSET), ('_IN', -CO_LOCATION_OFFSET)]:
+            location_point = (facility['x'] + offset, facility['y'] + offset)
+            add_road_link(location_point, node_point, 1, facility['location_id'],
+                          str(facility['location_id']) + suffix)
+    road.CommitTransaction()
+
+    # locations, an _IN and _OUT point per location
+    # ---------------------------------------------------------
+    locations = create_layer('locations', ogr.wkbPoint,
+                             [('location_id', ogr.OFTString), ('location_id_name', ogr.OFTString),
+                              ('connects_road', ogr.OFTInteger), ('connects_rail', ogr.OFTInteger),
+                              ('connects_water', ogr.OFTInteger), ('connects_pipeline_prod_trf_rts', ogr.OFTInteger),
+                              ('connects_pipeline_crude_trf_rts', ogr.OFTInteger), ('ignore', ogr.OFTInteger),
+                              ('source', ogr.OFTString), ('source_OID', ogr.OFTInteger)])
+    locations.StartTransaction()
+    location_oid = 0
+    for facility in facilities:
+        for suffix, offset in [('_OUT', CO_LOCATION_OFFSET), ('_IN', -CO_LOCATION_OFFSET)]:
+            location_oid += 1
+            point = ogr.Geometry(ogr.wkbPoint)
+            point.AddPoint_2D(facility['x'] + offset, facility['y'] + offset)
+            feature = ogr.Feature(locations.GetLayerDefn())
+            feature.SetGeometry(point)
+            feature.SetField('location_id', str(facility['location_id']))
+            feature.SetField('location_id_name', str(facility['location_id']) + suffix)
+            feature.SetField('connects_road', 1)
+            for field_name in ['connects_rail', 'connects_water', 'connects_pipeline_prod_trf_rts',
+                               'connects_pipeline_crude_trf_rts', 'ignore']:
+                feature.SetField(field_name, 0)
+            feature.SetField('source', 'locations')
+            feature.SetField('source_OID', location_oid)
+            locations.CreateFeature(feature)
+    locations.CommitTransaction()
+
+    # facility feature classes used by the p step
+    # ---------------------------------------------------------
+    for fc, facility_type in [('raw_material_producers', 'raw_material_producer'),
+                              ('ultimate_destinations', 'ultimate_destination'),
+                              ('processors', 'processor')]:
+        layer = create_layer(fc, ogr.wkbPoint, [('facility_name', ogr.OFTString)])
+        for facility in facilities:
+            if facility['facility_type'] == facility_type:
+                point = ogr.Geometry(ogr.wkbPoint)
+                point.AddPoint_2D(facility['x'], facility['y'])
+                feature = ogr.Feature(layer.GetLayerDefn())
+                feature.SetGeometry(point)
+                feature.SetField('facility_name', facility['facility_name'])
+                layer.CreateFeature(feature)
+
+    gdb = None
+    return main_gdb
+
+
+# ==============================================================================
+
+
+def write_main_db(scen_path, facilities, num_commodities, num_days):
+    # the main.db tables as they are after the s, f and c steps
+    main_db = os.path.join(scen_path, 'main.db')
+    if os.path.exists(main_db):
+        os.remove(main_db)
+
+    with sqlite3.connect(main_db) as db_con:
+        db_con.executescript("""
+            create table config(param text, value text, primary key(param));
+
+            create table locations(location_ID INTEGER PRIMARY KEY, shape_x real, shape_y real, ignore_location text);
+
+            create table facilities(facility_ID INTEGER PRIMARY KEY, location_id integer, facility_name text, facility_type_id integer,
+            ignore_facility text, candidate integer, schedule_id integer, max_capacity_ratio numeric, build_cost numeric, min_capacity_ratio numeric,
+            availability numeric, capacity_scaling numeric, scaling_factor numeric);
+
+            create table facility_type_id(facility_type_id INTEGER PRIMARY KEY, facility_type text);
+
+            create table phase_of_matter_id(phase_of_matter_id INTEGER PRIMARY KEY, phase_of_matter text);
+
+            create table facility_commodities(facility_id integer, location_id integer, commodity_id interger,
+            quantity numeric, units text, original_quantity numeric, original_units text, io text, share_max_transport_distance text, scaled_quantity numeric, udp numeric, access_cost numeric);
+
+            create table commodities(commodity_ID INTEGER PRIMARY KEY, commodity_name text, supertype text, subtype text,
+            units text, phase_of_matter text, density text, density_value numeric, density_units text, max_transport_distance numeric, proportion_of_supertype numeric,
+            share_max_transport_distance text, CONSTRAINT unique_name UNIQUE(commodity_name) );
+
+            create table schedule_names(schedule_id INTEGER PRIMARY KEY, schedule_name text, tot_availability numeric);
+
+            create table schedules(schedule_id integer, day integer, availability numeric);
+
+            create table coprocessing(coproc_id integer, label text, description text);
+
+            create table vehicle_types(mode text, vehicle_label text, property_name text, property_value text,
+            CONSTRAINT unique_vehicle_and_property UNIQUE(mode, vehicle_label, property_name));
+
+            create table commodity_mode(mode text, commodity_id text, commodity_phase text, vehicle_label text, allowed_yn text,
+            CONSTRAINT unique_commodity_and_mode UNIQUE(commodity_id, mode));
+
+            create table capacity_nodes(source text, id_field_name text, source_OID integer, capacity real, volume real, vcr real);
+
+            create table pipeline_mapping(source text, id_field_name text, id integer, mapping_id_field_name text, mapping_id integer);
+            """)
+
+        # schedules: a default schedule available on every day
+        db_con.execute("insert into schedule_names (schedule_id, schedule_name, tot_availability) values (1, 'default', ?);",
+                       (num_days,))
+        db_con.executemany("insert into schedules (schedule_id, day, availability) values (1, ?, 1);",
+                           [(day,) for day in range(num_days + 1)])
+
+        db_con.executemany("insert into facility_type_id (facility_type_id, facility_type) values (?, ?);",
+                           [(1, 'raw_material_producer'), (2, 'ultimate_destination')])
+
+        db_con.executemany("insert into commodities (commodity_id, commodity_name, units, phase_of_matter, share_max_transport_distance) "
+                           "values (?, ?, 'tons', 'solid', 'N');",
+                           [(c + 1, 'commodity_{}'.format(c + 1)) for c in range(num_commodities)])
+
+        db_con.executemany("insert into commodity_mode (mode, commodity_id, commodity_phase, vehicle_label, allowed_yn) "
+                           "values ('road', ?, 'solid', 'Default', 'Y');",
+                           [(c + 1,) for c in range(num_commodities)])
+
+        location_rows = []
+        facility_rows = []
+        facility_commodity_rows = []
+        for facility in facilities:
+            location_id = facility['location_id']
+            is_rmp = facility['facility_type'] == 'raw_material_producer'
+            location_rows.append((location_id, facility['x'], facility['y']))
+            facility_rows.append((location_id, str(location_id), facility['facility_name'], 1 if is_rmp else 2, num_days))
+            for c in range(num_commodities):
+                quantity = facility['quantities'][c]
+                facility_commodity_rows.append((location_id, str(location_id), c + 1, quantity, quantity,
+                                                'o' if is_rmp else 'i', None if is_rmp else UNMET_DEMAND_PENALTY))
+
+        db_con.executemany("insert into locations (location_id, shape_x, shape_y, ignore_location) values (?, ?, ?, 'false');",
+                           location_rows)
+        db_con.executemany("insert into facilities (facility_id, location_id, facility_name, facility_type_id, ignore_facility, "
+                           "candidate, schedule_id, build_cost, availability) values (?, ?, ?, ?, 'false', 0, 1, 0, ?);",
+                           facility_rows)
+        db_con.executemany("insert into facility_commodities (facility_id, location_id, commodity_id, quantity, units, "
+                           "original_quantity, original_units, io, share_max_transport_distance, udp, access_cost) "
+                           "values (?, ?, ?, ?, 'tons', ?, 'tons', ?, 'N', ?, 0);",
+                           facility_commodity_rows)
+
+    return main_db
+
+
+# ==============================================================================
+
+
+def generate_synthetic_scenario(scen_path, network_type, network_nodes, num_facilities, num_commodities, num_days, seed):
+    rand = random.Random(seed)
+
+    if network_type == 'grid':
+        nodes, links = make_grid_network(network_nodes)
+    else:
+        nodes, links = make_random_network(network_nodes, rand)
+    facilities = make_facilities(nodes, num_facilities, num_commodities, rand)
+
+    if not os.path.exists(scen_path):
+        os.makedirs(scen_path)
+    input_dir = write_input_csvs(scen_path, facilities, num_commodities, num_days)
+    xml_path = write_scenario_xml(scen_path, input_dir, os.path.basename(scen_path))
+    write_main_gdb(scen_path, nodes, links, facilities, rand)
+    write_main_db(scen_path, facilities, num_commodities, num_days)
+
+    print("Generated {}: {} network nodes, {} links, {} facilities, {} commodities, {} days".format(
+        scen_path, len(nodes), len(links), len(facilities), num_commodities, num_days))
+    return xml_path
+
+
+# ==============================================================================
+
+
+def get_latest_step_records(step, scen_path):
+    # records from the most recent run of a step, from the run metrics file written by the FTOT logger
+    metrics_file = os.path.join(scen_path, 'logs', 'run_metrics.jsonl')
+    step_records = []
+    if not os.path.exists(metrics_file):
+        return step_records
+
+    latest_log_file = None
+    with open(metrics_file, 'r') as mf:
+        for line in mf:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record['step'] != step:
+                continue
+            # records are appended in time order, so a new log file means a newer run of the step
+            if record['log_file'] != latest_log_file:
+                latest_log_file = record['log_file']
+                step_records = []
+            step_records.append(record)
+
+    return step_records
+
+
+# ==============================================================================
+
+
+def run_benchmark_steps(xml_path, steps):
+    scen_path = os.path.dirname(xml_path)
+    step_results = []
+    for step in steps:
+        print(f"Running step {step}")
+        cmd = [PYTHON, FTOT, xml_path, step]
+        if step not in ARCPY_STEPS:
+            cmd.append('-skip_arcpy_check')
+
+        start_time = time.time()
+        return_code = subprocess.call(cmd)
+        wall_seconds = time.time() - start_time
+
+        step_result = {'step': step,
+                       'status': 'complete' if return_code == 0 else 'failed',
+                       'wall_clock_seconds': round(wall_seconds, 2),
+                       'peak_memory_mb': None,
+                       'num_vertices': None,
+                       'num_edges': None,
+                       'num_variables': None,
+                       'num_constraints': None}
+
+        for record in get_latest_step_records(step, scen_path):
+            if record.get('peak_rss_mb') is not None:
+                step_result['peak_memory_mb'] = max(step_result['peak_memory_mb'] or 0, record['peak_rss_mb'])
+            if record.get('metric') in step_result:
+                step_result[record['metric']] = record['value']
+
+        step_results.append(step_result)
+        print(step_result)
+
+    return step_results
+
+
+# ==============================================================================
+
+
+def run_synthetic_benchmark_tool():
+    settings = get_benchmark_settings()
+
+    scenario_name = 'synthetic_{}_{}n_{}f_{}c_{}d'.format(settings['network_type'], settings['network_nodes'],
+                                                         settings['facilities'], settings['commodities'],
+                                                         settings['days'])
+    scen_path = os.path.join(settings['benchmark_dir'], scenario_name)
+    xml_path = generate_synthetic_scenario(scen_path, settings['network_type'], settings['network_nodes'],
+                                           settings['facilities'], settings['commodities'], settings['days'],
+                                           settings['seed'])
+
+    run_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    step_results = run_benchmark_steps(xml_path, BENCHMARK_STEPS)
+
+    # results from every run are appended so that regressions show up against earlier runs of the same size
+    results_file = os.path.join(settings['benchmark_dir'], 'benchmark_results.csv')
+    write_header = not os.path.exists(results_file)
+    with open(results_file, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULTS_FIELDS)
+        if write_header:
+            writer.writeheader()
+        for step_result in step_results:
+            row = {'run_timestamp': run_timestamp,
+                   'scenario': scenario_name,
+                   'network_type': settings['network_type'],
+                   'network_nodes': settings['network_nodes'],
+                   'facilities': settings['facilities'],
+                   'commodities': settings['commodities'],
+                   'days': settings['days']}
+            row.update(step_result)
+            writer.writerow(row)
+
+    failed_steps = [r['step'] for r in step_results if r['status'] == 'failed']
+    if failed_steps:
+        print("WARNING: the following steps failed, see the scenario logs: {}".format(failed_steps))
+    print(f"Results written to {results_file}")
+
+
+# ==============================================================================
+
+
+def run():
+    os.system('cls')
+    print("FTOT Synthetic Benchmark Tool")
+    print("-------------------------------")
+    print("")
+    print("")
+    run_synthetic_benchmark_tool()
@@ -7,6 +7,7 @@
 import pandas as pd
 import os
 import re
+import json
 from pint import UnitRegistry
 import sqlite3
 from IPython.display import display
@@ -25,6 +26,9 @@ import time
 PYTHON = r"C:\FTOT\python3_env\python.exe"
 FTOT = r"C:\FTOT\program\ftot.py"
 
+# UDP scaling factors solved together in each round of the search
+PROBES_PER_ROUND = 4
+
 # Define unit registry variables
 ureg = UnitRegistry()
 Q_ = ureg.Quantity
@@ -77,8 +81,8 @@ def get_commodity_name(scen_path):
 # ==============================================================================
 
 
-def get_metrics(commodity_name):
-    print(f"Provide a metric lower bound threshold (in US dollars per unit of {commodity_name})")
+def get_metrics(commodity_name, metric_cost):
+    print(f"Provide a metric lower bound threshold ({metric_cost} in US dollars per unit of {commodity_name})")
     metric_lower_bound = ""
     metric_lower_bound = input('----------------------> ')
     print(f"USER INPUT: metric lower bound provided is {metric_lower_bound}")
@@ -88,7 +92,7 @@ def get_metrics(commodity_name):
     except: 
         raise Exception("metric lower bound needs to be a numerical value")
 
-    print(f"Provide a metric upper bound threshold (in US dollars per unit of {commodity_name})")
+    print(f"Provide a metric upper bound threshold ({metric_cost} in US dollars per unit of {commodity_name})")
     metric_upper_bound = ""
     metric_upper_bound = input('----------------------> ')
     print(f"USER INPUT: metric upper bound provided is {metric_upper_bound}")
@@ -152,21 +156,39 @@ def get_max_scenario_runs():
 # ==============================================================================
 
 
+def get_latest_step_records(step, scen_path):
+    # records from the most recent run of a step, from the run metrics file written by the FTOT logger
+    metrics_file = os.path.join(scen_path, 'logs', 'run_metrics.jsonl')
+    step_records = []
+    if not os.path.exists(metrics_file):
+        return step_records
+
+    latest_log_file = None
+    with open(metrics_file, 'r') as mf:
+        for line in mf:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record['step'] != step:
+                continue
+            # records are appended in time order, so a new log file means a newer run of the step
+            if record['log_file'] != latest_log_file:
+                latest_log_file = record['log_file']
+                step_records = []
+            step_records.append(record)
+
+    return step_records
+
+
+# ==============================================================================
+
+
 def check_step_run_log(step, scen_path):
-    log_path = os.path.join(scen_path, 'logs')
-    log_list = []
-    for log in os.listdir(log_path):
-        if re.match(f'{step}_', log):
-            log_list.append(log)
-    latest_log = log_list[len(log_list)-1]
-
-    # checks the last line of the each log and makes sure it gets the time
-    total_flow_pattern = fr"{step} Step - Total Runtime \(HMS\): 	([0-9]+(:[0-9]+)+)"
-    with open(os.path.join(log_path, latest_log), 'r') as textfile:
-        for line in textfile:
-            match = re.search(total_flow_pattern, line)
-            if match:
-                return 
+    # the step's total runtime is recorded as the last record of a completed run
+    for record in get_latest_step_records(step, scen_path):
+        if record['level'] == 'RUNTIME' and record['message'].startswith(f"{step} Step - Total Runtime (HMS):"):
+            return
     # if no matches are found
     raise Exception(f"Something may be wrong with the {step}-log file. Please check that log for errors!")
 
@@ -214,7 +236,7 @@ def run_all_steps(XMLSCENARIO, PYTHON, FTOT, scen_path, db_path, scaling_factor)
 
         # create original table and update udp in udp_sensitivity_facility_commodities using scaling factor
         if step == 'f':
-            initialize_original_udp_table(db_path)
+            initialize_original_udp_table(db_path, get_default_udp(XMLSCENARIO))
             update_facilities_udp_with_scalar(scaling_factor, db_path)
 
         # after f and f2 step, update udp in facility_commodities
@@ -250,28 +272,21 @@ def update_facilities_udp_with_scalar(scaling_factor, db_path):
 
 
 def retrieve_flow_unit_delivered(scen_path, commodity_name):
-    # use most recent p log file to extract total flow all modes for specified commodity_name
-    log_path = os.path.join(scen_path, 'logs')
-    log_list = []
-    for log in os.listdir(log_path):
-        if re.match('p_', log):
-            log_list.append(log)
-    latest_log = log_list[len(log_list)-1]
-
-    # get the total flow of commodity
-    total_flow_pattern = fr'(?:RESULT   COMMODITY_SUMMARY_{commodity_name.upper()}_TOTAL_FLOW_ALLMODES:\s+)(\d+(?:,\d+)*(?:\.\d+)?)\s*:\s*(\w+)'
-
-    with open(os.path.join(log_path, latest_log), 'r') as textfile:
-        for line in textfile:
-            match = re.search(total_flow_pattern, line)
-            if match:
-                # extract number and take out commas
-                number = match.group(1).replace(',', '')
-                units = match.group(2)
-                total_flow_delivered = f"{number} {units}"
+    # use most recent p step results to extract total flow all modes for specified commodity_name
+    total_flow_pattern = fr'^COMMODITY_SUMMARY_{commodity_name.upper()}_TOTAL_FLOW_ALLMODES:\s+(\d+(?:,\d+)*(?:\.\d+)?)\s*:\s*(\w+)'
+
+    for record in get_latest_step_records('p', scen_path):
+        if record['level'] != 'RESULT':
+            continue
+        match = re.search(total_flow_pattern, record['message'])
+        if match:
+            # extract number and take out commas
+            number = match.group(1).replace(',', '')
+            units = match.group(2)
+            total_flow_delivered = f"{number} {units}"
+
+            return total_flow_delivered # string of number and flow unit
 
-                return total_flow_delivered # string of number and flow unit
-            
     return None
 
 
@@ -408,20 +423,225 @@ def rename_main_db(scen_path, num_scenario_runs):
 # ==============================================================================
  
 
-def initialize_original_udp_table(db_path):
+def get_default_udp(XMLSCENARIO):
+    # the scenario XML Unmet_Demand_Penalty, which o1 applies to destinations without a udp in dest.csv
+    xmlScenarioFile = minidom.parse(XMLSCENARIO)
+    return float(xmlScenarioFile.getElementsByTagName('Unmet_Demand_Penalty')[0].firstChild.data)
+
+
+# ==============================================================================
+
+
+def initialize_original_udp_table(db_path, default_udp):
     with sqlite3.connect(db_path) as db_con:
         cursor = db_con.cursor()
 
         # creating new table since the candidate steps rewrites the facility commodities table
         cursor.execute("create table udp_sensitivity_facility_commodities as select * from facility_commodities")
         cursor.execute("alter table udp_sensitivity_facility_commodities add column original_udp text;")
-        cursor.execute("update udp_sensitivity_facility_commodities set original_udp = udp;")
+        # destinations without a udp are scaled from the default UDP
+        cursor.execute("update udp_sensitivity_facility_commodities set original_udp = ifnull(udp, ?);",
+                       (default_udp,))
 
     return
 
 # ==============================================================================
 
 
+def uses_candidate_generation(XMLSCENARIO):
+    # UDP values also drive the candidate generation optimization, so those scenarios re-run every step per probe
+    xmlScenarioFile = minidom.parse(XMLSCENARIO)
+    return xmlScenarioFile.getElementsByTagName('Processors_Candidate_Commodity_Data')[0].firstChild.data.lower() != "none"
+
+
+# ==============================================================================
+
+
+def run_network_and_model_steps(XMLSCENARIO, PYTHON, FTOT, scen_path, db_path):
+    # the network, facilities, edges and vertices do not depend on the UDP, so they are built once
+    for step in ['s', 'f', 'c', 'g', 'o1']:
+        print(f"Running {step}")
+        cmd = PYTHON + ' ' + FTOT + ' ' + XMLSCENARIO + ' ' + step
+        os.system(cmd)
+        check_step_run_log(step, scen_path)
+
+    # keep the o1 UDP of each vertex, the probes scale from these values
+    with sqlite3.connect(db_path) as db_con:
+        db_con.execute("drop table if exists udp_sensitivity_vertices;")
+        db_con.execute("create table udp_sensitivity_vertices as select vertex_id, udp original_udp from vertices;")
+
+    return
+
+
+# ==============================================================================
+
+
+def get_top_level_commodity(db_path, commodity_name):
+    # the o2u results are reported by top level commodity, so a commodity subtype is resolved to its supertype
+    with sqlite3.connect(db_path) as db_con:
+        row = db_con.execute("select ifnull(supertype, commodity_name) from commodities where lower(commodity_name) = ?;",
+                             (commodity_name.lower(),)).fetchone()
+    if row is None:
+        raise Exception(f"The commodity {commodity_name} is not in the commodities table of {db_path}.")
+    if row[0].lower() != commodity_name.lower():
+        print(f"{commodity_name} is a subtype of {row[0]}. The metric is computed for the demand of {row[0]}.")
+    return row[0]
+
+
+# ==============================================================================
+
+
+def solve_probes(XMLSCENARIO, PYTHON, FTOT, scen_path, db_path, probe_list, top_level_commodity):
+    # solve the optimization problem for each (probe_id, scaling_factor) in probe_list with the o2u step
+    # returns a dict of probe_id -> (scaling_factor, flow cost string, flow delivered string)
+    # the flow cost is the objective cost of the flow on all edges, for all commodities, and the flow delivered is the
+    # met demand of top_level_commodity at the destinations
+    with sqlite3.connect(db_path) as db_con:
+        db_con.execute("drop table if exists udp_sensitivity_probes;")
+        db_con.execute("create table udp_sensitivity_probes(probe_id integer, scaling_factor real);")
+        db_con.executemany("insert into udp_sensitivity_probes values (?, ?);", probe_list)
+
+    print(f"Running o2u for scaling factors {[scaling_factor for probe_id, scaling_factor in probe_list]}")
+    cmd = PYTHON + ' ' + FTOT + ' ' + XMLSCENARIO + ' o2u'
+    os.system(cmd)
+    check_step_run_log('o2u', scen_path)
+
+    probe_results = {}
+    with sqlite3.connect(db_path) as db_con:
+        sql = """select probe_id, scaling_factor, solver_status, flow_cost, cost_units, total_demand - unmet_demand,
+            demand_units
+            from udp_sensitivity_results where commodity_name = ?;"""
+        for row in db_con.execute(sql, (top_level_commodity,)):
+            probe_id, scaling_factor, solver_status, flow_cost, cost_units, flow_delivered, demand_units = row
+            if solver_status != 'Optimal' or flow_cost is None or flow_delivered is None:
+                raise Exception(f"The o2u step did not find an optimal solution for scaling factor {scaling_factor} "
+                                f"(solver status: {solver_status}). Check the o2u log file.")
+            probe_results[probe_id] = (scaling_factor, f"{flow_cost} {cost_units}", f"{flow_delivered} {demand_units}")
+
+    missing_probes = [scaling_factor for probe_id, scaling_factor in probe_list if probe_id not in probe_results]
+    if missing_probes:
+        raise Exception(f"The o2u step did not report results for {top_level_commodity} for scaling factors "
+                        f"{missing_probes}. Check the o2u log file.")
+
+    return probe_results
+
+
+# ==============================================================================
+
+
+def run_best_scaling_factor(XMLSCENARIO, PYTHON, FTOT, scen_path, db_path, scaling_factor):
+    # re-solve and report the probe with the best metric so that its report and map are available
+    with sqlite3.connect(db_path) as db_con:
+        db_con.execute("""update vertices
+            set udp = (
+                select original_udp * ? from udp_sensitivity_vertices
+                where udp_sensitivity_vertices.vertex_id = vertices.vertex_id
+        );""", (scaling_factor,))
+
+    for step in ['o2', 'p', 'd', 'm']:
+        print(f"Running {step}")
+        cmd = PYTHON + ' ' + FTOT + ' ' + XMLSCENARIO + ' ' + step
+        os.system(cmd)
+        check_step_run_log(step, scen_path)
+
+    return
+
+
+# ==============================================================================
+
+
+def run_probe_search(XMLSCENARIO, scen_path, db_path, commodity_name, metric_lower_bound, metric_upper_bound,
+                     max_scenario_runs, metric_flow_unit):
+    # builds the network and the optimization model once, then solves PROBES_PER_ROUND UDP scaling factors per
+    # round in parallel, narrowing the scaling factor interval after each round
+    # the metric is the optimization flow cost per unit of met demand. unlike the transport cost of the p step report
+    # (TRANSPORT_COST_ALLMODES / TOTAL_FLOW), the flow cost includes the routing costs (mode impedances,
+    # transloading and CO2 costs) of every edge, and the flow is the demand met at the destinations
+    metric_currency_unit = 'usd'
+    num_times_to_meet_threshold = 3
+
+    scaling_factor_lower_bound = 0
+    scaling_factor_upper_bound = 10000
+    scaling_factor = 1
+
+    best_metric = 99999
+    best_flow = -1
+    best_scenario_step = None
+
+    results_df = pd.DataFrame(columns=['scenario_run_number', 'total_flow_cost',
+                                       'total_flow_delivered', 'scaling_factor', 'metric'])
+
+    run_network_and_model_steps(XMLSCENARIO, PYTHON, FTOT, scen_path, db_path)
+    top_level_commodity = get_top_level_commodity(db_path, commodity_name)
+
+    num_scenario_runs = 1
+    while num_scenario_runs <= max_scenario_runs and num_times_to_meet_threshold > 0:
+        # the next bisection point plus evenly spaced points across the rest of the current interval
+        num_probes = min(PROBES_PER_ROUND, max_scenario_runs - num_scenario_runs + 1)
+        scaling_factors = [scaling_factor] + [scaling_factor_lower_bound + (scaling_factor_upper_bound - scaling_factor_lower_bound) * (i + 1) / num_probes
+                                              for i in range(num_probes - 1)]
+        probe_list = [(num_scenario_runs + i, factor) for i, factor in enumerate(sorted(set(scaling_factors)))]
+        probe_results = solve_probes(XMLSCENARIO, PYTHON, FTOT, scen_path, db_path, probe_list, top_level_commodity)
+
+        for probe_id, factor in probe_list:
+            factor, flow_cost, total_flow_delivered = probe_results[probe_id]
+
+            if Q_(total_flow_delivered).magnitude > 0:
+                metric_with_units = Q_(flow_cost).to(metric_currency_unit) / Q_(total_flow_delivered).to(metric_flow_unit)
+                metric = metric_with_units.magnitude
+            else:
+                # nothing is delivered, so there is no cost per unit delivered
+                print(f"No demand for {top_level_commodity} is met at scaling factor {factor}.")
+                metric = None
+
+            results_df_step = pd.DataFrame([[probe_id, flow_cost, total_flow_delivered, factor, metric]],
+                                           columns=['scenario_run_number', 'total_flow_cost',
+                                                    'total_flow_delivered', 'scaling_factor', 'metric'])
+            results_df = pd.concat([results_df, results_df_step])
+            print(results_df.iloc[[-1]])
+
+            if metric is None or metric < metric_lower_bound:
+                # no flow delivered or metric too low, raise the udp
+                scaling_factor_lower_bound = max(scaling_factor_lower_bound, factor)
+            elif metric > metric_upper_bound:
+                # metric too high, lower the udp
+                scaling_factor_upper_bound = min(scaling_factor_upper_bound, factor)
+            else:
+                print(f"We found a metric that meets the threshold! The metric is {metric} where scaling factor is {factor}.")
+                num_times_to_meet_threshold -= 1
+                flow = Q_(total_flow_delivered).to(metric_flow_unit).magnitude
+                # the higher flow is kept as the best, and for the same flow the lower metric
+                if flow > best_flow or (flow == best_flow and metric < best_metric):
+                    best_flow = flow
+                    best_flow_cost = flow_cost
+                    best_metric = metric
+                    best_scaling_factor = factor
+                    best_scenario_step = probe_id
+                # keep searching above this scaling factor to see if there's a better metric
+                scaling_factor_lower_bound = max(scaling_factor_lower_bound, factor)
+
+        results_df.to_csv(os.path.join(scen_path, 'Results.csv'), index=False)
+
+        scaling_factor = (scaling_factor_lower_bound + scaling_factor_upper_bound) / 2
+        num_scenario_runs += len(probe_list)
+
+    if best_scenario_step is None:
+        print("\nFinal Result:")
+        print(f"We did not manage to find an optimal routing solution in your specified interval.")
+        return
+
+    print(f"Running the report and map for scaling factor {best_scaling_factor}")
+    run_best_scaling_factor(XMLSCENARIO, PYTHON, FTOT, scen_path, db_path, best_scaling_factor)
+    rename_report_and_map_directories(scen_path, best_scenario_step)
+
+    print("\nFinal Result:")
+    print(f"In your specified interval, {best_flow_cost} is the lowest flow cost with the maximum amount delivered ({best_flow} {metric_flow_unit}).")
+    print(f"Refer to step {best_scenario_step} for the optimal map and report.")
+
+
+# ==============================================================================
+
+
 def run_sensitivity_tool():
     # INITIALIZATION STEP
     scen_path = get_scenario_dir()
@@ -429,11 +649,20 @@ def run_sensitivity_tool():
     db_path = os.path.join(scen_path, 'main.db')
 
     # store inputs as variables
+    # scenarios without candidate generation build the network and model once and solve the probes in parallel.
+    # their metric is the optimization flow cost per unit of met demand rather than the reported transport cost
+    probe_search = not uses_candidate_generation(XMLSCENARIO)
     commodity_name = get_commodity_name(scen_path)
-    metric_lower_bound, metric_upper_bound = get_metrics(commodity_name)
+    metric_lower_bound, metric_upper_bound = get_metrics(commodity_name,
+                                                         "flow cost" if probe_search else "transport cost")
     max_scenario_runs = get_max_scenario_runs()
     metric_flow_unit = get_metric_flow_unit(scen_path, commodity_name)
 
+    if probe_search:
+        run_probe_search(XMLSCENARIO, scen_path, db_path, commodity_name, metric_lower_bound, metric_upper_bound,
+                         max_scenario_runs, metric_flow_unit)
+        return
+
     # hard coded inputs
     metric_currency_unit = 'usd'
     num_times_to_meet_threshold = 3